@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Набор поврежденных записей камеры и объединение видео с восстановлением чтения по индексу потока
+(TaskDescription.stream_resync) и без него: время, количество прочитанных и попавших в результат кадров.
+
+Из каждой исходной записи (синтетической, см. synthetic_footage, или заданной через --source_files)
+делаются поврежденные копии:
+    truncated - файл обрезан (запись прервалась), последний кадр записан не полностью
+    garbage - участок файла заменен случайными байтами
+    zeros - участок файла заменен нулями
+    cut - участок файла вырезан (потеряны данные)
+    head - начало файла потеряно, поток начинается не с ключевого кадра (только для "сырых" файлов .h264)
+
+Индекс потока строится только для "сырых" файлов H.264, для записей в контейнере оба режима одинаковы.
+Поэтому, если синтетические записи получаются не в "сыром" H.264 (нет кодировщика H.264), вместо них
+записываются потоки из несжатых макроблоков (см. pcm_h264_stream).
+
+Запуск из корня проекта:
+    python -m benchmarks.damaged_footage --minutes 1 --files 1 --output results.json
+    python -m benchmarks.damaged_footage --source_files //nas/record/cam1/20220816180012.h264
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import typing
+
+from benchmarks.pcm_h264_stream import MAX_FRAMES_COUNT, write_pcm_stream
+from benchmarks.synthetic_footage import FILENAME_STRFTIME_FORMAT, generate_footage
+from source.h264_stream_index import H264StreamScanner
+from source.stage_metrics import StageMetrics
+from source.task.task_description import TaskDescription
+from source.task_processor import TaskProcessor
+
+DAMAGE_TRUNCATED = 'truncated'
+DAMAGE_GARBAGE = 'garbage'
+DAMAGE_ZEROS = 'zeros'
+DAMAGE_CUT = 'cut'
+DAMAGE_HEAD = 'head'
+
+DAMAGE_KINDS = (DAMAGE_TRUNCATED, DAMAGE_GARBAGE, DAMAGE_ZEROS, DAMAGE_CUT, DAMAGE_HEAD)
+
+
+def damage_data(data: bytes, kind: str, is_annex_b: bool, seed: int = 0) -> typing.Optional[bytes]:
+    """
+    Поврежденная копия содержимого файла. Места повреждений задаются долей размера файла, поэтому
+    повреждения детерминированы
+    :param is_annex_b: файл - "сырой" поток H.264
+    :return: None, если такое повреждение для этого формата не делается
+    """
+    size = len(data)
+    # размер испорченного участка - примерно несколько кадров
+    block_size = max(size // 100, 4096)
+    if kind == DAMAGE_TRUNCATED:
+        return data[:int(size * 0.7)]
+    if kind == DAMAGE_GARBAGE:
+        begin = int(size * 0.4)
+        random_state = random.Random(seed)
+        garbage = bytes([random_state.getrandbits(8) for _ in range(block_size)])
+        return data[:begin] + garbage + data[begin + block_size:]
+    if kind == DAMAGE_ZEROS:
+        begin = int(size * 0.55)
+        return data[:begin] + bytes(block_size) + data[begin + block_size:]
+    if kind == DAMAGE_CUT:
+        begin = int(size * 0.3)
+        return data[:begin] + data[begin + 2 * block_size:]
+    if kind == DAMAGE_HEAD:
+        if not is_annex_b:
+            # у контейнера без начала не читается весь файл
+            return None
+        # поток должен начинаться со стартового кода, иначе файл не распознается как "сырой" H.264
+        start_code_index = data.find(b'\x00\x00\x01', int(size * 0.1))
+        if start_code_index < 0:
+            return None
+        return data[start_code_index:]
+    raise ValueError('Неизвестный вид повреждения: {0}'.format(kind))
+
+
+def generate_pcm_footage(
+        output_dir: str,
+        minutes_per_file: float,
+        files_count: int,
+        fps: float = 25.0,
+        gop: int = 50,
+        start_time: datetime.datetime = datetime.datetime(2022, 8, 16, 18, 0, 0)
+) -> typing.List[str]:
+    """
+    Записи камеры в "сыром" H.264 без кодировщика (длина файла ограничена MAX_FRAMES_COUNT кадрами)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    frames_count = min(int(minutes_per_file * 60.0 * fps), MAX_FRAMES_COUNT)
+    filenames = []
+    for file_number in range(files_count):
+        file_start_time = start_time + datetime.timedelta(minutes=minutes_per_file * file_number)
+        filename = os.path.join(output_dir, file_start_time.strftime(FILENAME_STRFTIME_FORMAT) + '.h264')
+        if not os.path.isfile(filename):
+            print('Генерация записи: {0}'.format(filename))
+            write_pcm_stream(filename, frames_count, gop)
+        filenames.append(filename)
+    return filenames
+
+
+def generate_damaged_corpus(
+        source_files: typing.List[str],
+        output_dir: str,
+        kinds: typing.Iterable[str] = DAMAGE_KINDS
+) -> typing.List[typing.Tuple[str, str]]:
+    """
+    Сделать поврежденные копии записей (уже сделанные копии не перезаписываются)
+    :return: список (вид повреждения, файл копии)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    corpus = []
+    for source_number, source_filename in enumerate(source_files):
+        is_annex_b = H264StreamScanner.is_annex_b_file(source_filename)
+        name, extension = os.path.splitext(os.path.basename(source_filename))
+        data: typing.Optional[bytes] = None
+        for kind in kinds:
+            filename = os.path.join(output_dir, '{0}_{1}{2}'.format(name, kind, extension))
+            if not os.path.isfile(filename):
+                if data is None:
+                    with open(source_filename, 'rb') as source_file:
+                        data = source_file.read()
+                damaged_data = damage_data(data, kind, is_annex_b, seed=source_number)
+                if damaged_data is None:
+                    continue
+                with open(filename, 'wb') as damaged_file:
+                    damaged_file.write(damaged_data)
+            corpus.append((kind, filename))
+    return corpus
+
+
+def measure(
+        work_dir: str,
+        filename: str,
+        stream_resync: bool,
+        skipped_frames_count: int
+) -> dict:
+    task = TaskDescription()
+    task.input_files = [filename]
+    task.output_concatenation_filename = os.path.join(work_dir, 'concatenation.mkv')
+    task.auto_add_date_prefix_to_result_file = False
+    task.write_output_frame_index = False
+    task.output_video_width = 1280
+    task.output_video_height = 720
+    task.skipped_frames_count = skipped_frames_count
+    task.stream_resync = stream_resync
+    task.keyframe_index_dir = os.path.join(work_dir, 'keyframe_index')
+    task_processor = TaskProcessor()
+    task_processor.headless = True
+    begin = time.perf_counter()
+    task_processor.process_task(task)
+    elapsed = time.perf_counter() - begin
+    metrics = task_processor.metrics
+    return {
+        'seconds': elapsed,
+        'frames_grabbed': metrics.get_counter(StageMetrics.COUNTER_FRAMES_GRABBED),
+        'frames_kept': metrics.get_counter(StageMetrics.COUNTER_FRAMES_KEPT),
+        'grab_calls': metrics.get_report()['stages'].get(StageMetrics.STAGE_GRAB, {}).get('count', 0),
+        'damaged_regions': metrics.get_counter(StageMetrics.COUNTER_DAMAGED_REGIONS),
+    }
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument(
+        '--source_files', nargs='+', help='записи для повреждения (по умолчанию синтетические)')
+    argument_parser.add_argument('--footage_dir', help='каталог синтетических записей (по умолчанию временный)')
+    argument_parser.add_argument('--corpus_dir', help='каталог поврежденных копий (по умолчанию временный)')
+    argument_parser.add_argument('--width', type=int, default=1920)
+    argument_parser.add_argument('--height', type=int, default=1080)
+    argument_parser.add_argument('--minutes', type=float, default=1.0, help='длина одного файла в минутах')
+    argument_parser.add_argument('--files', type=int, default=1, help='количество файлов')
+    argument_parser.add_argument('--activity', type=float, default=0.3, help='доля времени с движением (0..1)')
+    argument_parser.add_argument('--kinds', nargs='+', choices=DAMAGE_KINDS, default=list(DAMAGE_KINDS))
+    argument_parser.add_argument('--skipped_frames_count', type=int, default=24)
+    argument_parser.add_argument('--output_fourcc', help='кодек выходных видео вместо H264')
+    argument_parser.add_argument('--output', help='файл для результатов в JSON')
+    args = argument_parser.parse_args()
+
+    if args.output_fourcc is not None:
+        TaskProcessor.OUTPUT_FOURCC = args.output_fourcc
+
+    results: typing.Dict[str, dict] = {}
+    temp_dir = tempfile.mkdtemp(prefix='fastplay_damaged_')
+    try:
+        source_files = args.source_files
+        if source_files is None:
+            footage_dir = args.footage_dir or os.path.join(temp_dir, 'footage')
+            source_files, _ = generate_footage(
+                footage_dir, args.width, args.height, args.minutes, args.files, args.activity)
+            if not H264StreamScanner.is_annex_b_file(source_files[0]):
+                # без "сырого" H.264 индекс потока не строится и восстановление чтения не проверяется
+                print('Синтетические записи не в "сыром" H.264, используются потоки из несжатых макроблоков')
+                source_files = generate_pcm_footage(os.path.join(footage_dir, 'pcm'), args.minutes, args.files)
+        corpus_dir = args.corpus_dir or os.path.join(temp_dir, 'corpus')
+        for kind, filename in generate_damaged_corpus(source_files, corpus_dir, args.kinds):
+            for stream_resync in [False, True]:
+                result = measure(temp_dir, filename, stream_resync, args.skipped_frames_count)
+                mode = 'resync' if stream_resync else 'plain'
+                results['{0} {1}'.format(os.path.basename(filename), mode)] = result
+                print('{0} ({1}), stream_resync={2}: {3:.2f} с, вызовов grab {4}, кадров в результате {5}, '
+                      'поврежденных участков {6}'.format(
+                        os.path.basename(filename), kind, stream_resync, result['seconds'], result['grab_calls'],
+                        result['frames_kept'], result['damaged_regions']))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({'parameters': vars(args), 'results': results}, output_file, ensure_ascii=False, indent=2)
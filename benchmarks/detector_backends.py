@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Сравнение скорости способов поиска людей (HOG и нейронная сеть через OpenCV DNN) на одном и том же видео.
+
+Запуск из корня проекта:
+    python -m benchmarks.detector_backends clip.mp4 --frames 200 --dnn_model MobileNetSSD_deploy.caffemodel
+        --dnn_config MobileNetSSD_deploy.prototxt --dnn_batch_size 1 4 8
+"""
+import argparse
+import time
+import typing
+
+import cv2
+import numpy
+
+from source.dnn_person_detector_backend import DnnPersonDetectorBackend
+from source.hog_person_detector_backend import HogPersonDetectorBackend
+from source.i_person_detector_backend import IPersonDetectorBackend
+
+# разрешение, на котором ObjectDetector ищет людей
+PROCESSED_FRAME_RESOLUTION = (768, 432)
+
+
+def read_frames(filename: str, frames_count: int, frames_step: int) -> typing.List[numpy.ndarray]:
+    """
+    Прочитать кадры видео (каждый frames_step кадр), уменьшенные до разрешения распознавания
+    """
+    frames = []
+    video = cv2.VideoCapture(filename)
+    try:
+        frame_index = 0
+        while len(frames) < frames_count:
+            is_ok, frame = video.read()
+            if not is_ok:
+                break
+            if frame_index % frames_step == 0:
+                frames.append(cv2.resize(frame, PROCESSED_FRAME_RESOLUTION))
+            frame_index += 1
+    finally:
+        video.release()
+    return frames
+
+
+def measure(backend: IPersonDetectorBackend, frames: typing.List[numpy.ndarray]) -> typing.Tuple[float, int]:
+    """
+    :return: (кадров в секунду, количество найденных людей)
+    """
+    # первый вызов не учитываем (инициализация)
+    backend.detect(frames[:1])
+    batch_size = backend.get_batch_size()
+    persons_count = 0
+    start_time = time.perf_counter()
+    for batch_begin in range(0, len(frames), batch_size):
+        for boxes, weights in backend.detect(frames[batch_begin:batch_begin + batch_size]):
+            persons_count += len([weight for weight in weights if weight > backend.get_detection_threshold()])
+    elapsed_time = time.perf_counter() - start_time
+    return len(frames) / elapsed_time, persons_count
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('input_video_file')
+    argument_parser.add_argument('--frames', type=int, default=100, help='сколько кадров распознавать')
+    argument_parser.add_argument('--frames_step', type=int, default=10, help='брать каждый N-й кадр видео')
+    argument_parser.add_argument('--dnn_model', help='файл модели нейронной сети (без него сравнивается только HOG)')
+    argument_parser.add_argument('--dnn_config', default='', help='файл описания нейронной сети')
+    argument_parser.add_argument('--dnn_input_size', type=int, nargs=2, default=[300, 300], help='ширина и высота')
+    argument_parser.add_argument('--dnn_threads', type=int, default=0, help='количество потоков OpenCV')
+    argument_parser.add_argument('--dnn_batch_size', type=int, nargs='+', default=[1, 4], help='размеры пакетов')
+    argument_parser.add_argument('--dnn_person_class_id', type=int, default=15)
+    args = argument_parser.parse_args()
+
+    test_frames = read_frames(args.input_video_file, args.frames, args.frames_step)
+    if len(test_frames) == 0:
+        raise SystemExit('Не удалось прочитать кадры: {0}'.format(args.input_video_file))
+    print('Кадров: {0}, разрешение распознавания: {1}x{2}'.format(len(test_frames), *PROCESSED_FRAME_RESOLUTION))
+
+    backends: typing.List[typing.Tuple[str, IPersonDetectorBackend]] = [('hog', HogPersonDetectorBackend())]
+    if args.dnn_model is not None:
+        for dnn_batch_size in args.dnn_batch_size:
+            backends.append((
+                'dnn, пакет {0}'.format(dnn_batch_size),
+                DnnPersonDetectorBackend(
+                    args.dnn_model,
+                    args.dnn_config,
+                    args.dnn_input_size[0],
+                    args.dnn_input_size[1],
+                    args.dnn_threads,
+                    dnn_batch_size,
+                    args.dnn_person_class_id
+                )
+            ))
+
+    for name, backend in backends:
+        frames_per_second, persons = measure(backend, test_frames)
+        print('{0}: {1:.1f} кадров/с, найдено людей: {2}'.format(name, frames_per_second, persons))
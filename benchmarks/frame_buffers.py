@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Сравнение объединения видео с поиском людей при повторном использовании буферов кадров и без него
+(VideoConcatenator.reuse_frame_buffers, ObjectDetector.reuse_frame_buffers): скорость, пиковый размер
+памяти процесса и, с --tracemalloc, пиковый объем памяти, выделенной через numpy/Python.
+
+Каждый режим запускается в отдельном процессе, чтобы пиковая память одного режима не влияла на другой.
+По умолчанию люди "находятся" в каждом кадре без реального распознавания (измеряется обработка кадров
+вокруг распознавания, в том числе построение выходного кадра), --hog включает поиск людей HOG.
+
+Запуск из корня проекта:
+    python -m benchmarks.frame_buffers --width 1920 --height 1080 --minutes 1 --files 1 --skipped_frames_count 4
+        --pipeline_queue_size 0 8 --output results.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+
+import cv2
+import numpy
+
+from benchmarks.synthetic_footage import generate_footage
+from source.frame_info import FrameInfo
+from source.i_frame_post_processor import IFramePostProcessor
+from source.i_person_detector_backend import IPersonDetectorBackend
+from source.object_detector import ObjectDetector
+from source.stage_metrics import StageMetrics
+from source.video_concatenator import VideoConcatenator
+
+try:
+    import resource
+except ImportError:
+    # нет в Windows, пиковый размер памяти процесса не измеряется
+    resource = None
+
+# разрешение, которое ожидает ObjectDetector
+DETECTION_FRAME_RESOLUTION = (1920, 1080)
+
+
+class _EveryFrameDetectorBackend(IPersonDetectorBackend):
+    """
+    "Находит" одного человека в каждом кадре без распознавания (чтобы время распознавания не скрывало
+    время обработки кадров), кадры распознаются пакетами
+    """
+
+    def get_window_size(self) -> typing.Tuple[int, int]:
+        return 64, 128
+
+    def get_detection_threshold(self) -> float:
+        return 0.5
+
+    def get_batch_size(self) -> int:
+        return 4
+
+    def detect(self, images: list) -> typing.List[typing.Tuple[list, list]]:
+        return [([(300, 150, 64, 128)], [0.9]) for _ in images]
+
+
+class _DetectorPostProcessor(IFramePostProcessor):
+    def __init__(self, object_detector: ObjectDetector):
+        self._object_detector = object_detector
+
+    def process_frame(self, frame: numpy.ndarray, frame_info: typing.Optional[FrameInfo] = None):
+        self._object_detector.process_frame(frame, frame_info)
+
+    def get_detected_frames_count(self) -> int:
+        return self._object_detector.detected_frames_count
+
+
+def get_peak_rss() -> typing.Optional[int]:
+    """
+    :return: пиковый размер памяти процесса в байтах (None - не поддерживается)
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # в Linux значение в килобайтах, в macOS - в байтах
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def measure(
+        work_dir: str,
+        footage_files: typing.List[str],
+        reuse_frame_buffers: bool,
+        skipped_frames_count: int,
+        pipeline_queue_size: int,
+        hog: bool,
+        trace_allocations: bool
+) -> dict:
+    """
+    Объединить видео с поиском людей (в текущем процессе)
+    """
+    if trace_allocations:
+        tracemalloc.start()
+    output_video = cv2.VideoWriter(
+        os.path.join(work_dir, 'concatenation.mp4'),
+        cv2.VideoWriter_fourcc(*ObjectDetector.OUTPUT_VIDEO_FOURCC),
+        25.0,
+        DETECTION_FRAME_RESOLUTION
+    )
+    if not output_video.isOpened():
+        raise Exception('кодек выходного видео {0} недоступен'.format(ObjectDetector.OUTPUT_VIDEO_FOURCC))
+
+    object_detector = ObjectDetector()
+    object_detector.headless = True
+    object_detector.reuse_frame_buffers = reuse_frame_buffers
+    object_detector.detector_backend = None if hog else _EveryFrameDetectorBackend()
+    object_detector.set_output_filename(os.path.join(work_dir, 'detection.mp4'))
+    object_detector.begin_detection(*DETECTION_FRAME_RESOLUTION)
+
+    concatenator = VideoConcatenator(output_video, *DETECTION_FRAME_RESOLUTION)
+    concatenator.headless = True
+    concatenator.reuse_frame_buffers = reuse_frame_buffers
+    concatenator.skipped_frames_count = skipped_frames_count
+    concatenator.pipeline_queue_size = pipeline_queue_size
+    concatenator.add_post_processor(_DetectorPostProcessor(object_detector))
+
+    begin = time.perf_counter()
+    try:
+        for filename in footage_files:
+            input_video = cv2.VideoCapture(filename)
+            try:
+                concatenator.append_video(input_video)
+            finally:
+                input_video.release()
+    finally:
+        object_detector.end_detection()
+        output_video.release()
+    elapsed = time.perf_counter() - begin
+
+    frames_count = concatenator.metrics.get_counter(StageMetrics.COUNTER_FRAMES_KEPT)
+    results = {
+        'seconds': elapsed,
+        'output_frames': frames_count,
+        'output_frames_per_second': frames_count / elapsed,
+        'detected_frames': object_detector.detected_frames_count,
+        'peak_rss': get_peak_rss(),
+    }
+    if trace_allocations:
+        results['traced_peak'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return results
+
+
+def measure_in_subprocess(args: argparse.Namespace, footage_files: typing.List[str], reuse_frame_buffers: bool,
+                          pipeline_queue_size: int, work_dir: str) -> dict:
+    command = [
+        sys.executable, '-m', 'benchmarks.frame_buffers', '--child',
+        '--reuse', str(int(reuse_frame_buffers)),
+        '--pipeline_queue_size', str(pipeline_queue_size),
+        '--skipped_frames_count', str(args.skipped_frames_count),
+        '--work_dir', work_dir,
+        '--footage_files', *footage_files
+    ]
+    if args.hog:
+        command.append('--hog')
+    if args.tracemalloc:
+        command.append('--tracemalloc')
+    if args.output_fourcc is not None:
+        command += ['--output_fourcc', args.output_fourcc]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, check=True)
+    return json.loads(completed.stdout.decode('utf-8').strip().splitlines()[-1])
+
+
+def format_bytes(value: typing.Optional[int]) -> str:
+    return '-' if value is None else '{0:.1f} МБ'.format(value / 1024.0 / 1024.0)
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('--footage_dir', help='каталог синтетических записей (по умолчанию временный)')
+    argument_parser.add_argument('--width', type=int, default=1920)
+    argument_parser.add_argument('--height', type=int, default=1080)
+    argument_parser.add_argument('--minutes', type=float, default=1.0, help='длина одного файла в минутах')
+    argument_parser.add_argument('--files', type=int, default=1, help='количество файлов')
+    argument_parser.add_argument('--activity', type=float, default=0.3, help='доля времени с движением (0..1)')
+    argument_parser.add_argument('--skipped_frames_count', type=int, default=4)
+    argument_parser.add_argument('--pipeline_queue_size', type=int, nargs='+', default=[0, 8])
+    argument_parser.add_argument('--hog', action='store_true', help='искать людей HOG')
+    argument_parser.add_argument('--tracemalloc', action='store_true',
+                                 help='измерять пиковую память numpy/Python (замедляет обработку)')
+    argument_parser.add_argument('--output_fourcc', help='кодек выходных видео вместо H264')
+    argument_parser.add_argument('--output', help='файл для результатов в JSON')
+    # параметры запуска одного режима в отдельном процессе
+    argument_parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    argument_parser.add_argument('--reuse', type=int, default=1, help=argparse.SUPPRESS)
+    argument_parser.add_argument('--work_dir', help=argparse.SUPPRESS)
+    argument_parser.add_argument('--footage_files', nargs='*', help=argparse.SUPPRESS)
+    args = argument_parser.parse_args()
+
+    if args.output_fourcc is not None:
+        ObjectDetector.OUTPUT_VIDEO_FOURCC = args.output_fourcc
+
+    if args.child:
+        child_results = measure(
+            args.work_dir, args.footage_files, bool(args.reuse), args.skipped_frames_count,
+            args.pipeline_queue_size[0], args.hog, args.tracemalloc)
+        print(json.dumps(child_results))
+        sys.exit(0)
+
+    results: typing.Dict[str, dict] = {}
+    temp_dir = tempfile.mkdtemp(prefix='fastplay_buffers_')
+    try:
+        footage_dir = args.footage_dir or os.path.join(temp_dir, 'footage')
+        footage_files, _ = generate_footage(
+            footage_dir, args.width, args.height, args.minutes, args.files, args.activity)
+        for queue_size in args.pipeline_queue_size:
+            for reuse in [False, True]:
+                name = 'pipeline {0}, reuse {1}'.format(queue_size, 'on' if reuse else 'off')
+                mode_dir = os.path.join(temp_dir, 'pipeline_{0}_reuse_{1}'.format(queue_size, int(reuse)))
+                os.makedirs(mode_dir, exist_ok=True)
+                result = measure_in_subprocess(args, footage_files, reuse, queue_size, mode_dir)
+                results[name] = result
+                print('{0}: {1:.1f} кадров/с, пиковая память процесса {2}, numpy/Python {3}'.format(
+                    name, result['output_frames_per_second'], format_bytes(result['peak_rss']),
+                    format_bytes(result.get('traced_peak'))))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({'parameters': vars(args), 'results': results}, output_file, ensure_ascii=False, indent=2)
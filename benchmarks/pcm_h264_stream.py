@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Генерация "сырого" потока H.264 (Annex-B) без кодировщика: ключевые кадры (IDR) состоят из несжатых
+макроблоков I_PCM, остальные кадры - из двух макроблоков I_PCM и пропущенных (P_Skip) макроблоков.
+Такой поток декодируется любым декодером H.264, поэтому поврежденные записи и чтение "сырых" файлов можно
+проверять и там, где нет ни ffmpeg, ни кодека H.264 в сборке OpenCV.
+
+Номер кадра записан в яркости первых двух макроблоков кадра и читается из декодированного кадра
+(см. get_frame_number), так что по декодированным кадрам видно, какие кадры потока потеряны.
+
+Запуск из корня проекта:
+    python -m benchmarks.pcm_h264_stream stream.h264 --frames 500 --gop_size 50
+"""
+import argparse
+import typing
+
+import numpy
+
+# номер кадра записывается двумя "цифрами" по _DIGIT_BASE значений яркости
+_DIGIT_BASE = 50
+_FIRST_LUMA = 20
+_LUMA_STEP = 4
+
+# макроблок 16x16: 256 отсчетов яркости и 2 * 64 отсчета цветности (4:2:0)
+_MACROBLOCK_LUMA_SIZE = 256
+_MACROBLOCK_CHROMA_SIZE = 128
+
+# log2_max_frame_num - 4 в SPS (frame_num занимает 4 бита)
+_LOG2_MAX_FRAME_NUM_MINUS4 = 0
+
+# mb_type макроблока I_PCM в I и P слайсах
+_MB_TYPE_I_PCM_IN_I_SLICE = 25
+_MB_TYPE_I_PCM_IN_P_SLICE = 30
+
+# slice_type (все слайсы картинки одного типа)
+_SLICE_TYPE_P = 5
+_SLICE_TYPE_I = 7
+
+MAX_FRAMES_COUNT = _DIGIT_BASE * _DIGIT_BASE
+
+
+class _BitWriter:
+    """
+    Запись полей заголовков H.264 (битами и кодами Exp-Golomb)
+    """
+
+    def __init__(self):
+        self._data = bytearray()
+        self._current_byte = 0
+        self._bits_count = 0
+
+    def write_bits(self, count: int, value: int):
+        for bit_index in range(count - 1, -1, -1):
+            self._current_byte = (self._current_byte << 1) | ((value >> bit_index) & 1)
+            self._bits_count += 1
+            if self._bits_count == 8:
+                self._data.append(self._current_byte)
+                self._current_byte = 0
+                self._bits_count = 0
+
+    def write_ue(self, value: int):
+        code = value + 1
+        self.write_bits(code.bit_length() - 1, 0)
+        self.write_bits(code.bit_length(), code)
+
+    def write_se(self, value: int):
+        self.write_ue(2 * value - 1 if value > 0 else -2 * value)
+
+    def align(self):
+        while self._bits_count != 0:
+            self.write_bits(1, 0)
+
+    def write_bytes(self, data: bytes):
+        assert self._bits_count == 0
+        self._data += data
+
+    def write_trailing_bits(self):
+        self.write_bits(1, 1)
+        self.align()
+
+    def get_bytes(self) -> bytes:
+        assert self._bits_count == 0
+        return bytes(self._data)
+
+
+def _make_nal_unit(nal_ref_idc: int, nal_type: int, rbsp: bytes) -> bytes:
+    """
+    NAL блок со стартовым кодом (в данные вставляются байты emulation_prevention_three_byte)
+    """
+    payload = bytearray()
+    zeros_count = 0
+    for byte in rbsp:
+        if zeros_count >= 2 and byte <= 3:
+            payload.append(3)
+            zeros_count = 0
+        payload.append(byte)
+        zeros_count = zeros_count + 1 if byte == 0 else 0
+    return b'\x00\x00\x00\x01' + bytes([(nal_ref_idc << 5) | nal_type]) + bytes(payload)
+
+
+def _make_sps(width_mbs: int, height_mbs: int) -> bytes:
+    writer = _BitWriter()
+    # profile_idc (Baseline), constraint_set0/1_flag, level_idc
+    writer.write_bits(8, 66)
+    writer.write_bits(8, 0xC0)
+    writer.write_bits(8, 30)
+    # seq_parameter_set_id, log2_max_frame_num_minus4, pic_order_cnt_type, max_num_ref_frames
+    writer.write_ue(0)
+    writer.write_ue(_LOG2_MAX_FRAME_NUM_MINUS4)
+    writer.write_ue(2)
+    writer.write_ue(1)
+    # gaps_in_frame_num_value_allowed_flag
+    writer.write_bits(1, 0)
+    writer.write_ue(width_mbs - 1)
+    writer.write_ue(height_mbs - 1)
+    # frame_mbs_only_flag, direct_8x8_inference_flag, frame_cropping_flag, vui_parameters_present_flag
+    writer.write_bits(4, 0b1100)
+    writer.write_trailing_bits()
+    return _make_nal_unit(3, 7, writer.get_bytes())
+
+
+def _make_pps() -> bytes:
+    writer = _BitWriter()
+    # pic_parameter_set_id, seq_parameter_set_id
+    writer.write_ue(0)
+    writer.write_ue(0)
+    # entropy_coding_mode_flag (CAVLC), bottom_field_pic_order_in_frame_present_flag
+    writer.write_bits(2, 0)
+    # num_slice_groups_minus1, num_ref_idx_l0_default_active_minus1, num_ref_idx_l1_default_active_minus1
+    writer.write_ue(0)
+    writer.write_ue(0)
+    writer.write_ue(0)
+    # weighted_pred_flag, weighted_bipred_idc
+    writer.write_bits(3, 0)
+    # pic_init_qp_minus26, pic_init_qs_minus26, chroma_qp_index_offset
+    writer.write_se(0)
+    writer.write_se(0)
+    writer.write_se(0)
+    # deblocking_filter_control_present_flag, constrained_intra_pred_flag, redundant_pic_cnt_present_flag
+    writer.write_bits(3, 0b100)
+    writer.write_trailing_bits()
+    return _make_nal_unit(3, 8, writer.get_bytes())
+
+
+def _write_pcm_macroblock(writer: _BitWriter, luma: int):
+    writer.align()
+    writer.write_bytes(bytes([luma]) * _MACROBLOCK_LUMA_SIZE + bytes([128]) * _MACROBLOCK_CHROMA_SIZE)
+
+
+def _write_slice_header_end(writer: _BitWriter):
+    # slice_qp_delta, disable_deblocking_filter_idc (фильтр выключен, яркость макроблоков не смешивается)
+    writer.write_se(0)
+    writer.write_ue(1)
+
+
+def _get_frame_luma(frame_number: int) -> typing.Tuple[int, int]:
+    """
+    Яркость первых двух макроблоков кадра
+    """
+    return (_FIRST_LUMA + _LUMA_STEP * (frame_number // _DIGIT_BASE),
+            _FIRST_LUMA + _LUMA_STEP * (frame_number % _DIGIT_BASE))
+
+
+def _make_idr_slice(width_mbs: int, height_mbs: int, frame_number: int, idr_pic_id: int) -> bytes:
+    writer = _BitWriter()
+    # first_mb_in_slice, slice_type, pic_parameter_set_id, frame_num, idr_pic_id
+    writer.write_ue(0)
+    writer.write_ue(_SLICE_TYPE_I)
+    writer.write_ue(0)
+    writer.write_bits(_LOG2_MAX_FRAME_NUM_MINUS4 + 4, 0)
+    writer.write_ue(idr_pic_id)
+    # no_output_of_prior_pics_flag, long_term_reference_flag
+    writer.write_bits(2, 0)
+    _write_slice_header_end(writer)
+    first_luma, second_luma = _get_frame_luma(frame_number)
+    for macroblock_index in range(width_mbs * height_mbs):
+        writer.write_ue(_MB_TYPE_I_PCM_IN_I_SLICE)
+        if macroblock_index < 2:
+            luma = first_luma if macroblock_index == 0 else second_luma
+        else:
+            # неподвижный фон
+            luma = 60 + (macroblock_index % 7) * 20
+        _write_pcm_macroblock(writer, luma)
+    writer.write_trailing_bits()
+    return _make_nal_unit(3, 5, writer.get_bytes())
+
+
+def _make_p_slice(width_mbs: int, height_mbs: int, frame_number: int, frame_num: int) -> bytes:
+    writer = _BitWriter()
+    # first_mb_in_slice, slice_type, pic_parameter_set_id, frame_num
+    writer.write_ue(0)
+    writer.write_ue(_SLICE_TYPE_P)
+    writer.write_ue(0)
+    writer.write_bits(_LOG2_MAX_FRAME_NUM_MINUS4 + 4, frame_num % (1 << (_LOG2_MAX_FRAME_NUM_MINUS4 + 4)))
+    # num_ref_idx_active_override_flag, ref_pic_list_modification_flag_l0, adaptive_ref_pic_marking_mode_flag
+    writer.write_bits(3, 0)
+    _write_slice_header_end(writer)
+    for luma in _get_frame_luma(frame_number):
+        # mb_skip_run, mb_type
+        writer.write_ue(0)
+        writer.write_ue(_MB_TYPE_I_PCM_IN_P_SLICE)
+        _write_pcm_macroblock(writer, luma)
+    # остальные макроблоки пропущены (копируются из предыдущего кадра)
+    writer.write_ue(width_mbs * height_mbs - 2)
+    writer.write_trailing_bits()
+    return _make_nal_unit(2, 1, writer.get_bytes())
+
+
+def write_pcm_stream(
+        filename: str,
+        frames_count: int,
+        gop_size: int = 50,
+        width_mbs: int = 4,
+        height_mbs: int = 3
+) -> typing.List[int]:
+    """
+    Записать поток H.264. Ключевые кадры (с SPS и PPS перед ними) - каждые gop_size кадров, начиная с первого
+    :param width_mbs: ширина кадра в макроблоках (16 пикселей)
+    :param height_mbs: высота кадра в макроблоках
+    :return: смещения блоков доступа всех кадров в файле
+    """
+    assert 0 < frames_count <= MAX_FRAMES_COUNT
+    assert gop_size > 0
+    assert width_mbs >= 2 and height_mbs >= 1
+    offsets = []
+    parameter_sets = _make_sps(width_mbs, height_mbs) + _make_pps()
+    with open(filename, 'wb') as output_file:
+        for frame_number in range(frames_count):
+            offsets.append(output_file.tell())
+            gop_frame_number = frame_number % gop_size
+            if gop_frame_number == 0:
+                output_file.write(parameter_sets)
+                output_file.write(_make_idr_slice(width_mbs, height_mbs, frame_number, (frame_number // gop_size) % 2))
+            else:
+                output_file.write(_make_p_slice(width_mbs, height_mbs, frame_number, gop_frame_number))
+    return offsets
+
+
+def get_frame_number(frame: numpy.ndarray) -> int:
+    """
+    Номер кадра потока по декодированному кадру (BGR, в разрешении потока)
+    """
+    digits = []
+    for x in (8, 24):
+        # серый цвет: G = 1.164 * (Y - 16)
+        luma = float(frame[8, x, 1]) / 1.164 + 16.0
+        digits.append(int(round((luma - _FIRST_LUMA) / _LUMA_STEP)))
+    return digits[0] * _DIGIT_BASE + digits[1]
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('filename')
+    argument_parser.add_argument('--frames', type=int, default=500)
+    argument_parser.add_argument('--gop_size', type=int, default=50)
+    argument_parser.add_argument('--width_mbs', type=int, default=20, help='ширина кадра в макроблоках')
+    argument_parser.add_argument('--height_mbs', type=int, default=15, help='высота кадра в макроблоках')
+    args = argument_parser.parse_args()
+    write_pcm_stream(args.filename, args.frames, args.gop_size, args.width_mbs, args.height_mbs)
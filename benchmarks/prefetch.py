@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Объединение видео с упреждающим чтением следующих входных файлов и без него (TaskDescription.prefetch_files):
+время обработки задачи и статистика упреждающего чтения.
+
+Перед каждым режимом входные файлы вытесняются из кэша операционной системы (posix_fadvise(DONTNEED),
+в Windows не поддерживается - там файлы могут оказаться в кэше после первого режима), поэтому каждый режим
+начинает с "холодного" чтения, как при первом обращении к файлам в сетевой папке. Сильнее всего разница видна,
+если --footage_dir находится в сетевой папке или на медленном диске.
+
+Запуск из корня проекта:
+    python -m benchmarks.prefetch --footage_dir //nas/record/bench --minutes 2 --files 6
+        --prefetch_files 0 1 2 --output results.json
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import typing
+
+from benchmarks.synthetic_footage import generate_footage
+from source.stage_metrics import StageMetrics
+from source.task.task_description import TaskDescription
+from source.task_processor import TaskProcessor
+
+
+def evict_from_cache(filenames: typing.List[str]) -> bool:
+    """
+    Вытеснить файлы из кэша операционной системы
+    :return: False, если это не поддерживается
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for filename in filenames:
+        with open(filename, 'rb') as file:
+            os.fsync(file.fileno())
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    return True
+
+
+def measure(
+        work_dir: str,
+        footage_files: typing.List[str],
+        prefetch_files: int,
+        prefetch_budget_mb: int,
+        skipped_frames_count: int,
+        pipeline_queue_size: int
+) -> dict:
+    task = TaskDescription()
+    task.input_files = footage_files
+    task.output_concatenation_filename = os.path.join(work_dir, 'concatenation_{0}.mkv'.format(prefetch_files))
+    task.auto_add_date_prefix_to_result_file = False
+    task.write_output_frame_index = False
+    task.output_video_width = 1280
+    task.output_video_height = 720
+    task.skipped_frames_count = skipped_frames_count
+    task.pipeline_queue_size = pipeline_queue_size
+    task.prefetch_files = prefetch_files
+    task.prefetch_budget_mb = prefetch_budget_mb
+    task_processor = TaskProcessor()
+    task_processor.headless = True
+    begin = time.perf_counter()
+    task_processor.process_task(task)
+    elapsed = time.perf_counter() - begin
+    metrics = task_processor.metrics
+    return {
+        'seconds': elapsed,
+        'prefetch_hits': metrics.get_counter(StageMetrics.COUNTER_PREFETCH_HITS),
+        'prefetch_partial': metrics.get_counter(StageMetrics.COUNTER_PREFETCH_PARTIAL),
+        'prefetch_misses': metrics.get_counter(StageMetrics.COUNTER_PREFETCH_MISSES),
+        'prefetched_bytes': metrics.get_counter(StageMetrics.COUNTER_PREFETCHED_BYTES),
+        'grab_seconds': metrics.get_report()['stages'].get(StageMetrics.STAGE_GRAB, {}).get('sum', 0.0),
+    }
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('--footage_dir', help='каталог синтетических записей (по умолчанию временный)')
+    argument_parser.add_argument('--width', type=int, default=1920)
+    argument_parser.add_argument('--height', type=int, default=1080)
+    argument_parser.add_argument('--minutes', type=float, default=1.0, help='длина одного файла в минутах')
+    argument_parser.add_argument('--files', type=int, default=4, help='количество файлов')
+    argument_parser.add_argument('--activity', type=float, default=0.3, help='доля времени с движением (0..1)')
+    argument_parser.add_argument('--skipped_frames_count', type=int, default=24)
+    argument_parser.add_argument('--pipeline_queue_size', type=int, default=8)
+    argument_parser.add_argument('--prefetch_files', type=int, nargs='+', default=[0, 1])
+    argument_parser.add_argument('--prefetch_budget_mb', type=int, default=512)
+    argument_parser.add_argument('--output_fourcc', help='кодек выходных видео вместо H264')
+    argument_parser.add_argument('--output', help='файл для результатов в JSON')
+    args = argument_parser.parse_args()
+
+    if args.output_fourcc is not None:
+        TaskProcessor.OUTPUT_FOURCC = args.output_fourcc
+
+    results: typing.Dict[str, dict] = {}
+    temp_dir = tempfile.mkdtemp(prefix='fastplay_prefetch_')
+    try:
+        footage_dir = args.footage_dir or os.path.join(temp_dir, 'footage')
+        footage_files, _ = generate_footage(
+            footage_dir, args.width, args.height, args.minutes, args.files, args.activity)
+        for prefetch_files in args.prefetch_files:
+            if not evict_from_cache(footage_files):
+                print('Вытеснение файлов из кэша не поддерживается, файлы могут читаться из кэша')
+            result = measure(temp_dir, footage_files, prefetch_files, args.prefetch_budget_mb,
+                             args.skipped_frames_count, args.pipeline_queue_size)
+            results['prefetch {0}'.format(prefetch_files)] = result
+            print('prefetch {0}: {1:.2f} с (чтение кадров {2:.2f} с), заранее прочитаны {3}, частично {4}, '
+                  'не прочитаны {5}'.format(prefetch_files, result['seconds'], result['grab_seconds'],
+                                            result['prefetch_hits'], result['prefetch_partial'],
+                                            result['prefetch_misses']))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({'parameters': vars(args), 'results': results}, output_file, ensure_ascii=False, indent=2)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Набор тестов скорости на синтетических записях камеры (см. synthetic_footage): поиск видеофайлов,
+объединение видео, поиск людей и обработка задачи целиком. Результаты пишутся в JSON, чтобы сравнивать
+запуски на разных версиях и машинах (--baseline печатает отношение к результатам прошлого запуска).
+
+Запуск из корня проекта:
+    python -m benchmarks.suite --width 1920 --height 1080 --minutes 1 --files 2 --activity 0.3
+        --output results.json --baseline previous.json
+
+Если в сборке OpenCV нет кодека H.264, для выходных видео можно указать другой кодек: --output_fourcc mp4v
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import typing
+
+import cv2
+
+from benchmarks.synthetic_footage import SyntheticFootageGenerator, generate_footage
+from source.object_detector import ObjectDetector
+from source.task.task_description import TaskDescription
+from source.task_processor import TaskProcessor
+from source.video_concatenator import VideoConcatenator
+from source.video_files_index import VideoFilesIndex
+from source.video_files_searcher import VideoFilesSearcher
+
+RESULTS_VERSION = 1
+
+# разрешение, которое ожидает ObjectDetector
+DETECTION_FRAME_RESOLUTION = (1920, 1080)
+
+
+class StageSkipped(Exception):
+    """
+    Этап нельзя выполнить в этом окружении (например, нет нужного кодека)
+    """
+
+
+def measure_search(work_dir: str, days: int, files_per_hour: int, repeats: int) -> dict:
+    """
+    Поиск видеофайлов за сутки в каталоге архива за days дней: через glob и однократным чтением каталога
+    """
+    archive_dir = os.path.join(work_dir, 'search_archive')
+    os.makedirs(archive_dir, exist_ok=True)
+    start_time = datetime.datetime(2022, 8, 1, 0, 0, 0)
+    minutes_step = 60 // files_per_hour
+    files_count = 0
+    for minute in range(0, days * 24 * 60, minutes_step):
+        name = (start_time + datetime.timedelta(minutes=minute)).strftime('%Y%m%d%H%M%S') + '.h264'
+        # файлы создаются по пути, который строит VideoFilesSearcher ('{dir}\\{name}', как в Windows)
+        open('{dir}\\{name}'.format(dir=archive_dir, name=name), 'a').close()
+        files_count += 1
+
+    result = {'archive_files': files_count}
+    for mode_name, single_scan in (('glob', False), ('single_scan', True)):
+        searcher = VideoFilesSearcher()
+        searcher.strftime_pattern = '%Y%m%d%H%M'
+        searcher.suffix_pattern = '*.h264'
+        searcher.reference_date = start_time + datetime.timedelta(days=days // 2 + 1)
+        searcher.single_scan = single_scan
+        times = []
+        found_files: typing.List[str] = []
+        for _ in range(repeats):
+            # индекс каталога запоминается между поисками - каждый повтор измеряется с чтением каталога
+            VideoFilesIndex.clear_cache()
+            begin = time.perf_counter()
+            found_files = searcher.search_video_files(archive_dir)
+            times.append(time.perf_counter() - begin)
+        result[mode_name] = {'seconds': min(times), 'found_files': len(found_files)}
+    VideoFilesIndex.clear_cache()
+    return result
+
+
+def check_fourcc(work_dir: str, fourcc: str, extension: str) -> bool:
+    filename = os.path.join(work_dir, 'probe_' + fourcc + extension)
+    video = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*fourcc), 25.0, (64, 64))
+    is_opened = video.isOpened()
+    video.release()
+    if os.path.isfile(filename):
+        os.remove(filename)
+    return is_opened
+
+
+def get_frames_count(filename: str) -> int:
+    input_video = cv2.VideoCapture(filename)
+    try:
+        frames_count = int(input_video.get(cv2.CAP_PROP_FRAME_COUNT))
+        if frames_count > 0:
+            return frames_count
+        # у "сырых" потоков количество кадров неизвестно - считаем без декодирования
+        frames_count = 0
+        while input_video.grab():
+            frames_count += 1
+        return frames_count
+    finally:
+        input_video.release()
+
+
+def measure_concatenation(
+        work_dir: str,
+        footage_files: typing.List[str],
+        skipped_frames_count: int,
+        pipeline_queue_size: int
+) -> dict:
+    """
+    Скорость VideoConcatenator.append_video (входных кадров в секунду, без поиска людей)
+    """
+    if not check_fourcc(work_dir, TaskProcessor.OUTPUT_FOURCC, '.mp4'):
+        raise StageSkipped('кодек выходного видео {0} недоступен'.format(TaskProcessor.OUTPUT_FOURCC))
+    output_filename = os.path.join(work_dir, 'concatenation.mp4')
+    output_video = cv2.VideoWriter(
+        output_filename, cv2.VideoWriter_fourcc(*TaskProcessor.OUTPUT_FOURCC), TaskProcessor.OUTPUT_FPS, (960, 540))
+    input_frames_count = 0
+    try:
+        concatenator = VideoConcatenator(output_video, 960, 540)
+        concatenator.headless = True
+        concatenator.skipped_frames_count = skipped_frames_count
+        concatenator.pipeline_queue_size = pipeline_queue_size
+        begin = time.perf_counter()
+        for filename in footage_files:
+            input_video = cv2.VideoCapture(filename)
+            try:
+                concatenator.append_video(input_video)
+            finally:
+                input_video.release()
+        elapsed = time.perf_counter() - begin
+    finally:
+        output_video.release()
+    for filename in footage_files:
+        input_frames_count += get_frames_count(filename)
+    return {
+        'seconds': elapsed,
+        'input_frames': input_frames_count,
+        'input_frames_per_second': input_frames_count / elapsed,
+        'output_frames': get_frames_count(output_filename),
+    }
+
+
+def measure_detection(work_dir: str, frames_count: int, activity: float) -> dict:
+    """
+    Скорость ObjectDetector.process_frame (кадров в секунду) на кадрах 1920x1080
+    """
+    if not check_fourcc(work_dir, ObjectDetector.OUTPUT_VIDEO_FOURCC, '.mp4'):
+        raise StageSkipped('кодек видео распознавания {0} недоступен'.format(ObjectDetector.OUTPUT_VIDEO_FOURCC))
+    generator = SyntheticFootageGenerator(DETECTION_FRAME_RESOLUTION[0], DETECTION_FRAME_RESOLUTION[1], 25.0, activity)
+
+    # кадры берутся с шагом, как при объединении, и готовятся заранее, чтобы измерять только распознавание
+    frames = [generator.get_frame(frame_number * 25) for frame_number in range(frames_count)]
+    object_detector = ObjectDetector()
+    object_detector.headless = True
+    object_detector.write_frame_index = False
+    object_detector.set_output_filename(os.path.join(work_dir, 'detection.mp4'))
+    object_detector.begin_detection(*DETECTION_FRAME_RESOLUTION)
+    begin = time.perf_counter()
+    try:
+        for frame in frames:
+            object_detector.process_frame(frame)
+    finally:
+        object_detector.end_detection()
+    elapsed = time.perf_counter() - begin
+    return {
+        'seconds': elapsed,
+        'frames': frames_count,
+        'frames_per_second': frames_count / elapsed,
+        'detected_frames': object_detector.detected_frames_count,
+    }
+
+
+def measure_task(
+        work_dir: str,
+        footage_files: typing.List[str],
+        skipped_frames_count: int,
+        pipeline_queue_size: int,
+        detection: bool
+) -> dict:
+    """
+    Время обработки задачи целиком (TaskProcessor.process_task)
+    """
+    if not check_fourcc(work_dir, TaskProcessor.OUTPUT_FOURCC, '.mp4'):
+        raise StageSkipped('кодек выходного видео {0} недоступен'.format(TaskProcessor.OUTPUT_FOURCC))
+    task_dir = os.path.join(work_dir, 'task')
+    os.makedirs(task_dir, exist_ok=True)
+    task_description = TaskDescription()
+    task_description.input_files = list(footage_files)
+    task_description.auto_add_date_prefix_to_result_file = False
+    task_description.output_concatenation_filename = os.path.join(task_dir, 'concatenation.mp4')
+    if detection:
+        task_description.output_object_detection_filename = os.path.join(task_dir, 'detection.mp4')
+        task_description.output_video_width, task_description.output_video_height = DETECTION_FRAME_RESOLUTION
+    task_description.skipped_frames_count = skipped_frames_count
+    task_description.pipeline_queue_size = pipeline_queue_size
+    task_processor = TaskProcessor()
+    task_processor.headless = True
+    begin = time.perf_counter()
+    task_processor.process_task(task_description)
+    elapsed = time.perf_counter() - begin
+    return {
+        'seconds': elapsed,
+        'output_frames': get_frames_count(task_description.get_actual_output_concatenation_filename()),
+        'stage_seconds': {stage: histogram['sum']
+                          for stage, histogram in task_processor.metrics.get_report()['stages'].items()},
+        'counters': task_processor.metrics.get_report()['counters'],
+    }
+
+
+def run_stage(results: dict, name: str, stage_function: typing.Callable, *args):
+    print('--- {0} ---'.format(name))
+    try:
+        results[name] = stage_function(*args)
+    except StageSkipped as e:
+        results[name] = {'skipped': str(e)}
+    print(json.dumps(results[name], ensure_ascii=False))
+
+
+def get_machine_info() -> dict:
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'opencv_threads': cv2.getNumThreads(),
+    }
+
+
+def print_comparison(results: dict, baseline: dict):
+    """
+    Напечатать отношение времени этапов к времени прошлого запуска (меньше 1 - стало быстрее)
+    """
+    print('--- Сравнение с {0} ({1}) ---'.format(
+        baseline.get('timestamp'), baseline.get('machine', {}).get('platform')))
+    for stage_name, stage_results in results.items():
+        baseline_results = baseline.get('results', {}).get(stage_name, {})
+        for key, value in stage_results.items():
+            baseline_value = baseline_results.get(key)
+            if isinstance(value, dict):
+                value = value.get('seconds')
+                baseline_value = baseline_value.get('seconds') if isinstance(baseline_value, dict) else None
+            elif key != 'seconds':
+                continue
+            if isinstance(value, float) and isinstance(baseline_value, float) and baseline_value > 0.0:
+                print('{0} {1}: {2:.3f} с, было {3:.3f} с ({4:.2f})'.format(
+                    stage_name, key, value, baseline_value, value / baseline_value))
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('--footage_dir', help='каталог синтетических записей (по умолчанию временный)')
+    argument_parser.add_argument('--width', type=int, default=1920)
+    argument_parser.add_argument('--height', type=int, default=1080)
+    argument_parser.add_argument('--fps', type=float, default=25.0)
+    argument_parser.add_argument('--minutes', type=float, default=1.0, help='длина одного файла в минутах')
+    argument_parser.add_argument('--files', type=int, default=2, help='количество файлов')
+    argument_parser.add_argument('--activity', type=float, default=0.3, help='доля времени с движением (0..1)')
+    argument_parser.add_argument('--skipped_frames_count', type=int, default=110)
+    argument_parser.add_argument('--pipeline_queue_size', type=int, default=8, help='для сравнения с 0')
+    argument_parser.add_argument('--detection_frames', type=int, default=50)
+    argument_parser.add_argument('--search_days', type=int, default=30)
+    argument_parser.add_argument('--search_files_per_hour', type=int, default=6)
+    argument_parser.add_argument('--output_fourcc', help='кодек выходных видео вместо H264')
+    argument_parser.add_argument('--output', default='benchmark_results.json')
+    argument_parser.add_argument('--baseline', help='результаты прошлого запуска для сравнения')
+    args = argument_parser.parse_args()
+
+    if args.output_fourcc is not None:
+        TaskProcessor.OUTPUT_FOURCC = args.output_fourcc
+        ObjectDetector.OUTPUT_VIDEO_FOURCC = args.output_fourcc
+
+    temp_dir = tempfile.mkdtemp(prefix='fastplay_benchmark_')
+    try:
+        footage_dir = args.footage_dir or os.path.join(temp_dir, 'footage')
+        footage_files, footage_format = generate_footage(
+            footage_dir, args.width, args.height, args.minutes, args.files, args.activity, args.fps)
+        stage_results: typing.Dict[str, dict] = {}
+        run_stage(stage_results, 'search', measure_search, temp_dir, args.search_days, args.search_files_per_hour, 5)
+        run_stage(
+            stage_results, 'concatenation', measure_concatenation,
+            temp_dir, footage_files, args.skipped_frames_count, 0)
+        run_stage(
+            stage_results, 'concatenation_pipelined', measure_concatenation,
+            temp_dir, footage_files, args.skipped_frames_count, args.pipeline_queue_size)
+        run_stage(stage_results, 'detection', measure_detection, temp_dir, args.detection_frames, args.activity)
+        run_stage(
+            stage_results, 'task', measure_task,
+            temp_dir, footage_files, args.skipped_frames_count, args.pipeline_queue_size, False)
+        run_stage(
+            stage_results, 'task_detection', measure_task,
+            temp_dir, footage_files, args.skipped_frames_count, args.pipeline_queue_size, True)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    all_results = {
+        'version': RESULTS_VERSION,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'machine': get_machine_info(),
+        'parameters': vars(args),
+        'footage_format': footage_format,
+        'output_fourcc': TaskProcessor.OUTPUT_FOURCC,
+        'results': stage_results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as output_file:
+        json.dump(all_results, output_file, ensure_ascii=False, indent=2)
+    print('Результаты: {0}'.format(args.output))
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            print_comparison(stage_results, json.load(baseline_file))
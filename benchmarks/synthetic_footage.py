@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Генерация синтетических записей камеры для тестов скорости: неподвижный фон с шумом матрицы и движущиеся
+фигуры людей в периоды активности. Файлы называются как у регистратора (время начала записи, %Y%m%d%H%M%S).
+
+Записи кодируются в "сырой" поток H.264 (.h264), как у камер: через ffmpeg (libx264), если он есть,
+иначе через cv2.VideoWriter (нужен кодек H.264 в сборке OpenCV, например openh264). Если H.264 недоступен,
+записи кодируются в MPEG-4 Part 2 (.mkv) - на них измеряется все, кроме режимов с ключевыми кадрами.
+
+Запуск из корня проекта (сгенерировать записи без измерений):
+    python -m benchmarks.synthetic_footage footage --width 1920 --height 1080 --minutes 2 --files 3 --activity 0.3
+"""
+import argparse
+import datetime
+import os
+import shutil
+import subprocess
+import typing
+
+import cv2
+import numpy
+
+# форматы записей: (название, расширение, fourcc для cv2.VideoWriter)
+FORMAT_H264 = ('h264', '.h264', 'H264')
+FORMAT_MPEG4 = ('mpeg4', '.mkv', 'mp4v')
+
+FILENAME_STRFTIME_FORMAT = '%Y%m%d%H%M%S'
+
+
+class SyntheticFootageGenerator:
+    """
+    Генератор кадров синтетической записи. Кадры детерминированы (зависят только от параметров и seed),
+    поэтому результаты измерений на разных машинах и версиях можно сравнивать
+    """
+
+    # длительность одного периода активности (в секундах)
+    _ACTIVITY_PERIOD_SECONDS = 20.0
+
+    # сколько людей одновременно в кадре в период активности
+    _PERSONS_COUNT = 2
+
+    # амплитуда шума матрицы (0..255)
+    _NOISE_AMPLITUDE = 6
+
+    # сколько разных кадров шума заготавливается (генерация шума для каждого кадра слишком медленная)
+    _NOISE_FRAMES_COUNT = 8
+
+    def __init__(self, width: int, height: int, fps: float, activity: float, seed: int = 0):
+        """
+        :param activity: доля времени, когда в кадре есть движущиеся люди (0.0 - статичная запись)
+        """
+        assert 0.0 <= activity <= 1.0
+        self._width = width
+        self._height = height
+        self._fps = fps
+        self._activity = activity
+        random_state = numpy.random.RandomState(seed)
+        self._background = self._create_background(width, height, random_state)
+        self._noise = [
+            random_state.randint(0, self._NOISE_AMPLITUDE, size=(height, width, 1), dtype=numpy.uint8)
+            for _ in range(self._NOISE_FRAMES_COUNT)
+        ]
+
+    def get_frame(self, frame_number: int) -> numpy.ndarray:
+        frame = cv2.add(self._background, numpy.broadcast_to(
+            self._noise[frame_number % self._NOISE_FRAMES_COUNT], self._background.shape))
+        seconds = frame_number / self._fps
+        period_position = (seconds % self._ACTIVITY_PERIOD_SECONDS) / self._ACTIVITY_PERIOD_SECONDS
+        if period_position < self._activity:
+            progress = period_position / self._activity
+            for person_number in range(self._PERSONS_COUNT):
+                self._draw_person(frame, progress, person_number)
+        return frame
+
+    def is_active(self, frame_number: int) -> bool:
+        seconds = frame_number / self._fps
+        return (seconds % self._ACTIVITY_PERIOD_SECONDS) / self._ACTIVITY_PERIOD_SECONDS < self._activity
+
+    def _draw_person(self, frame: numpy.ndarray, progress: float, person_number: int):
+        """
+        Нарисовать упрощенную фигуру человека (голова, туловище, ноги), идущего через кадр
+        """
+        person_height = self._height // 3
+        person_width = person_height // 3
+        direction = 1 if person_number % 2 == 0 else -1
+        x_progress = progress if direction > 0 else 1.0 - progress
+        x = int(x_progress * (self._width + person_width)) - person_width
+        y = self._height // 2 + person_number * self._height // 10 - person_height // 2
+        color = (40 + 30 * person_number, 50, 60)
+        head_radius = person_width // 3
+        cv2.circle(frame, (x + person_width // 2, y + head_radius), head_radius, color, -1)
+        cv2.rectangle(
+            frame, (x, y + 2 * head_radius), (x + person_width, y + person_height * 6 // 10), color, -1)
+        step = int(progress * 40) % 2
+        leg_width = person_width // 3
+        for leg_number in range(2):
+            leg_x = x + leg_number * (person_width - leg_width) + (leg_width // 2 if step == leg_number else 0)
+            cv2.rectangle(frame, (leg_x, y + person_height * 6 // 10), (leg_x + leg_width, y + person_height),
+                          color, -1)
+
+    @staticmethod
+    def _create_background(width: int, height: int, random_state: numpy.random.RandomState) -> numpy.ndarray:
+        """
+        Фон: вертикальный градиент (небо, земля) и несколько неподвижных прямоугольников (здания, машины)
+        """
+        gradient = numpy.linspace(180, 90, height, dtype=numpy.float32).reshape(height, 1, 1)
+        background = numpy.broadcast_to(gradient, (height, width, 3)).astype(numpy.uint8).copy()
+        for _ in range(12):
+            x1 = random_state.randint(0, width)
+            y1 = random_state.randint(height // 3, height)
+            x2 = min(width - 1, x1 + random_state.randint(width // 20, width // 5))
+            y2 = min(height - 1, y1 + random_state.randint(height // 20, height // 4))
+            color = tuple(int(value) for value in random_state.randint(60, 220, size=3))
+            cv2.rectangle(background, (x1, y1), (x2, y2), color, -1)
+        return background
+
+
+def get_available_format(ffmpeg_path: str = 'ffmpeg') -> typing.Tuple[str, str, str]:
+    """
+    Лучший доступный формат записей: H.264 (через ffmpeg или OpenCV) или, если его нет, MPEG-4
+    """
+    if shutil.which(ffmpeg_path) is not None:
+        return FORMAT_H264
+    probe_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.probe' + FORMAT_H264[1])
+    video = cv2.VideoWriter(probe_filename, cv2.VideoWriter_fourcc(*FORMAT_H264[2]), 25.0, (64, 64))
+    is_opened = video.isOpened()
+    video.release()
+    if os.path.isfile(probe_filename):
+        os.remove(probe_filename)
+    return FORMAT_H264 if is_opened else FORMAT_MPEG4
+
+
+def write_footage_file(
+        filename: str,
+        generator: SyntheticFootageGenerator,
+        frames_count: int,
+        fps: float,
+        width: int,
+        height: int,
+        footage_format: typing.Tuple[str, str, str],
+        gop: int,
+        ffmpeg_path: str = 'ffmpeg'
+):
+    """
+    Записать один файл синтетической записи
+    :param gop: расстояние между ключевыми кадрами
+    """
+    if footage_format == FORMAT_H264 and shutil.which(ffmpeg_path) is not None:
+        process = subprocess.Popen(
+            [
+                ffmpeg_path,
+                '-hide_banner', '-loglevel', 'error', '-y',
+                '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', '{0}x{1}'.format(width, height), '-r', str(fps),
+                '-i', 'pipe:0',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(gop), '-bf', '0', '-pix_fmt', 'yuv420p',
+                '-f', 'h264', filename
+            ],
+            stdin=subprocess.PIPE
+        )
+        try:
+            for frame_number in range(frames_count):
+                process.stdin.write(generator.get_frame(frame_number).tobytes())
+        finally:
+            process.stdin.close()
+            if process.wait() != 0:
+                raise Exception('Ошибка ffmpeg при записи {0}'.format(filename))
+        return
+
+    video = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*footage_format[2]), fps, (width, height))
+    if not video.isOpened():
+        raise Exception('Не удалось открыть на запись {0}'.format(filename))
+    try:
+        for frame_number in range(frames_count):
+            video.write(generator.get_frame(frame_number))
+    finally:
+        video.release()
+
+
+def generate_footage(
+        output_dir: str,
+        width: int,
+        height: int,
+        minutes_per_file: float,
+        files_count: int,
+        activity: float,
+        fps: float = 25.0,
+        gop: int = 50,
+        start_time: datetime.datetime = datetime.datetime(2022, 8, 16, 18, 0, 0),
+        ffmpeg_path: str = 'ffmpeg'
+) -> typing.Tuple[typing.List[str], str]:
+    """
+    Сгенерировать записи камеры: files_count файлов подряд по minutes_per_file минут.
+    Уже сгенерированные с теми же параметрами файлы не перезаписываются
+    :return: (файлы записей, название формата)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    footage_format = get_available_format(ffmpeg_path)
+    frames_count = int(minutes_per_file * 60.0 * fps)
+    generator = SyntheticFootageGenerator(width, height, fps, activity)
+    filenames = []
+    for file_number in range(files_count):
+        file_start_time = start_time + datetime.timedelta(minutes=minutes_per_file * file_number)
+        filename = os.path.join(
+            output_dir, file_start_time.strftime(FILENAME_STRFTIME_FORMAT) + footage_format[1])
+        if not os.path.isfile(filename):
+            print('Генерация записи: {0}'.format(filename))
+            write_footage_file(
+                filename, generator, frames_count, fps, width, height, footage_format, gop, ffmpeg_path)
+        filenames.append(filename)
+    return filenames, footage_format[0]
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('output_dir')
+    argument_parser.add_argument('--width', type=int, default=1920)
+    argument_parser.add_argument('--height', type=int, default=1080)
+    argument_parser.add_argument('--fps', type=float, default=25.0)
+    argument_parser.add_argument('--minutes', type=float, default=1.0, help='длина одного файла в минутах')
+    argument_parser.add_argument('--files', type=int, default=2, help='количество файлов')
+    argument_parser.add_argument('--activity', type=float, default=0.3, help='доля времени с движением (0..1)')
+    argument_parser.add_argument('--gop', type=int, default=50, help='расстояние между ключевыми кадрами')
+    argument_parser.add_argument('--ffmpeg_path', default='ffmpeg')
+    args = argument_parser.parse_args()
+    footage_files, footage_format_name = generate_footage(
+        args.output_dir, args.width, args.height, args.minutes, args.files, args.activity, args.fps, args.gop,
+        ffmpeg_path=args.ffmpeg_path)
+    print('Формат: {0}, файлов: {1}'.format(footage_format_name, len(footage_files)))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Сравнение скорости записи выходного видео: cv2.VideoWriter и ffmpeg (FfmpegVideoWriter) с разными preset,
+CRF и количеством потоков. Кадры синтетические (см. synthetic_footage) и готовятся заранее, поэтому
+измеряется только кодирование и запись.
+
+Запуск из корня проекта:
+    python -m benchmarks.video_writers --width 1920 --height 1080 --frames 300 --opencv_fourcc avc1 mp4v
+        --presets ultrafast veryfast medium --crf 23 --threads 0 4 --output results.json
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import typing
+
+import cv2
+import numpy
+
+from benchmarks.synthetic_footage import SyntheticFootageGenerator
+from source.ffmpeg_video_writer import FfmpegVideoWriter
+
+
+def measure(
+        writer_factory: typing.Callable[[str], typing.Any],
+        filename: str,
+        frames: typing.List[numpy.ndarray]
+) -> typing.Optional[dict]:
+    """
+    :return: результаты или None, если объект записи не открылся
+    """
+    begin = time.perf_counter()
+    video_writer = writer_factory(filename)
+    if not video_writer.isOpened():
+        video_writer.release()
+        return None
+    try:
+        for frame in frames:
+            video_writer.write(frame)
+    finally:
+        # время завершения записи тоже учитывается (ffmpeg дописывает оставшиеся кадры)
+        video_writer.release()
+    elapsed = time.perf_counter() - begin
+    return {
+        'seconds': elapsed,
+        'frames_per_second': len(frames) / elapsed,
+        'file_size': os.path.getsize(filename) if os.path.isfile(filename) else 0,
+    }
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('--width', type=int, default=1920)
+    argument_parser.add_argument('--height', type=int, default=1080)
+    argument_parser.add_argument('--fps', type=float, default=30.0)
+    argument_parser.add_argument('--frames', type=int, default=300)
+    argument_parser.add_argument('--activity', type=float, default=0.3, help='доля времени с движением (0..1)')
+    argument_parser.add_argument('--extension', default='.mp4', help='формат выходного файла')
+    argument_parser.add_argument('--opencv_fourcc', nargs='*', default=['H264', 'avc1', 'mp4v'])
+    argument_parser.add_argument('--ffmpeg_path', default='ffmpeg')
+    argument_parser.add_argument('--codec', default='libx264')
+    argument_parser.add_argument('--presets', nargs='*', default=['ultrafast', 'veryfast', 'medium'])
+    argument_parser.add_argument('--crf', type=int, nargs='+', default=[23])
+    argument_parser.add_argument('--threads', type=int, nargs='+', default=[0])
+    argument_parser.add_argument('--output', help='файл для результатов в JSON')
+    args = argument_parser.parse_args()
+
+    generator = SyntheticFootageGenerator(args.width, args.height, 25.0, args.activity)
+    # кадры берутся с шагом, как в выходном видео объединения
+    test_frames = [generator.get_frame(frame_number * 10) for frame_number in range(args.frames)]
+    frame_size = (args.width, args.height)
+
+    writers: typing.List[typing.Tuple[str, typing.Callable[[str], typing.Any]]] = []
+    for opencv_fourcc in args.opencv_fourcc:
+        writers.append((
+            'opencv {0}'.format(opencv_fourcc),
+            lambda filename, fourcc=opencv_fourcc: cv2.VideoWriter(
+                filename, cv2.VideoWriter_fourcc(*fourcc), args.fps, frame_size)
+        ))
+    if FfmpegVideoWriter.is_available(args.ffmpeg_path):
+        for preset in args.presets:
+            for crf in args.crf:
+                for threads_count in args.threads:
+                    writers.append((
+                        'ffmpeg {0}, preset {1}, crf {2}, threads {3}'.format(args.codec, preset, crf, threads_count),
+                        lambda filename, p=preset, c=crf, t=threads_count: FfmpegVideoWriter(
+                            filename, args.fps, frame_size, args.ffmpeg_path, args.codec, p, c, t)
+                    ))
+    else:
+        print('Не найден ffmpeg: {0}'.format(args.ffmpeg_path))
+
+    results: typing.Dict[str, typing.Optional[dict]] = {}
+    temp_dir = tempfile.mkdtemp(prefix='fastplay_writers_')
+    try:
+        for writer_number, (name, factory) in enumerate(writers):
+            output_filename = os.path.join(temp_dir, '{0}{1}'.format(writer_number, args.extension))
+            result = measure(factory, output_filename, test_frames)
+            results[name] = result
+            if result is None:
+                print('{0}: недоступно'.format(name))
+            else:
+                print('{0}: {1:.1f} кадров/с, размер {2:.1f} МБ'.format(
+                    name, result['frames_per_second'], result['file_size'] / 1024.0 / 1024.0))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({'parameters': vars(args), 'results': results}, output_file, ensure_ascii=False, indent=2)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import argparse
+import datetime
+
+import cv2
+
+from source.detection_event_log import DetectionEventLog
+from source.event_clip_extractor import EventClipExtractor
+from source.event_segmenter import EventSegmenter
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Поиск найденных людей в журнале за промежуток времени')
+    argument_parser.add_argument('events_file', help='журнал найденных людей (output_detection_events_filename)')
+    argument_parser.add_argument('--begin', required=True, help='начало промежутка, "ГГГГ-ММ-ДД ЧЧ:ММ"')
+    argument_parser.add_argument('--end', required=True, help='конец промежутка (не включая), "ГГГГ-ММ-ДД ЧЧ:ММ"')
+    argument_parser.add_argument('--min_weight', type=float, default=0.0, help='минимальная оценка')
+    argument_parser.add_argument('--count', action='store_true', help='вывести только количество')
+    argument_parser.add_argument('--clips_dir', help='записать в каталог отрывки исходных файлов с событиями')
+    argument_parser.add_argument('--max_gap', type=float, default=10.0,
+                                 help='наибольший промежуток между найденными людьми одного события, с')
+    argument_parser.add_argument('--padding', type=float, default=3.0, help='запас до и после события, с')
+    args = argument_parser.parse_args()
+    begin = datetime.datetime.strptime(args.begin, DATETIME_FORMAT)
+    end = datetime.datetime.strptime(args.end, DATETIME_FORMAT)
+    with DetectionEventLog(args.events_file) as event_log:
+        events = event_log.find_detections(begin, end, args.min_weight)
+    if not args.count:
+        for event in events:
+            print(event)
+    print('Найдено: {0}'.format(len(events)))
+    if args.clips_dir is not None:
+        extractor = EventClipExtractor()
+        clip_filenames = extractor.extract_event_clips(
+            events,
+            EventSegmenter(args.max_gap, args.padding),
+            args.clips_dir,
+            cv2.VideoWriter_fourcc(*'H264')
+        )
+        print('Отрывков событий: {0}'.format(len(clip_filenames)))
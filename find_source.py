@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import argparse
+
+import cv2
+
+from source.source_video_opener import SourceVideoOpener
+
+KEY_ESC = 27
+
+
+def parse_output_time(text: str) -> float:
+    """
+    Время в выходном видео: секунды, "ММ:СС" или "ЧЧ:ММ:СС"
+    """
+    seconds = 0.0
+    for part in text.split(':'):
+        seconds = seconds * 60.0 + float(part)
+    return seconds
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(
+        description='Открыть исходный файл архива в момент, который показан в выходном видео')
+    argument_parser.add_argument('video_file', help='выходное видео (рядом должен быть индекс кадров .index.json)')
+    argument_parser.add_argument('time', help='время в выходном видео: секунды, "ММ:СС" или "ЧЧ:ММ:СС"')
+    argument_parser.add_argument('--seconds', type=float, default=60.0, help='сколько секунд исходного видео показать')
+    argument_parser.add_argument('--headless', action='store_true', help='только вывести исходный файл и кадр')
+    args = argument_parser.parse_args()
+
+    opener = SourceVideoOpener()
+    frame_source, video = opener.open_output_moment(args.video_file, parse_output_time(args.time), args.seconds)
+    if frame_source is None:
+        print('Происхождение кадра неизвестно')
+    else:
+        print(frame_source)
+    if video is not None:
+        try:
+            if not args.headless:
+                delay = max(1, int(1000.0 / video.get_fps()))
+                end_position = video.position + int(args.seconds * video.get_fps())
+                key = -1
+                while video.position < end_position and key != KEY_ESC:
+                    is_ok, frame = video.read()
+                    if not is_ok:
+                        break
+                    cv2.imshow('source', frame)
+                    key = cv2.waitKey(delay)
+                cv2.destroyAllWindows()
+        finally:
+            video.release()
@@ -14,12 +14,14 @@ if __name__ == '__main__':
     argument_parser = argparse.ArgumentParser()
     argument_parser.add_argument('input_video_file')
     argument_parser.add_argument('output_video_file')
+    argument_parser.add_argument('--headless', action='store_true', help='работа без окон')
     args = argument_parser.parse_args()
     input_video_file = args.input_video_file
     output_video_file = args.output_video_file
     print(f'input video file: {input_video_file}')
     print(f'output video file: {output_video_file}')
     detector = ObjectDetector()
+    detector.headless = args.headless
     detector.set_output_filename(output_video_file)
     # todo: определять размер кадра
     detector.begin_detection(1920, 1080)
@@ -43,11 +45,13 @@ if __name__ == '__main__':
                 if is_ok:
                     detector.process_frame(frame)
 
-                key = cv2.waitKey(1)
+                if not args.headless:
+                    key = cv2.waitKey(1)
 
         finally:
             video.release()
 
     finally:
         detector.end_detection()
-        cv2.destroyAllWindows()
+        if not args.headless:
+            cv2.destroyAllWindows()
@@ -1,19 +1,101 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import argparse
+import datetime
+import multiprocessing
 import os.path
+import signal
+import tempfile
 
+from source.frame_preview import SharedFramePreview
+from source.parallel_task_runner import ParallelTaskRunner
+from source.queue_coordinator import QueueCoordinator
+from source.queue_worker import QueueWorker
 from source.task.json_task_parser import JsonTaskParser, JsonTaskParserException
 from source.task_processor import TaskProcessor
+from source.task_scheduler import TaskScheduler
+from source.task_watcher import TaskWatcher
+
+
+def install_stop_signal_handlers(stop_event):
+    """
+    В режиме без окон обработка останавливается сигналом (Ctrl+C, SIGTERM от планировщика)
+    вместо клавиши ESC. Выходные файлы при этом корректно закрываются
+    """
+    def handler(signum, frame):
+        print(f'Получен сигнал {signum}, обработка будет остановлена')
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+    if hasattr(signal, 'SIGBREAK'):
+        signal.signal(signal.SIGBREAK, handler)
 
 
 if __name__ == '__main__':
+    # нужно для запуска процессов обработки из собранного pyinstaller exe
+    multiprocessing.freeze_support()
+
     argument_parser = argparse.ArgumentParser()
-    argument_parser.add_argument('json_config_filename')
+    argument_parser.add_argument('json_config_filename', nargs='?')
     argument_parser.add_argument('--only_info', '-i', action='store_true')
+    argument_parser.add_argument(
+        '--workers', '-w', type=int, default=1,
+        help='количество процессов для параллельной обработки задач (по умолчанию задачи выполняются по очереди)')
+    argument_parser.add_argument(
+        '--cpu_threads', type=int, default=0,
+        help='сколько потоков OpenCV на все процессы обработки (по умолчанию по количеству ядер)')
+    argument_parser.add_argument(
+        '--disk_workers', type=int, default=0,
+        help='сколько задач с одного диска выполнять одновременно при параллельной обработке '
+             '(по умолчанию без ограничения)')
+    argument_parser.add_argument(
+        '--task_history', default=os.path.join(tempfile.gettempdir(), 'fastplay_task_history.json'),
+        help='файл истории скоростей обработки задач (для порядка запуска при параллельной обработке)')
+    argument_parser.add_argument(
+        '--headless', action='store_true',
+        help='работа без окон, остановка по сигналу (Ctrl+C, SIGTERM) вместо ESC')
+    argument_parser.add_argument(
+        '--preview', action='store_true',
+        help='показывать кадры в отдельном процессе просмотра, не замедляя обработку')
+    argument_parser.add_argument(
+        '--watch', action='store_true',
+        help='постоянно наблюдать за каталогами камер: обрабатывать каждый файл сразу после записи, '
+             'а в ежедневное время (--daily_time) склеивать результаты')
+    argument_parser.add_argument('--daily_time', default='00:30', help='ежедневное время склейки ЧЧ:ММ (для --watch)')
+    argument_parser.add_argument('--poll_seconds', type=float, default=60.0, help='интервал опроса каталогов')
+    argument_parser.add_argument(
+        '--settle_seconds', type=float, default=120.0,
+        help='сколько секунд последний файл камеры не должен изменяться, чтобы считаться записанным')
+    argument_parser.add_argument(
+        '--checkpoint_dir', help='каталог сегментов для задач без checkpoint_dir (для --watch)')
+    argument_parser.add_argument(
+        '--queue_dir',
+        help='общий каталог очереди работы: задачи разбиваются по входным файлам и обрабатываются процессами '
+             'обработки (--worker) на этой и других машинах, --workers - сколько процессов запустить на этой машине')
+    argument_parser.add_argument(
+        '--worker', action='store_true', help='процесс обработки очереди --queue_dir (файл настроек не нужен)')
+    argument_parser.add_argument(
+        '--lease_seconds', type=float, default=300.0,
+        help='время аренды единицы работы очереди: после него работа пропавшего процесса выдается другому')
     args = argument_parser.parse_args()
+    if args.worker:
+        if args.queue_dir is None:
+            argument_parser.error('для --worker нужно задать --queue_dir')
+        worker_stop_event = multiprocessing.Event()
+        if args.headless:
+            install_stop_signal_handlers(worker_stop_event)
+        worker = QueueWorker(args.queue_dir, None, args.lease_seconds, headless=args.headless,
+                             stop_event=worker_stop_event)
+        worker.run()
+        exit(4 if worker.is_exit_requested() else 0)
+    if args.json_config_filename is None:
+        argument_parser.error('не задан файл с настройками')
     json_config_filename = args.json_config_filename
     only_info = args.only_info
+    workers_count = args.workers
+    headless = args.headless
+    preview_enabled = args.preview
     print(f'Получен файл с настройками: {json_config_filename}')
     exit_code = 0
     try:
@@ -25,6 +107,8 @@ if __name__ == '__main__':
             tasks = parser.tasks_from_json(file_content)
             for task in tasks:
                 print(task)
+                if only_info:
+                    TaskProcessor().print_input_files_info(task)
 
             all_task_correct = True
             for task in tasks:
@@ -35,12 +119,63 @@ if __name__ == '__main__':
             if not only_info:
                 is_interrupted = False
                 if all_task_correct:
-                    task_processor = TaskProcessor()
-                    for task in tasks:
-                        task_processor.process_task(task)
-                        if task_processor.is_exit_requested():
+                    stop_event = multiprocessing.Event()
+                    if headless:
+                        install_stop_signal_handlers(stop_event)
+                    if args.queue_dir is not None:
+                        if preview_enabled:
+                            print('Предпросмотр не поддерживается при обработке через очередь')
+                        coordinator = QueueCoordinator(
+                            args.queue_dir, headless, stop_event, args.lease_seconds)
+                        coordinator.run(file_content, max(0, workers_count))
+                        if coordinator.is_exit_requested():
+                            exit_code = 4
+                        elif coordinator.has_errors():
+                            exit_code = 5
+                    elif args.watch:
+                        if workers_count > 1 or preview_enabled:
+                            print('При наблюдении за каталогами задачи выполняются по очереди, без предпросмотра')
+                        watcher = TaskWatcher(
+                            json_config_filename,
+                            datetime.datetime.strptime(args.daily_time, '%H:%M').time(),
+                            args.poll_seconds,
+                            args.settle_seconds,
+                            args.checkpoint_dir,
+                            headless,
+                            stop_event
+                        )
+                        watcher.run()
+                        if watcher.is_exit_requested():
                             exit_code = 4
-                            break
+                    elif workers_count > 1:
+                        if preview_enabled:
+                            print('Предпросмотр не поддерживается при параллельной обработке задач')
+                        runner = ParallelTaskRunner(
+                            workers_count,
+                            headless,
+                            stop_event,
+                            TaskScheduler(args.task_history, args.disk_workers),
+                            args.cpu_threads
+                        )
+                        results = runner.run(tasks)
+                        exit_code = runner.get_exit_code(results)
+                    else:
+                        task_processor = TaskProcessor()
+                        task_processor.stop_event = stop_event
+                        task_processor.headless = headless
+                        preview = SharedFramePreview(stop_event) if preview_enabled else None
+                        if preview is not None:
+                            preview.start()
+                        try:
+                            task_processor.preview = preview
+                            for task in tasks:
+                                task_processor.process_task(task)
+                                if task_processor.is_exit_requested():
+                                    exit_code = 4
+                                    break
+                        finally:
+                            if preview is not None:
+                                preview.stop()
 
         else:
             print(f'Файл с настройками не найден: {json_config_filename}')
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import typing
+
+import cv2
+import numpy
+
+
+class AdaptiveFrameSampler:
+    """
+    Адаптивное прореживание кадров: шаг между кадрами, попадающими в выходное видео, зависит от активности
+    в кадре. В статичные периоды (ночь, пустой двор) кадры берутся реже, при активности - чаще.
+
+    Активность оценивается дешево: по средней разнице яркости уменьшенного кадра с предыдущим выбранным
+    кадром и по найденным людям (если найден человек, то несколько следующих кадров берутся с наименьшим шагом).
+    Шаг меняется в пределах [base_step / steps_range, base_step * steps_range], а средний шаг поддерживается
+    близким к base_step: сэкономленные в статичные периоды кадры тратятся на периоды активности.
+
+    Если известно количество входных кадров и задано количество кадров выходного видео, то шаг не бывает меньше,
+    чем нужно, чтобы оставшихся кадров выходного видео хватило на оставшиеся входные кадры. Поэтому выходное
+    видео не длиннее заданного, пока для этого хватает наибольшего шага (base_step * steps_range)
+    """
+
+    # размер уменьшенного кадра для оценки активности
+    _ACTIVITY_FRAME_SIZE = (64, 36)
+
+    # средняя разница яркости (0..255), ниже которой кадр считается статичным, и выше которой - активным
+    _STATIC_DIFFERENCE = 2.0
+    _ACTIVE_DIFFERENCE = 10.0
+
+    # сколько выбранных кадров после кадра с найденным человеком считаются активными
+    _DETECTION_HOLD_FRAMES = 5
+
+    # за сколько выбранных кадров отклонение от заданной длины выходного видео исправляется в 2 раза
+    _BUDGET_WINDOW_FRAMES = 300
+
+    def __init__(
+            self,
+            base_step: float,
+            steps_range: float = 4.0,
+            total_input_frames_count: int = 0,
+            max_output_frames_count: int = 0
+    ):
+        """
+        :param base_step: средний шаг между выбранными кадрами (количество пропускаемых кадров + 1)
+        :param steps_range: во сколько раз шаг может отличаться от среднего в каждую сторону
+        :param total_input_frames_count: количество кадров всех входных видео (0 - неизвестно)
+        :param max_output_frames_count: наибольшее количество кадров выходного видео (0 - не ограничено)
+        """
+        assert base_step >= 1.0
+        assert steps_range >= 1.0
+        assert total_input_frames_count >= 0
+        assert max_output_frames_count >= 0
+        self._base_step = float(base_step)
+        self._min_step = max(1, int(round(base_step / steps_range)))
+        self._max_step = max(self._min_step, int(round(base_step * steps_range)))
+        self._total_input_frames_count = total_input_frames_count
+        self._max_output_frames_count = max_output_frames_count
+
+        # уменьшенный предыдущий выбранный кадр (None - начало файла)
+        self._previous_frame: typing.Optional[numpy.ndarray] = None
+
+        # сколько еще кадров считать активными после найденного человека
+        self._detection_hold: int = 0
+        self._detected_frames_count: int = 0
+
+        # сколько всего входных кадров пройдено и выбрано (для соблюдения заданной длины выходного видео)
+        self._input_frames_count: int = 0
+        self._output_frames_count: int = 0
+
+        self._active_frames_count: int = 0
+        self._static_frames_count: int = 0
+
+    @property
+    def base_step(self) -> float:
+        return self._base_step
+
+    @property
+    def min_step(self) -> int:
+        return self._min_step
+
+    @property
+    def max_step(self) -> int:
+        return self._max_step
+
+    def start_video(self):
+        """
+        Начало нового входного видео (первый кадр сравнивать не с чем)
+        """
+        self._previous_frame = None
+
+    def get_skipped_frames_count(self, frame: numpy.ndarray, detected_frames_count: int = 0) -> int:
+        """
+        Сколько кадров пропустить после выбранного кадра
+        :param frame: выбранный кадр
+        :param detected_frames_count: сколько всего кадров с найденными людьми (счетчик постобработчиков)
+        """
+        activity = self._get_activity(frame, detected_frames_count)
+        if activity >= 1.0:
+            self._active_frames_count += 1
+        elif activity <= 0.0:
+            self._static_frames_count += 1
+
+        # шаг от наибольшего (нет активности) до наименьшего (есть активность) в логарифмической шкале
+        step = self._max_step * (float(self._min_step) / float(self._max_step)) ** activity
+
+        # поправка на отклонение от заданной длины выходного видео: если выбрано больше кадров, чем нужно,
+        # то шаг увеличивается, если меньше - уменьшается
+        self._output_frames_count += 1
+        surplus_frames = self._output_frames_count - self._input_frames_count / self._base_step
+        step *= 2.0 ** max(-1.0, min(1.0, surplus_frames / self._BUDGET_WINDOW_FRAMES))
+
+        step = max(self._min_step, min(self._max_step, int(round(step))))
+        step = max(step, self._get_budget_step())
+        self._input_frames_count += step
+        return step - 1
+
+    def get_statistics(self) -> str:
+        return 'adaptive sampling: output frames {0}, active {1}, static {2}, avg step {3:.1f} (base {4:.1f})'.format(
+            self._output_frames_count,
+            self._active_frames_count,
+            self._static_frames_count,
+            self._input_frames_count / max(1, self._output_frames_count),
+            self._base_step
+        )
+
+    def _get_budget_step(self) -> int:
+        """
+        Наименьший шаг, при котором оставшихся кадров выходного видео хватит на оставшиеся входные кадры
+        (не больше наибольшего шага; 1, если количество кадров не задано)
+        """
+        if self._total_input_frames_count <= 0 or self._max_output_frames_count <= 0:
+            return 1
+        # входные кадры после текущего выбранного кадра и кадры выходного видео, которые еще можно выбрать
+        remaining_input_frames = self._total_input_frames_count - self._input_frames_count - 1
+        remaining_output_frames = self._max_output_frames_count - self._output_frames_count
+        if remaining_output_frames <= 0:
+            return self._max_step
+        return max(1, min(self._max_step, -(-remaining_input_frames // remaining_output_frames)))
+
+    def _get_activity(self, frame: numpy.ndarray, detected_frames_count: int) -> float:
+        """
+        :return: активность от 0.0 (статичный кадр) до 1.0 (есть движение или найден человек)
+        """
+        small_frame = cv2.resize(frame, self._ACTIVITY_FRAME_SIZE, interpolation=cv2.INTER_AREA)
+        if len(small_frame.shape) == 3:
+            small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
+        previous_frame = self._previous_frame
+        self._previous_frame = small_frame
+
+        if detected_frames_count > self._detected_frames_count:
+            self._detection_hold = self._DETECTION_HOLD_FRAMES
+        self._detected_frames_count = detected_frames_count
+        if self._detection_hold > 0:
+            self._detection_hold -= 1
+            return 1.0
+
+        if previous_frame is None:
+            return 1.0
+        difference = float(cv2.absdiff(small_frame, previous_frame).mean())
+        activity = (difference - self._STATIC_DIFFERENCE) / (self._ACTIVE_DIFFERENCE - self._STATIC_DIFFERENCE)
+        return max(0.0, min(1.0, activity))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+import os
+import sqlite3
+import typing
+
+import cv2
+
+from source.h264_stream_index import H264StreamIndex, H264StreamScanner
+from source.utils.frozen import Frozen
+
+
+class ArchiveFileInfo(Frozen):
+    """
+    Сведения о видеофайле архива: размер и время изменения файла (по ним проверяется актуальность),
+    разрешение, количество кадров и частота кадров
+    """
+
+    def __init__(
+            self,
+            filename: str,
+            file_size: int,
+            file_mtime: float,
+            width: int,
+            height: int,
+            frames_count: int,
+            fps: float
+    ):
+        super().__init__()
+        assert isinstance(filename, str)
+        assert isinstance(file_size, int)
+        assert isinstance(width, int)
+        assert isinstance(height, int)
+        assert isinstance(frames_count, int)
+        self._filename = filename
+        self._file_size = file_size
+        self._file_mtime = float(file_mtime)
+        self._width = width
+        self._height = height
+        self._frames_count = frames_count
+        self._fps = float(fps)
+        self.freeze()
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    @property
+    def file_size(self) -> int:
+        return self._file_size
+
+    @property
+    def file_mtime(self) -> float:
+        return self._file_mtime
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @property
+    def frames_count(self) -> int:
+        """
+        Количество кадров (0, если не удалось определить)
+        """
+        return self._frames_count
+
+    @property
+    def fps(self) -> float:
+        """
+        Частота кадров (0.0, если не удалось определить)
+        """
+        return self._fps
+
+    def get_duration_seconds(self) -> float:
+        if self._fps <= 0.0:
+            return 0.0
+        return self._frames_count / self._fps
+
+
+class ArchiveCatalog:
+    """
+    Каталог видеоархива на диске (база SQLite в каталоге кэша). Для каждого каталога камеры хранится
+    список файлов, для каждого файла - размер, время изменения, разрешение, количество кадров,
+    частота кадров и индекс ключевых кадров (для "сырых" файлов H.264).
+
+    Каталог обновляется постепенно: список файлов каталога камеры перечитывается, только если изменилось
+    время изменения каталога (добавлены или удалены файлы), а сведения о файле - только если у файла
+    изменились размер или время изменения. Поэтому повторные запуски не открывают уже известные файлы.
+
+    Можно использовать из нескольких процессов одновременно (SQLite сам блокирует запись).
+    """
+
+    CATALOG_VERSION = 2
+
+    _CATALOG_FILENAME = 'archive_catalog.sqlite'
+
+    # сколько секунд ждать, пока другой процесс закончит запись в базу
+    _LOCK_TIMEOUT = 60.0
+
+    def __init__(self, catalog_dir: str):
+        assert isinstance(catalog_dir, str)
+        os.makedirs(catalog_dir, exist_ok=True)
+        self._catalog_filename = os.path.join(catalog_dir, self._CATALOG_FILENAME)
+        self._connection = sqlite3.connect(self._catalog_filename, timeout=self._LOCK_TIMEOUT)
+        self._scanner = H264StreamScanner()
+        self._create_tables()
+
+    @property
+    def catalog_filename(self) -> str:
+        return self._catalog_filename
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def list_directory(self, dirname: str) -> typing.List[str]:
+        """
+        Имена файлов каталога (как os.listdir). Если каталог не изменялся с прошлого чтения,
+        то список берется из базы без обращения к каталогу
+        """
+        directory_key = self._get_directory_key(dirname)
+        try:
+            directory_mtime = os.stat(dirname or os.curdir).st_mtime
+        except OSError:
+            return []
+
+        row = self._connection.execute(
+            'SELECT mtime FROM directories WHERE directory = ?', (directory_key,)).fetchone()
+        if row is not None and row[0] == directory_mtime:
+            rows = self._connection.execute(
+                'SELECT name FROM files WHERE directory = ?', (directory_key,)).fetchall()
+            return [name for name, in rows]
+
+        names = os.listdir(dirname or os.curdir)
+        with self._connection:
+            known_names = set([name for name, in self._connection.execute(
+                'SELECT name FROM files WHERE directory = ?', (directory_key,))])
+            current_names = set(names)
+            self._connection.executemany(
+                'DELETE FROM files WHERE directory = ? AND name = ?',
+                [(directory_key, name) for name in known_names - current_names])
+            self._connection.executemany(
+                'INSERT INTO files (directory, name) VALUES (?, ?)',
+                [(directory_key, name) for name in current_names - known_names])
+            self._connection.execute(
+                'INSERT OR REPLACE INTO directories (directory, mtime) VALUES (?, ?)',
+                (directory_key, directory_mtime))
+        print('Каталог архива обновлен: {0} (новых файлов {1}, удаленных {2})'.format(
+            dirname, len(current_names - known_names), len(known_names - current_names)))
+        return names
+
+    def get_file_info(self, filename: str) -> typing.Optional[ArchiveFileInfo]:
+        """
+        Сведения о видеофайле (из базы, или файл открывается и сведения сохраняются, если их нет или они устарели)
+        :return: сведения или None, если файл не найден
+        """
+        stat = self._stat(filename)
+        if stat is None:
+            return None
+        directory_key, name = self._get_file_key(filename)
+        row = self._connection.execute(
+            'SELECT size, mtime, width, height, frames_count, fps FROM files WHERE directory = ? AND name = ?',
+            (directory_key, name)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime and row[2] is not None:
+            return ArchiveFileInfo(filename, row[0], row[1], row[2], row[3], row[4], row[5])
+
+        input_video = cv2.VideoCapture(filename)
+        try:
+            width = int(input_video.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(input_video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            frames_count = max(0, int(input_video.get(cv2.CAP_PROP_FRAME_COUNT)))
+            fps = max(0.0, float(input_video.get(cv2.CAP_PROP_FPS)))
+        finally:
+            input_video.release()
+        if H264StreamScanner.is_annex_b_file(filename):
+            # у "сырых" файлов H.264 CAP_PROP_FRAME_COUNT равно 0 или неверно, кадры считаются по индексу
+            frames_count = self.get_index(filename).frames_count
+        info = ArchiveFileInfo(filename, stat.st_size, stat.st_mtime, width, height, frames_count, fps)
+        with self._connection:
+            self._update_file(directory_key, name, stat)
+            self._connection.execute(
+                'UPDATE files SET width = ?, height = ?, frames_count = ?, fps = ? WHERE directory = ? AND name = ?',
+                (width, height, frames_count, fps, directory_key, name))
+        return info
+
+    def get_index(self, filename: str) -> H264StreamIndex:
+        """
+        Индекс ключевых кадров "сырого" файла H.264 (из базы, или построить и сохранить,
+        если его нет или он устарел). Может использоваться вместо H264StreamIndexStore
+        """
+        stat = self._stat(filename)
+        directory_key, name = self._get_file_key(filename)
+        row = self._connection.execute(
+            'SELECT size, mtime, keyframe_index FROM files WHERE directory = ? AND name = ?',
+            (directory_key, name)).fetchone()
+        if stat is not None and row is not None and row[2] is not None \
+                and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            index = self._load_index(row[2], filename)
+            if index is not None and index.is_actual():
+                return index
+
+        print('Построение индекса ключевых кадров: {0}'.format(filename))
+        index = self._scanner.scan(filename)
+        stat = self._stat(filename)
+        if stat is not None:
+            with self._connection:
+                self._update_file(directory_key, name, stat)
+                self._connection.execute(
+                    'UPDATE files SET keyframe_index = ? WHERE directory = ? AND name = ?',
+                    (json.dumps(index.to_dict()), directory_key, name))
+        return index
+
+    def _update_file(self, directory_key: str, name: str, stat: os.stat_result):
+        """
+        Записать размер и время изменения файла. Если файл изменился, то ранее сохраненные сведения сбрасываются
+        """
+        self._connection.execute(
+            'INSERT OR IGNORE INTO files (directory, name) VALUES (?, ?)', (directory_key, name))
+        self._connection.execute(
+            'UPDATE files SET width = NULL, height = NULL, frames_count = NULL, fps = NULL, keyframe_index = NULL '
+            'WHERE directory = ? AND name = ? AND (size IS NOT ? OR mtime IS NOT ?)',
+            (directory_key, name, stat.st_size, stat.st_mtime))
+        self._connection.execute(
+            'UPDATE files SET size = ?, mtime = ? WHERE directory = ? AND name = ?',
+            (stat.st_size, stat.st_mtime, directory_key, name))
+
+    @staticmethod
+    def _load_index(index_json: str, filename: str) -> typing.Optional[H264StreamIndex]:
+        try:
+            index_dict = json.loads(index_json)
+            if index_dict.get('version') != H264StreamScanner.INDEX_VERSION:
+                return None
+            index = H264StreamIndex.from_dict(index_dict)
+        except (ValueError, KeyError, TypeError):
+            return None
+        # путь к файлу в индексе должен совпадать с запрошенным (файл мог быть открыт по другому пути)
+        return index if index.filename == filename else None
+
+    @staticmethod
+    def _stat(filename: str) -> typing.Optional[os.stat_result]:
+        try:
+            return os.stat(filename)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _get_directory_key(dirname: str) -> str:
+        return os.path.normcase(os.path.abspath(dirname or os.curdir))
+
+    def _get_file_key(self, filename: str) -> typing.Tuple[str, str]:
+        dirname, name = os.path.split(filename)
+        return self._get_directory_key(dirname), name
+
+    def _create_tables(self):
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value INTEGER)')
+            row = self._connection.execute("SELECT value FROM settings WHERE key = 'version'").fetchone()
+            if row is not None and row[0] != self.CATALOG_VERSION:
+                # формат базы изменился - сведения будут собраны заново
+                self._connection.execute('DROP TABLE IF EXISTS directories')
+                self._connection.execute('DROP TABLE IF EXISTS files')
+            self._connection.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES ('version', ?)", (self.CATALOG_VERSION,))
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS directories ('
+                'directory TEXT PRIMARY KEY, '
+                'mtime REAL)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'directory TEXT NOT NULL, '
+                'name TEXT NOT NULL, '
+                'size INTEGER, '
+                'mtime REAL, '
+                'width INTEGER, '
+                'height INTEGER, '
+                'frames_count INTEGER, '
+                'fps REAL, '
+                'keyframe_index TEXT, '
+                'PRIMARY KEY (directory, name))')
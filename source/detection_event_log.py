@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import sqlite3
+import time
+import typing
+
+from source.frame_info import FrameInfo
+from source.utils.frozen import Frozen
+
+
+class DetectionEvent(Frozen):
+    """
+    Найденный на кадре человек: откуда кадр, когда снят, где на кадре (в долях ширины и высоты кадра) и оценка
+    """
+
+    def __init__(
+            self,
+            source_filename: str,
+            frame_index: int,
+            timestamp: typing.Optional[datetime.datetime],
+            box: typing.Tuple[float, float, float, float],
+            weight: float
+    ):
+        super().__init__()
+        self._source_filename = source_filename
+        self._frame_index = frame_index
+        self._timestamp = timestamp
+        self._box = box
+        self._weight = weight
+        self.freeze()
+
+    @property
+    def source_filename(self) -> str:
+        return self._source_filename
+
+    @property
+    def frame_index(self) -> int:
+        return self._frame_index
+
+    @property
+    def timestamp(self) -> typing.Optional[datetime.datetime]:
+        return self._timestamp
+
+    @property
+    def box(self) -> typing.Tuple[float, float, float, float]:
+        """
+        (x, y, ширина, высота) в долях ширины и высоты кадра
+        """
+        return self._box
+
+    @property
+    def weight(self) -> float:
+        return self._weight
+
+    def __str__(self):
+        x, y, width, height = self._box
+        return f'{self._timestamp} {self._source_filename} кадр {self._frame_index} ' \
+               f'({x:.3f}, {y:.3f}, {width:.3f}, {height:.3f}) оценка {self._weight:.2f}'
+
+
+class DetectionEventLog:
+    """
+    Журнал найденных людей (база SQLite, записи только добавляются). По журналу можно быстро узнать,
+    были ли люди в заданный промежуток времени, не декодируя видео.
+
+    Записи накапливаются в памяти и записываются пакетами (одной транзакцией), чтобы запись в базу
+    не замедляла распознавание. Повторная обработка того же файла не создает дубликатов
+    """
+
+    # после скольких записей или секунд накопленные записи сохраняются в базу
+    _FLUSH_EVENTS_COUNT = 500
+    _FLUSH_INTERVAL = 10.0
+
+    # сколько секунд ждать, пока другой процесс закончит запись в базу
+    _LOCK_TIMEOUT = 60.0
+
+    _TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+    def __init__(self, filename: str):
+        assert isinstance(filename, str)
+        self._filename = filename
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        # запись может выполняться из потока распознавания (конвейерная обработка), но не одновременно
+        # с другими потоками, поэтому соединение можно использовать не только в создавшем его потоке
+        self._connection: typing.Optional[sqlite3.Connection] = sqlite3.connect(
+            filename, timeout=self._LOCK_TIMEOUT, check_same_thread=False)
+        self._pending_rows: typing.List[tuple] = []
+        self._last_flush_time = time.time()
+        self._create_tables()
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_detection(
+            self,
+            frame_info: FrameInfo,
+            box: typing.Tuple[float, float, float, float],
+            weight: float
+    ):
+        """
+        Добавить найденного человека
+        :param frame_info: происхождение кадра
+        :param box: (x, y, ширина, высота) в долях ширины и высоты кадра
+        :param weight: оценка
+        """
+        assert isinstance(frame_info, FrameInfo)
+        timestamp = None
+        if frame_info.timestamp is not None:
+            timestamp = frame_info.timestamp.strftime(self._TIMESTAMP_FORMAT)
+        x, y, width, height = box
+        self._pending_rows.append((
+            frame_info.source_filename or '',
+            frame_info.frame_index,
+            timestamp,
+            round(float(x), 4), round(float(y), 4), round(float(width), 4), round(float(height), 4),
+            float(weight)
+        ))
+        if len(self._pending_rows) >= self._FLUSH_EVENTS_COUNT or \
+                time.time() - self._last_flush_time >= self._FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """
+        Сохранить накопленные записи в базу
+        """
+        self._last_flush_time = time.time()
+        if len(self._pending_rows) == 0 or self._connection is None:
+            return
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO detections '
+                '(source_file, frame_index, time, x, y, width, height, weight) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                self._pending_rows)
+        self._pending_rows = []
+
+    def close(self):
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    def find_detections(
+            self,
+            begin: datetime.datetime,
+            end: datetime.datetime,
+            min_weight: float = 0.0
+    ) -> typing.List[DetectionEvent]:
+        """
+        Найденные люди за промежуток времени [begin, end) (только записи с известным временем), по времени
+        """
+        self.flush()
+        rows = self._connection.execute(
+            'SELECT source_file, frame_index, time, x, y, width, height, weight FROM detections '
+            'WHERE time >= ? AND time < ? AND weight >= ? ORDER BY time, source_file, frame_index',
+            (begin.strftime(self._TIMESTAMP_FORMAT), end.strftime(self._TIMESTAMP_FORMAT), float(min_weight))
+        ).fetchall()
+        return [self._event_from_row(row) for row in rows]
+
+    def find_file_detections(self, source_filename: str) -> typing.List[DetectionEvent]:
+        """
+        Найденные люди в исходном файле (по номеру кадра)
+        """
+        self.flush()
+        rows = self._connection.execute(
+            'SELECT source_file, frame_index, time, x, y, width, height, weight FROM detections '
+            'WHERE source_file = ? ORDER BY frame_index',
+            (source_filename,)
+        ).fetchall()
+        return [self._event_from_row(row) for row in rows]
+
+    @classmethod
+    def _event_from_row(cls, row: tuple) -> DetectionEvent:
+        source_filename, frame_index, timestamp, x, y, width, height, weight = row
+        if timestamp is not None:
+            timestamp = datetime.datetime.strptime(timestamp, cls._TIMESTAMP_FORMAT)
+        return DetectionEvent(source_filename, frame_index, timestamp, (x, y, width, height), weight)
+
+    def _create_tables(self):
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS detections ('
+                'source_file TEXT NOT NULL, '
+                'frame_index INTEGER NOT NULL, '
+                'time TEXT, '
+                'x REAL, '
+                'y REAL, '
+                'width REAL, '
+                'height REAL, '
+                'weight REAL, '
+                'UNIQUE (source_file, frame_index, x, y, width, height))')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS detections_time ON detections (time)')
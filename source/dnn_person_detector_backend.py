@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import typing
+
+import cv2
+import numpy
+
+from source.i_person_detector_backend import IPersonDetectorBackend
+
+
+class DnnPersonDetectorBackend(IPersonDetectorBackend):
+    """
+    Поиск людей нейронной сетью через модуль OpenCV DNN (на процессоре). Подходят сети семейства SSD
+    с выходом DetectionOutput (строки [номер изображения, класс, оценка, x1, y1, x2, y2] в долях размера
+    изображения), например MobileNet-SSD (Caffe: .prototxt + .caffemodel) или SSD из TensorFlow Object Detection
+    (.pb + .pbtxt). Файл модели должен лежать локально.
+
+    Несколько изображений распознаются за один проход сети (пакетом), это заметно быстрее, чем по одному.
+    Значения по умолчанию подходят для MobileNet-SSD (VOC, класс человека 15)
+    """
+
+    def __init__(
+            self,
+            model_filename: str,
+            config_filename: str = '',
+            input_width: int = 300,
+            input_height: int = 300,
+            threads_count: int = 0,
+            batch_size: int = 4,
+            person_class_id: int = 15,
+            confidence_threshold: float = 0.5,
+            scale: float = 0.007843,
+            mean: float = 127.5,
+            swap_rb: bool = False
+    ):
+        """
+        :param model_filename: файл модели (веса)
+        :param config_filename: файл описания сети (если нужен для данного формата модели)
+        :param input_width: ширина входа сети
+        :param input_height: высота входа сети
+        :param threads_count: количество потоков OpenCV (0 - не менять). Влияет на все вычисления OpenCV в процессе
+        :param batch_size: сколько изображений распознавать за один проход сети
+        :param person_class_id: номер класса "человек" в выходе сети
+        :param confidence_threshold: минимальная оценка, с которой объект считается человеком
+        :param scale: множитель значений пикселей при подготовке входа сети
+        :param mean: значение, вычитаемое из пикселей при подготовке входа сети
+        :param swap_rb: поменять местами красный и синий каналы (сети, обученные на RGB)
+        """
+        assert isinstance(model_filename, str)
+        assert isinstance(config_filename, str)
+        assert isinstance(input_width, int) and input_width > 0
+        assert isinstance(input_height, int) and input_height > 0
+        assert isinstance(threads_count, int) and threads_count >= 0
+        assert isinstance(batch_size, int) and batch_size > 0
+        assert isinstance(person_class_id, int)
+        assert isinstance(swap_rb, bool)
+        if not os.path.isfile(model_filename):
+            raise Exception('Не найден файл модели: {0}'.format(model_filename))
+        self._input_size = (input_width, input_height)
+        self._batch_size = batch_size
+        self._person_class_id = person_class_id
+        self._confidence_threshold = float(confidence_threshold)
+        self._scale = float(scale)
+        self._mean = float(mean)
+        self._swap_rb = swap_rb
+
+        if threads_count > 0:
+            cv2.setNumThreads(threads_count)
+        self._net = cv2.dnn.readNet(model_filename, config_filename)
+        self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def get_window_size(self) -> typing.Tuple[int, int]:
+        # области меньше входа сети пришлось бы увеличивать, что только ухудшает распознавание
+        return self._input_size
+
+    def get_detection_threshold(self) -> float:
+        return self._confidence_threshold
+
+    def get_batch_size(self) -> int:
+        return self._batch_size
+
+    def detect(self, images: typing.List[numpy.ndarray]) -> typing.List[typing.Tuple[list, list]]:
+        results: typing.List[typing.Tuple[list, list]] = [([], []) for _ in images]
+        for batch_begin in range(0, len(images), self._batch_size):
+            batch = images[batch_begin:batch_begin + self._batch_size]
+            blob = cv2.dnn.blobFromImages(
+                batch,
+                self._scale,
+                self._input_size,
+                (self._mean, self._mean, self._mean),
+                swapRB=self._swap_rb,
+                crop=False
+            )
+            self._net.setInput(blob)
+            detections = self._net.forward()
+            for detection in detections.reshape(-1, 7):
+                image_index = int(detection[0])
+                if int(detection[1]) != self._person_class_id or not 0 <= image_index < len(batch):
+                    continue
+                confidence = float(detection[2])
+                if confidence < self._confidence_threshold:
+                    continue
+                image_height, image_width = batch[image_index].shape[0], batch[image_index].shape[1]
+                x1 = int(max(0.0, float(detection[3])) * image_width)
+                y1 = int(max(0.0, float(detection[4])) * image_height)
+                x2 = int(min(1.0, float(detection[5])) * image_width)
+                y2 = int(min(1.0, float(detection[6])) * image_height)
+                if x2 <= x1 or y2 <= y1:
+                    continue
+                boxes, weights = results[batch_begin + image_index]
+                boxes.append((x1, y1, x2 - x1, y2 - y1))
+                weights.append(confidence)
+        return results
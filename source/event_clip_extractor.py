@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import typing
+
+import cv2
+
+from source.detection_event_log import DetectionEvent
+from source.event_segmenter import EventSegment, EventSegmenter
+from source.source_video_opener import SourceVideoOpener
+
+
+class EventClipExtractor:
+    """
+    Запись отрывков исходных файлов с событиями (см. EventSegmenter) в обычной скорости и исходном разрешении.
+    Декодируется только отрезок события (см. SourceVideoOpener)
+    """
+
+    # частота кадров отрывка, если частоту кадров исходного файла определить не удалось
+    _DEFAULT_FPS = 25.0
+
+    # метка в имени отрывка, который еще записывается (ставится перед расширением)
+    _PARTIAL_MARK = '.partial'
+
+    def __init__(self, index_store: typing.Optional[typing.Any] = None):
+        """
+        :param index_store: хранилище индексов ключевых кадров (объект с методом get_index),
+         None - индексы строятся заново при каждом вызове
+        """
+        self._opener = SourceVideoOpener(index_store)
+
+    def extract_event_clips(
+            self,
+            events: typing.List[DetectionEvent],
+            segmenter: EventSegmenter,
+            output_dir: str,
+            fourcc: int,
+            extension: str = '.mkv'
+    ) -> typing.List[str]:
+        """
+        Объединить найденных людей в события и записать отрывок для каждого события.
+        Уже записанные (при прошлых запусках) отрывки не перезаписываются
+        :param events: найденные люди (из любых файлов)
+        :param output_dir: каталог для отрывков
+        :param fourcc: кодек отрывков
+        :param extension: расширение файлов отрывков (определяет формат файла)
+        :return: файлы отрывков
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        events_by_file: typing.Dict[str, typing.List[DetectionEvent]] = {}
+        for event in events:
+            events_by_file.setdefault(event.source_filename, []).append(event)
+
+        clip_filenames = []
+        for source_filename, file_events in events_by_file.items():
+            if not os.path.isfile(source_filename):
+                print('Не найден исходный файл событий: {0}'.format(source_filename))
+                continue
+            fps, frames_count = self._get_video_parameters(source_filename)
+            for segment in segmenter.segment(file_events, fps, frames_count):
+                clip_filename = os.path.join(output_dir, self._get_clip_name(segment, extension))
+                if not os.path.isfile(clip_filename):
+                    print('Событие: {0}'.format(segment))
+                    partial_filename = self._get_partial_filename(clip_filename)
+                    if self.extract(segment, partial_filename, fourcc) == 0:
+                        print('Не удалось прочитать кадры события')
+                        if os.path.isfile(partial_filename):
+                            os.remove(partial_filename)
+                        continue
+                    os.replace(partial_filename, clip_filename)
+                clip_filenames.append(clip_filename)
+        return clip_filenames
+
+    def extract(self, segment: EventSegment, output_filename: str, fourcc: int) -> int:
+        """
+        Записать отрывок исходного файла с событием
+        :return: количество записанных кадров
+        """
+        assert isinstance(segment, EventSegment)
+        video = self._opener.open(segment.source_filename, segment.begin_frame, segment.end_frame)
+        if video is None:
+            return 0
+        output_video: typing.Optional[cv2.VideoWriter] = None
+        written_frames_count = 0
+        try:
+            while video.position < segment.end_frame:
+                is_ok, frame = video.read()
+                if not is_ok:
+                    break
+                if output_video is None:
+                    output_video = cv2.VideoWriter(
+                        output_filename, fourcc, video.get_fps(), (frame.shape[1], frame.shape[0]))
+                output_video.write(frame)
+                written_frames_count += 1
+        finally:
+            video.release()
+            if output_video is not None:
+                output_video.release()
+        return written_frames_count
+
+    def _get_video_parameters(self, filename: str) -> typing.Tuple[float, int]:
+        """
+        :return: (частота кадров, количество кадров или 0, если неизвестно)
+        """
+        input_video = cv2.VideoCapture(filename)
+        try:
+            fps = float(input_video.get(cv2.CAP_PROP_FPS))
+        finally:
+            input_video.release()
+        if fps <= 0.0:
+            fps = self._DEFAULT_FPS
+        # у "сырых" файлов H.264 CAP_PROP_FRAME_COUNT равно 0 или неверно, количество кадров берется из индекса
+        return fps, self._opener.get_frames_count(filename)
+
+    @staticmethod
+    def _get_clip_name(segment: EventSegment, extension: str) -> str:
+        source_name = os.path.splitext(os.path.basename(segment.source_filename))[0]
+        name = '{0}_{1:07d}-{2:07d}'.format(source_name, segment.begin_frame, segment.end_frame)
+        if segment.begin_time is not None:
+            name = segment.begin_time.strftime('%Y%m%d_%H%M%S_') + name
+        return name + extension
+
+    def _get_partial_filename(self, filename: str) -> str:
+        name, extension = os.path.splitext(filename)
+        return name + self._PARTIAL_MARK + extension
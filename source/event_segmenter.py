@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime
+import typing
+
+from source.detection_event_log import DetectionEvent
+from source.utils.frozen import Frozen
+
+
+class EventSegment(Frozen):
+    """
+    Событие: отрезок исходного файла, на котором найдены люди (вместе с запасом до и после)
+    """
+
+    def __init__(
+            self,
+            source_filename: str,
+            begin_frame: int,
+            end_frame: int,
+            begin_time: typing.Optional[datetime.datetime],
+            detections_count: int,
+            max_weight: float
+    ):
+        super().__init__()
+        assert isinstance(source_filename, str)
+        assert isinstance(begin_frame, int)
+        assert isinstance(end_frame, int) and end_frame > begin_frame
+        assert isinstance(begin_time, datetime.datetime) or begin_time is None
+        assert isinstance(detections_count, int)
+        self._source_filename = source_filename
+        self._begin_frame = begin_frame
+        self._end_frame = end_frame
+        self._begin_time = begin_time
+        self._detections_count = detections_count
+        self._max_weight = float(max_weight)
+        self.freeze()
+
+    @property
+    def source_filename(self) -> str:
+        return self._source_filename
+
+    @property
+    def begin_frame(self) -> int:
+        """
+        Первый кадр отрезка
+        """
+        return self._begin_frame
+
+    @property
+    def end_frame(self) -> int:
+        """
+        Кадр после последнего кадра отрезка
+        """
+        return self._end_frame
+
+    @property
+    def begin_time(self) -> typing.Optional[datetime.datetime]:
+        """
+        Время первого кадра отрезка (None, если неизвестно)
+        """
+        return self._begin_time
+
+    @property
+    def detections_count(self) -> int:
+        return self._detections_count
+
+    @property
+    def max_weight(self) -> float:
+        return self._max_weight
+
+    def get_frames_count(self) -> int:
+        return self._end_frame - self._begin_frame
+
+    def __str__(self):
+        return f'{self._begin_time} {self._source_filename} кадры {self._begin_frame}-{self._end_frame} ' \
+               f'(найдено {self._detections_count}, макс. оценка {self._max_weight:.2f})'
+
+
+class EventSegmenter:
+    """
+    Объединение найденных людей в события. Найденные в одном файле люди, между которыми прошло не больше
+    max_gap_seconds, относятся к одному событию. К событию добавляется запас padding_seconds до первого
+    и после последнего найденного человека, чтобы в отрывке было видно, откуда человек пришел и куда ушел
+    """
+
+    def __init__(self, max_gap_seconds: float = 10.0, padding_seconds: float = 3.0):
+        assert max_gap_seconds >= 0.0
+        assert padding_seconds >= 0.0
+        self._max_gap_seconds = float(max_gap_seconds)
+        self._padding_seconds = float(padding_seconds)
+
+    @property
+    def max_gap_seconds(self) -> float:
+        return self._max_gap_seconds
+
+    @property
+    def padding_seconds(self) -> float:
+        return self._padding_seconds
+
+    def segment(
+            self,
+            events: typing.List[DetectionEvent],
+            fps: float,
+            frames_count: int = 0
+    ) -> typing.List[EventSegment]:
+        """
+        Разбить на события найденных людей одного исходного файла
+        :param events: найденные люди (в любом порядке, из одного файла)
+        :param fps: частота кадров исходного файла
+        :param frames_count: количество кадров исходного файла (0 - неизвестно, конец отрезка не ограничивается)
+        :return: события по порядку кадров
+        """
+        assert fps > 0.0
+        if len(events) == 0:
+            return []
+        source_filename = events[0].source_filename
+        assert all([event.source_filename == source_filename for event in events])
+        padding_frames = int(round(self._padding_seconds * fps))
+        # события, запасы которых пересекаются, тоже объединяются
+        max_gap_frames = max(int(round(self._max_gap_seconds * fps)), 2 * padding_frames)
+
+        segments = []
+        group: typing.List[DetectionEvent] = []
+        for event in sorted(events, key=lambda item: item.frame_index):
+            if len(group) > 0 and event.frame_index - group[-1].frame_index > max_gap_frames:
+                segments.append(self._create_segment(group, fps, frames_count, padding_frames))
+                group = []
+            group.append(event)
+        segments.append(self._create_segment(group, fps, frames_count, padding_frames))
+        return segments
+
+    @staticmethod
+    def _create_segment(
+            group: typing.List[DetectionEvent],
+            fps: float,
+            frames_count: int,
+            padding_frames: int
+    ) -> EventSegment:
+        first_event = group[0]
+        begin_frame = max(0, first_event.frame_index - padding_frames)
+        end_frame = group[-1].frame_index + 1 + padding_frames
+        if frames_count > 0:
+            end_frame = max(begin_frame + 1, min(frames_count, end_frame))
+        begin_time = None
+        if first_event.timestamp is not None:
+            begin_time = first_event.timestamp - datetime.timedelta(
+                seconds=(first_event.frame_index - begin_frame) / fps)
+        return EventSegment(
+            first_event.source_filename,
+            begin_frame,
+            end_frame,
+            begin_time,
+            len(group),
+            max([event.weight for event in group])
+        )
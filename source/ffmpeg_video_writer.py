@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import shutil
+import subprocess
+import typing
+
+import numpy
+
+from source.i_video_writer import IVideoWriter
+
+
+class FfmpegVideoWriter(IVideoWriter):
+    """
+    Запись видео через ffmpeg: кадры в формате BGR передаются без сжатия через канал в процесс ffmpeg,
+    который кодирует их заданным кодеком (с заданными preset, CRF и количеством потоков) и записывает
+    в файл (формат файла определяется расширением). Кодирование идет в отдельном процессе, на других ядрах.
+
+    Непрерывные кадры нужного размера передаются в канал без копирования, остальные копируются
+    в один и тот же буфер
+    """
+
+    def __init__(
+            self,
+            filename: str,
+            fps: float,
+            frame_size: typing.Tuple[int, int],
+            ffmpeg_path: str = 'ffmpeg',
+            codec: str = 'libx264',
+            preset: typing.Optional[str] = 'veryfast',
+            crf: typing.Optional[int] = 23,
+            threads_count: int = 0,
+            pix_fmt: str = 'yuv420p'
+    ):
+        """
+        :param frame_size: (ширина, высота) кадра
+        :param preset: preset кодека (None - не задается, для кодеков без preset)
+        :param crf: качество (constant rate factor, меньше - лучше), None - не задается
+        :param threads_count: количество потоков кодирования (0 - выбирает ffmpeg)
+        """
+        assert isinstance(filename, str)
+        assert fps > 0.0
+        assert threads_count >= 0
+        self._filename = filename
+        self._frame_width, self._frame_height = frame_size
+        self._process: typing.Optional[subprocess.Popen] = None
+
+        # буфер для кадров, которые нельзя передать в канал без копирования
+        self._frame_buffer = numpy.empty((self._frame_height, self._frame_width, 3), dtype=numpy.uint8)
+
+        if shutil.which(ffmpeg_path) is None:
+            print('Не найден ffmpeg: {0}'.format(ffmpeg_path))
+            return
+        command = [
+            ffmpeg_path,
+            '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', '{0}x{1}'.format(self._frame_width, self._frame_height), '-r', str(fps),
+            '-i', 'pipe:0',
+            '-an', '-c:v', codec
+        ]
+        if preset is not None:
+            command += ['-preset', preset]
+        if crf is not None:
+            command += ['-crf', str(crf)]
+        command += ['-threads', str(threads_count), '-pix_fmt', pix_fmt, filename]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    @staticmethod
+    def is_available(ffmpeg_path: str = 'ffmpeg') -> bool:
+        return shutil.which(ffmpeg_path) is not None
+
+    def isOpened(self) -> bool:
+        return self._process is not None
+
+    def write(self, frame: numpy.ndarray):
+        if self._process is None:
+            return
+        if frame.shape != self._frame_buffer.shape:
+            raise Exception('Размер записываемого кадра {0} не соответствует размеру видео {1}'.format(
+                frame.shape, self._frame_buffer.shape))
+        if frame.dtype != numpy.uint8 or not frame.flags['C_CONTIGUOUS']:
+            numpy.copyto(self._frame_buffer, frame, casting='unsafe')
+            frame = self._frame_buffer
+        try:
+            self._process.stdin.write(memoryview(frame).cast('B'))
+        except OSError:
+            # ffmpeg завершился: в Windows запись в такой канал вызывает OSError (EINVAL), а не BrokenPipeError
+            errors = self._finish()
+            raise Exception('ffmpeg завершился при записи {0}: {1}'.format(self._filename, errors))
+
+    def release(self):
+        if self._process is None:
+            return
+        errors = self._finish()
+        if errors:
+            print('Ошибка ffmpeg при записи {0}: {1}'.format(self._filename, errors))
+
+    def _finish(self) -> str:
+        """
+        Закрыть канал и дождаться завершения ffmpeg
+        :return: сообщения об ошибках ffmpeg
+        """
+        process = self._process
+        self._process = None
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        errors = process.stderr.read().decode('utf-8', errors='replace').strip()
+        if process.wait() != 0 and not errors:
+            errors = 'код завершения {0}'.format(process.returncode)
+        return errors
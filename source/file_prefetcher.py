@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import threading
+import typing
+
+
+class FilePrefetcher:
+    """
+    Упреждающее чтение входных файлов: пока декодируется текущий файл, фоновый поток читает следующие
+    files_ahead файлов, чтобы при открытии файла его начало уже было в кэше операционной системы
+    (в сетевой папке первое чтение каждого файла иначе останавливает обработку).
+
+    Чтение идет блоками в один и тот же буфер, данные остаются только в кэше операционной системы.
+    Перед чтением вызывается posix_fadvise(WILLNEED), если он есть (не в Windows), чтобы система начала
+    читать файл сама. Всего заранее читается не больше budget_bytes байт (от начала следующих файлов),
+    чтобы не вытеснять из кэша текущий файл.
+
+    Статистика (готов ли файл к открытию) собирается для всех файлов, кроме первого: его нельзя прочитать заранее
+    """
+
+    # размер блока чтения
+    _CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, files_ahead: int = 1, budget_bytes: int = 512 * 1024 * 1024):
+        """
+        :param files_ahead: сколько следующих файлов читать заранее
+        :param budget_bytes: сколько байт всего читать заранее
+        """
+        assert isinstance(files_ahead, int)
+        assert files_ahead > 0
+        assert isinstance(budget_bytes, int)
+        assert budget_bytes > 0
+        self._files_ahead = files_ahead
+        self._budget_bytes = budget_bytes
+
+        self._condition = threading.Condition()
+        self._files: typing.List[str] = []
+        # номер открытого файла в списке файлов
+        self._current_index: int = 0
+        # номер списка файлов и открытого файла: поток чтения прерывает чтение, если они изменились
+        self._generation: int = 0
+        # сколько байт от начала файла прочитано заранее
+        self._prefetched: typing.Dict[str, int] = {}
+        # сколько байт файла нужно прочитать заранее (размер файла, но не больше оставшегося бюджета)
+        self._targets: typing.Dict[str, int] = {}
+        # файлы, которые не удалось прочитать (больше не читаются)
+        self._failed_files: typing.Set[str] = set()
+        # файлы, которые оказались короче, чем нужно было прочитать (или еще дописываются), и сколько байт
+        # нужно было прочитать: такой файл снова читается, только если это количество изменится
+        self._ended_files: typing.Dict[str, int] = {}
+        self._thread: typing.Optional[threading.Thread] = None
+        self._is_stopped: bool = False
+
+        self._hits_count: int = 0
+        self._partial_count: int = 0
+        self._misses_count: int = 0
+        self._prefetched_bytes: int = 0
+
+    @property
+    def hits_count(self) -> int:
+        """
+        Сколько файлов к открытию были прочитаны заранее полностью (в пределах бюджета)
+        """
+        return self._hits_count
+
+    @property
+    def partial_count(self) -> int:
+        """
+        Сколько файлов к открытию были прочитаны заранее частично
+        """
+        return self._partial_count
+
+    @property
+    def misses_count(self) -> int:
+        """
+        Сколько файлов к открытию не были прочитаны заранее
+        """
+        return self._misses_count
+
+    @property
+    def prefetched_bytes(self) -> int:
+        """
+        Сколько байт всего прочитано заранее
+        """
+        return self._prefetched_bytes
+
+    def set_files(self, files: typing.List[str]):
+        """
+        Задать файлы в порядке открытия (первый файл открывается сразу, следующие начинают читаться заранее)
+        """
+        assert all([isinstance(file, str) for file in files])
+        with self._condition:
+            self._files = list(files)
+            self._current_index = 0
+            self._generation += 1
+            self._update_targets()
+            self._condition.notify_all()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='file-prefetcher', daemon=True)
+            self._thread.start()
+
+    def open_file(self, file: str) -> typing.Optional[bool]:
+        """
+        Файл открывается: учитывается в статистике, и начинают читаться заранее файлы после него
+        :return: прочитан ли файл заранее полностью (None - файл не из списка или первый файл)
+        """
+        with self._condition:
+            try:
+                index = self._files.index(file, self._current_index)
+            except ValueError:
+                return None
+            is_prefetched: typing.Optional[bool] = None
+            if index > 0:
+                prefetched = self._prefetched.get(file, 0)
+                target = self._targets.get(file, 0)
+                is_prefetched = prefetched > 0 and prefetched >= target
+                if is_prefetched:
+                    self._hits_count += 1
+                elif prefetched > 0:
+                    self._partial_count += 1
+                else:
+                    self._misses_count += 1
+            self._current_index = index
+            self._generation += 1
+            self._update_targets()
+            self._condition.notify_all()
+            return is_prefetched
+
+    def stop(self):
+        with self._condition:
+            self._is_stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_statistics(self) -> str:
+        return 'Упреждающее чтение: прочитаны заранее {0}, частично {1}, не прочитаны {2}, всего {3:.1f} МБ'.format(
+            self._hits_count, self._partial_count, self._misses_count, self._prefetched_bytes / 1024.0 / 1024.0)
+
+    def _update_targets(self):
+        """
+        Распределить бюджет между следующими файлами (вызывается под блокировкой)
+        """
+        self._targets = {}
+        remaining_bytes = self._budget_bytes
+        for file in self._files[self._current_index + 1:self._current_index + 1 + self._files_ahead]:
+            if remaining_bytes <= 0:
+                break
+            try:
+                file_size = os.path.getsize(file)
+            except OSError:
+                continue
+            self._targets[file] = min(file_size, remaining_bytes)
+            remaining_bytes -= self._targets[file]
+
+    def _get_next_target(self) -> typing.Optional[typing.Tuple[str, int, int]]:
+        """
+        Следующий файл, который нужно дочитать (вызывается под блокировкой)
+        :return: (файл, сколько байт прочитать, номер списка и открытого файла)
+        """
+        for file, target in self._targets.items():
+            if self._prefetched.get(file, 0) < target and file not in self._failed_files \
+                    and self._ended_files.get(file) != target:
+                return file, target, self._generation
+        return None
+
+    def _run(self):
+        buffer = bytearray(self._CHUNK_SIZE)
+        while True:
+            with self._condition:
+                next_target = None
+                while not self._is_stopped:
+                    next_target = self._get_next_target()
+                    if next_target is not None:
+                        break
+                    self._condition.wait()
+                if self._is_stopped:
+                    return
+            file, target, generation = next_target
+            self._prefetch_file(file, target, generation, buffer)
+
+    def _prefetch_file(self, file: str, target: int, generation: int, buffer: bytearray):
+        offset = self._prefetched.get(file, 0)
+        try:
+            with open(file, 'rb', buffering=0) as input_file:
+                if offset == 0 and hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(input_file.fileno(), 0, target, os.POSIX_FADV_WILLNEED)
+                input_file.seek(offset)
+                view = memoryview(buffer)
+                while offset < target:
+                    read_count = input_file.readinto(view[:min(self._CHUNK_SIZE, target - offset)])
+                    offset += read_count
+                    with self._condition:
+                        self._prefetched[file] = offset
+                        self._prefetched_bytes += read_count
+                        if not read_count:
+                            # файл короче, чем был (или еще дописывается) - больше читать нечего,
+                            # файл считается прочитанным заранее частично
+                            self._ended_files[file] = target
+                            return
+                        if self._is_stopped or self._generation != generation:
+                            # открыт другой файл - нужно заново выбрать, что читать
+                            return
+        except OSError as error:
+            print('Не удалось прочитать заранее {0}: {1}'.format(file, error))
+            with self._condition:
+                self._failed_files.add(file)
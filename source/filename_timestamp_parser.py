@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import re
+import typing
+
+
+class FilenameTimestampParser:
+    """
+    Получение времени начала записи из имени видеофайла по шаблону strftime
+    (например, для 20220816180000.h264 шаблон %Y%m%d%H%M%S). Метка даты-времени может находиться
+    в любом месте имени файла
+    """
+
+    # регулярные выражения для поддерживаемых директив strftime
+    _DIRECTIVE_PATTERNS = {
+        'Y': r'\d{4}',
+        'y': r'\d{2}',
+        'm': r'\d{2}',
+        'd': r'\d{2}',
+        'H': r'\d{2}',
+        'M': r'\d{2}',
+        'S': r'\d{2}',
+        'j': r'\d{3}',
+        '%': '%',
+    }
+
+    def __init__(self, strftime_format: str):
+        assert isinstance(strftime_format, str)
+        self._strftime_format = strftime_format
+        self._regex = re.compile(self._format_to_regex(strftime_format))
+
+    @property
+    def strftime_format(self) -> str:
+        return self._strftime_format
+
+    def parse(self, filename: str) -> typing.Optional[datetime.datetime]:
+        """
+        :return: дата-время из имени файла или None, если в имени файла нет метки по шаблону
+        """
+        name = os.path.basename(filename)
+        for match in self._regex.finditer(name):
+            try:
+                return datetime.datetime.strptime(match.group(0), self._strftime_format)
+            except ValueError:
+                continue
+        return None
+
+    @classmethod
+    def _format_to_regex(cls, strftime_format: str) -> str:
+        regex = ''
+        position = 0
+        while position < len(strftime_format):
+            char = strftime_format[position]
+            if char == '%' and position + 1 < len(strftime_format):
+                directive = strftime_format[position + 1]
+                if directive not in cls._DIRECTIVE_PATTERNS:
+                    raise ValueError('Директива %{0} не поддерживается в шаблоне времени имени файла'.format(directive))
+                regex += cls._DIRECTIVE_PATTERNS[directive]
+                position += 2
+            else:
+                regex += re.escape(char)
+                position += 1
+        return regex
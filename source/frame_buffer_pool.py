@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+import typing
+
+import numpy
+
+
+class FrameBufferPool:
+    """
+    Пул буферов кадров: вместо выделения памяти под каждый кадр (декодирование, изменение размера)
+    используются освобожденные буферы того же размера. Для кадра 1920x1080 это 6 МБ на кадр, выделение
+    которых (и заполнение страниц памяти) обходится дороже, чем повторное использование.
+
+    Буфер, полученный через acquire, принадлежит получателю до вызова release. После release
+    буфер может быть выдан снова, поэтому ссылки на него нигде не должны оставаться. Пул может
+    использоваться из нескольких потоков (конвейерная обработка)
+    """
+
+    def __init__(self, max_free_buffers: int = 16):
+        """
+        :param max_free_buffers: сколько свободных буферов одного размера хранить (остальные освобождаются)
+        """
+        assert max_free_buffers > 0
+        self._max_free_buffers = max_free_buffers
+        self._lock = threading.Lock()
+        self._free_buffers: typing.Dict[tuple, typing.List[numpy.ndarray]] = {}
+        self._allocated_count: int = 0
+
+    @property
+    def allocated_count(self) -> int:
+        """
+        Сколько буферов выделено (при повторном использовании перестает расти)
+        """
+        return self._allocated_count
+
+    def acquire(self, shape: typing.Tuple[int, ...], dtype=numpy.uint8) -> numpy.ndarray:
+        """
+        Получить буфер (содержимое не определено)
+        """
+        key = (tuple(shape), numpy.dtype(dtype).str)
+        with self._lock:
+            free_buffers = self._free_buffers.get(key)
+            if free_buffers:
+                return free_buffers.pop()
+            self._allocated_count += 1
+        return numpy.empty(shape, dtype=dtype)
+
+    def release(self, buffer: typing.Optional[numpy.ndarray]):
+        """
+        Вернуть буфер в пул (None и массивы, которые не являются отдельными буферами, пропускаются)
+        """
+        if buffer is None or buffer.base is not None or not buffer.flags['C_CONTIGUOUS']:
+            return
+        key = (buffer.shape, buffer.dtype.str)
+        with self._lock:
+            free_buffers = self._free_buffers.setdefault(key, [])
+            if len(free_buffers) < self._max_free_buffers:
+                free_buffers.append(buffer)
+
+    def clear(self):
+        with self._lock:
+            self._free_buffers.clear()
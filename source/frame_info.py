@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime
+import typing
+
+from source.utils.frozen import Frozen
+
+
+class FrameInfo(Frozen):
+    """
+    Происхождение кадра: исходный файл, номер кадра в нем, время съемки кадра и (если известно)
+    смещение кадра в исходном файле
+    """
+
+    def __init__(
+            self,
+            source_filename: typing.Optional[str],
+            frame_index: int,
+            timestamp: typing.Optional[datetime.datetime],
+            byte_offset: typing.Optional[int] = None
+    ):
+        super().__init__()
+        assert isinstance(source_filename, str) or source_filename is None
+        assert isinstance(frame_index, int)
+        assert isinstance(timestamp, datetime.datetime) or timestamp is None
+        assert isinstance(byte_offset, int) or byte_offset is None
+        self._source_filename = source_filename
+        self._frame_index = frame_index
+        self._timestamp = timestamp
+        self._byte_offset = byte_offset
+        self.freeze()
+
+    @property
+    def source_filename(self) -> typing.Optional[str]:
+        """
+        Исходный файл (None, если неизвестен)
+        """
+        return self._source_filename
+
+    @property
+    def frame_index(self) -> int:
+        """
+        Номер кадра в исходном файле (с нуля)
+        """
+        return self._frame_index
+
+    @property
+    def timestamp(self) -> typing.Optional[datetime.datetime]:
+        """
+        Время съемки кадра: время начала файла (из имени файла) плюс смещение кадра (None, если неизвестно)
+        """
+        return self._timestamp
+
+    @property
+    def byte_offset(self) -> typing.Optional[int]:
+        """
+        Смещение кадра (блока доступа H.264) в исходном файле (None, если неизвестно)
+        """
+        return self._byte_offset
+
+    @classmethod
+    def from_source(
+            cls,
+            source_filename: typing.Optional[str],
+            frame_index: int,
+            start_time: typing.Optional[datetime.datetime],
+            fps: float,
+            byte_offset: typing.Optional[int] = None
+    ) -> 'FrameInfo':
+        """
+        :param start_time: время начала записи исходного файла (None - неизвестно)
+        :param fps: частота кадров исходного файла (если не больше 0, то время кадра неизвестно)
+        """
+        timestamp = None
+        if start_time is not None and fps > 0.0:
+            timestamp = start_time + datetime.timedelta(seconds=frame_index / fps)
+        return cls(source_filename, frame_index, timestamp, byte_offset)
+
+    def __str__(self):
+        return f'{self._source_filename}, кадр {self._frame_index}, время {self._timestamp}'
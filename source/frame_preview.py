@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import multiprocessing
+import time
+import typing
+from multiprocessing import shared_memory
+
+import cv2
+import numpy
+
+
+def _preview_viewer_main(
+        shared_memory_name: str,
+        frame_shape: typing.Tuple[int, int, int],
+        slots_count: int,
+        fps: float,
+        stop_event
+):
+    """
+    Процесс просмотра: с заданной частотой показывает последний опубликованный кадр.
+    ESC в окне просмотра запрашивает остановку обработки
+    """
+    memory = shared_memory.SharedMemory(name=shared_memory_name)
+    header, slots = SharedFramePreview.map_buffer(memory, frame_shape, slots_count)
+    try:
+        shown_sequence = 0
+        delay_ms = max(1, int(1000.0 / fps))
+        while not stop_event.is_set():
+            sequence = int(header[SharedFramePreview.HEADER_SEQUENCE])
+            if sequence == SharedFramePreview.SEQUENCE_CLOSED:
+                break
+            if sequence > shown_sequence:
+                frame = slots[sequence % slots_count].copy()
+                # если пока копировали кадр, записывающая сторона прошла по кругу и дошла до этого
+                # же слота, то кадр мог быть испорчен - такой кадр не показываем
+                if int(header[SharedFramePreview.HEADER_SEQUENCE]) - sequence < slots_count - 1:
+                    cv2.imshow('preview', frame)
+                    shown_sequence = sequence
+            key = cv2.waitKey(delay_ms)
+            if key == SharedFramePreview.KEY_ESC:
+                stop_event.set()
+        cv2.destroyAllWindows()
+    finally:
+        del header, slots
+        memory.close()
+
+
+class SharedFramePreview:
+    """
+    Предпросмотр кадров в отдельном процессе. Обработка только копирует уменьшенный кадр в кольцевой буфер
+    в разделяемой памяти (не чаще, чем fps раз в секунду) и никогда не ждет процесс просмотра, поэтому
+    предпросмотр не замедляет обработку. Процесс просмотра сам с частотой fps забирает последний кадр.
+    """
+
+    KEY_ESC = 27
+
+    HEADER_SEQUENCE = 0
+    SEQUENCE_CLOSED = -1
+    _HEADER_SIZE = 8
+
+    def __init__(
+            self,
+            stop_event,
+            width: int = 640,
+            height: int = 360,
+            fps: float = 5.0,
+            slots_count: int = 4
+    ):
+        """
+        :param stop_event: событие (multiprocessing.Event), которое устанавливается при нажатии ESC в окне просмотра
+        :param width: ширина кадра предпросмотра
+        :param height: высота кадра предпросмотра
+        :param fps: частота обновления предпросмотра
+        :param slots_count: количество кадров в кольцевом буфере
+        """
+        assert isinstance(width, int)
+        assert isinstance(height, int)
+        assert isinstance(slots_count, int)
+        assert slots_count >= 2
+        self._stop_event = stop_event
+        self._frame_shape = (height, width, 3)
+        self._fps = float(fps)
+        self._slots_count = slots_count
+        self._memory: typing.Optional[shared_memory.SharedMemory] = None
+        self._header: typing.Optional[numpy.ndarray] = None
+        self._slots: typing.Optional[numpy.ndarray] = None
+        self._viewer: typing.Optional[multiprocessing.Process] = None
+        self._sequence = 0
+        self._last_publish_time = 0.0
+
+    @staticmethod
+    def map_buffer(
+            memory: shared_memory.SharedMemory,
+            frame_shape: typing.Tuple[int, int, int],
+            slots_count: int
+    ) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Разметка разделяемой памяти: заголовок (номер последнего записанного кадра) и слоты кадров
+        """
+        header = numpy.ndarray((1,), dtype=numpy.int64, buffer=memory.buf[:SharedFramePreview._HEADER_SIZE])
+        slots = numpy.ndarray(
+            (slots_count,) + tuple(frame_shape),
+            dtype=numpy.uint8,
+            buffer=memory.buf[SharedFramePreview._HEADER_SIZE:]
+        )
+        return header, slots
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """
+        Создать буфер в разделяемой памяти и запустить процесс просмотра
+        """
+        frame_size = int(numpy.prod(self._frame_shape))
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=self._HEADER_SIZE + frame_size * self._slots_count)
+        self._header, self._slots = self.map_buffer(self._memory, self._frame_shape, self._slots_count)
+        self._header[self.HEADER_SEQUENCE] = 0
+        self._viewer = multiprocessing.Process(
+            target=_preview_viewer_main,
+            args=(self._memory.name, self._frame_shape, self._slots_count, self._fps, self._stop_event),
+            daemon=True
+        )
+        self._viewer.start()
+
+    def publish(self, frame: numpy.ndarray):
+        """
+        Опубликовать кадр для предпросмотра (если с прошлой публикации прошло достаточно времени)
+        """
+        now = time.time()
+        if self._slots is None or now - self._last_publish_time < 1.0 / self._fps:
+            return
+        self._last_publish_time = now
+        sequence = self._sequence + 1
+        height, width, _ = self._frame_shape
+        cv2.resize(frame, (width, height), dst=self._slots[sequence % self._slots_count])
+        self._sequence = sequence
+        self._header[self.HEADER_SEQUENCE] = sequence
+
+    def stop(self):
+        """
+        Завершить процесс просмотра и освободить разделяемую память
+        """
+        if self._header is not None:
+            self._header[self.HEADER_SEQUENCE] = self.SEQUENCE_CLOSED
+        if self._viewer is not None:
+            self._viewer.join(timeout=5.0)
+            if self._viewer.is_alive():
+                self._viewer.terminate()
+            self._viewer = None
+        self._header = None
+        self._slots = None
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
@@ -0,0 +1,640 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import typing
+
+from source.utils.frozen import Frozen
+
+
+class H264Keyframe(Frozen):
+    """
+    Ключевой кадр (IDR) в потоке H.264: номер кадра от начала файла и байтовый диапазон
+    его блока доступа (access unit) в файле
+    """
+
+    def __init__(self, frame_number: int, offset: int, size: int, has_parameter_sets: bool):
+        super().__init__()
+        assert isinstance(frame_number, int)
+        assert isinstance(offset, int)
+        assert isinstance(size, int)
+        assert isinstance(has_parameter_sets, bool)
+        self._frame_number = frame_number
+        self._offset = offset
+        self._size = size
+        self._has_parameter_sets = has_parameter_sets
+        self.freeze()
+
+    @property
+    def frame_number(self) -> int:
+        return self._frame_number
+
+    @property
+    def offset(self) -> int:
+        return self._offset
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def has_parameter_sets(self) -> bool:
+        """
+        Есть ли перед кадром SPS и PPS (иначе для независимого декодирования их нужно добавить)
+        """
+        return self._has_parameter_sets
+
+
+class H264StreamIndex(Frozen):
+    """
+    Индекс ключевых кадров файла с "сырым" потоком H.264 (формат Annex-B)
+    """
+
+    # размер блока при копировании отрезка файла
+    _COPY_BLOCK_SIZE = 4 * 1024 * 1024
+
+    def __init__(
+            self,
+            filename: str,
+            file_size: int,
+            file_mtime: float,
+            frames_count: int,
+            keyframes: typing.List[H264Keyframe],
+            sps: bytes,
+            pps: bytes,
+            damaged_ranges: typing.Optional[typing.List[typing.Tuple[int, int]]] = None
+    ):
+        super().__init__()
+        assert isinstance(filename, str)
+        assert isinstance(file_size, int)
+        assert isinstance(frames_count, int)
+        assert all([isinstance(keyframe, H264Keyframe) for keyframe in keyframes])
+        assert isinstance(sps, bytes)
+        assert isinstance(pps, bytes)
+        self._filename = filename
+        self._file_size = file_size
+        self._file_mtime = float(file_mtime)
+        self._frames_count = frames_count
+        self._keyframes = keyframes
+        self._sps = sps
+        self._pps = pps
+        self._damaged_ranges: typing.List[typing.Tuple[int, int]] = [
+            (int(begin), int(end)) for begin, end in damaged_ranges or []]
+        self.freeze()
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    @property
+    def file_size(self) -> int:
+        return self._file_size
+
+    @property
+    def file_mtime(self) -> float:
+        return self._file_mtime
+
+    @property
+    def frames_count(self) -> int:
+        return self._frames_count
+
+    @property
+    def keyframes(self) -> typing.List[H264Keyframe]:
+        return self._keyframes
+
+    @property
+    def sps(self) -> bytes:
+        """
+        Первый SPS потока вместе со стартовым кодом (пустой, если не найден)
+        """
+        return self._sps
+
+    @property
+    def pps(self) -> bytes:
+        """
+        Первый PPS потока вместе со стартовым кодом (пустой, если не найден)
+        """
+        return self._pps
+
+    @property
+    def damaged_ranges(self) -> typing.List[typing.Tuple[int, int]]:
+        """
+        Поврежденные участки потока: (номер первого поврежденного кадра, номер ключевого кадра, с которого
+        изображение снова правильное, или frames_count, если ключевых кадров до конца файла нет)
+        """
+        return self._damaged_ranges
+
+    def get_first_decoded_frame_number(self) -> int:
+        """
+        Номер первого кадра, который выдает декодер: кадры до первого ключевого кадра не декодируются
+        (нет опорного кадра), поэтому декодер начинает с него
+        """
+        return self._keyframes[0].frame_number if len(self._keyframes) > 0 else 0
+
+    def get_resync_frame_number(self, frame_number: int) -> typing.Optional[int]:
+        """
+        Если кадр находится в поврежденном участке - номер кадра, с которого изображение снова правильное
+        (None - кадр не поврежден)
+        """
+        for begin, end in self._damaged_ranges:
+            if begin <= frame_number < end:
+                return end
+        return None
+
+    def get_codec_parameters(self) -> bytes:
+        """
+        Параметры кодирования потока (SPS и PPS без стартовых кодов) для сравнения потоков разных файлов
+        """
+        return self._sps.lstrip(b'\x00')[1:] + self._pps.lstrip(b'\x00')[1:]
+
+    def is_actual(self) -> bool:
+        """
+        Соответствует ли индекс текущему состоянию файла (файл не изменялся после построения индекса)
+        """
+        try:
+            stat = os.stat(self._filename)
+        except OSError:
+            return False
+        return stat.st_size == self._file_size and stat.st_mtime == self._file_mtime
+
+    def select_keyframes(self, frames_step: int) -> typing.List[H264Keyframe]:
+        """
+        Выбрать ключевые кадры так, чтобы в среднем между ними было frames_step кадров.
+        Для каждого кадра с номером, кратным frames_step, берется первый ключевой кадр не раньше него
+        :param frames_step: шаг по кадрам (количество пропускаемых кадров + 1)
+        :return: выбранные ключевые кадры
+        """
+        assert isinstance(frames_step, int)
+        assert frames_step > 0
+        selected = []
+        target_frame_number = 0
+        for keyframe in self._keyframes:
+            if keyframe.frame_number >= target_frame_number:
+                selected.append(keyframe)
+                while target_frame_number <= keyframe.frame_number:
+                    target_frame_number += frames_step
+        return selected
+
+    def write_access_units(self, keyframes: typing.List[H264Keyframe], output_file: typing.BinaryIO):
+        """
+        Записать блоки доступа ключевых кадров в выходной поток. Получается корректный поток H.264,
+        состоящий только из ключевых кадров, каждый из которых декодируется независимо
+        :param keyframes: ключевые кадры этого файла
+        :param output_file: открытый на запись двоичный файл
+        """
+        with open(self._filename, 'rb') as input_file:
+            for keyframe in keyframes:
+                if not keyframe.has_parameter_sets:
+                    output_file.write(self._sps)
+                    output_file.write(self._pps)
+                input_file.seek(keyframe.offset)
+                output_file.write(input_file.read(keyframe.size))
+
+    def write_frames(self, begin_frame: int, end_frame: int, output_file: typing.BinaryIO) -> int:
+        """
+        Записать в выходной поток отрезок файла, содержащий кадры [begin_frame, end_frame): от ближайшего
+        ключевого кадра не позже begin_frame до ближайшего ключевого кадра не раньше end_frame.
+        Получается корректный поток H.264, для декодирования которого не нужно читать остальной файл
+        :return: номер (в исходном файле) первого кадра записанного потока
+        """
+        assert begin_frame < end_frame
+        first_keyframe: typing.Optional[H264Keyframe] = None
+        end_offset = self._file_size
+        for keyframe in self._keyframes:
+            if keyframe.frame_number <= begin_frame:
+                first_keyframe = keyframe
+            elif keyframe.frame_number >= end_frame:
+                end_offset = keyframe.offset
+                break
+        begin_offset = 0
+        first_frame_number = 0
+        with open(self._filename, 'rb') as input_file:
+            if first_keyframe is not None:
+                if not first_keyframe.has_parameter_sets:
+                    output_file.write(self._sps)
+                    output_file.write(self._pps)
+                begin_offset = first_keyframe.offset
+                first_frame_number = first_keyframe.frame_number
+            input_file.seek(begin_offset)
+            remaining_size = end_offset - begin_offset
+            while remaining_size > 0:
+                block = input_file.read(min(remaining_size, self._COPY_BLOCK_SIZE))
+                if len(block) == 0:
+                    break
+                output_file.write(block)
+                remaining_size -= len(block)
+        return first_frame_number
+
+    def to_dict(self) -> dict:
+        return {
+            'version': H264StreamScanner.INDEX_VERSION,
+            'filename': self._filename,
+            'file_size': self._file_size,
+            'file_mtime': self._file_mtime,
+            'frames_count': self._frames_count,
+            'sps': self._sps.hex(),
+            'pps': self._pps.hex(),
+            'keyframes': [
+                [keyframe.frame_number, keyframe.offset, keyframe.size, keyframe.has_parameter_sets]
+                for keyframe in self._keyframes
+            ],
+            'damaged_ranges': [[begin, end] for begin, end in self._damaged_ranges],
+        }
+
+    @staticmethod
+    def from_dict(index_dict: dict) -> 'H264StreamIndex':
+        return H264StreamIndex(
+            index_dict['filename'],
+            index_dict['file_size'],
+            index_dict['file_mtime'],
+            index_dict['frames_count'],
+            [
+                H264Keyframe(frame_number, offset, size, has_parameter_sets)
+                for frame_number, offset, size, has_parameter_sets in index_dict['keyframes']
+            ],
+            bytes.fromhex(index_dict['sps']),
+            bytes.fromhex(index_dict['pps']),
+            [(begin, end) for begin, end in index_dict['damaged_ranges']],
+        )
+
+
+class _RbspReader:
+    """
+    Чтение полей из начала NAL блока: битовые поля и коды Exp-Golomb (байты защиты от эмуляции стартового
+    кода удаляются). Если данных не хватает, выбрасывается ValueError
+    """
+
+    def __init__(self, payload: bytes):
+        data = payload.replace(b'\x00\x00\x03', b'\x00\x00')
+        self._value = int.from_bytes(data, 'big')
+        self._bits_count = len(data) * 8
+        self._position = 0
+
+    def read_bits(self, count: int) -> int:
+        if self._position + count > self._bits_count:
+            raise ValueError('Недостаточно данных NAL блока')
+        self._position += count
+        return (self._value >> (self._bits_count - self._position)) & ((1 << count) - 1)
+
+    def read_ue(self) -> int:
+        leading_zeros = 0
+        while self.read_bits(1) == 0:
+            leading_zeros += 1
+            if leading_zeros > 31:
+                raise ValueError('Неверный код Exp-Golomb')
+        return (1 << leading_zeros) - 1 + self.read_bits(leading_zeros)
+
+    def read_se(self) -> int:
+        value = self.read_ue()
+        return (value + 1) // 2 if value % 2 == 1 else -(value // 2)
+
+
+class _SequenceParameters:
+    """
+    Поля SPS, нужные для чтения номера кадра (frame_num) из заголовка слайса
+    """
+
+    # профили, в SPS которых есть формат цветности и матрицы квантования
+    _HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+    def __init__(self, reader: _RbspReader):
+        profile_idc = reader.read_bits(8)
+        # constraint_set флаги и level_idc
+        reader.read_bits(16)
+        self.sps_id: int = reader.read_ue()
+        self.separate_colour_plane: bool = False
+        if profile_idc in self._HIGH_PROFILES:
+            chroma_format_idc = reader.read_ue()
+            if chroma_format_idc == 3:
+                self.separate_colour_plane = reader.read_bits(1) == 1
+            # bit_depth_luma, bit_depth_chroma, qpprime_y_zero_transform_bypass_flag
+            reader.read_ue()
+            reader.read_ue()
+            reader.read_bits(1)
+            if reader.read_bits(1):
+                for list_index in range(8 if chroma_format_idc != 3 else 12):
+                    if reader.read_bits(1):
+                        self._skip_scaling_list(reader, 16 if list_index < 6 else 64)
+        self.log2_max_frame_num: int = reader.read_ue() + 4
+        pic_order_cnt_type = reader.read_ue()
+        if pic_order_cnt_type == 0:
+            reader.read_ue()
+        elif pic_order_cnt_type == 1:
+            reader.read_bits(1)
+            reader.read_se()
+            reader.read_se()
+            for _ in range(reader.read_ue()):
+                reader.read_se()
+        # max_num_ref_frames
+        reader.read_ue()
+        self.gaps_in_frame_num_allowed: bool = reader.read_bits(1) == 1
+
+    @staticmethod
+    def _skip_scaling_list(reader: _RbspReader, size: int):
+        last_scale = 8
+        next_scale = 8
+        for _ in range(size):
+            if next_scale != 0:
+                next_scale = (last_scale + reader.read_se() + 256) % 256
+            last_scale = next_scale if next_scale != 0 else last_scale
+
+
+class H264StreamScanner:
+    """
+    Разбор "сырого" потока H.264 (Annex-B) по NAL блокам без декодирования.
+    Кадры считаются по первому слайсу каждой картинки (first_mb_in_slice == 0).
+
+    Поврежденные участки (сбой записи, потерянные или испорченные данные) находятся по разрыву
+    в нумерации кадров (frame_num после опорного кадра должен увеличиваться на 1) и по неверным
+    заголовкам NAL блоков. Изображение после повреждения снова правильное с ближайшего ключевого кадра
+    """
+
+    INDEX_VERSION = 2
+
+    NAL_TYPE_SLICE = 1
+    NAL_TYPE_IDR_SLICE = 5
+    NAL_TYPE_SEI = 6
+    NAL_TYPE_SPS = 7
+    NAL_TYPE_PPS = 8
+    NAL_TYPE_AUD = 9
+
+    # NAL блоки, которые могут начинать новый блок доступа перед первым слайсом картинки
+    _AU_PREFIX_NAL_TYPES = {NAL_TYPE_SEI, NAL_TYPE_SPS, NAL_TYPE_PPS, NAL_TYPE_AUD, 14, 15, 16, 17, 18}
+
+    _START_CODE = b'\x00\x00\x01'
+    _READ_BLOCK_SIZE = 4 * 1024 * 1024
+
+    # сколько байт после стартового кода нужно для разбора (заголовок NAL и первый байт слайса)
+    _NAL_HEADER_BYTES = 2
+
+    # сколько байт после заголовка NAL выдается для чтения полей SPS, PPS и заголовка слайса
+    _NAL_PAYLOAD_BYTES = 64
+
+    @staticmethod
+    def is_annex_b_file(filename: str) -> bool:
+        """
+        Начинается ли файл со стартового кода Annex-B (то есть это "сырой" поток H.264, а не контейнер)
+        """
+        with open(filename, 'rb') as file:
+            head = file.read(4)
+        return head.startswith(b'\x00\x00\x00\x01') or head.startswith(b'\x00\x00\x01')
+
+    def iterate_nal_units(self, file: typing.BinaryIO) -> typing.Iterator[typing.Tuple[int, int, bytes]]:
+        """
+        Перебрать NAL блоки потока
+        :param file: открытый на чтение двоичный файл
+        :return: итератор (смещение начала NAL блока вместе со стартовым кодом, байт заголовка NAL,
+         начало данных после заголовка - не больше _NAL_PAYLOAD_BYTES байт, может захватывать следующий NAL блок)
+        """
+        data = b''
+        # смещение начала data от начала файла
+        data_offset = 0
+        is_file_end = False
+        while not is_file_end:
+            block = file.read(self._READ_BLOCK_SIZE)
+            is_file_end = len(block) == 0
+            data += block
+            position = 0
+            while True:
+                index = data.find(self._START_CODE, position)
+                if index < 0:
+                    break
+                header_index = index + len(self._START_CODE)
+                available_count = len(data) - header_index
+                if available_count < self._NAL_HEADER_BYTES or \
+                        (available_count <= self._NAL_PAYLOAD_BYTES and not is_file_end):
+                    break
+                # четырехбайтовый стартовый код (с лишним нулем) тоже относим к NAL блоку
+                nal_offset = index - 1 if index > 0 and data[index - 1] == 0 else index
+                yield data_offset + nal_offset, data[header_index], \
+                    data[header_index + 1:header_index + 1 + self._NAL_PAYLOAD_BYTES]
+                position = header_index
+            # оставляем хвост, в котором может начинаться стартовый код, разрезанный границей блока
+            keep_from = max(position, len(data) - len(self._START_CODE) - self._NAL_PAYLOAD_BYTES - 1)
+            keep_from = max(keep_from, 0)
+            data_offset += keep_from
+            data = data[keep_from:]
+
+    def scan(self, filename: str) -> H264StreamIndex:
+        """
+        Построить индекс ключевых кадров файла
+        """
+        stat = os.stat(filename)
+        keyframes: typing.List[H264Keyframe] = []
+        frames_count = 0
+        sps_range: typing.Optional[typing.List[int]] = None
+        pps_range: typing.Optional[typing.List[int]] = None
+
+        # смещение начала блока доступа, в котором еще не встретился первый слайс картинки
+        au_offset: typing.Optional[int] = None
+        au_has_sps = False
+        au_has_pps = False
+
+        # идет ли сейчас картинка (встречен ее первый слайс, а следующий блок доступа еще не начат)
+        is_in_picture = False
+
+        # ключевой кадр, для которого еще не известен конец блока доступа (номер кадра, смещение, SPS и PPS)
+        open_keyframe: typing.Optional[typing.Tuple[int, int, bool]] = None
+
+        # незавершенный (длина не известна) SPS или PPS
+        open_parameter_set: typing.Optional[typing.List[int]] = None
+
+        # параметры SPS по sps_id и sps_id по pps_id (для чтения frame_num из заголовка слайса)
+        sequence_parameters: typing.Dict[int, _SequenceParameters] = {}
+        pps_sps_ids: typing.Dict[int, int] = {}
+
+        # frame_num последнего опорного кадра (None - неизвестен, нумерация не проверяется)
+        prev_ref_frame_num: typing.Optional[int] = None
+
+        # поврежденные участки [первый поврежденный кадр, ключевой кадр после повреждения],
+        # у последнего участка конец может быть еще не известен (None)
+        damaged_ranges: typing.List[typing.List[typing.Optional[int]]] = []
+
+        with open(filename, 'rb') as file:
+            for offset, header, payload in self.iterate_nal_units(file):
+                if open_parameter_set is not None:
+                    open_parameter_set[1] = offset
+                    open_parameter_set = None
+
+                nal_type = header & 0x1F
+                if header & 0x80 or nal_type == 0:
+                    # forbidden_zero_bit или несуществующий тип - стартовый код внутри испорченных данных
+                    self._open_damaged_range(damaged_ranges, frames_count - 1)
+                    prev_ref_frame_num = None
+                elif nal_type in self._AU_PREFIX_NAL_TYPES:
+                    if is_in_picture or au_offset is None:
+                        # начинается новый блок доступа, предыдущий ключевой кадр (если есть) закончился
+                        if open_keyframe is not None:
+                            keyframes.append(self._close_keyframe(open_keyframe, offset))
+                            open_keyframe = None
+                        is_in_picture = False
+                        au_offset = offset
+                        au_has_sps = False
+                        au_has_pps = False
+                    if nal_type == self.NAL_TYPE_SPS:
+                        au_has_sps = True
+                        if sps_range is None:
+                            sps_range = open_parameter_set = [offset, offset]
+                        self._read_sps(payload, sequence_parameters)
+                    if nal_type == self.NAL_TYPE_PPS:
+                        au_has_pps = True
+                        if pps_range is None:
+                            pps_range = open_parameter_set = [offset, offset]
+                        self._read_pps(payload, pps_sps_ids)
+                elif nal_type in (self.NAL_TYPE_SLICE, self.NAL_TYPE_IDR_SLICE) and payload[0] & 0x80:
+                    # first_mb_in_slice == 0 (ue(v) с первым битом 1), начинается новая картинка
+                    if au_offset is None:
+                        # блок доступа начинается прямо со слайса
+                        if open_keyframe is not None:
+                            keyframes.append(self._close_keyframe(open_keyframe, offset))
+                            open_keyframe = None
+                        au_offset = offset
+                        au_has_sps = False
+                        au_has_pps = False
+                    frame_num = self._read_frame_num(payload, sequence_parameters, pps_sps_ids)
+                    if nal_type == self.NAL_TYPE_IDR_SLICE:
+                        open_keyframe = (frames_count, au_offset, au_has_sps and au_has_pps)
+                        if len(damaged_ranges) > 0 and damaged_ranges[-1][1] is None:
+                            damaged_ranges[-1][1] = frames_count
+                    elif frame_num is not None and prev_ref_frame_num is not None:
+                        sps_parameters = frame_num[1]
+                        expected_frame_num = (prev_ref_frame_num + 1) % (1 << sps_parameters.log2_max_frame_num)
+                        if not sps_parameters.gaps_in_frame_num_allowed \
+                                and frame_num[0] not in (expected_frame_num, prev_ref_frame_num):
+                            # пропали кадры: испорчен конец предыдущей картинки (в ней потерян стартовый код)
+                            self._open_damaged_range(damaged_ranges, frames_count - 1)
+                    if frame_num is None:
+                        prev_ref_frame_num = None
+                    elif header & 0x60:
+                        # nal_ref_idc != 0 - опорный кадр
+                        prev_ref_frame_num = frame_num[0]
+                    frames_count += 1
+                    is_in_picture = True
+                    au_offset = None
+
+        if open_parameter_set is not None:
+            open_parameter_set[1] = stat.st_size
+        if open_keyframe is not None:
+            keyframes.append(self._close_keyframe(open_keyframe, stat.st_size))
+        if len(damaged_ranges) > 0 and damaged_ranges[-1][1] is None:
+            damaged_ranges[-1][1] = frames_count
+
+        sps = self._read_range(filename, sps_range)
+        pps = self._read_range(filename, pps_range)
+        return H264StreamIndex(
+            filename, stat.st_size, stat.st_mtime, frames_count, keyframes, sps, pps,
+            [(begin, end) for begin, end in damaged_ranges])
+
+    @staticmethod
+    def _open_damaged_range(damaged_ranges: typing.List[typing.List[typing.Optional[int]]], frame_number: int):
+        """
+        Начать поврежденный участок (если предыдущий участок еще не закончился, он продолжается)
+        """
+        if len(damaged_ranges) == 0 or damaged_ranges[-1][1] is not None:
+            damaged_ranges.append([max(frame_number, 0), None])
+
+    @staticmethod
+    def _read_sps(payload: bytes, sequence_parameters: typing.Dict[int, _SequenceParameters]):
+        try:
+            parameters = _SequenceParameters(_RbspReader(payload))
+        except ValueError:
+            return
+        sequence_parameters[parameters.sps_id] = parameters
+
+    @staticmethod
+    def _read_pps(payload: bytes, pps_sps_ids: typing.Dict[int, int]):
+        try:
+            reader = _RbspReader(payload)
+            pps_id = reader.read_ue()
+            pps_sps_ids[pps_id] = reader.read_ue()
+        except ValueError:
+            pass
+
+    @staticmethod
+    def _read_frame_num(
+            payload: bytes,
+            sequence_parameters: typing.Dict[int, _SequenceParameters],
+            pps_sps_ids: typing.Dict[int, int]
+    ) -> typing.Optional[typing.Tuple[int, _SequenceParameters]]:
+        """
+        Прочитать frame_num из заголовка слайса
+        :return: (frame_num, параметры SPS слайса) или None, если SPS или PPS слайса неизвестны
+        """
+        try:
+            reader = _RbspReader(payload)
+            # first_mb_in_slice, slice_type
+            reader.read_ue()
+            reader.read_ue()
+            sps_id = pps_sps_ids.get(reader.read_ue())
+            parameters = sequence_parameters.get(sps_id) if sps_id is not None else None
+            if parameters is None:
+                return None
+            if parameters.separate_colour_plane:
+                reader.read_bits(2)
+            return reader.read_bits(parameters.log2_max_frame_num), parameters
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _close_keyframe(open_keyframe: typing.Tuple[int, int, bool], end_offset: int) -> H264Keyframe:
+        frame_number, offset, has_parameter_sets = open_keyframe
+        return H264Keyframe(frame_number, offset, end_offset - offset, has_parameter_sets)
+
+    @staticmethod
+    def _read_range(filename: str, byte_range: typing.Optional[typing.List[int]]) -> bytes:
+        if byte_range is None:
+            return b''
+        with open(filename, 'rb') as file:
+            file.seek(byte_range[0])
+            return file.read(byte_range[1] - byte_range[0])
+
+
+class H264StreamIndexStore:
+    """
+    Хранилище индексов ключевых кадров на диске (по JSON файлу на каждый видеофайл).
+    Индекс перестраивается, если видеофайл изменился
+    """
+
+    def __init__(self, index_dir: str):
+        assert isinstance(index_dir, str)
+        self._index_dir = index_dir
+        self._scanner = H264StreamScanner()
+
+    def get_index(self, filename: str) -> H264StreamIndex:
+        """
+        Получить индекс файла (из хранилища, или построить и сохранить, если его нет или он устарел)
+        """
+        index_filename = self._get_index_filename(filename)
+        index = self._load(index_filename)
+        if index is None or index.filename != filename or not index.is_actual():
+            print('Построение индекса ключевых кадров: {0}'.format(filename))
+            index = self._scanner.scan(filename)
+            self._save(index_filename, index)
+        return index
+
+    def _get_index_filename(self, filename: str) -> str:
+        name_hash = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+        return os.path.join(self._index_dir, '{0}_{1}.json'.format(os.path.basename(filename), name_hash[:16]))
+
+    @staticmethod
+    def _load(index_filename: str) -> typing.Optional[H264StreamIndex]:
+        if not os.path.isfile(index_filename):
+            return None
+        try:
+            with open(index_filename, 'r') as file:
+                index_dict = json.load(file)
+            if index_dict.get('version') != H264StreamScanner.INDEX_VERSION:
+                return None
+            return H264StreamIndex.from_dict(index_dict)
+        except (ValueError, KeyError, TypeError):
+            print('Поврежден файл индекса: {0}'.format(index_filename))
+            return None
+
+    def _save(self, index_filename: str, index: H264StreamIndex):
+        os.makedirs(self._index_dir, exist_ok=True)
+        # пишем во временный файл и переименовываем, чтобы параллельные процессы не прочитали недописанный
+        temp_filename = '{0}.{1}.tmp'.format(index_filename, os.getpid())
+        with open(temp_filename, 'w') as file:
+            json.dump(index.to_dict(), file)
+        os.replace(temp_filename, index_filename)
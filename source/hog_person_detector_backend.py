@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import typing
+
+import cv2
+import numpy
+
+from source.i_person_detector_backend import IPersonDetectorBackend
+
+
+class HogPersonDetectorBackend(IPersonDetectorBackend):
+    """
+    Поиск людей гистограммами направленных градиентов (HOG + SVM, стандартный детектор людей OpenCV)
+    """
+
+    # какая минимальная оценка похожести нужна, чтобы учитывать объект
+    _DETECTION_THRESHOLD = 0.7
+
+    _WIN_STRIDE = (8, 8)
+
+    def __init__(self):
+        self._hog = cv2.HOGDescriptor()
+        self._hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def get_window_size(self) -> typing.Tuple[int, int]:
+        return self._hog.winSize[0], self._hog.winSize[1]
+
+    def get_detection_threshold(self) -> float:
+        return self._DETECTION_THRESHOLD
+
+    def detect(self, images: typing.List[numpy.ndarray]) -> typing.List[typing.Tuple[list, list]]:
+        results = []
+        for image in images:
+            boxes, weights = self._hog.detectMultiScale(
+                image,
+                hitThreshold=0,
+                winStride=self._WIN_STRIDE
+            )
+            results.append((list(boxes), list(weights)))
+        return results
@@ -1,11 +1,32 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import typing
 from abc import abstractmethod, ABC
 
 import numpy
 
+from source.frame_info import FrameInfo
+from source.stage_metrics import StageMetrics
+
 
 class IFramePostProcessor(ABC):
     @abstractmethod
-    def process_frame(self, frame: numpy.ndarray):
+    def process_frame(self, frame: numpy.ndarray, frame_info: typing.Optional[FrameInfo] = None):
+        """
+        :param frame: кадр (в разрешении выходного видео). Буфер кадра используется повторно, поэтому кадр
+         можно использовать только во время вызова (если кадр нужен дольше, его нужно скопировать)
+        :param frame_info: происхождение кадра (None - неизвестно)
+        """
+        pass
+
+    def get_detected_frames_count(self) -> int:
+        """
+        Сколько обработанных кадров содержат найденные объекты (используется адаптивным прореживанием кадров)
+        """
+        return 0
+
+    def set_metrics(self, metrics: StageMetrics):
+        """
+        Учитывать время стадий постобработки и счетчики в metrics (задается объединителем видео)
+        """
         pass
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import typing
+from abc import abstractmethod, ABC
+
+import numpy
+
+
+class IPersonDetectorBackend(ABC):
+    """
+    Способ поиска людей на изображении (используется в ObjectDetector)
+    """
+
+    @abstractmethod
+    def get_window_size(self) -> typing.Tuple[int, int]:
+        """
+        Размер окна распознавания (ширина, высота): минимальный размер области изображения, в которой
+        имеет смысл искать людей
+        """
+        pass
+
+    @abstractmethod
+    def get_detection_threshold(self) -> float:
+        """
+        Минимальная оценка, с которой найденный объект считается человеком
+        """
+        pass
+
+    def get_batch_size(self) -> int:
+        """
+        Сколько изображений выгодно распознавать за один вызов detect
+        """
+        return 1
+
+    @abstractmethod
+    def detect(self, images: typing.List[numpy.ndarray]) -> typing.List[typing.Tuple[list, list]]:
+        """
+        Найти людей на изображениях
+        :param images: изображения BGR (могут быть разного размера)
+        :return: для каждого изображения (прямоугольники (x, y, ширина, высота) в координатах изображения, оценки)
+        """
+        pass
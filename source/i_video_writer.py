@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from abc import abstractmethod, ABC
+
+import numpy
+
+
+class IVideoWriter(ABC):
+    """
+    Запись кадров в выходной видеофайл. Имена методов совпадают с cv2.VideoWriter, поэтому там, где
+    принимается IVideoWriter, можно передать и cv2.VideoWriter
+    """
+
+    @abstractmethod
+    def isOpened(self) -> bool:
+        """
+        Открыт ли файл на запись
+        """
+        pass
+
+    @abstractmethod
+    def write(self, frame: numpy.ndarray):
+        """
+        :param frame: кадр (высота, ширина, цвет в BGR) в разрешении выходного видео
+        """
+        pass
+
+    @abstractmethod
+    def release(self):
+        """
+        Завершить запись файла
+        """
+        pass
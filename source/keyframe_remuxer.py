@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import shutil
+import subprocess
+import typing
+
+from source.h264_stream_index import H264StreamIndex, H264Keyframe
+
+
+class KeyframeRemuxer:
+    """
+    Сборка ускоренного видео из ключевых кадров исходных файлов без декодирования и повторного кодирования.
+    Блоки доступа ключевых кадров передаются в ffmpeg, который только упаковывает их в выходной контейнер
+    с заданной частотой кадров (-c copy). Все исходные файлы должны иметь одинаковые параметры кодирования
+    (разрешение, профиль и т.д.), так как в выходном файле получается один видеопоток без изменений
+    """
+
+    def __init__(self, ffmpeg_path: str = 'ffmpeg'):
+        assert isinstance(ffmpeg_path, str)
+        self._ffmpeg_path = ffmpeg_path
+        self._process: typing.Optional[subprocess.Popen] = None
+        self._output_filename: typing.Optional[str] = None
+
+        # ffmpeg завершился раньше времени (запись в него невозможна)
+        self._is_broken = False
+
+    def is_available(self) -> bool:
+        return shutil.which(self._ffmpeg_path) is not None
+
+    @staticmethod
+    def is_compatible(indexes: typing.List[H264StreamIndex]) -> bool:
+        """
+        Можно ли собрать файлы в один видеопоток без перекодирования
+        (у всех файлов найдены ключевые кадры и совпадают параметры кодирования)
+        """
+        if len(indexes) == 0:
+            return False
+        codec_parameters = indexes[0].get_codec_parameters()
+        for index in indexes:
+            if len(index.keyframes) == 0 or len(index.sps) == 0 or len(index.pps) == 0:
+                print('Нет ключевых кадров или параметров кодирования: {0}'.format(index.filename))
+                return False
+            if index.get_codec_parameters() != codec_parameters:
+                print('Параметры кодирования отличаются: {0}'.format(index.filename))
+                return False
+        return True
+
+    def open(self, output_filename: str, fps: float):
+        assert isinstance(output_filename, str)
+        assert self._process is None
+        self._output_filename = output_filename
+        self._is_broken = False
+        self._process = subprocess.Popen(
+            [
+                self._ffmpeg_path,
+                '-hide_banner', '-loglevel', 'error', '-y',
+                '-f', 'h264', '-framerate', str(fps), '-i', 'pipe:0',
+                '-map', '0:v:0', '-c:v', 'copy',
+                output_filename
+            ],
+            stdin=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+    def write_keyframes(self, index: H264StreamIndex, keyframes: typing.List[H264Keyframe]):
+        assert self._process is not None
+        if self._is_broken:
+            return
+        try:
+            index.write_access_units(keyframes, self._process.stdin)
+        except OSError:
+            # ffmpeg завершился: в Windows запись в такой канал вызывает OSError (EINVAL), а не BrokenPipeError
+            self._is_broken = True
+
+    def close(self) -> bool:
+        """
+        Завершить запись выходного файла
+        :return: успешно ли ffmpeg записал файл
+        """
+        if self._process is None:
+            return False
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        errors = self._process.stderr.read().decode('utf-8', errors='replace')
+        return_code = self._process.wait()
+        self._process = None
+        if return_code != 0 or self._is_broken:
+            print('Ошибка ffmpeg при записи {0} (код {1}): {2}'.format(self._output_filename, return_code, errors))
+        return return_code == 0 and not self._is_broken
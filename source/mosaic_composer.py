@@ -0,0 +1,453 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime
+import math
+import os
+import queue
+import threading
+import time
+import typing
+
+import cv2
+import numpy
+
+from source.filename_timestamp_parser import FilenameTimestampParser
+from source.frame_info import FrameInfo
+from source.i_frame_post_processor import IFramePostProcessor
+from source.i_video_writer import IVideoWriter
+from source.stage_metrics import StageMetrics
+from source.utils.frozen import Frozen
+
+
+# признак того, что у камеры больше нет кадров
+_END_OF_CAMERA = object()
+
+
+class _CameraReader(threading.Thread):
+    """
+    Поток чтения одной камеры: для каждого момента мозаики (начало + номер кадра мозаики * шаг) выдает
+    в очередь кадр камеры, снятый в этот момент (уменьшенный до размера ячейки мозаики), или None,
+    если в этот момент у камеры нет записи. Файлы камеры декодируются по очереди, кадры между моментами
+    мозаики пропускаются без декодирования изображения (grab)
+    """
+
+    # если больше N попыток подряд не удалось получить кадр, то файл считается завершенным
+    _EOF_FILE_ERROR_FRAMES_COUNT = 150
+
+    # частота кадров, если ее не удалось определить по файлу
+    _DEFAULT_FPS = 25.0
+
+    def __init__(
+            self,
+            camera_index: int,
+            files: typing.List[typing.Tuple[str, datetime.datetime]],
+            start_time: datetime.datetime,
+            step_seconds: float,
+            tile_size: typing.Tuple[int, int],
+            detection_frame_size: typing.Optional[typing.Tuple[int, int]],
+            output_queue: queue.Queue,
+            stop_reading: threading.Event,
+            metrics: StageMetrics
+    ):
+        """
+        :param files: (имя файла, время начала записи) по возрастанию времени
+        :param tile_size: (ширина, высота) ячейки мозаики
+        :param detection_frame_size: (ширина, высота) кадра для постобработки (None - не нужен)
+        """
+        super().__init__(name='camera {0}'.format(camera_index), daemon=True)
+        self._files = files
+        self._start_time = start_time
+        self._step_seconds = step_seconds
+        self._tile_size = tile_size
+        self._detection_frame_size = detection_frame_size
+        self.output_queue = output_queue
+        self._stop_reading = stop_reading
+        self._metrics = metrics
+        self.error: typing.Optional[BaseException] = None
+
+    def run(self):
+        try:
+            self._read_files()
+        except BaseException as error:
+            self.error = error
+        finally:
+            self._put(_END_OF_CAMERA)
+
+    def _read_files(self):
+        # номер следующего кадра мозаики
+        tick = 0
+        for file_number, (filename, file_start_time) in enumerate(self._files):
+            next_file_start_time = None
+            if file_number + 1 < len(self._files):
+                next_file_start_time = self._files[file_number + 1][1]
+            input_video = cv2.VideoCapture(filename)
+            try:
+                self._metrics.increment(StageMetrics.COUNTER_INPUT_FILES)
+                self._metrics.increment(StageMetrics.COUNTER_BYTES_READ, self._get_file_size(filename))
+                tick = self._read_file(input_video, filename, file_start_time, next_file_start_time, tick)
+            finally:
+                input_video.release()
+            if self._stop_reading.is_set():
+                return
+
+    def _read_file(
+            self,
+            input_video: cv2.VideoCapture,
+            filename: str,
+            file_start_time: datetime.datetime,
+            next_file_start_time: typing.Optional[datetime.datetime],
+            tick: int
+    ) -> int:
+        """
+        Выдать кадры мозаики из файла (пока не начнется следующий файл или не закончится этот)
+        :return: номер следующего кадра мозаики
+        """
+        fps = float(input_video.get(cv2.CAP_PROP_FPS))
+        if fps <= 0.0:
+            print('Не удалось определить частоту кадров, принята {0}: {1}'.format(self._DEFAULT_FPS, filename))
+            fps = self._DEFAULT_FPS
+
+        # номер следующего кадра во входном видео (считаются только успешно полученные кадры)
+        frame_position = 0
+        metrics = self._metrics
+        while input_video.isOpened() and not self._stop_reading.is_set():
+            tick_time = self._start_time + datetime.timedelta(seconds=tick * self._step_seconds)
+            if next_file_start_time is not None and tick_time >= next_file_start_time:
+                break
+            if tick_time < file_start_time:
+                # запись файла еще не началась
+                self._put(None)
+                tick += 1
+                continue
+
+            target_position = int((tick_time - file_start_time).total_seconds() * fps)
+            empty_count = 0
+            start_t = time.perf_counter()
+            while frame_position <= target_position and empty_count < self._EOF_FILE_ERROR_FRAMES_COUNT:
+                if input_video.grab():
+                    frame_position += 1
+                    empty_count = 0
+                    metrics.increment(StageMetrics.COUNTER_FRAMES_GRABBED)
+                else:
+                    empty_count += 1
+            metrics.add_time(StageMetrics.STAGE_GRAB, time.perf_counter() - start_t)
+            if empty_count >= self._EOF_FILE_ERROR_FRAMES_COUNT:
+                break
+
+            start_t = time.perf_counter()
+            ret, frame = input_video.retrieve()
+            metrics.add_time(StageMetrics.STAGE_RETRIEVE, time.perf_counter() - start_t)
+            if not ret:
+                metrics.increment(StageMetrics.COUNTER_RETRIEVE_FAILURES)
+                self._put(None)
+                tick += 1
+                continue
+
+            metrics.increment(StageMetrics.COUNTER_FRAMES_KEPT)
+            start_t = time.perf_counter()
+            tile = cv2.resize(frame, self._tile_size)
+            detection_frame = None
+            if self._detection_frame_size is not None:
+                detection_frame = cv2.resize(frame, self._detection_frame_size)
+            metrics.add_time(StageMetrics.STAGE_RESIZE, time.perf_counter() - start_t)
+            frame_info = FrameInfo.from_source(filename, frame_position - 1, file_start_time, fps)
+            self._put((tile, detection_frame, frame_info))
+            tick += 1
+        return tick
+
+    def _put(self, item):
+        while not self._stop_reading.is_set():
+            try:
+                self.output_queue.put(item, timeout=MosaicComposer.POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    @staticmethod
+    def _get_file_size(filename: str) -> int:
+        try:
+            return os.path.getsize(filename)
+        except OSError:
+            return 0
+
+
+class MosaicComposer(Frozen):
+    """
+    Мозаика нескольких камер в одном выходном видео: камеры декодируются параллельно (каждая в своем потоке),
+    кадры выравниваются по времени съемки (время начала записи файла берется из имени файла), и на каждом
+    кадре мозаики все камеры показаны в один и тот же момент. Моменты, когда ни у одной камеры нет записи,
+    пропускаются.
+
+    Постобработчики (поиск людей) получают кадры каждой камеры по очереди в полном разрешении
+    detection_frame_size, поэтому одно видео распознавания содержит кадры всех камер
+    """
+
+    # как часто проверять, не нужно ли завершиться (в секундах)
+    POLL_INTERVAL = 0.1
+
+    # сколько кадров мозаики каждая камера читает заранее
+    _READ_AHEAD_FRAMES = 4
+
+    _KEY_ESC = 27
+
+    _NO_VIDEO_COLOR = (32, 32, 32)
+
+    def __init__(
+            self,
+            output_video: typing.Union[cv2.VideoWriter, IVideoWriter],
+            out_frame_width: int,
+            out_frame_height: int,
+            camera_names: typing.List[str],
+            columns_count: int = 0
+    ):
+        """
+        :param camera_names: подписи камер (по порядку ячеек мозаики)
+        :param columns_count: количество столбцов мозаики (0 - сетка, близкая к квадратной)
+        """
+        super().__init__()
+        assert isinstance(output_video, (cv2.VideoWriter, IVideoWriter))
+        assert output_video.isOpened()
+        assert len(camera_names) > 0
+        assert columns_count >= 0
+        self._output_video = output_video
+        self._camera_names = list(camera_names)
+        self._columns_count = columns_count or math.ceil(math.sqrt(len(camera_names)))
+        rows_count = math.ceil(len(camera_names) / self._columns_count)
+        self._tile_size: typing.Tuple[int, int] = (
+            out_frame_width // self._columns_count, out_frame_height // rows_count)
+
+        # кадр мозаики (создается один раз, ячейки перезаписываются)
+        self._mosaic_frame = numpy.zeros((out_frame_height, out_frame_width, 3), dtype=numpy.uint8)
+
+        self._step_seconds: float = 4.0
+        self._post_processors: typing.List[IFramePostProcessor] = []
+        self._detection_frame_size: typing.Tuple[int, int] = (1920, 1080)
+        self._stop_event: typing.Optional[typing.Any] = None
+        self._headless: bool = False
+        self._preview: typing.Optional[typing.Any] = None
+        self._metrics: StageMetrics = StageMetrics()
+        self._exit_requested: bool = False
+        self._output_frames_count: int = 0
+        self.freeze()
+
+    @property
+    def step_seconds(self) -> float:
+        """
+        Шаг времени съемки между кадрами мозаики
+        """
+        return self._step_seconds
+
+    @step_seconds.setter
+    def step_seconds(self, value: float):
+        assert value > 0.0
+        self._step_seconds = float(value)
+
+    @property
+    def detection_frame_size(self) -> typing.Tuple[int, int]:
+        """
+        (ширина, высота) кадров камер, которые передаются постобработчикам
+        """
+        return self._detection_frame_size
+
+    @detection_frame_size.setter
+    def detection_frame_size(self, value: typing.Tuple[int, int]):
+        assert len(value) == 2
+        self._detection_frame_size = (int(value[0]), int(value[1]))
+
+    @property
+    def stop_event(self) -> typing.Optional[typing.Any]:
+        return self._stop_event
+
+    @stop_event.setter
+    def stop_event(self, value: typing.Optional[typing.Any]):
+        assert value is None or hasattr(value, 'is_set')
+        self._stop_event = value
+
+    @property
+    def headless(self) -> bool:
+        return self._headless
+
+    @headless.setter
+    def headless(self, value: bool):
+        assert isinstance(value, bool)
+        self._headless = value
+
+    @property
+    def preview(self) -> typing.Optional[typing.Any]:
+        return self._preview
+
+    @preview.setter
+    def preview(self, value: typing.Optional[typing.Any]):
+        assert value is None or hasattr(value, 'publish')
+        self._preview = value
+
+    @property
+    def metrics(self) -> StageMetrics:
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, value: StageMetrics):
+        assert isinstance(value, StageMetrics)
+        self._metrics = value
+        for post_processor in self._post_processors:
+            post_processor.set_metrics(value)
+
+    @property
+    def output_frames_count(self) -> int:
+        return self._output_frames_count
+
+    def add_post_processor(self, processor: IFramePostProcessor):
+        assert isinstance(processor, IFramePostProcessor)
+        processor.set_metrics(self._metrics)
+        self._post_processors.append(processor)
+
+    def compose(self, cameras_files: typing.List[typing.List[str]], timestamp_parser: FilenameTimestampParser):
+        """
+        Записать мозаику камер
+        :param cameras_files: входные файлы каждой камеры (по порядку подписей камер)
+        :param timestamp_parser: определение времени начала записи по имени файла
+         (файлы без времени в имени пропускаются)
+        """
+        assert len(cameras_files) == len(self._camera_names)
+        cameras_timed_files = [self._get_timed_files(files, timestamp_parser) for files in cameras_files]
+        start_times = [files[0][1] for files in cameras_timed_files if len(files) > 0]
+        if len(start_times) == 0:
+            print('Нет входных файлов с временем начала записи в имени файла')
+            return
+        start_time = min(start_times)
+        print('Начало мозаики: {0}'.format(start_time))
+
+        stop_reading = threading.Event()
+        readers: typing.List[_CameraReader] = []
+        for camera_index, files in enumerate(cameras_timed_files):
+            readers.append(_CameraReader(
+                camera_index,
+                files,
+                start_time,
+                self._step_seconds,
+                self._tile_size,
+                self._detection_frame_size if self._post_processors else None,
+                queue.Queue(maxsize=self._READ_AHEAD_FRAMES),
+                stop_reading,
+                self._metrics
+            ))
+        for reader in readers:
+            reader.start()
+        try:
+            self._compose_frames(readers, start_time)
+        finally:
+            stop_reading.set()
+            for reader in readers:
+                reader.join()
+        for reader in readers:
+            if reader.error is not None:
+                raise reader.error
+
+    def _compose_frames(self, readers: typing.List[_CameraReader], start_time: datetime.datetime):
+        finished = [False] * len(readers)
+        tick = 0
+        while not self._exit_requested:
+            if self._stop_event is not None and self._stop_event.is_set():
+                self._exit_requested = True
+                break
+            camera_frames = []
+            for camera_index, reader in enumerate(readers):
+                camera_frame = None
+                if not finished[camera_index]:
+                    camera_frame = self._get_from_reader(reader)
+                    if camera_frame is _END_OF_CAMERA:
+                        finished[camera_index] = True
+                        camera_frame = None
+                camera_frames.append(camera_frame)
+            if all(finished):
+                break
+            tick_time = start_time + datetime.timedelta(seconds=tick * self._step_seconds)
+            tick += 1
+            if all([camera_frame is None for camera_frame in camera_frames]):
+                # ни у одной камеры нет записи в этот момент
+                continue
+            self._write_mosaic_frame(camera_frames, tick_time)
+            self._post_process_frames(camera_frames)
+
+    def _get_from_reader(self, reader: _CameraReader):
+        output_queue = reader.output_queue
+        while True:
+            try:
+                return output_queue.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                if not reader.is_alive() and output_queue.empty():
+                    return _END_OF_CAMERA
+
+    def _write_mosaic_frame(self, camera_frames: list, tick_time: datetime.datetime):
+        tile_width, tile_height = self._tile_size
+        for camera_index, camera_frame in enumerate(camera_frames):
+            x = (camera_index % self._columns_count) * tile_width
+            y = (camera_index // self._columns_count) * tile_height
+            tile_region = self._mosaic_frame[y:y + tile_height, x:x + tile_width]
+            if camera_frame is None:
+                tile_region[:] = self._NO_VIDEO_COLOR
+                # OpenCV выводит только латинские буквы
+                label = '{0}: no video'.format(self._camera_names[camera_index])
+                label_time = tick_time
+            else:
+                tile, _, frame_info = camera_frame
+                tile_region[:] = tile
+                label = self._camera_names[camera_index]
+                label_time = frame_info.timestamp or tick_time
+            self._print_label(tile_region, '{0} {1}'.format(label, label_time.strftime('%Y-%m-%d %H:%M:%S')))
+
+        if not self._headless or self._preview is not None:
+            start_t = time.perf_counter()
+            if not self._headless:
+                cv2.imshow('mosaic', self._mosaic_frame)
+                if cv2.waitKey(1) == self._KEY_ESC:
+                    self._exit_requested = True
+            if self._preview is not None:
+                self._preview.publish(self._mosaic_frame)
+            self._metrics.add_time(StageMetrics.STAGE_GUI, time.perf_counter() - start_t)
+
+        start_t = time.perf_counter()
+        self._output_video.write(self._mosaic_frame)
+        self._metrics.add_time(StageMetrics.STAGE_ENCODE, time.perf_counter() - start_t)
+        self._output_frames_count += 1
+
+    def _post_process_frames(self, camera_frames: list):
+        if not self._post_processors:
+            return
+        start_t = time.perf_counter()
+        for camera_frame in camera_frames:
+            if camera_frame is None:
+                continue
+            _, detection_frame, frame_info = camera_frame
+            for post_processor in self._post_processors:
+                post_processor.process_frame(detection_frame, frame_info)
+        self._metrics.add_time(StageMetrics.STAGE_POST_PROCESS, time.perf_counter() - start_t)
+
+    @staticmethod
+    def _print_label(tile: numpy.ndarray, text: str):
+        font_scale = max(0.4, tile.shape[0] / 720.0)
+        thickness = max(1, round(font_scale * 2))
+        (width, height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+        cv2.rectangle(tile, (0, 0), (width + 10, height + baseline + 10), (0, 0, 0), thickness=-1)
+        cv2.putText(
+            tile, text, (5, height + 5), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
+
+    @staticmethod
+    def _get_timed_files(
+            files: typing.List[str],
+            timestamp_parser: FilenameTimestampParser
+    ) -> typing.List[typing.Tuple[str, datetime.datetime]]:
+        """
+        :return: (файл, время начала записи) по возрастанию времени
+        """
+        timed_files = []
+        for file in files:
+            file_start_time = timestamp_parser.parse(file)
+            if file_start_time is None:
+                print('Нет времени начала записи в имени файла, файл пропущен: {0}'.format(file))
+                continue
+            timed_files.append((file, file_start_time))
+        return sorted(timed_files, key=lambda timed_file: timed_file[1])
+
+    def is_exit_requested(self) -> bool:
+        return self._exit_requested
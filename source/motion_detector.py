@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import typing
+
+import cv2
+import numpy
+
+from source.utils.frozen import Frozen
+
+
+class MotionDetector(Frozen):
+    """
+    Дешевый поиск движения в кадре: кадр уменьшается, переводится в оттенки серого и сравнивается
+    с фоном (скользящее среднее предыдущих кадров). Возвращаются прямоугольники областей, где кадр
+    отличается от фона. Используется, чтобы не запускать дорогое распознавание на статичных кадрах
+    """
+
+    # ширина кадра, на котором ищется движение
+    _PROCESSED_WIDTH = 192
+
+    _BLUR_KERNEL_SIZE = (5, 5)
+    _DILATE_ITERATIONS = 2
+
+    def __init__(self):
+        super().__init__()
+        # насколько (0..255) яркость пикселя должна отличаться от фона, чтобы считать его изменившимся
+        self._threshold: int = 25
+
+        # минимальная доля площади кадра, которую должна занимать область движения
+        self._min_area: float = 0.002
+
+        # скорость обновления фона (0..1), чем больше, тем быстрее фон "забывает" прошлые кадры
+        self._background_update_rate: float = 0.3
+
+        self._background: typing.Optional[numpy.ndarray] = None
+        self.freeze()
+
+    @property
+    def threshold(self) -> int:
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value: int):
+        assert isinstance(value, int)
+        assert 0 < value < 256
+        self._threshold = value
+
+    @property
+    def min_area(self) -> float:
+        return self._min_area
+
+    @min_area.setter
+    def min_area(self, value: float):
+        assert isinstance(value, (int, float))
+        assert 0.0 <= value <= 1.0
+        self._min_area = float(value)
+
+    @property
+    def background_update_rate(self) -> float:
+        return self._background_update_rate
+
+    @background_update_rate.setter
+    def background_update_rate(self, value: float):
+        assert isinstance(value, (int, float))
+        assert 0.0 < value <= 1.0
+        self._background_update_rate = float(value)
+
+    def reset(self):
+        self._background = None
+
+    def detect(self, frame: numpy.ndarray) -> typing.List[typing.Tuple[int, int, int, int]]:
+        """
+        Найти области движения в кадре
+        :param frame: кадр BGR
+        :return: список прямоугольников (x, y, ширина, высота) в координатах переданного кадра.
+         Для первого кадра (фон еще не известен) возвращается весь кадр
+        """
+        assert len(frame.shape) == 3
+        frame_height, frame_width = frame.shape[0], frame.shape[1]
+        scale = float(frame_width) / float(self._PROCESSED_WIDTH)
+        processed_height = max(1, round(frame_height / scale))
+
+        small = cv2.resize(frame, (self._PROCESSED_WIDTH, processed_height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, self._BLUR_KERNEL_SIZE, 0)
+
+        if self._background is None:
+            self._background = gray.astype(numpy.float32)
+            return [(0, 0, frame_width, frame_height)]
+
+        difference = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(gray, self._background, self._background_update_rate)
+
+        _, mask = cv2.threshold(difference, self._threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, None, iterations=self._DILATE_ITERATIONS)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        min_area_pixels = self._min_area * self._PROCESSED_WIDTH * processed_height
+        regions = []
+        for contour in contours:
+            if cv2.contourArea(contour) < min_area_pixels:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            regions.append((
+                int(x * scale),
+                int(y * scale),
+                min(frame_width, int(round((x + w) * scale))) - int(x * scale),
+                min(frame_height, int(round((y + h) * scale))) - int(y * scale),
+            ))
+        return regions
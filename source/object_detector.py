@@ -1,10 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import time
 import typing
 
 import cv2
 import numpy
 
+from source.detection_event_log import DetectionEventLog
+from source.frame_buffer_pool import FrameBufferPool
+from source.frame_info import FrameInfo
+from source.hog_person_detector_backend import HogPersonDetectorBackend
+from source.i_person_detector_backend import IPersonDetectorBackend
+from source.i_video_writer import IVideoWriter
+from source.motion_detector import MotionDetector
+from source.output_frame_index import OutputFrameIndex
+from source.stage_metrics import StageMetrics
+
 
 class ObjectDetector:
     # разрешение кадра, на котором определяются объекты
@@ -12,15 +23,22 @@ class ObjectDetector:
     _PROCESSED_FRAME_RESOLUTION_WIDTH = 768
     _PROCESSED_FRAME_RESOLUTION_HEIGHT = 432
 
-    # какая минимальная оценка похожести нужна, чтобы учитывать объект
-    _DETECTION_THRESHOLD = 0.7
-
     # какую часть выходного кадра будет занимать изображение
     _IMAGE_COEF_FULL_FRAME = 0.9
 
     _NUMPY_ARR_WIDTH_INDEX = 1
     _NUMPY_ARR_HEIGHT_INDEX = 0
 
+    # кодек и частота кадров выходного видео с распознанными людьми
+    OUTPUT_VIDEO_FOURCC = 'avc1'
+    OUTPUT_VIDEO_FPS = 2.0
+
+    # насколько расширять область движения перед поиском людей (доля от размера области)
+    _MOTION_REGION_MARGIN = 0.25
+
+    # если области движения занимают большую часть кадра, то проще искать людей во всем кадре
+    _MOTION_REGIONS_MAX_AREA = 0.5
+
     def __init__(self):
         # ширина и высота только изображения (на полном выходном кадре)
         self._output_only_image_width: typing.Optional[int] = None
@@ -32,14 +50,36 @@ class ObjectDetector:
         # высота верхней панели на полном выходном кадре (расстояние до изображения сверху)
         self._top_panel_height: typing.Optional[int] = None
 
-        # объект, который распознает изображения
-        self._hog: typing.Optional[cv2.HOGDescriptor] = None
+        # способ поиска людей (если не задан, то при начале распознавания используется HOG)
+        self._detector_backend: typing.Optional[IPersonDetectorBackend] = None
+
+        # кадры, ожидающие распознавания пакетом:
+        # (входной кадр, происхождение кадра, обрабатываемое изображение, области поиска,
+        # является ли входной кадр копией из пула)
+        self._pending_frames: typing.List[tuple] = []
+
+        # повторное использование буферов: обрабатываемые изображения и копии входных кадров берутся из пула,
+        # выходной кадр (с панелью и полями вокруг изображения) создается один раз
+        self._reuse_frame_buffers: bool = True
+        self._frame_pool = FrameBufferPool()
+        self._output_frame: typing.Optional[numpy.ndarray] = None
+
+        # журнал найденных людей (None - не ведется)
+        self._detection_event_log: typing.Optional[DetectionEventLog] = None
 
         # имя выходного видеофайла
         self._output_filename: typing.Optional[str] = None
 
+        # записывать рядом с выходным видеофайлом индекс кадров (происхождение каждого кадра)
+        self._write_frame_index: bool = False
+        self._output_frame_index: typing.Optional[OutputFrameIndex] = None
+
         # объект, записывающий в выходной видеофайл
-        self._out_video: typing.Optional[cv2.VideoWriter] = None
+        self._out_video: typing.Optional[typing.Union[cv2.VideoWriter, IVideoWriter]] = None
+
+        # создание объекта записи выходного видео: функция (имя файла, частота кадров, (ширина, высота)),
+        # None - cv2.VideoWriter с кодеком OUTPUT_VIDEO_FOURCC
+        self._video_writer_factory: typing.Optional[typing.Callable] = None
 
         # коэффициент, определяющий, во сколько раз распознаваемый кадр меньше исходного
         self._detection_resize_coef: typing.Optional[float] = None
@@ -49,6 +89,115 @@ class ObjectDetector:
         self._full_frame_width: typing.Optional[int] = None
         self._full_frame_height: typing.Optional[int] = None
 
+        # режим без окон (кадры с найденными объектами не показываются)
+        self._headless: bool = False
+
+        # поиск движения перед распознаванием (None - распознавание выполняется на каждом кадре)
+        self._motion_detector: typing.Optional[MotionDetector] = None
+
+        # искать людей только в областях движения (иначе во всем кадре, если в нем есть движение)
+        self._motion_regions_only: bool = True
+
+        # счетчики обработанных кадров
+        self._frames_count: int = 0
+        self._motion_skipped_frames_count: int = 0
+        self._motion_regions_frames_count: int = 0
+        self._detected_frames_count: int = 0
+
+        # время стадий распознавания и счетчики (см. StageMetrics)
+        self._metrics: StageMetrics = StageMetrics()
+
+    @property
+    def headless(self) -> bool:
+        return self._headless
+
+    @headless.setter
+    def headless(self, value: bool):
+        assert isinstance(value, bool)
+        self._headless = value
+
+    @property
+    def detected_frames_count(self) -> int:
+        """
+        Сколько кадров с найденными людьми записано в выходной видеофайл
+        """
+        return self._detected_frames_count
+
+    @property
+    def metrics(self) -> StageMetrics:
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, value: StageMetrics):
+        assert isinstance(value, StageMetrics)
+        self._metrics = value
+
+    @property
+    def reuse_frame_buffers(self) -> bool:
+        return self._reuse_frame_buffers
+
+    @reuse_frame_buffers.setter
+    def reuse_frame_buffers(self, value: bool):
+        assert isinstance(value, bool)
+        self._reuse_frame_buffers = value
+        if not value:
+            self._frame_pool.clear()
+            self._output_frame = None
+
+    @property
+    def video_writer_factory(self) -> typing.Optional[typing.Callable]:
+        return self._video_writer_factory
+
+    @video_writer_factory.setter
+    def video_writer_factory(self, value: typing.Optional[typing.Callable]):
+        assert value is None or callable(value)
+        self._video_writer_factory = value
+
+    @property
+    def write_frame_index(self) -> bool:
+        return self._write_frame_index
+
+    @write_frame_index.setter
+    def write_frame_index(self, value: bool):
+        assert isinstance(value, bool)
+        self._write_frame_index = value
+
+    @property
+    def detector_backend(self) -> typing.Optional[IPersonDetectorBackend]:
+        return self._detector_backend
+
+    @detector_backend.setter
+    def detector_backend(self, value: typing.Optional[IPersonDetectorBackend]):
+        assert isinstance(value, IPersonDetectorBackend) or value is None
+        self._detector_backend = value
+
+    @property
+    def detection_event_log(self) -> typing.Optional[DetectionEventLog]:
+        return self._detection_event_log
+
+    @detection_event_log.setter
+    def detection_event_log(self, value: typing.Optional[DetectionEventLog]):
+        assert isinstance(value, DetectionEventLog) or value is None
+        self._detection_event_log = value
+
+    @property
+    def motion_detector(self) -> typing.Optional[MotionDetector]:
+        return self._motion_detector
+
+    @motion_detector.setter
+    def motion_detector(self, value: typing.Optional[MotionDetector]):
+        assert isinstance(value, MotionDetector) or value is None
+        self._motion_detector = value
+
+    @property
+    def motion_regions_only(self) -> bool:
+        return self._motion_regions_only
+
+    @motion_regions_only.setter
+    def motion_regions_only(self, value: bool):
+        assert isinstance(value, bool)
+        self._motion_regions_only = value
+
     def set_output_filename(self, name: str):
         assert isinstance(name, str)
         self._output_filename = name
@@ -69,9 +218,12 @@ class ObjectDetector:
 
         self._full_frame_width = frame_width
         self._full_frame_height = frame_height
-        fourcc = cv2.VideoWriter_fourcc(*'avc1')
-        self._out_video = cv2.VideoWriter(
-            self._output_filename, fourcc, 2.0, (self._full_frame_width, self._full_frame_height))
+        frame_size = (self._full_frame_width, self._full_frame_height)
+        if self._video_writer_factory is not None:
+            self._out_video = self._video_writer_factory(self._output_filename, self.OUTPUT_VIDEO_FPS, frame_size)
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*self.OUTPUT_VIDEO_FOURCC)
+            self._out_video = cv2.VideoWriter(self._output_filename, fourcc, self.OUTPUT_VIDEO_FPS, frame_size)
 
         self._detection_resize_coef = float(self._full_frame_width) / float(self._PROCESSED_FRAME_RESOLUTION_WIDTH)
 
@@ -87,13 +239,19 @@ class ObjectDetector:
         self._top_panel_height: int = self._full_frame_height - self._output_only_image_height
         self._left_shift_width: int = round(float(left_right_side_width) / 2.0)
 
-        self._hog = cv2.HOGDescriptor()
-        self._hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        if self._detector_backend is None:
+            self._detector_backend = HogPersonDetectorBackend()
+        self._pending_frames = []
+        self._output_frame = None
+        self._output_frame_index = None
+        if self._write_frame_index:
+            self._output_frame_index = OutputFrameIndex(self._output_filename, self.OUTPUT_VIDEO_FPS)
 
-    def process_frame(self, input_frame: numpy.ndarray):
+    def process_frame(self, input_frame: numpy.ndarray, frame_info: typing.Optional[FrameInfo] = None):
         """
         Распознать кадр, и поместить результат распознавания (если есть объекты) в результирующий видеофайл.
         :param input_frame: трехмерный массив, представляющий двумерный кадр (высота, ширина, цвет в BGR)
+        :param frame_info: происхождение кадра (для журнала найденных людей)
         """
         assert len(input_frame.shape) == 3
         if (
@@ -102,31 +260,106 @@ class ObjectDetector:
         ):
             raise Exception('Размер обрабатываемого кадра не соответствует')
 
+        start_t = time.perf_counter()
         processed_frame = cv2.resize(
             input_frame,
-            (self._PROCESSED_FRAME_RESOLUTION_WIDTH, self._PROCESSED_FRAME_RESOLUTION_HEIGHT)
-        )
-
-        boxes, weights = self._hog.detectMultiScale(
-            processed_frame,
-            hitThreshold=0,
-            winStride=(8, 8)
-        )
-
-        output_frame = numpy.zeros(shape=input_frame.shape, dtype=input_frame.dtype)
-        output_frame_image = cv2.resize(
-            input_frame,
-            (self._output_only_image_width, self._output_only_image_height),
+            (self._PROCESSED_FRAME_RESOLUTION_WIDTH, self._PROCESSED_FRAME_RESOLUTION_HEIGHT),
+            dst=self._acquire_buffer(
+                (self._PROCESSED_FRAME_RESOLUTION_HEIGHT, self._PROCESSED_FRAME_RESOLUTION_WIDTH) +
+                input_frame.shape[2:],
+                input_frame.dtype
+            )
         )
+        self._metrics.add_time(StageMetrics.STAGE_DETECTION_RESIZE, time.perf_counter() - start_t)
+
+        self._frames_count += 1
+        self._metrics.increment(StageMetrics.COUNTER_DETECTION_FRAMES)
+        detection_regions = None
+        if self._motion_detector is not None:
+            start_t = time.perf_counter()
+            motion_regions = self._motion_detector.detect(processed_frame)
+            self._metrics.add_time(StageMetrics.STAGE_MOTION, time.perf_counter() - start_t)
+            if len(motion_regions) == 0:
+                # статичный кадр, людей в нем не ищем
+                self._motion_skipped_frames_count += 1
+                self._metrics.increment(StageMetrics.COUNTER_MOTION_SKIPPED_FRAMES)
+                self._release_buffer(processed_frame)
+                return
+            if self._motion_regions_only:
+                detection_regions = self._get_detection_regions(motion_regions)
+
+        # распознавание выполняется пакетами по несколько кадров (если способ поиска это поддерживает);
+        # входной кадр действителен только во время вызова, поэтому для пакета он копируется
+        input_frame_copied = self._detector_backend.get_batch_size() > 1
+        if input_frame_copied:
+            input_frame_copy = self._acquire_buffer(input_frame.shape, input_frame.dtype)
+            numpy.copyto(input_frame_copy, input_frame)
+            input_frame = input_frame_copy
+        self._pending_frames.append((input_frame, frame_info, processed_frame, detection_regions, input_frame_copied))
+        if len(self._pending_frames) >= self._detector_backend.get_batch_size():
+            self._detect_pending_frames()
+
+    def _detect_pending_frames(self):
+        """
+        Распознать накопленные кадры и записать кадры с найденными людьми в выходной видеофайл
+        """
+        pending_frames = self._pending_frames
+        self._pending_frames = []
+        if len(pending_frames) == 0:
+            return
+        start_t = time.perf_counter()
+        detection_results = self._detect_objects([
+            (processed_frame, detection_regions) for _, _, processed_frame, detection_regions, _ in pending_frames])
+        # время распознавания пакета делится поровну между кадрами пакета
+        frame_detection_time = (time.perf_counter() - start_t) / len(pending_frames)
+        for _ in pending_frames:
+            self._metrics.add_time(StageMetrics.STAGE_DETECTION, frame_detection_time)
+        for pending_frame, (boxes, weights) in zip(pending_frames, detection_results):
+            input_frame, frame_info, processed_frame, _, input_frame_copied = pending_frame
+            start_t = time.perf_counter()
+            self._write_detection_result(input_frame, frame_info, processed_frame, boxes, weights)
+            self._metrics.add_time(StageMetrics.STAGE_DETECTION_OUTPUT, time.perf_counter() - start_t)
+            self._release_buffer(processed_frame)
+            if input_frame_copied:
+                self._release_buffer(input_frame)
+            if self._detection_event_log is not None and frame_info is not None:
+                self._log_detections(frame_info, boxes, weights)
+
+    def _log_detections(self, frame_info: FrameInfo, boxes: list, weights: list):
+        """
+        Записать в журнал найденных людей (координаты в долях размера кадра)
+        """
+        threshold = self._detector_backend.get_detection_threshold()
+        for box, weight in zip(boxes, weights):
+            if weight > threshold:
+                self._detection_event_log.add_detection(
+                    frame_info,
+                    (
+                        float(box[0]) / self._PROCESSED_FRAME_RESOLUTION_WIDTH,
+                        float(box[1]) / self._PROCESSED_FRAME_RESOLUTION_HEIGHT,
+                        float(box[2]) / self._PROCESSED_FRAME_RESOLUTION_WIDTH,
+                        float(box[3]) / self._PROCESSED_FRAME_RESOLUTION_HEIGHT
+                    ),
+                    float(weight)
+                )
+
+    def _write_detection_result(
+            self,
+            input_frame: numpy.ndarray,
+            frame_info: typing.Optional[FrameInfo],
+            processed_frame: numpy.ndarray,
+            boxes: list,
+            weights: list
+    ):
+        """
+        Нарисовать найденные объекты и, если найден хотя бы один, записать кадр в выходной видеофайл
+        """
+        # кадр без найденных объектов не записывается, поэтому и выходной кадр для него не нужен
+        threshold = self._detector_backend.get_detection_threshold()
+        if not any(weight > threshold for weight in weights):
+            return
 
-        # поместим на результирующий кадр уменьшенное изображение
-        output_frame[
-            # верхняя панель занимает место сверху, поэтому отступаем от нее
-            self._top_panel_height:self._full_frame_height,
-
-            # левая область и правая область обрамляют изображение посередине
-            self._left_shift_width:self._full_frame_width - self._left_shift_width
-        ] = output_frame_image
+        output_frame = self._get_output_frame(input_frame)
 
         # признак, что найден объект (объекты) с достаточным весом
         object_detected = False
@@ -134,7 +367,7 @@ class ObjectDetector:
         # если получены данные распознавания
         if len(boxes) > 0:
             for box, weight in zip(boxes, weights):
-                if weight > self._DETECTION_THRESHOLD:
+                if weight > self._detector_backend.get_detection_threshold():
                     x1_det = int(box[0])
                     y1_det = int(box[1])
                     width_det = int(box[2])
@@ -158,11 +391,14 @@ class ObjectDetector:
                     self._draw_object_zone(processed_frame, float(weight), x1_det, y1_det, x2_det, y2_det)
 
                     object_detected = True
+                    self._metrics.increment(StageMetrics.COUNTER_DETECTIONS)
 
         if object_detected:
+            self._detected_frames_count += 1
+            self._metrics.increment(StageMetrics.COUNTER_DETECTED_FRAMES)
+
             # получим ширину и высоту окна распознавания в координатах изображения на котором распознавалось
-            detection_window_width = self._hog.winSize[0]
-            detection_window_height = self._hog.winSize[1]
+            detection_window_width, detection_window_height = self._detector_backend.get_window_size()
 
             # посчитаем координаты окна распознавания, чтобы поместить его слева внизу
             # (координаты в системе изображения на котором распознавалось)
@@ -200,12 +436,147 @@ class ObjectDetector:
                 color=(0, 0, 0)
             )
 
-            cv2.imshow('detection', output_frame)
-            cv2.imshow('processed_frame', processed_frame)
+            if not self._headless:
+                cv2.imshow('detection', output_frame)
+                cv2.imshow('processed_frame', processed_frame)
             self._out_video.write(output_frame)
+            if self._output_frame_index is not None:
+                self._output_frame_index.add_frame(frame_info)
+
+    def _get_output_frame(self, input_frame: numpy.ndarray) -> numpy.ndarray:
+        """
+        Выходной кадр: уменьшенное входное изображение с панелью сверху и полями слева и справа
+        """
+        image_rows = slice(
+            # верхняя панель занимает место сверху, поэтому отступаем от нее
+            self._top_panel_height, self._full_frame_height)
+        image_columns = slice(
+            # левая область и правая область обрамляют изображение посередине
+            self._left_shift_width, self._full_frame_width - self._left_shift_width)
+        image_size = (self._output_only_image_width, self._output_only_image_height)
+
+        if not self._reuse_frame_buffers:
+            output_frame = numpy.zeros(shape=input_frame.shape, dtype=input_frame.dtype)
+            output_frame[image_rows, image_columns] = cv2.resize(input_frame, image_size)
+            return output_frame
+
+        output_frame = self._output_frame
+        if output_frame is None or output_frame.shape != input_frame.shape or output_frame.dtype != input_frame.dtype:
+            output_frame = numpy.zeros(shape=input_frame.shape, dtype=input_frame.dtype)
+            self._output_frame = output_frame
+        else:
+            # изображение перезаписывается целиком, а на панели и полях могли остаться рамки и надписи
+            # предыдущего кадра
+            output_frame[:self._top_panel_height] = 0
+            output_frame[self._top_panel_height:, :image_columns.start] = 0
+            output_frame[self._top_panel_height:, image_columns.stop:] = 0
+
+        # изображение уменьшается сразу на место в выходном кадре (без промежуточного массива)
+        cv2.resize(input_frame, image_size, dst=output_frame[image_rows, image_columns])
+        return output_frame
+
+    def _acquire_buffer(self, shape: tuple, dtype) -> numpy.ndarray:
+        if not self._reuse_frame_buffers:
+            return numpy.empty(shape, dtype=dtype)
+        return self._frame_pool.acquire(shape, dtype)
+
+    def _release_buffer(self, buffer: numpy.ndarray):
+        if self._reuse_frame_buffers:
+            self._frame_pool.release(buffer)
 
     def end_detection(self):
+        self._detect_pending_frames()
         self._out_video.release()
+        if self._output_frame_index is not None:
+            self._output_frame_index.save()
+        print(
+            'person detection frames: {0}, skipped without motion: {1}, '
+            'detected only in motion regions: {2}'.format(
+                self._frames_count, self._motion_skipped_frames_count, self._motion_regions_frames_count))
+
+    def _detect_objects(
+            self,
+            frames: typing.List[typing.Tuple[numpy.ndarray, typing.Optional[list]]]
+    ) -> typing.List[typing.Tuple[list, list]]:
+        """
+        Найти объекты на обрабатываемых изображениях (все изображения и области распознаются одним пакетом)
+        :param frames: список (обрабатываемое изображение, области (x, y, ширина, высота), в которых искать объекты,
+         None - искать во всем изображении)
+        :return: для каждого изображения (прямоугольники объектов в координатах обрабатываемого изображения, веса)
+        """
+        images = []
+        # для каждого распознаваемого изображения: номер кадра и смещение области в кадре
+        image_owners = []
+        for frame_index, (processed_frame, regions) in enumerate(frames):
+            if regions is None:
+                images.append(processed_frame)
+                image_owners.append((frame_index, 0, 0))
+                continue
+            self._motion_regions_frames_count += 1
+            for x, y, width, height in regions:
+                images.append(processed_frame[y:y + height, x:x + width])
+                image_owners.append((frame_index, x, y))
+
+        results: typing.List[typing.Tuple[list, list]] = [([], []) for _ in frames]
+        for (frame_index, x, y), (boxes, weights) in zip(image_owners, self._detector_backend.detect(images)):
+            frame_boxes, frame_weights = results[frame_index]
+            for box, weight in zip(boxes, weights):
+                frame_boxes.append((int(box[0]) + x, int(box[1]) + y, int(box[2]), int(box[3])))
+                frame_weights.append(weight)
+        return results
+
+    def _get_detection_regions(
+            self,
+            motion_regions: typing.List[typing.Tuple[int, int, int, int]]
+    ) -> typing.Optional[typing.List[typing.Tuple[int, int, int, int]]]:
+        """
+        Получить области для поиска людей по областям движения: области расширяются (не меньше окна
+        распознавания) и пересекающиеся области объединяются
+        :return: области или None, если выгоднее искать во всем изображении
+        """
+        frame_width = self._PROCESSED_FRAME_RESOLUTION_WIDTH
+        frame_height = self._PROCESSED_FRAME_RESOLUTION_HEIGHT
+        window_width, window_height = self._detector_backend.get_window_size()
+        rects = []
+        for x, y, width, height in motion_regions:
+            margin_x = round(width * self._MOTION_REGION_MARGIN)
+            margin_y = round(height * self._MOTION_REGION_MARGIN)
+            x1, y1 = x - margin_x, y - margin_y
+            x2, y2 = x + width + margin_x, y + height + margin_y
+            if x2 - x1 < window_width:
+                x1 -= (window_width - (x2 - x1) + 1) // 2
+                x2 = x1 + window_width
+            if y2 - y1 < window_height:
+                y1 -= (window_height - (y2 - y1) + 1) // 2
+                y2 = y1 + window_height
+            # сдвигаем область внутрь кадра, сохраняя ее размер
+            region_width = x2 - x1
+            region_height = y2 - y1
+            x1 = max(0, min(x1, frame_width - region_width))
+            y1 = max(0, min(y1, frame_height - region_height))
+            x2 = min(frame_width, x1 + region_width)
+            y2 = min(frame_height, y1 + region_height)
+            rects.append([x1, y1, x2, y2])
+
+        # объединяем пересекающиеся области, пока есть что объединять
+        is_merged = True
+        while is_merged:
+            is_merged = False
+            for i in range(len(rects)):
+                for j in range(i + 1, len(rects)):
+                    a, b = rects[i], rects[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        rects[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del rects[j]
+                        is_merged = True
+                        break
+                if is_merged:
+                    break
+
+        regions_area = sum([(x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in rects])
+        if regions_area > self._MOTION_REGIONS_MAX_AREA * frame_width * frame_height:
+            return None
+        return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in rects]
 
     def _coord_processed_image_to_image(self, x: int, y: int) -> typing.Tuple[int, int]:
         """
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import os
+import typing
+
+from source.frame_info import FrameInfo
+from source.utils.frozen import Frozen
+
+
+class OutputFrameSource(Frozen):
+    """
+    Происхождение кадра выходного видео: исходный файл, номер кадра в нем, смещение в файле и время съемки
+    """
+
+    def __init__(
+            self,
+            output_frame_number: int,
+            source_filename: str,
+            frame_index: int,
+            byte_offset: typing.Optional[int],
+            timestamp: typing.Optional[datetime.datetime]
+    ):
+        super().__init__()
+        self._output_frame_number = output_frame_number
+        self._source_filename = source_filename
+        self._frame_index = frame_index
+        self._byte_offset = byte_offset
+        self._timestamp = timestamp
+        self.freeze()
+
+    @property
+    def output_frame_number(self) -> int:
+        return self._output_frame_number
+
+    @property
+    def source_filename(self) -> str:
+        return self._source_filename
+
+    @property
+    def frame_index(self) -> int:
+        return self._frame_index
+
+    @property
+    def byte_offset(self) -> typing.Optional[int]:
+        return self._byte_offset
+
+    @property
+    def timestamp(self) -> typing.Optional[datetime.datetime]:
+        return self._timestamp
+
+    def __str__(self):
+        return f'кадр {self._output_frame_number}: {self._source_filename}, кадр {self._frame_index}, ' \
+               f'смещение {self._byte_offset}, время {self._timestamp}'
+
+
+class OutputFrameIndex:
+    """
+    Индекс кадров выходного видео (файл рядом с видео, <имя видео>.index.json): для каждого кадра выходного
+    видео хранится, из какого исходного файла и кадра он получен, смещение кадра в исходном файле
+    (если известно) и время съемки. По индексу можно сразу открыть исходный файл в нужном месте
+    (см. SourceVideoOpener), не просматривая архив вручную
+    """
+
+    INDEX_VERSION = 1
+
+    SIDECAR_SUFFIX = '.index.json'
+
+    _TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+    def __init__(self, video_filename: str, fps: float):
+        assert isinstance(video_filename, str)
+        assert fps > 0.0
+        self._video_filename = video_filename
+        self._fps = float(fps)
+        self._source_filenames: typing.List[str] = []
+        self._source_ids: typing.Dict[str, int] = {}
+
+        # для каждого кадра: [номер исходного файла, номер кадра, смещение, время] или None, если неизвестно
+        self._frames: typing.List[typing.Optional[list]] = []
+
+    @property
+    def video_filename(self) -> str:
+        return self._video_filename
+
+    @property
+    def fps(self) -> float:
+        return self._fps
+
+    @classmethod
+    def get_sidecar_filename(cls, video_filename: str) -> str:
+        return video_filename + cls.SIDECAR_SUFFIX
+
+    def add_frame(self, frame_info: typing.Optional[FrameInfo]):
+        """
+        Добавить следующий кадр выходного видео
+        :param frame_info: происхождение кадра (None - неизвестно)
+        """
+        if frame_info is None or frame_info.source_filename is None:
+            self._frames.append(None)
+            return
+        source_id = self._source_ids.get(frame_info.source_filename)
+        if source_id is None:
+            source_id = len(self._source_filenames)
+            self._source_filenames.append(frame_info.source_filename)
+            self._source_ids[frame_info.source_filename] = source_id
+        timestamp = None
+        if frame_info.timestamp is not None:
+            timestamp = frame_info.timestamp.strftime(self._TIMESTAMP_FORMAT)
+        self._frames.append([source_id, frame_info.frame_index, frame_info.byte_offset, timestamp])
+
+    def extend(self, other: 'OutputFrameIndex'):
+        """
+        Добавить кадры другого индекса (при склейке выходных видео)
+        """
+        assert isinstance(other, OutputFrameIndex)
+        for output_frame_number in range(other.get_frames_count()):
+            frame_source = other.get_frame_source(output_frame_number)
+            if frame_source is None:
+                self.add_frame(None)
+            else:
+                self.add_frame(FrameInfo(
+                    frame_source.source_filename,
+                    frame_source.frame_index,
+                    frame_source.timestamp,
+                    frame_source.byte_offset
+                ))
+
+    def get_frames_count(self) -> int:
+        return len(self._frames)
+
+    def get_frame_source(self, output_frame_number: int) -> typing.Optional[OutputFrameSource]:
+        """
+        :return: происхождение кадра выходного видео или None, если кадра нет или происхождение неизвестно
+        """
+        if not 0 <= output_frame_number < len(self._frames):
+            return None
+        frame = self._frames[output_frame_number]
+        if frame is None:
+            return None
+        source_id, frame_index, byte_offset, timestamp = frame
+        if timestamp is not None:
+            timestamp = datetime.datetime.strptime(timestamp, self._TIMESTAMP_FORMAT)
+        return OutputFrameSource(
+            output_frame_number, self._source_filenames[source_id], frame_index, byte_offset, timestamp)
+
+    def find_frame_source(self, output_seconds: float) -> typing.Optional[OutputFrameSource]:
+        """
+        Происхождение кадра, который показывается на output_seconds секунде выходного видео
+        """
+        return self.get_frame_source(int(output_seconds * self._fps))
+
+    def save(self):
+        sidecar_filename = self.get_sidecar_filename(self._video_filename)
+        # пишем во временный файл и переименовываем, чтобы при сбое не остался недописанный индекс
+        temp_filename = '{0}.{1}.tmp'.format(sidecar_filename, os.getpid())
+        with open(temp_filename, 'w', encoding='utf-8') as file:
+            json.dump({
+                'version': self.INDEX_VERSION,
+                'fps': self._fps,
+                'sources': self._source_filenames,
+                'frames': self._frames,
+            }, file)
+        os.replace(temp_filename, sidecar_filename)
+
+    @classmethod
+    def load(cls, video_filename: str) -> typing.Optional['OutputFrameIndex']:
+        """
+        Прочитать индекс кадров выходного видео
+        :return: индекс или None, если его нет или он поврежден
+        """
+        sidecar_filename = cls.get_sidecar_filename(video_filename)
+        if not os.path.isfile(sidecar_filename):
+            return None
+        try:
+            with open(sidecar_filename, 'r', encoding='utf-8') as file:
+                index_dict = json.load(file)
+            if index_dict.get('version') != cls.INDEX_VERSION:
+                return None
+            index = cls(video_filename, index_dict['fps'])
+            index._source_filenames = list(index_dict['sources'])
+            index._source_ids = {filename: source_id for source_id, filename in enumerate(index._source_filenames)}
+            index._frames = list(index_dict['frames'])
+        except (ValueError, KeyError, TypeError):
+            print('Поврежден индекс кадров: {0}'.format(sidecar_filename))
+            return None
+        return index
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+import typing
+
+import cv2
+
+from source.task.task_description import TaskDescription
+from source.task_processor import TaskProcessor
+from source.task_scheduler import TaskScheduler
+from source.utils.frozen import Frozen
+
+# событие остановки, общее для всех процессов обработки (задается при запуске процесса)
+_worker_stop_event: typing.Optional[typing.Any] = None
+
+# режим без окон для процессов обработки
+_worker_headless: bool = False
+
+
+class TaskResult(Frozen):
+    """
+    Результат выполнения задачи в отдельном процессе: код завершения, журнал (все, что задача вывела на экран)
+    и время выполнения
+    """
+    EXIT_CODE_OK = 0
+    EXIT_CODE_INTERRUPTED = 4
+    EXIT_CODE_ERROR = 5
+
+    def __init__(self, task_index: int, exit_code: int, log: str, seconds: float = 0.0):
+        super().__init__()
+        assert isinstance(task_index, int)
+        assert isinstance(exit_code, int)
+        assert isinstance(log, str)
+        self._task_index = task_index
+        self._exit_code = exit_code
+        self._log = log
+        self._seconds = float(seconds)
+        self.freeze()
+
+    @property
+    def task_index(self) -> int:
+        return self._task_index
+
+    @property
+    def exit_code(self) -> int:
+        return self._exit_code
+
+    @property
+    def log(self) -> str:
+        return self._log
+
+    @property
+    def seconds(self) -> float:
+        return self._seconds
+
+
+def _init_worker(stop_event, headless: bool, threads_count: int):
+    global _worker_stop_event, _worker_headless
+    _worker_stop_event = stop_event
+    _worker_headless = headless
+    # потоки OpenCV (декодирование, изменение размера, распознавание) делят ядра между процессами,
+    # иначе каждый процесс запускает потоки на все ядра, и они мешают друг другу
+    cv2.setNumThreads(threads_count)
+    # Ctrl+C обрабатывает родительский процесс и передает остановку через общее событие,
+    # чтобы каждый процесс успел корректно закрыть выходные видеофайлы
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _run_task(task_index: int, task: TaskDescription) -> TaskResult:
+    log = io.StringIO()
+    exit_code = TaskResult.EXIT_CODE_OK
+    begin = time.perf_counter()
+    with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            task_processor = TaskProcessor()
+            task_processor.stop_event = _worker_stop_event
+            task_processor.headless = _worker_headless
+            task_processor.process_task(task)
+            if task_processor.is_exit_requested():
+                # выход, запрошенный в одном процессе (ESC), распространяется на все процессы
+                _worker_stop_event.set()
+                exit_code = TaskResult.EXIT_CODE_INTERRUPTED
+        except Exception:
+            traceback.print_exc()
+            exit_code = TaskResult.EXIT_CODE_ERROR
+    return TaskResult(task_index, exit_code, log.getvalue(), time.perf_counter() - begin)
+
+
+class ParallelTaskRunner:
+    """
+    Выполняет задачи параллельно в пуле процессов (каждая задача, то есть камера, в своем процессе).
+    Порядок запуска задач выбирает TaskScheduler: задачи с одного диска не читают его одновременно,
+    долгие задачи запускаются первыми. Потоки OpenCV делятся между процессами (cpu_threads на все процессы).
+    Журналы и коды завершения задач собираются в родительском процессе.
+    Выход (ESC в любом из процессов или Ctrl+C) передается всем процессам.
+    """
+
+    # интервал проверки завершения задач
+    _POLL_SECONDS = 0.2
+
+    def __init__(
+            self,
+            workers_count: int,
+            headless: bool = False,
+            stop_event: typing.Optional[typing.Any] = None,
+            scheduler: typing.Optional[TaskScheduler] = None,
+            cpu_threads: int = 0
+    ):
+        """
+        :param workers_count: количество процессов
+        :param headless: режим без окон
+        :param stop_event: внешнее событие остановки (multiprocessing.Event), если не задано, создается свое
+        :param scheduler: порядок запуска задач (по умолчанию без ограничения задач на диск и без истории)
+        :param cpu_threads: сколько потоков OpenCV на все процессы (0 - по количеству ядер)
+        """
+        assert isinstance(workers_count, int)
+        assert workers_count > 0
+        assert isinstance(headless, bool)
+        assert isinstance(cpu_threads, int)
+        assert cpu_threads >= 0
+        self._workers_count = workers_count
+        self._headless = headless
+        self._stop_event = stop_event
+        self._scheduler = scheduler if scheduler is not None else TaskScheduler()
+        self._cpu_threads = cpu_threads or os.cpu_count() or 1
+        self._is_exit_requested: bool = False
+
+    def run(self, tasks: typing.List[TaskDescription]) -> typing.List[TaskResult]:
+        """
+        Выполнить задачи
+        :param tasks: список задач
+        :return: результаты задач в порядке следования задач
+        """
+        assert all([isinstance(task, TaskDescription) for task in tasks])
+        stop_event = self._stop_event if self._stop_event is not None else multiprocessing.Event()
+        results: typing.Dict[int, TaskResult] = {}
+        self._scheduler.add_tasks(tasks)
+        workers_count = min(self._workers_count, len(tasks)) or 1
+        parallel_tasks_count = self._scheduler.get_parallel_tasks_count()
+        if 0 < parallel_tasks_count < workers_count:
+            # лишние процессы простаивали бы, пока задачи ждут своих дисков
+            print(f'Задачи с одного диска выполняются не больше {self._scheduler.device_workers} одновременно, '
+                  f'поэтому параллельно выполняются только {parallel_tasks_count} задач из {workers_count}')
+            workers_count = parallel_tasks_count
+        threads_count = max(1, self._cpu_threads // workers_count)
+        device_workers = self._scheduler.device_workers or 'без ограничения'
+        print(f'Запуск {len(tasks)} задач в {workers_count} процессах, потоков OpenCV на процесс: {threads_count}, '
+              f'задач на диск: {device_workers}')
+        running: typing.Dict[int, typing.Tuple[TaskDescription, typing.Any]] = {}
+        previous_interrupt_handler = self._install_interrupt_handler(stop_event)
+        try:
+            with multiprocessing.Pool(
+                    workers_count, initializer=_init_worker,
+                    initargs=(stop_event, self._headless, threads_count)) as pool:
+                while len(running) > 0 or (self._scheduler.has_pending_tasks() and not stop_event.is_set()):
+                    while len(running) < workers_count and not stop_event.is_set():
+                        next_task = self._scheduler.start_next_task()
+                        if next_task is None:
+                            # остальные задачи ждут, пока освободятся их диски
+                            break
+                        task_index, task = next_task
+                        running[task_index] = (task, pool.apply_async(_run_task, (task_index, task)))
+                    time.sleep(self._POLL_SECONDS)
+                    finished_task_indexes = [
+                        index for index, (_, async_result) in running.items() if async_result.ready()]
+                    for task_index in finished_task_indexes:
+                        task, async_result = running.pop(task_index)
+                        result = async_result.get()
+                        is_completed = result.exit_code == TaskResult.EXIT_CODE_OK
+                        self._scheduler.finish_task(task, result.seconds if is_completed else None)
+                        self._print_result(result)
+                        results[task_index] = result
+                pool.close()
+                pool.join()
+        finally:
+            if previous_interrupt_handler is not None:
+                signal.signal(signal.SIGINT, previous_interrupt_handler)
+        self._scheduler.save_history()
+
+        # задачи, которые не были запущены из-за остановки
+        for task_index in range(len(tasks)):
+            if task_index not in results:
+                results[task_index] = TaskResult(task_index, TaskResult.EXIT_CODE_INTERRUPTED, '')
+        self._is_exit_requested = stop_event.is_set()
+        return [results[task_index] for task_index in range(len(tasks))]
+
+    def is_exit_requested(self) -> bool:
+        return self._is_exit_requested
+
+    @staticmethod
+    def get_exit_code(results: typing.List[TaskResult]) -> int:
+        """
+        Общий код завершения по результатам всех задач (прерывание важнее ошибки)
+        """
+        exit_codes = [result.exit_code for result in results]
+        if TaskResult.EXIT_CODE_INTERRUPTED in exit_codes:
+            return TaskResult.EXIT_CODE_INTERRUPTED
+        if TaskResult.EXIT_CODE_ERROR in exit_codes:
+            return TaskResult.EXIT_CODE_ERROR
+        return TaskResult.EXIT_CODE_OK
+
+    @staticmethod
+    def _install_interrupt_handler(stop_event) -> typing.Optional[typing.Any]:
+        """
+        Ctrl+C в любой момент (в том числе во время запуска задачи или получения ее результата) только передает
+        остановку процессам обработки через общее событие: KeyboardInterrupt внутри блока пула завершил бы
+        процессы, не дав им закрыть выходные видеофайлы
+        :return: предыдущий обработчик SIGINT (None - обработчик не установлен, так как сигналы принимает
+         только главный поток)
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return None
+
+        def handler(signum, frame):
+            print('Получен запрос на прерывание, останавливаю все процессы')
+            stop_event.set()
+
+        return signal.signal(signal.SIGINT, handler)
+
+    @staticmethod
+    def _print_result(result: TaskResult):
+        print(f'--- журнал задачи {result.task_index} ---')
+        print(result.log, end='')
+        print(f'--- задача {result.task_index} завершена с кодом {result.exit_code} за {result.seconds:.1f} с ---')
@@ -4,16 +4,28 @@ import typing
 
 import numpy
 
+from source.detection_event_log import DetectionEventLog
+from source.frame_info import FrameInfo
 from source.i_frame_post_processor import IFramePostProcessor
+from source.i_person_detector_backend import IPersonDetectorBackend
+from source.motion_detector import MotionDetector
 from source.object_detector import ObjectDetector
+from source.stage_metrics import StageMetrics
 
 
 class PersonDetectorFramePostprocessor(IFramePostProcessor):
-    def __init__(self, filename: typing.Optional[str]):
+    def __init__(
+            self,
+            filename: typing.Optional[str],
+            headless: bool = False,
+            detector_backend: typing.Optional[IPersonDetectorBackend] = None
+    ):
         self._person_detector: typing.Optional[ObjectDetector] = None
         if filename is not None:
             self._person_detector = ObjectDetector()
             self._person_detector.set_output_filename(filename)
+            self._person_detector.headless = headless
+            self._person_detector.detector_backend = detector_backend
 
     def __enter__(self):
         if self._person_detector is not None:
@@ -21,12 +33,50 @@ class PersonDetectorFramePostprocessor(IFramePostProcessor):
             self._person_detector.begin_detection(1920, 1080)
         return self
 
+    def set_motion_detector(self, motion_detector: typing.Optional[MotionDetector], regions_only: bool = True):
+        """
+        Искать людей только в кадрах с движением (и, если regions_only, только в областях движения)
+        """
+        if self._person_detector is not None:
+            self._person_detector.motion_detector = motion_detector
+            self._person_detector.motion_regions_only = regions_only
+
+    def set_detection_event_log(self, detection_event_log: typing.Optional[DetectionEventLog]):
+        """
+        Записывать найденных людей в журнал
+        """
+        if self._person_detector is not None:
+            self._person_detector.detection_event_log = detection_event_log
+
+    def set_write_frame_index(self, value: bool):
+        """
+        Записывать рядом с выходным видеофайлом индекс кадров (см. OutputFrameIndex)
+        """
+        if self._person_detector is not None:
+            self._person_detector.write_frame_index = value
+
+    def set_video_writer_factory(self, video_writer_factory: typing.Optional[typing.Callable]):
+        """
+        Задать создание объекта записи выходного видео (см. ObjectDetector.video_writer_factory)
+        """
+        if self._person_detector is not None:
+            self._person_detector.video_writer_factory = video_writer_factory
+
+    def set_metrics(self, metrics: StageMetrics):
+        if self._person_detector is not None:
+            self._person_detector.metrics = metrics
+
     def is_enabled(self) -> bool:
         return self._person_detector is not None
 
-    def process_frame(self, frame: numpy.ndarray):
+    def process_frame(self, frame: numpy.ndarray, frame_info: typing.Optional[FrameInfo] = None):
         assert self._person_detector is not None
-        self._person_detector.process_frame(frame)
+        self._person_detector.process_frame(frame, frame_info)
+
+    def get_detected_frames_count(self) -> int:
+        if self._person_detector is None:
+            return 0
+        return self._person_detector.detected_frames_count
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self._person_detector is not None:
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+import multiprocessing
+import os
+import signal
+import time
+import typing
+
+from source.queue_worker import QueueWorker
+from source.task.json_task_parser import JsonTaskParser
+from source.task.task_description import TaskDescription
+from source.task_processor import TaskProcessor
+from source.work_queue import WorkQueue
+
+
+def _run_local_worker(queue_dir: str, lease_seconds: float, poll_seconds: float, headless: bool, stop_event):
+    # Ctrl+C обрабатывает координатор и передает остановку через общее событие
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    QueueWorker(queue_dir, None, lease_seconds, poll_seconds, headless, stop_event).run()
+
+
+class QueueCoordinator:
+    """
+    Координатор распределенной обработки: разбивает задачи на единицы работы (входной файл задачи),
+    добавляет их в очередь (см. WorkQueue) и ждет, пока процессы обработки (QueueWorker на этой и других машинах)
+    обработают их в сегменты. Затем выходные файлы задач склеиваются из сегментов (см. SegmentCache).
+
+    Задачи, которые нельзя разделить на сегменты (мозаика, adaptive_sampling, keyframe_remux), добавляются
+    в очередь целиком. Сегменты задач без segment_cache_dir хранятся в каталоге segments каталога очереди.
+    Пути входных файлов, каталога очереди и кэша сегментов должны быть одинаковыми на всех машинах
+    """
+
+    # каталог сегментов в каталоге очереди (для задач без segment_cache_dir)
+    _SEGMENTS_DIRNAME = 'segments'
+
+    def __init__(
+            self,
+            queue_dir: str,
+            headless: bool = True,
+            stop_event: typing.Optional[typing.Any] = None,
+            lease_seconds: float = 300.0,
+            poll_seconds: float = 5.0
+    ):
+        """
+        :param queue_dir: общий каталог очереди
+        :param stop_event: внешнее событие остановки (объект с методами is_set() и wait(timeout))
+        :param lease_seconds: время аренды единицы работы (см. QueueWorker)
+        :param poll_seconds: интервал проверки состояния запуска
+        """
+        assert isinstance(queue_dir, str)
+        self._queue_dir = os.path.abspath(queue_dir)
+        self._headless = headless
+        self._stop_event = stop_event
+        self._lease_seconds = lease_seconds
+        self._poll_seconds = poll_seconds
+        self._is_exit_requested: bool = False
+        self._failed_units_count: int = 0
+
+    def run(self, json_text: str, local_workers_count: int = 1):
+        """
+        Выполнить задачи файла настроек
+        :param json_text: содержимое файла настроек
+        :param local_workers_count: сколько процессов обработки запустить на этой машине
+         (0 - только процессы обработки на других машинах)
+        """
+        assert local_workers_count >= 0
+        tasks, units = self._create_units(json_text)
+        with WorkQueue(self._queue_dir) as queue:
+            job_id = queue.add_job(units)
+            print('Запуск {0}: единиц работы {1}, очередь: {2}'.format(job_id, len(units), self._queue_dir))
+
+            workers_stop_event = multiprocessing.Event()
+            workers = [
+                multiprocessing.Process(
+                    target=_run_local_worker,
+                    args=(self._queue_dir, self._lease_seconds, self._poll_seconds, self._headless, workers_stop_event)
+                )
+                for _ in range(local_workers_count)
+            ]
+            for worker in workers:
+                worker.start()
+            try:
+                self._wait_job(queue, job_id)
+            finally:
+                workers_stop_event.set()
+                for worker in workers:
+                    worker.join()
+            if self._is_exit_requested:
+                print('Обработка прервана, запуск {0} можно продолжить процессами обработки'.format(job_id))
+                return
+
+            failed_units = queue.get_job_errors(job_id)
+            self._failed_units_count = len(failed_units)
+            for task_index, input_file, error in failed_units:
+                print('Ошибка обработки задачи {0}: {1}\n{2}'.format(
+                    task_index, input_file or 'задача целиком', error))
+            whole_task_indexes = {task_index for task_index, _, input_file in units if input_file is None}
+
+        for task_index, task in enumerate(tasks):
+            if task_index in whole_task_indexes or self._is_stopped():
+                continue
+            # все файлы уже обработаны в сегменты, остается склейка (ошибочные файлы обрабатываются здесь повторно)
+            print('Склейка задачи {0}: {1}'.format(task_index, task.output_concatenation_filename))
+            task_processor = TaskProcessor()
+            task_processor.stop_event = self._stop_event
+            task_processor.headless = self._headless
+            task_processor.process_task(task)
+            if task_processor.is_exit_requested():
+                self._is_exit_requested = True
+
+    def is_exit_requested(self) -> bool:
+        return self._is_exit_requested
+
+    def has_errors(self) -> bool:
+        """
+        Были ли единицы работы, обработка которых не удалась после всех попыток
+        """
+        return self._failed_units_count > 0
+
+    def _wait_job(self, queue: WorkQueue, job_id: int):
+        last_states: typing.Dict[str, int] = {}
+        while not queue.is_job_finished(job_id):
+            if self._is_stopped():
+                self._is_exit_requested = True
+                return
+            states = queue.get_job_states(job_id)
+            if states != last_states:
+                print('Запуск {0}: {1}'.format(
+                    job_id, ', '.join(['{0} {1}'.format(state, count) for state, count in sorted(states.items())])))
+                last_states = states
+            if self._stop_event is not None:
+                self._stop_event.wait(self._poll_seconds)
+            else:
+                time.sleep(self._poll_seconds)
+
+    def _create_units(
+            self,
+            json_text: str
+    ) -> typing.Tuple[typing.List[TaskDescription], typing.List[typing.Tuple[int, str, typing.Optional[str]]]]:
+        """
+        Разбить задачи на единицы работы. Процессы обработки получают настройки задачи с уже найденными
+        входными файлами, поэтому все машины обрабатывают одни и те же файлы
+        :return: (задачи, единицы работы (номер задачи, настройки задачи, входной файл или None))
+        """
+        parser = JsonTaskParser(False)
+        tasks = []
+        units = []
+        for task_index, task_dict in enumerate(parser.task_dicts_from_json(json_text)):
+            task = parser.task_from_dict(task_dict)
+            tasks.append(task)
+            unit_task_dict = dict(task_dict)
+            unit_task_dict.pop('video_searcher', None)
+            if task.task_type == TaskDescription.TASK_TYPE_MOSAIC_VIDEO:
+                unit_task_dict['cameras'] = [
+                    {'name': camera.name, 'input_files': camera.input_files} for camera in task.cameras]
+            else:
+                unit_task_dict['input_files'] = task.input_files
+            if not TaskProcessor.is_segmented_task(task):
+                units.append((task_index, json.dumps(unit_task_dict), None))
+                continue
+            # контрольные точки (checkpoint_dir) нельзя использовать из нескольких процессов, а кэш сегментов можно
+            if task.segment_cache_dir is None:
+                task.segment_cache_dir = os.path.join(self._queue_dir, self._SEGMENTS_DIRNAME)
+                unit_task_dict['segment_cache_dir'] = task.segment_cache_dir
+            task_json = json.dumps(unit_task_dict)
+            units.extend([(task_index, task_json, input_file) for input_file in task.input_files])
+        return tasks, units
+
+    def _is_stopped(self) -> bool:
+        return self._is_exit_requested or (self._stop_event is not None and self._stop_event.is_set())
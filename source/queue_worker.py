@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+import typing
+
+from source.task.json_task_parser import JsonTaskParser
+from source.task_processor import TaskProcessor
+from source.work_queue import WorkQueue, WorkUnit
+
+
+class _LeaseKeeper(threading.Thread):
+    """
+    Продление аренды единицы работы, пока она обрабатывается (у потока свое соединение с базой очереди).
+    Если аренда потеряна, обработка единицы работы останавливается (см. _UnitStopEvent)
+    """
+
+    def __init__(self, queue_dir: str, unit: WorkUnit, worker_id: str, lease_seconds: float):
+        super().__init__(name='lease-keeper', daemon=True)
+        self._queue_dir = queue_dir
+        self._unit = unit
+        self._worker_id = worker_id
+        self._lease_seconds = lease_seconds
+        self._stop_event = threading.Event()
+        self._lease_lost = threading.Event()
+
+    def is_lease_lost(self) -> bool:
+        return self._lease_lost.is_set()
+
+    def run(self):
+        with WorkQueue(self._queue_dir) as queue:
+            while not self._stop_event.wait(self._lease_seconds / 3.0):
+                try:
+                    is_renewed = queue.renew_lease(self._unit, self._worker_id, self._lease_seconds)
+                except Exception as error:
+                    # база временно недоступна (сетевая папка), попробуем при следующем продлении
+                    print('Не удалось продлить аренду: {0}'.format(error))
+                    continue
+                if not is_renewed:
+                    print('Аренда потеряна, единица работы выдана другому процессу, обработка останавливается: '
+                          '{0}'.format(self._unit))
+                    self._lease_lost.set()
+                    return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class _UnitStopEvent:
+    """
+    Событие остановки обработки единицы работы (см. TaskProcessor.stop_event): внешняя остановка
+    или потеря аренды
+    """
+
+    def __init__(self, stop_event: typing.Optional[typing.Any], lease_keeper: _LeaseKeeper):
+        self._stop_event = stop_event
+        self._lease_keeper = lease_keeper
+
+    def is_set(self) -> bool:
+        return self._lease_keeper.is_lease_lost() or (self._stop_event is not None and self._stop_event.is_set())
+
+
+class QueueWorker:
+    """
+    Процесс обработки очереди работы (см. WorkQueue): берет в аренду единицы работы и обрабатывает их -
+    входной файл в сегмент кэша сегментов задачи (см. SegmentCache, каталог кэша должен быть общим для всех машин)
+    или задачу целиком. Процессов обработки может быть несколько на каждой машине
+    """
+
+    def __init__(
+            self,
+            queue_dir: str,
+            worker_id: typing.Optional[str] = None,
+            lease_seconds: float = 300.0,
+            poll_seconds: float = 5.0,
+            headless: bool = True,
+            stop_event: typing.Optional[typing.Any] = None
+    ):
+        """
+        :param queue_dir: общий каталог очереди
+        :param worker_id: имя процесса обработки в очереди (по умолчанию имя машины и номер процесса)
+        :param lease_seconds: время аренды (продлевается каждую треть времени аренды, пока идет обработка)
+        :param poll_seconds: интервал опроса очереди, когда работы нет
+        :param stop_event: внешнее событие остановки (объект с методами is_set() и wait(timeout))
+        """
+        assert isinstance(queue_dir, str)
+        assert lease_seconds > 0.0
+        assert poll_seconds > 0.0
+        self._queue_dir = queue_dir
+        self._worker_id = worker_id or '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        self._lease_seconds = lease_seconds
+        self._poll_seconds = poll_seconds
+        self._headless = headless
+        self._stop_event = stop_event
+        self._is_exit_requested: bool = False
+
+    @property
+    def worker_id(self) -> str:
+        return self._worker_id
+
+    def run(self):
+        """
+        Обрабатывать единицы работы до остановки (stop_event или ESC в окне обработки)
+        """
+        print('Процесс обработки {0}, очередь: {1}'.format(self._worker_id, self._queue_dir))
+        with WorkQueue(self._queue_dir) as queue:
+            while not self._is_stopped():
+                unit = queue.lease(self._worker_id, self._lease_seconds)
+                if unit is None:
+                    if self._stop_event is not None:
+                        self._stop_event.wait(self._poll_seconds)
+                    else:
+                        time.sleep(self._poll_seconds)
+                    continue
+                print('Обработка: {0}'.format(unit))
+                self._process_unit(queue, unit)
+
+    def is_exit_requested(self) -> bool:
+        return self._is_exit_requested
+
+    def _process_unit(self, queue: WorkQueue, unit: WorkUnit):
+        lease_keeper = _LeaseKeeper(self._queue_dir, unit, self._worker_id, self._lease_seconds)
+        lease_keeper.start()
+        task_processor = TaskProcessor()
+        task_processor.stop_event = _UnitStopEvent(self._stop_event, lease_keeper)
+        task_processor.headless = self._headless
+        error: typing.Optional[str] = None
+        try:
+            task = JsonTaskParser(False).task_from_dict(json.loads(unit.task_json))
+            if unit.input_file is None:
+                task_processor.process_task(task)
+            else:
+                task_processor.process_task_segments(task, [unit.input_file])
+        except Exception:
+            error = traceback.format_exc()
+            print(error)
+        finally:
+            lease_keeper.stop()
+        if lease_keeper.is_lease_lost():
+            # единица работы выдана другому процессу, результат этой обработки не записывается
+            print('Обработка остановлена, аренда потеряна: {0}'.format(unit))
+        elif task_processor.is_exit_requested():
+            # прерванная обработка не считается попыткой, единица работы достанется другому процессу
+            self._is_exit_requested = True
+            queue.release(unit, self._worker_id)
+        elif error is not None:
+            queue.fail(unit, self._worker_id, error)
+        else:
+            queue.complete(unit, self._worker_id)
+
+    def _is_stopped(self) -> bool:
+        return self._is_exit_requested or (self._stop_event is not None and self._stop_event.is_set())
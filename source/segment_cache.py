@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import socket
+import time
+import typing
+
+from source.output_frame_index import OutputFrameIndex
+from source.task.task_description import TaskDescription
+from source.task_checkpoint import TaskCheckpoint
+
+
+class SegmentCache:
+    """
+    Кэш сегментов входных файлов: каждый входной файл обрабатывается в свой сегмент (как в TaskCheckpoint),
+    но сегменты не удаляются после склейки и используются повторно любой задачей с теми же параметрами обработки.
+    Выходные файлы задачи собираются склейкой сегментов (см. SegmentStitcher), поэтому повторная обработка
+    перекрывающихся интервалов (поиск за последние 25 часов, запуск с другим reference_date) почти ничего не стоит.
+
+    Ключ сегмента - входной файл (полный путь, размер и время изменения) и параметры обработки, от которых зависит
+    содержимое сегмента. Измененный входной файл получает новый ключ и обрабатывается заново. Сегмент считается
+    готовым, когда записан его файл описания, поэтому общий файл состояния не нужен и кэш можно использовать
+    из нескольких процессов. Сегменты, которые не использовались segment_cache_days дней, удаляются (prune).
+
+    Сегменты хранятся в подкаталоге параметров обработки: segment_cache_dir/<ключ параметров>/<ключ файла>_*.
+    Недописанный сегмент записывается в файл с именем процесса (машина и номер процесса), поэтому процессы,
+    одновременно обрабатывающие один и тот же входной файл, не пишут в один файл
+    """
+
+    CACHE_VERSION = 1
+
+    # расширение файла описания сегмента
+    _ENTRY_EXTENSION = '.json'
+
+    # метка в имени сегмента, который еще записывается (ставится перед расширением,
+    # так как по расширению выбирается формат выходного файла)
+    _PARTIAL_MARK = '.partial'
+
+    def __init__(self, cache_dir: str, task_description: TaskDescription):
+        assert isinstance(cache_dir, str)
+        assert isinstance(task_description, TaskDescription)
+        self._concatenation_extension = os.path.splitext(task_description.output_concatenation_filename)[1]
+        self._object_detection_extension: typing.Optional[str] = None
+        if task_description.output_object_detection_filename is not None:
+            self._object_detection_extension = os.path.splitext(
+                task_description.output_object_detection_filename)[1]
+        self._task_dir = os.path.join(cache_dir, self._get_parameters_key(task_description))
+        # метка процесса в именах недописанных сегментов
+        self._writer_mark = '.{0}-{1}'.format(socket.gethostname(), os.getpid())
+
+        # записываемые сегменты: входной файл -> (ключ файла, размер, время изменения) на начало обработки
+        # (если камера дописала файл во время обработки, готовым считается сегмент прежней версии файла)
+        self._pending_files: typing.Dict[str, typing.Tuple[str, int, float]] = {}
+
+        # сегменты, использованные при склейке (время использования обновляется один раз)
+        self._touched_entries: typing.Set[str] = set()
+
+    @property
+    def task_dir(self) -> str:
+        """
+        Каталог сегментов с параметрами обработки задачи
+        """
+        return self._task_dir
+
+    def is_file_done(self, input_file: str) -> bool:
+        """
+        Есть ли в кэше готовый сегмент текущей версии входного файла
+        """
+        file_key = self._get_file_key(input_file)
+        if file_key is None or not os.path.isfile(self._get_entry_filename(file_key)):
+            return False
+        return all([segment is None or os.path.isfile(segment) for segment in self._get_segment_filenames(file_key)])
+
+    def get_partial_segment_filenames(self, input_file: str) -> typing.Tuple[str, typing.Optional[str]]:
+        """
+        Имена файлов, в которые записывается сегмент входного файла (до вызова mark_file_done)
+        :return: (файл объединения, файл распознавания или None, если распознавание не выполняется)
+        """
+        stat = os.stat(input_file)
+        file_key = self._get_file_key(input_file, stat)
+        self._pending_files[input_file] = (file_key, stat.st_size, stat.st_mtime)
+        concatenation_segment, object_detection_segment = self._get_segment_filenames(file_key)
+        os.makedirs(self._task_dir, exist_ok=True)
+        return (
+            self._get_partial_filename(concatenation_segment),
+            None if object_detection_segment is None else self._get_partial_filename(object_detection_segment)
+        )
+
+    def mark_file_done(self, input_file: str):
+        """
+        Запомнить, что входной файл обработан (записанный сегмент становится готовым)
+        """
+        file_key, size, mtime = self._pending_files.pop(input_file)
+        for segment_filename in self._get_segment_filenames(file_key):
+            if segment_filename is None:
+                continue
+            partial_filename = self._get_partial_filename(segment_filename)
+            if os.path.isfile(partial_filename):
+                os.replace(partial_filename, segment_filename)
+            # индекс кадров сегмента (если записывается) переименовывается вместе с сегментом
+            partial_index_filename = OutputFrameIndex.get_sidecar_filename(partial_filename)
+            if os.path.isfile(partial_index_filename):
+                os.replace(partial_index_filename, OutputFrameIndex.get_sidecar_filename(segment_filename))
+        entry = {
+            'version': self.CACHE_VERSION,
+            'input_file': os.path.abspath(input_file),
+            'size': size,
+            'mtime': mtime,
+        }
+        entry_filename = self._get_entry_filename(file_key)
+        # пишем во временный файл и переименовываем, чтобы недописанный сегмент не считался готовым
+        temp_filename = '{0}.{1}.tmp'.format(entry_filename, os.getpid())
+        with open(temp_filename, 'w') as file:
+            json.dump(entry, file)
+        os.replace(temp_filename, entry_filename)
+
+    def get_segment_filenames(
+            self,
+            input_files: typing.List[str]
+    ) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        """
+        Готовые сегменты входных файлов (в порядке входных файлов). Время использования сегментов обновляется,
+        чтобы они не были удалены из кэша
+        :return: (сегменты объединения, сегменты распознавания)
+        """
+        concatenation_segments = []
+        object_detection_segments = []
+        for input_file in input_files:
+            if not self.is_file_done(input_file):
+                continue
+            file_key = self._get_file_key(input_file)
+            concatenation_segment, object_detection_segment = self._get_segment_filenames(file_key)
+            concatenation_segments.append(concatenation_segment)
+            if object_detection_segment is not None:
+                object_detection_segments.append(object_detection_segment)
+            self._touch_entry(file_key)
+        return concatenation_segments, object_detection_segments
+
+    def prune(self, max_unused_days: float) -> int:
+        """
+        Удалить из кэша (из всех подкаталогов параметров) сегменты, которые не использовались max_unused_days дней,
+        и недописанные сегменты той же давности
+        :return: количество удаленных файлов
+        """
+        assert max_unused_days > 0
+        cache_dir = os.path.dirname(self._task_dir)
+        if not os.path.isdir(cache_dir):
+            return 0
+        min_time = time.time() - max_unused_days * 24.0 * 3600.0
+        removed_count = 0
+        for parameters_key in os.listdir(cache_dir):
+            parameters_dir = os.path.join(cache_dir, parameters_key)
+            if not os.path.isdir(parameters_dir):
+                continue
+            # файлы сегмента начинаются с ключа файла, время использования хранится в файле описания
+            used_keys = set()
+            filenames = os.listdir(parameters_dir)
+            for filename in filenames:
+                if filename == self._get_filename_key(filename) + self._ENTRY_EXTENSION and self._is_newer(
+                        os.path.join(parameters_dir, filename), min_time):
+                    used_keys.add(self._get_filename_key(filename))
+            for filename in filenames:
+                filename_path = os.path.join(parameters_dir, filename)
+                if self._get_filename_key(filename) in used_keys or self._is_newer(filename_path, min_time):
+                    continue
+                try:
+                    os.remove(filename_path)
+                    removed_count += 1
+                except OSError:
+                    pass
+        return removed_count
+
+    @staticmethod
+    def _get_file_key(input_file: str, stat: typing.Optional[os.stat_result] = None) -> typing.Optional[str]:
+        """
+        Ключ версии входного файла (по умолчанию текущей, None - файл недоступен)
+        """
+        if stat is None:
+            try:
+                stat = os.stat(input_file)
+            except OSError:
+                return None
+        file_identity = '{0}|{1}|{2}'.format(os.path.abspath(input_file), stat.st_size, stat.st_mtime)
+        return hashlib.sha1(file_identity.encode('utf-8')).hexdigest()[:20]
+
+    def _get_segment_filenames(self, file_key: str) -> typing.Tuple[str, typing.Optional[str]]:
+        concatenation_segment = os.path.join(
+            self._task_dir, '{0}_concatenation{1}'.format(file_key, self._concatenation_extension))
+        object_detection_segment = None
+        if self._object_detection_extension is not None:
+            object_detection_segment = os.path.join(
+                self._task_dir, '{0}_detection{1}'.format(file_key, self._object_detection_extension))
+        return concatenation_segment, object_detection_segment
+
+    def _get_entry_filename(self, file_key: str) -> str:
+        return os.path.join(self._task_dir, file_key + self._ENTRY_EXTENSION)
+
+    def _get_partial_filename(self, segment_filename: str) -> str:
+        name, extension = os.path.splitext(segment_filename)
+        return name + self._writer_mark + self._PARTIAL_MARK + extension
+
+    def _touch_entry(self, file_key: str):
+        if file_key in self._touched_entries:
+            return
+        try:
+            os.utime(self._get_entry_filename(file_key))
+        except OSError:
+            pass
+        self._touched_entries.add(file_key)
+
+    @staticmethod
+    def _get_filename_key(filename: str) -> str:
+        """
+        Ключ файла, к сегменту которого относится файл каталога параметров
+        """
+        return filename.split('_', 1)[0].split('.', 1)[0]
+
+    @staticmethod
+    def _is_newer(filename: str, min_time: float) -> bool:
+        try:
+            return os.path.getmtime(filename) >= min_time
+        except OSError:
+            return True
+
+    @classmethod
+    def _get_parameters_key(cls, task_description: TaskDescription) -> str:
+        """
+        Ключ параметров обработки: все, от чего зависит содержимое сегментов, кроме имен выходных файлов
+        (расширения выходных файлов задают формат сегментов)
+        """
+        parameters = TaskCheckpoint.get_processing_parameters(task_description)
+        parameters['version'] = cls.CACHE_VERSION
+        parameters['concatenation_extension'] = os.path.splitext(task_description.output_concatenation_filename)[1]
+        parameters['write_output_frame_index'] = task_description.write_output_frame_index
+        parameters['filename_timestamp_format'] = task_description.filename_timestamp_format
+        if task_description.output_object_detection_filename is not None:
+            parameters['object_detection_extension'] = os.path.splitext(
+                task_description.output_object_detection_filename)[1]
+        parameters_json = json.dumps(parameters, sort_keys=True)
+        return hashlib.sha1(parameters_json.encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import subprocess
+import tempfile
+import typing
+
+import cv2
+
+
+class SegmentStitcher:
+    """
+    Склейка сегментов (видеофайлов с одинаковыми параметрами) в один выходной файл.
+    Если доступен ffmpeg, то сегменты склеиваются без перекодирования (concat, -c copy),
+    иначе кадры сегментов перечитываются и записываются заново через cv2.VideoWriter
+    """
+
+    def __init__(self, ffmpeg_path: str = 'ffmpeg'):
+        assert isinstance(ffmpeg_path, str)
+        self._ffmpeg_path = ffmpeg_path
+
+    def stitch(self, segment_filenames: typing.List[str], output_filename: str, fourcc: int, fps: float) -> bool:
+        """
+        Склеить сегменты
+        :param segment_filenames: сегменты в порядке следования
+        :param output_filename: выходной файл
+        :param fourcc: кодек выходного файла (если склейка выполняется через cv2.VideoWriter)
+        :param fps: частота кадров выходного файла (если склейка выполняется через cv2.VideoWriter)
+        :return: успешно ли записан выходной файл
+        """
+        segment_filenames = [filename for filename in segment_filenames if not self._is_empty(filename)]
+        if len(segment_filenames) == 0:
+            print('Нет сегментов с кадрами для {0}'.format(output_filename))
+            return True
+        if shutil.which(self._ffmpeg_path) is not None:
+            if self._stitch_ffmpeg(segment_filenames, output_filename):
+                return True
+            print('Склейка через ffmpeg не удалась, сегменты будут перекодированы')
+        return self._stitch_opencv(segment_filenames, output_filename, fourcc, fps)
+
+    def _stitch_ffmpeg(self, segment_filenames: typing.List[str], output_filename: str) -> bool:
+        list_file_descriptor, list_filename = tempfile.mkstemp(suffix='.txt')
+        try:
+            with os.fdopen(list_file_descriptor, 'w', encoding='utf-8') as list_file:
+                for filename in segment_filenames:
+                    # в списке concat кавычки внутри имени экранируются
+                    list_file.write("file '{0}'\n".format(os.path.abspath(filename).replace("'", "'\\''")))
+            process = subprocess.run(
+                [
+                    self._ffmpeg_path,
+                    '-hide_banner', '-loglevel', 'error', '-y',
+                    '-f', 'concat', '-safe', '0', '-i', list_filename,
+                    '-map', '0:v:0', '-c', 'copy',
+                    output_filename
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+        finally:
+            os.remove(list_filename)
+        if process.returncode != 0:
+            print('Ошибка ffmpeg при склейке {0} (код {1}): {2}'.format(
+                output_filename, process.returncode, process.stderr.decode('utf-8', errors='replace')))
+            return False
+        return True
+
+    @staticmethod
+    def _stitch_opencv(segment_filenames: typing.List[str], output_filename: str, fourcc: int, fps: float) -> bool:
+        output_video: typing.Optional[cv2.VideoWriter] = None
+        try:
+            for filename in segment_filenames:
+                input_video = cv2.VideoCapture(filename)
+                try:
+                    is_ok, frame = input_video.read()
+                    while is_ok:
+                        if output_video is None:
+                            output_video = cv2.VideoWriter(
+                                output_filename, fourcc, fps, (frame.shape[1], frame.shape[0]))
+                            if not output_video.isOpened():
+                                print('Не удалось открыть на запись {0}'.format(output_filename))
+                                return False
+                        output_video.write(frame)
+                        is_ok, frame = input_video.read()
+                finally:
+                    input_video.release()
+        finally:
+            if output_video is not None:
+                output_video.release()
+        return True
+
+    @staticmethod
+    def _is_empty(filename: str) -> bool:
+        """
+        Сегмент без кадров (например, в файле не найдено ни одного человека)
+        """
+        if not os.path.isfile(filename) or os.path.getsize(filename) == 0:
+            return True
+        input_video = cv2.VideoCapture(filename)
+        try:
+            is_ok = input_video.grab()
+        finally:
+            input_video.release()
+        return not is_ok
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import typing
+
+import cv2
+import numpy
+
+from source.h264_stream_index import H264StreamIndex, H264StreamScanner
+from source.output_frame_index import OutputFrameIndex, OutputFrameSource
+
+
+class SeekedVideo:
+    """
+    Исходное видео, открытое с нужного кадра (см. SourceVideoOpener). Следующий читаемый кадр - position
+    """
+
+    # частота кадров, если частоту кадров видео определить не удалось
+    DEFAULT_FPS = 25.0
+
+    def __init__(self, input_video: cv2.VideoCapture, position: int, temp_filename: typing.Optional[str] = None):
+        self._input_video = input_video
+        self._position = position
+        self._temp_filename = temp_filename
+
+    @property
+    def position(self) -> int:
+        """
+        Номер (в исходном файле) следующего читаемого кадра
+        """
+        return self._position
+
+    def get_fps(self) -> float:
+        fps = float(self._input_video.get(cv2.CAP_PROP_FPS))
+        return fps if fps > 0.0 else self.DEFAULT_FPS
+
+    def read(self) -> typing.Tuple[bool, typing.Optional[numpy.ndarray]]:
+        is_ok, frame = self._input_video.read()
+        if is_ok:
+            self._position += 1
+        return is_ok, frame
+
+    def grab(self) -> bool:
+        is_ok = self._input_video.grab()
+        if is_ok:
+            self._position += 1
+        return is_ok
+
+    def release(self):
+        self._input_video.release()
+        if self._temp_filename is not None:
+            os.remove(self._temp_filename)
+            self._temp_filename = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class SourceVideoOpener:
+    """
+    Открытие исходного видеофайла сразу с нужного кадра, без декодирования предыдущих кадров файла.
+    У "сырых" файлов H.264 по индексу ключевых кадров во временный файл копируется (без декодирования)
+    часть файла от ключевого кадра перед нужным кадром, в остальных файлах выполняется переход к кадру
+    средствами OpenCV (декодирование от ближайшего ключевого кадра)
+    """
+
+    def __init__(self, index_store: typing.Optional[typing.Any] = None):
+        """
+        :param index_store: хранилище индексов ключевых кадров (объект с методом get_index),
+         None - индексы строятся заново при каждом открытии "сырого" файла H.264
+        """
+        assert index_store is None or hasattr(index_store, 'get_index')
+        self._index_store = index_store
+        self._scanner = H264StreamScanner()
+
+    def open(self, source_filename: str, begin_frame: int, end_frame: int) -> typing.Optional[SeekedVideo]:
+        """
+        Открыть видео так, чтобы следующим читался кадр begin_frame
+        :param end_frame: кадр после последнего кадра, который будет читаться (у "сырых" файлов H.264
+         копируется только часть файла до этого кадра)
+        :return: видео или None, если файл не открывается или в нем меньше кадров
+        """
+        assert begin_frame < end_frame
+        if H264StreamScanner.is_annex_b_file(source_filename):
+            video = self._open_annex_b(source_filename, begin_frame, end_frame)
+        else:
+            video = self._open_container(source_filename, begin_frame)
+        if video is None:
+            return None
+        while video.position < begin_frame:
+            if not video.grab():
+                video.release()
+                return None
+        return video
+
+    def get_frames_count(self, source_filename: str) -> int:
+        """
+        Количество кадров исходного видео. У "сырых" файлов H.264 OpenCV не знает количество кадров,
+        оно берется из индекса ключевых кадров
+        :return: количество кадров или 0, если неизвестно
+        """
+        if H264StreamScanner.is_annex_b_file(source_filename):
+            return self._get_index(source_filename).frames_count
+        input_video = cv2.VideoCapture(source_filename)
+        try:
+            return max(0, int(input_video.get(cv2.CAP_PROP_FRAME_COUNT)))
+        finally:
+            input_video.release()
+
+    def open_output_moment(
+            self,
+            video_filename: str,
+            output_seconds: float,
+            duration_seconds: float = 60.0
+    ) -> typing.Tuple[typing.Optional[OutputFrameSource], typing.Optional[SeekedVideo]]:
+        """
+        Открыть исходный файл, из которого получен кадр выходного видео на output_seconds секунде
+        (по индексу кадров выходного видео, см. OutputFrameIndex), с этого кадра
+        :param duration_seconds: сколько секунд исходного видео нужно прочитать (у "сырых" файлов H.264
+         копируется только эта часть файла)
+        :return: (происхождение кадра, видео) или None вместо неизвестного
+        """
+        output_frame_index = OutputFrameIndex.load(video_filename)
+        if output_frame_index is None:
+            print('Нет индекса кадров: {0}'.format(OutputFrameIndex.get_sidecar_filename(video_filename)))
+            return None, None
+        frame_source = output_frame_index.find_frame_source(output_seconds)
+        if frame_source is None or not os.path.isfile(frame_source.source_filename):
+            return frame_source, None
+        input_video = cv2.VideoCapture(frame_source.source_filename)
+        try:
+            fps = float(input_video.get(cv2.CAP_PROP_FPS))
+        finally:
+            input_video.release()
+        frames_count = max(1, int(duration_seconds * (fps if fps > 0.0 else SeekedVideo.DEFAULT_FPS)))
+        video = self.open(
+            frame_source.source_filename, frame_source.frame_index, frame_source.frame_index + frames_count)
+        return frame_source, video
+
+    def _open_annex_b(self, source_filename: str, begin_frame: int, end_frame: int) -> typing.Optional[SeekedVideo]:
+        index = self._get_index(source_filename)
+        temp_file_descriptor, temp_filename = tempfile.mkstemp(suffix='.h264')
+        try:
+            with os.fdopen(temp_file_descriptor, 'wb') as temp_file:
+                first_frame_number = index.write_frames(begin_frame, end_frame, temp_file)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+        return SeekedVideo(cv2.VideoCapture(temp_filename), first_frame_number, temp_filename)
+
+    def _get_index(self, source_filename: str) -> H264StreamIndex:
+        if self._index_store is not None:
+            return self._index_store.get_index(source_filename)
+        return self._scanner.scan(source_filename)
+
+    @staticmethod
+    def _open_container(source_filename: str, begin_frame: int) -> typing.Optional[SeekedVideo]:
+        input_video = cv2.VideoCapture(source_filename)
+        if not input_video.isOpened():
+            input_video.release()
+            return None
+        if begin_frame == 0:
+            return SeekedVideo(input_video, 0)
+        if input_video.set(cv2.CAP_PROP_POS_FRAMES, begin_frame):
+            position = int(input_video.get(cv2.CAP_PROP_POS_FRAMES))
+            if 0 <= position <= begin_frame:
+                return SeekedVideo(input_video, position)
+        # переход выполнен неправильно - читаем с начала файла
+        input_video.release()
+        return SeekedVideo(cv2.VideoCapture(source_filename), 0)
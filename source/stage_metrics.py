@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import bisect
+import json
+import os
+import threading
+import time
+import typing
+
+
+class StageHistogram:
+    """
+    Распределение времени выполнения одной стадии обработки (количество, сумма, наибольшее время
+    и количество попаданий в интервалы BUCKETS)
+    """
+
+    # верхние границы интервалов времени (в секундах)
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+    def __init__(self):
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+        # количество значений в каждом интервале (последний - больше наибольшей границы)
+        self.bucket_counts: typing.List[int] = [0] * (len(self.BUCKETS) + 1)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.bucket_counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        Оценка квантиля по интервалам (верхняя граница интервала, в который попадает квантиль)
+        """
+        if self.count == 0:
+            return 0.0
+        rank = quantile * self.count
+        accumulated = 0
+        for bucket_index, bucket_count in enumerate(self.bucket_counts):
+            accumulated += bucket_count
+            if accumulated >= rank:
+                return self.BUCKETS[bucket_index] if bucket_index < len(self.BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count > 0 else 0.0,
+            'max': self.max,
+            'p50': self.get_quantile(0.5),
+            'p95': self.get_quantile(0.95),
+            'buckets': {str(bound): count for bound, count in zip(self.BUCKETS + ('+Inf',), self.bucket_counts)},
+        }
+
+
+class StageMetrics:
+    """
+    Время стадий обработки (чтение, пропуск кадров, изменение размера, запись, распознавание, окна) и счетчики
+    (прочитано кадров, ошибок чтения, найдено людей, прочитано байт). Заполняется объединителем видео,
+    постобработчиками и распознавателем, может использоваться из нескольких потоков (конвейерная обработка).
+
+    В конце задачи (и, если задан интервал, периодически во время обработки) записывается отчет в JSON
+    и файл метрик для Prometheus (textfile collector node_exporter)
+    """
+
+    # стадии
+    STAGE_GRAB = 'grab'
+    STAGE_SKIP = 'skip'
+    STAGE_RETRIEVE = 'retrieve'
+    STAGE_SAMPLING = 'sampling'
+    STAGE_RESIZE = 'resize'
+    STAGE_ENCODE = 'encode'
+    STAGE_GUI = 'gui'
+    STAGE_POST_PROCESS = 'post_process'
+    STAGE_DETECTION_RESIZE = 'detection_resize'
+    STAGE_MOTION = 'motion'
+    STAGE_DETECTION = 'detection'
+    STAGE_DETECTION_OUTPUT = 'detection_output'
+
+    # счетчики
+    COUNTER_FRAMES_GRABBED = 'frames_grabbed'
+    COUNTER_FRAMES_KEPT = 'frames_kept'
+    COUNTER_GRAB_FAILURES = 'grab_failures'
+    COUNTER_RETRIEVE_FAILURES = 'retrieve_failures'
+    COUNTER_INPUT_FILES = 'input_files'
+    COUNTER_BYTES_READ = 'bytes_read'
+    COUNTER_DETECTION_FRAMES = 'detection_frames'
+    COUNTER_MOTION_SKIPPED_FRAMES = 'motion_skipped_frames'
+    COUNTER_DETECTED_FRAMES = 'detected_frames'
+    COUNTER_DETECTIONS = 'detections'
+    COUNTER_PREFETCH_HITS = 'prefetch_hits'
+    COUNTER_PREFETCH_PARTIAL = 'prefetch_partial'
+    COUNTER_PREFETCH_MISSES = 'prefetch_misses'
+    COUNTER_PREFETCHED_BYTES = 'prefetched_bytes'
+    COUNTER_DAMAGED_REGIONS = 'damaged_regions'
+
+    # префикс имен метрик Prometheus
+    PROMETHEUS_PREFIX = 'fastplay'
+
+    REPORT_VERSION = 1
+
+    def __init__(self, labels: typing.Optional[typing.Dict[str, str]] = None):
+        """
+        :param labels: метки всех метрик Prometheus (например, {'task': 'cam2'})
+        """
+        self._labels: typing.Dict[str, str] = dict(labels or {})
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._histograms: typing.Dict[str, StageHistogram] = {}
+        self._counters: typing.Dict[str, int] = {}
+        self._start_time = time.time()
+
+        # файлы отчетов (None - не записываются) и интервал периодической записи (0 - только в конце)
+        self._json_filename: typing.Optional[str] = None
+        self._prometheus_filename: typing.Optional[str] = None
+        self._flush_interval_seconds: float = 0.0
+        self._last_flush_time: float = time.monotonic()
+
+    def set_export(
+            self,
+            json_filename: typing.Optional[str],
+            prometheus_filename: typing.Optional[str],
+            flush_interval_seconds: float = 0.0
+    ):
+        """
+        Задать файлы отчетов
+        :param flush_interval_seconds: как часто записывать отчеты во время обработки (0 - только в flush)
+        """
+        assert flush_interval_seconds >= 0.0
+        self._json_filename = json_filename
+        self._prometheus_filename = prometheus_filename
+        self._flush_interval_seconds = float(flush_interval_seconds)
+
+    def add_time(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = StageHistogram()
+                self._histograms[stage] = histogram
+            histogram.observe(seconds)
+        self._flush_if_due()
+
+    def increment(self, counter: str, value: int = 1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def get_counter(self, counter: str) -> int:
+        with self._lock:
+            return self._counters.get(counter, 0)
+
+    def get_report(self) -> dict:
+        with self._lock:
+            return {
+                'version': self.REPORT_VERSION,
+                'labels': dict(self._labels),
+                'start_time': self._start_time,
+                'elapsed_seconds': time.time() - self._start_time,
+                'stages': {stage: histogram.to_dict() for stage, histogram in sorted(self._histograms.items())},
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+    def get_summary(self) -> str:
+        """
+        Краткая сводка для вывода в консоль: суммарное время стадий (по убыванию) и счетчики
+        """
+        report = self.get_report()
+        stages = sorted(report['stages'].items(), key=lambda item: item[1]['sum'], reverse=True)
+        lines = ['stage times:']
+        for stage, histogram in stages:
+            lines.append('    {0}: {1:.2f} s, count {2}, avg {3:.2f} ms, p95 <= {4:.1f} ms, max {5:.1f} ms'.format(
+                stage,
+                histogram['sum'],
+                histogram['count'],
+                histogram['avg'] * 1000.0,
+                histogram['p95'] * 1000.0,
+                histogram['max'] * 1000.0
+            ))
+        lines.append('counters: ' + ', '.join(
+            ['{0}={1}'.format(counter, value) for counter, value in report['counters'].items()]))
+        return '\n'.join(lines)
+
+    def get_prometheus_text(self) -> str:
+        """
+        Метрики в текстовом формате Prometheus
+        """
+        report = self.get_report()
+        prefix = self.PROMETHEUS_PREFIX
+        lines = [
+            '# HELP {0}_stage_seconds Time spent in processing stages.'.format(prefix),
+            '# TYPE {0}_stage_seconds histogram'.format(prefix),
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            for stage, histogram in histograms:
+                accumulated = 0
+                for bound, bucket_count in zip(StageHistogram.BUCKETS + ('+Inf',), histogram.bucket_counts):
+                    accumulated += bucket_count
+                    lines.append('{0}_stage_seconds_bucket{1} {2}'.format(
+                        prefix, self._format_labels(stage=stage, le=str(bound)), accumulated))
+                lines.append('{0}_stage_seconds_sum{1} {2}'.format(
+                    prefix, self._format_labels(stage=stage), repr(histogram.sum)))
+                lines.append('{0}_stage_seconds_count{1} {2}'.format(
+                    prefix, self._format_labels(stage=stage), histogram.count))
+        for counter, value in report['counters'].items():
+            lines.append('# TYPE {0}_{1}_total counter'.format(prefix, counter))
+            lines.append('{0}_{1}_total{2} {3}'.format(prefix, counter, self._format_labels(), value))
+        lines.append('# TYPE {0}_elapsed_seconds gauge'.format(prefix))
+        lines.append('{0}_elapsed_seconds{1} {2}'.format(
+            prefix, self._format_labels(), repr(report['elapsed_seconds'])))
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """
+        Записать отчеты в заданные файлы
+        """
+        with self._flush_lock:
+            self._last_flush_time = time.monotonic()
+            if self._json_filename is not None:
+                self._write_atomic(self._json_filename, json.dumps(self.get_report(), indent=2))
+            if self._prometheus_filename is not None:
+                self._write_atomic(self._prometheus_filename, self.get_prometheus_text())
+
+    def _flush_if_due(self):
+        if self._flush_interval_seconds <= 0.0:
+            return
+        if time.monotonic() - self._last_flush_time < self._flush_interval_seconds:
+            return
+        # отчеты записывает только один поток, остальные продолжают обработку
+        if self._flush_lock.locked():
+            return
+        self.flush()
+
+    def _format_labels(self, **labels: str) -> str:
+        all_labels = dict(self._labels)
+        all_labels.update(labels)
+        if len(all_labels) == 0:
+            return ''
+        return '{' + ','.join(['{0}="{1}"'.format(name, self._escape_label_value(value))
+                               for name, value in all_labels.items()]) + '}'
+
+    @staticmethod
+    def _escape_label_value(value: str) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @staticmethod
+    def _write_atomic(filename: str, text: str):
+        # пишем во временный файл и переименовываем: сборщик метрик не должен прочитать недописанный файл
+        temp_filename = '{0}.{1}.tmp'.format(filename, os.getpid())
+        with open(temp_filename, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temp_filename, filename)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from typing import List
+
+from source.utils.frozen import Frozen
+
+
+class CameraSettings(Frozen):
+    """
+    Камера задачи мозаики (см. TaskDescription.cameras): подпись на мозаике и входные файлы камеры
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._name: str = ''
+        self._input_files: List[str] = []
+        self.freeze()
+
+    @property
+    def name(self) -> str:
+        """
+        Подпись камеры на мозаике
+        """
+        return self._name
+
+    @name.setter
+    def name(self, value: str):
+        assert isinstance(value, str)
+        self._name = value
+
+    @property
+    def input_files(self) -> List[str]:
+        """
+        Входные файлы камеры (время начала записи каждого файла определяется по имени файла)
+        """
+        return self._input_files
+
+    @input_files.setter
+    def input_files(self, value: List[str]):
+        assert isinstance(value, list)
+        assert all([isinstance(name, str) for name in value])
+        self._input_files = value
+
+    def __str__(self):
+        return f'{self._name} (входных файлов: {len(self._input_files)})'
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from source.utils.frozen import Frozen
+
+
+class DnnDetectorSettings(Frozen):
+    """
+    Настройки поиска людей нейронной сетью (см. DnnPersonDetectorBackend).
+    Значения по умолчанию подходят для MobileNet-SSD (Caffe, классы VOC)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._model_filename: str = ''
+        self._config_filename: str = ''
+        self._input_width: int = 300
+        self._input_height: int = 300
+        self._threads_count: int = 0
+        self._batch_size: int = 4
+        self._person_class_id: int = 15
+        self._confidence_threshold: float = 0.5
+        self._scale: float = 0.007843
+        self._mean: float = 127.5
+        self._swap_rb: bool = False
+        self.freeze()
+
+    @property
+    def model_filename(self) -> str:
+        return self._model_filename
+
+    @model_filename.setter
+    def model_filename(self, value: str):
+        assert isinstance(value, str)
+        self._model_filename = value
+
+    @property
+    def config_filename(self) -> str:
+        return self._config_filename
+
+    @config_filename.setter
+    def config_filename(self, value: str):
+        assert isinstance(value, str)
+        self._config_filename = value
+
+    @property
+    def input_width(self) -> int:
+        return self._input_width
+
+    @input_width.setter
+    def input_width(self, value: int):
+        assert isinstance(value, int)
+        assert value > 0
+        self._input_width = value
+
+    @property
+    def input_height(self) -> int:
+        return self._input_height
+
+    @input_height.setter
+    def input_height(self, value: int):
+        assert isinstance(value, int)
+        assert value > 0
+        self._input_height = value
+
+    @property
+    def threads_count(self) -> int:
+        """
+        Количество потоков OpenCV (0 - по умолчанию)
+        """
+        return self._threads_count
+
+    @threads_count.setter
+    def threads_count(self, value: int):
+        assert isinstance(value, int)
+        assert value >= 0
+        self._threads_count = value
+
+    @property
+    def batch_size(self) -> int:
+        """
+        Сколько изображений распознавать за один проход сети
+        """
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, value: int):
+        assert isinstance(value, int)
+        assert value > 0
+        self._batch_size = value
+
+    @property
+    def person_class_id(self) -> int:
+        return self._person_class_id
+
+    @person_class_id.setter
+    def person_class_id(self, value: int):
+        assert isinstance(value, int)
+        self._person_class_id = value
+
+    @property
+    def confidence_threshold(self) -> float:
+        return self._confidence_threshold
+
+    @confidence_threshold.setter
+    def confidence_threshold(self, value: float):
+        assert isinstance(value, (int, float))
+        self._confidence_threshold = float(value)
+
+    @property
+    def scale(self) -> float:
+        return self._scale
+
+    @scale.setter
+    def scale(self, value: float):
+        assert isinstance(value, (int, float))
+        self._scale = float(value)
+
+    @property
+    def mean(self) -> float:
+        return self._mean
+
+    @mean.setter
+    def mean(self, value: float):
+        assert isinstance(value, (int, float))
+        self._mean = float(value)
+
+    @property
+    def swap_rb(self) -> bool:
+        return self._swap_rb
+
+    @swap_rb.setter
+    def swap_rb(self, value: bool):
+        assert isinstance(value, bool)
+        self._swap_rb = value
+
+    def __str__(self):
+        return \
+            f'model "{self._model_filename}", config "{self._config_filename}", ' \
+            f'input {self._input_width}x{self._input_height}, threads {self._threads_count}, ' \
+            f'batch {self._batch_size}, person class {self._person_class_id}, ' \
+            f'threshold {self._confidence_threshold}'
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import typing
+
+from source.utils.frozen import Frozen
+
+
+class FfmpegEncoderSettings(Frozen):
+    """
+    Настройки кодирования выходных видео через ffmpeg (см. FfmpegVideoWriter)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._codec: str = 'libx264'
+        self._preset: typing.Optional[str] = 'veryfast'
+        self._crf: typing.Optional[int] = 23
+        self._threads_count: int = 0
+        self._pix_fmt: str = 'yuv420p'
+        self.freeze()
+
+    @property
+    def codec(self) -> str:
+        """
+        Кодек ffmpeg (libx264, libx265, h264_nvenc, mpeg4 и т.д.)
+        """
+        return self._codec
+
+    @codec.setter
+    def codec(self, value: str):
+        assert isinstance(value, str)
+        assert len(value) > 0
+        self._codec = value
+
+    @property
+    def preset(self) -> typing.Optional[str]:
+        """
+        Preset кодека (для libx264: ultrafast, superfast, veryfast, faster, fast, medium и т.д.),
+        None - не задается (для кодеков без preset)
+        """
+        return self._preset
+
+    @preset.setter
+    def preset(self, value: typing.Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._preset = value
+
+    @property
+    def crf(self) -> typing.Optional[int]:
+        """
+        Качество (constant rate factor, меньше - лучше и больше файл), None - не задается
+        """
+        return self._crf
+
+    @crf.setter
+    def crf(self, value: typing.Optional[int]):
+        assert isinstance(value, int) or value is None
+        assert value is None or value >= 0
+        self._crf = value
+
+    @property
+    def threads_count(self) -> int:
+        """
+        Количество потоков кодирования (0 - выбирает ffmpeg)
+        """
+        return self._threads_count
+
+    @threads_count.setter
+    def threads_count(self, value: int):
+        assert isinstance(value, int)
+        assert value >= 0
+        self._threads_count = value
+
+    @property
+    def pix_fmt(self) -> str:
+        return self._pix_fmt
+
+    @pix_fmt.setter
+    def pix_fmt(self, value: str):
+        assert isinstance(value, str)
+        self._pix_fmt = value
+
+    def __str__(self):
+        return f'codec {self._codec}, preset {self._preset}, crf {self._crf}, threads {self._threads_count}, ' \
+               f'pix_fmt {self._pix_fmt}'
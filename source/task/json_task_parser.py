@@ -5,6 +5,10 @@ import json
 import os.path
 import typing
 
+from source.filename_timestamp_parser import FilenameTimestampParser
+from source.task.camera_settings import CameraSettings
+from source.task.dnn_detector_settings import DnnDetectorSettings
+from source.task.ffmpeg_encoder_settings import FfmpegEncoderSettings
 from source.task.task_description import TaskDescription
 from source.video_files_searcher import VideoFilesSearcher
 
@@ -18,13 +22,18 @@ class JsonTaskParserException(Exception):
 
 
 class JsonTaskParser:
-    def __init__(self):
-        pass
+    def __init__(self, verbose: bool = True, search_reference_date: typing.Optional[datetime.datetime] = None):
+        """
+        :param verbose: выводить настройки поисковиков и найденные файлы
+        :param search_reference_date: точка отсчета времени для всех поисковиков видео вместо reference_date
+         задач (используется при наблюдении за каталогами, см. TaskWatcher)
+        """
+        assert isinstance(search_reference_date, datetime.datetime) or search_reference_date is None
+        self._verbose = verbose
+        self._search_reference_date = search_reference_date
 
     def tasks_from_json(self, text: str) -> typing.List[TaskDescription]:
-        text = self._delete_comments(text)
-        root_json_dict = json.loads(text)
-        tasks = root_json_dict['tasks']
+        tasks = self.task_dicts_from_json(text)
         tasks_description = []
         for task in tasks:
             task_description = self.task_from_dict(task)
@@ -32,14 +41,30 @@ class JsonTaskParser:
                 tasks_description.append(task_description)
         return tasks_description
 
+    def task_dicts_from_json(self, text: str) -> typing.List[dict]:
+        """
+        Словари задач файла настроек (без разбора, комментарии удаляются)
+        """
+        text = self._delete_comments(text)
+        root_json_dict = json.loads(text)
+        return root_json_dict['tasks']
+
     def task_from_dict(self, task_dict: dict) -> typing.Optional[TaskDescription]:
         assert isinstance(task_dict, dict)
         object_type = task_dict.get('type')
-        if object_type != 'process_video_task':
-            raise JsonTaskParserException(f'Ожидался тип process_video_task, получен "{object_type}"')
+        if object_type not in (TaskDescription.TASK_TYPE_PROCESS_VIDEO, TaskDescription.TASK_TYPE_MOSAIC_VIDEO):
+            raise JsonTaskParserException(
+                f'Ожидался тип process_video_task или mosaic_video_task, получен "{object_type}"')
 
         task = TaskDescription()
-        task.input_files = self._get_input_files(task_dict)
+        task.task_type = object_type
+        if object_type == TaskDescription.TASK_TYPE_MOSAIC_VIDEO:
+            task.cameras = self._get_cameras(task_dict)
+            task.input_files = [file for camera in task.cameras for file in camera.input_files]
+            task.mosaic_step_seconds = task_dict.get('mosaic_step_seconds', task.mosaic_step_seconds)
+            task.mosaic_columns = task_dict.get('mosaic_columns', task.mosaic_columns)
+        else:
+            task.input_files = self._get_input_files(task_dict)
         try:
             task.output_concatenation_filename = task_dict['output_concatenation_filename']
         except KeyError:
@@ -50,9 +75,106 @@ class JsonTaskParser:
         task.output_video_width = task_dict.get('output_video_width', task.output_video_width)
         task.output_video_height = task_dict.get('output_video_height', task.output_video_height)
         task.skipped_frames_count = task_dict.get('skipped_frames_count', task.skipped_frames_count)
+        task.pipeline_queue_size = task_dict.get('pipeline_queue_size', task.pipeline_queue_size)
+        task.prefetch_files = task_dict.get('prefetch_files', task.prefetch_files)
+        task.prefetch_budget_mb = task_dict.get('prefetch_budget_mb', task.prefetch_budget_mb)
+        task.keyframe_seek = task_dict.get('keyframe_seek', task.keyframe_seek)
+        task.stream_resync = task_dict.get('stream_resync', task.stream_resync)
+        task.keyframe_index_dir = task_dict.get('keyframe_index_dir', task.keyframe_index_dir)
+        task.keyframe_remux = task_dict.get('keyframe_remux', task.keyframe_remux)
+        task.ffmpeg_path = task_dict.get('ffmpeg_path', task.ffmpeg_path)
+        task.motion_gate = task_dict.get('motion_gate', task.motion_gate)
+        task.motion_threshold = task_dict.get('motion_threshold', task.motion_threshold)
+        task.motion_min_area = task_dict.get('motion_min_area', task.motion_min_area)
+        task.motion_regions_only = task_dict.get('motion_regions_only', task.motion_regions_only)
+        task.archive_catalog_dir = task_dict.get('archive_catalog_dir', task.archive_catalog_dir)
+        task.checkpoint_dir = task_dict.get('checkpoint_dir', task.checkpoint_dir)
+        task.segment_cache_dir = task_dict.get('segment_cache_dir', task.segment_cache_dir)
+        task.segment_cache_days = task_dict.get('segment_cache_days', task.segment_cache_days)
+        task.storage_device = task_dict.get('storage_device', task.storage_device)
+        task.detector_backend = task_dict.get('detector_backend', task.detector_backend)
+        if task.detector_backend == TaskDescription.DETECTOR_BACKEND_DNN:
+            task.dnn_detector_settings = self._get_dnn_detector_settings(task_dict)
+        task.output_detection_events_filename = task_dict.get(
+            'output_detection_events_filename', task.output_detection_events_filename)
+        task.filename_timestamp_format = task_dict.get('filename_timestamp_format', task.filename_timestamp_format)
+        try:
+            FilenameTimestampParser(task.filename_timestamp_format)
+        except ValueError as error:
+            raise JsonTaskParserException(str(error))
+        task.output_event_clips_dir = task_dict.get('output_event_clips_dir', task.output_event_clips_dir)
+        task.event_max_gap_seconds = task_dict.get('event_max_gap_seconds', task.event_max_gap_seconds)
+        task.event_padding_seconds = task_dict.get('event_padding_seconds', task.event_padding_seconds)
+        task.adaptive_sampling = task_dict.get('adaptive_sampling', task.adaptive_sampling)
+        task.target_output_minutes = task_dict.get('target_output_minutes', task.target_output_minutes)
+        task.adaptive_sampling_range = task_dict.get('adaptive_sampling_range', task.adaptive_sampling_range)
+        task.write_output_frame_index = task_dict.get('write_output_frame_index', task.write_output_frame_index)
+        task.output_metrics_filename = task_dict.get('output_metrics_filename', task.output_metrics_filename)
+        task.output_prometheus_filename = task_dict.get('output_prometheus_filename', task.output_prometheus_filename)
+        task.metrics_flush_interval_seconds = task_dict.get(
+            'metrics_flush_interval_seconds', task.metrics_flush_interval_seconds)
+        task.video_writer_backend = task_dict.get('video_writer_backend', task.video_writer_backend)
+        if task.video_writer_backend == TaskDescription.VIDEO_WRITER_BACKEND_FFMPEG:
+            task.ffmpeg_encoder_settings = self._get_ffmpeg_encoder_settings(task_dict)
+        if task.output_event_clips_dir is not None and task.output_detection_events_filename is None:
+            raise JsonTaskParserException(
+                'Для output_event_clips_dir нужно задать журнал найденных людей output_detection_events_filename')
 
         return task
 
+    @staticmethod
+    def _get_dnn_detector_settings(task_dict: dict) -> DnnDetectorSettings:
+        dnn_detector = task_dict.get('dnn_detector')
+        if not isinstance(dnn_detector, dict):
+            raise JsonTaskParserException('Для detector_backend "dnn" нужно задать словарь dnn_detector')
+        settings = DnnDetectorSettings()
+        try:
+            settings.model_filename = dnn_detector['model_filename']
+        except KeyError:
+            raise JsonTaskParserException('Не задан параметр dnn_detector.model_filename')
+        if not os.path.isfile(settings.model_filename):
+            raise JsonTaskParserException('Не найден файл модели: "{0}"'.format(settings.model_filename))
+        settings.config_filename = dnn_detector.get('config_filename', settings.config_filename)
+        settings.input_width = dnn_detector.get('input_width', settings.input_width)
+        settings.input_height = dnn_detector.get('input_height', settings.input_height)
+        settings.threads_count = dnn_detector.get('threads_count', settings.threads_count)
+        settings.batch_size = dnn_detector.get('batch_size', settings.batch_size)
+        settings.person_class_id = dnn_detector.get('person_class_id', settings.person_class_id)
+        settings.confidence_threshold = dnn_detector.get('confidence_threshold', settings.confidence_threshold)
+        settings.scale = dnn_detector.get('scale', settings.scale)
+        settings.mean = dnn_detector.get('mean', settings.mean)
+        settings.swap_rb = dnn_detector.get('swap_rb', settings.swap_rb)
+        return settings
+
+    @staticmethod
+    def _get_ffmpeg_encoder_settings(task_dict: dict) -> FfmpegEncoderSettings:
+        ffmpeg_encoder = task_dict.get('ffmpeg_encoder', {})
+        if not isinstance(ffmpeg_encoder, dict):
+            raise JsonTaskParserException('ffmpeg_encoder должен иметь тип словарь')
+        settings = FfmpegEncoderSettings()
+        settings.codec = ffmpeg_encoder.get('codec', settings.codec)
+        settings.preset = ffmpeg_encoder.get('preset', settings.preset)
+        settings.crf = ffmpeg_encoder.get('crf', settings.crf)
+        settings.threads_count = ffmpeg_encoder.get('threads_count', settings.threads_count)
+        settings.pix_fmt = ffmpeg_encoder.get('pix_fmt', settings.pix_fmt)
+        return settings
+
+    def _get_cameras(self, task_dict: dict) -> typing.List[CameraSettings]:
+        cameras_list = task_dict.get('cameras')
+        if not isinstance(cameras_list, list) or len(cameras_list) == 0:
+            raise JsonTaskParserException('Для mosaic_video_task нужно задать список камер cameras')
+        cameras = []
+        for camera_number, camera_dict in enumerate(cameras_list):
+            if not isinstance(camera_dict, dict):
+                raise JsonTaskParserException('Камера в cameras должна иметь тип словарь')
+            camera = CameraSettings()
+            camera.name = camera_dict.get('name', 'cam{0}'.format(camera_number + 1))
+            # входные файлы камеры задаются так же, как у process_video_task (списком или поисковиком)
+            camera.input_files = self._get_input_files(
+                {'archive_catalog_dir': task_dict.get('archive_catalog_dir'), **camera_dict})
+            cameras.append(camera)
+        return cameras
+
     def _get_input_files(self, task_dict: dict) -> typing.List[str]:
         input_files = task_dict.get('input_files')
         video_searcher = task_dict.get('video_searcher')
@@ -62,7 +184,8 @@ class JsonTaskParser:
                     raise JsonTaskParserException('Ошибка. Входные файлы должны быть строками')
                 if not os.path.isfile(input_file):
                     raise JsonTaskParserException('Не является файлом: "{0}"'.format(input_file))
-            print('Использован список входных файлов')
+            if self._verbose:
+                print('Использован список входных файлов')
             input_files = input_files
         else:
             if video_searcher is None:
@@ -79,14 +202,20 @@ class JsonTaskParser:
             searcher.suffix_pattern = video_searcher.get('suffix_pattern', '')
             searcher.strftime_pattern = video_searcher['strftime_pattern']
             reference_date_str: typing.Optional[str] = video_searcher.get('reference_date', None)
-            if reference_date_str is None:
+            if self._search_reference_date is not None:
+                searcher.reference_date = self._search_reference_date
+            elif reference_date_str is None:
                 searcher.reference_date = None
             else:
                 searcher.reference_date = datetime.datetime.strptime(reference_date_str, '%Y-%m-%d %H:%M')
                 print('Дата начала отсчета: {0}'.format(searcher.reference_date))
             searcher.reference_date_delta_hours = video_searcher['reference_date_delta_hours']
             searcher.reference_date_delta_minutes = video_searcher['reference_date_delta_minutes']
+            searcher.single_scan = video_searcher.get('single_scan', False)
+            searcher.archive_catalog_dir = task_dict.get('archive_catalog_dir')
             input_files = searcher.search_video_files(video_searcher['dir'])
+            if not self._verbose:
+                return input_files
             print('Заданы настройки поисковика:')
             print(searcher)
             print(f'Поисковик нашел следующие видео ({len(input_files)}) по критериям:')
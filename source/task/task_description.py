@@ -1,14 +1,26 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import datetime
+import os
 import pathlib
+import tempfile
 from pathlib import Path
 from typing import Optional, List
 
+from source.task.camera_settings import CameraSettings
+from source.task.dnn_detector_settings import DnnDetectorSettings
+from source.task.ffmpeg_encoder_settings import FfmpegEncoderSettings
 from source.utils.frozen import Frozen
 
 
 class TaskDescription(Frozen):
+    DETECTOR_BACKEND_HOG = 'hog'
+    DETECTOR_BACKEND_DNN = 'dnn'
+    VIDEO_WRITER_BACKEND_OPENCV = 'opencv'
+    VIDEO_WRITER_BACKEND_FFMPEG = 'ffmpeg'
+    TASK_TYPE_PROCESS_VIDEO = 'process_video_task'
+    TASK_TYPE_MOSAIC_VIDEO = 'mosaic_video_task'
+
     def __init__(self):
         super().__init__()
         self._input_files: List[str] = []
@@ -19,6 +31,43 @@ class TaskDescription(Frozen):
         self._output_video_width: int = 960
         self._output_video_height: int = 540
         self._skipped_frames_count: int = 110
+        self._pipeline_queue_size: int = 0
+        self._prefetch_files: int = 1
+        self._prefetch_budget_mb: int = 512
+        self._keyframe_seek: bool = False
+        self._stream_resync: bool = False
+        self._keyframe_index_dir: Optional[str] = None
+        self._keyframe_remux: bool = False
+        self._ffmpeg_path: str = 'ffmpeg'
+        self._motion_gate: bool = False
+        self._motion_threshold: int = 25
+        self._motion_min_area: float = 0.002
+        self._motion_regions_only: bool = True
+        self._archive_catalog_dir: Optional[str] = None
+        self._checkpoint_dir: Optional[str] = None
+        self._segment_cache_dir: Optional[str] = None
+        self._segment_cache_days: float = 30.0
+        self._storage_device: Optional[str] = None
+        self._detector_backend: str = self.DETECTOR_BACKEND_HOG
+        self._dnn_detector_settings: DnnDetectorSettings = DnnDetectorSettings()
+        self._output_detection_events_filename: Optional[str] = None
+        self._filename_timestamp_format: str = '%Y%m%d%H%M%S'
+        self._output_event_clips_dir: Optional[str] = None
+        self._event_max_gap_seconds: float = 10.0
+        self._event_padding_seconds: float = 3.0
+        self._adaptive_sampling: bool = False
+        self._target_output_minutes: float = 0.0
+        self._adaptive_sampling_range: float = 4.0
+        self._write_output_frame_index: bool = True
+        self._output_metrics_filename: Optional[str] = None
+        self._output_prometheus_filename: Optional[str] = None
+        self._metrics_flush_interval_seconds: float = 0.0
+        self._video_writer_backend: str = self.VIDEO_WRITER_BACKEND_OPENCV
+        self._ffmpeg_encoder_settings: FfmpegEncoderSettings = FfmpegEncoderSettings()
+        self._task_type: str = self.TASK_TYPE_PROCESS_VIDEO
+        self._cameras: List[CameraSettings] = []
+        self._mosaic_step_seconds: float = 4.0
+        self._mosaic_columns: int = 0
         self.freeze()
 
     @property
@@ -76,6 +125,477 @@ class TaskDescription(Frozen):
         assert isinstance(value, int)
         self._skipped_frames_count = value
 
+    @property
+    def pipeline_queue_size(self) -> int:
+        """
+        Размер очередей между стадиями конвейера обработки (чтение, запись, распознавание).
+        0 - все стадии выполняются последовательно в одном потоке
+        """
+        return self._pipeline_queue_size
+
+    @pipeline_queue_size.setter
+    def pipeline_queue_size(self, value: int):
+        assert isinstance(value, int)
+        assert value >= 0
+        self._pipeline_queue_size = value
+
+    @property
+    def prefetch_files(self) -> int:
+        """
+        Сколько следующих входных файлов читать заранее, пока декодируется текущий (см. FilePrefetcher).
+        0 - не читать заранее
+        """
+        return self._prefetch_files
+
+    @prefetch_files.setter
+    def prefetch_files(self, value: int):
+        assert isinstance(value, int)
+        assert value >= 0
+        self._prefetch_files = value
+
+    @property
+    def prefetch_budget_mb(self) -> int:
+        """
+        Сколько мегабайт всего читать заранее (от начала следующих файлов)
+        """
+        return self._prefetch_budget_mb
+
+    @prefetch_budget_mb.setter
+    def prefetch_budget_mb(self, value: int):
+        assert isinstance(value, int)
+        assert value > 0
+        self._prefetch_budget_mb = value
+
+    @property
+    def keyframe_seek(self) -> bool:
+        """
+        Читать из "сырых" файлов H.264 только ключевые кадры (по индексу ключевых кадров),
+        вместо декодирования всех кадров подряд. Кадр для выходного видео берется на ближайшем
+        ключевом кадре, поэтому шаг между кадрами выдерживается только в среднем
+        """
+        return self._keyframe_seek
+
+    @keyframe_seek.setter
+    def keyframe_seek(self, value: bool):
+        assert isinstance(value, bool)
+        self._keyframe_seek = value
+
+    @property
+    def stream_resync(self) -> bool:
+        """
+        Для "сырых" файлов H.264 использовать индекс потока (см. H264StreamScanner) при декодировании всех кадров:
+        конец файла определяется по количеству кадров потока, а после начала файла и после поврежденных
+        участков кадры пропускаются только до ближайшего ключевого кадра
+        """
+        return self._stream_resync
+
+    @stream_resync.setter
+    def stream_resync(self, value: bool):
+        assert isinstance(value, bool)
+        self._stream_resync = value
+
+    @property
+    def keyframe_index_dir(self) -> Optional[str]:
+        """
+        Каталог для хранения индексов ключевых кадров (None - каталог во временной папке пользователя)
+        """
+        return self._keyframe_index_dir
+
+    @keyframe_index_dir.setter
+    def keyframe_index_dir(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._keyframe_index_dir = value
+
+    @property
+    def keyframe_remux(self) -> bool:
+        """
+        Собирать видео объединения из ключевых кадров исходных файлов без декодирования и перекодирования
+        (с помощью ffmpeg). Разрешение выходного видео равно разрешению исходного. Если у файлов отличаются
+        параметры кодирования, или ffmpeg недоступен, видео собирается обычным способом (с декодированием)
+        """
+        return self._keyframe_remux
+
+    @keyframe_remux.setter
+    def keyframe_remux(self, value: bool):
+        assert isinstance(value, bool)
+        self._keyframe_remux = value
+
+    @property
+    def ffmpeg_path(self) -> str:
+        return self._ffmpeg_path
+
+    @ffmpeg_path.setter
+    def ffmpeg_path(self, value: str):
+        assert isinstance(value, str)
+        self._ffmpeg_path = value
+
+    @property
+    def motion_gate(self) -> bool:
+        """
+        Искать людей только на кадрах, где есть движение (по сравнению с фоном)
+        """
+        return self._motion_gate
+
+    @motion_gate.setter
+    def motion_gate(self, value: bool):
+        assert isinstance(value, bool)
+        self._motion_gate = value
+
+    @property
+    def motion_threshold(self) -> int:
+        """
+        Чувствительность поиска движения: на сколько (0..255) яркость должна отличаться от фона
+        """
+        return self._motion_threshold
+
+    @motion_threshold.setter
+    def motion_threshold(self, value: int):
+        assert isinstance(value, int)
+        self._motion_threshold = value
+
+    @property
+    def motion_min_area(self) -> float:
+        """
+        Минимальная доля площади кадра, которую должна занимать область движения
+        """
+        return self._motion_min_area
+
+    @motion_min_area.setter
+    def motion_min_area(self, value: float):
+        assert isinstance(value, (int, float))
+        self._motion_min_area = float(value)
+
+    @property
+    def motion_regions_only(self) -> bool:
+        """
+        Искать людей только в областях движения (иначе во всем кадре, если в нем есть движение)
+        """
+        return self._motion_regions_only
+
+    @motion_regions_only.setter
+    def motion_regions_only(self, value: bool):
+        assert isinstance(value, bool)
+        self._motion_regions_only = value
+
+    @property
+    def archive_catalog_dir(self) -> Optional[str]:
+        """
+        Каталог с базой видеоархива (см. ArchiveCatalog): списки файлов, сведения о файлах и индексы
+        ключевых кадров. None - база не используется
+        """
+        return self._archive_catalog_dir
+
+    @archive_catalog_dir.setter
+    def archive_catalog_dir(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._archive_catalog_dir = value
+
+    @property
+    def checkpoint_dir(self) -> Optional[str]:
+        """
+        Каталог для сегментов и состояния обработки (см. TaskCheckpoint). Если задан, то каждый входной файл
+        обрабатывается в свой сегмент, и повторный запуск задачи после сбоя продолжает обработку
+        с необработанных файлов. None - выходные файлы пишутся сразу, без контрольных точек
+        """
+        return self._checkpoint_dir
+
+    @checkpoint_dir.setter
+    def checkpoint_dir(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._checkpoint_dir = value
+
+    @property
+    def segment_cache_dir(self) -> Optional[str]:
+        """
+        Каталог кэша сегментов (см. SegmentCache). Если задан, то сегменты входных файлов сохраняются после склейки
+        и используются всеми задачами с теми же параметрами обработки, поэтому повторная обработка файла
+        (перекрывающиеся интервалы поиска, повторный запуск) сводится к склейке. Используется вместо checkpoint_dir.
+        None - кэш не используется
+        """
+        return self._segment_cache_dir
+
+    @segment_cache_dir.setter
+    def segment_cache_dir(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._segment_cache_dir = value
+
+    @property
+    def segment_cache_days(self) -> float:
+        """
+        Через сколько дней без использования сегменты удаляются из кэша (0 - не удаляются)
+        """
+        return self._segment_cache_days
+
+    @segment_cache_days.setter
+    def segment_cache_days(self, value: float):
+        assert isinstance(value, (int, float))
+        assert value >= 0
+        self._segment_cache_days = float(value)
+
+    @property
+    def storage_device(self) -> Optional[str]:
+        """
+        Имя диска входных файлов для параллельного выполнения задач (см. TaskScheduler): задачи с одного диска
+        не читают его одновременно. None - диск определяется по входным файлам
+        """
+        return self._storage_device
+
+    @storage_device.setter
+    def storage_device(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._storage_device = value
+
+    @property
+    def detector_backend(self) -> str:
+        """
+        Способ поиска людей: hog (гистограммы направленных градиентов) или dnn (нейронная сеть,
+        настройки в dnn_detector_settings)
+        """
+        return self._detector_backend
+
+    @detector_backend.setter
+    def detector_backend(self, value: str):
+        assert value in (self.DETECTOR_BACKEND_HOG, self.DETECTOR_BACKEND_DNN)
+        self._detector_backend = value
+
+    @property
+    def dnn_detector_settings(self) -> DnnDetectorSettings:
+        return self._dnn_detector_settings
+
+    @dnn_detector_settings.setter
+    def dnn_detector_settings(self, value: DnnDetectorSettings):
+        assert isinstance(value, DnnDetectorSettings)
+        self._dnn_detector_settings = value
+
+    @property
+    def output_detection_events_filename(self) -> Optional[str]:
+        """
+        Журнал найденных людей (база SQLite, см. DetectionEventLog). Записи добавляются в тот же файл
+        при каждом запуске, поэтому дата к имени файла не добавляется. None - журнал не ведется
+        """
+        return self._output_detection_events_filename
+
+    @output_detection_events_filename.setter
+    def output_detection_events_filename(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._output_detection_events_filename = value
+
+    @property
+    def filename_timestamp_format(self) -> str:
+        """
+        Шаблон strftime времени начала записи в имени входного файла (для времени найденных людей в журнале)
+        """
+        return self._filename_timestamp_format
+
+    @filename_timestamp_format.setter
+    def filename_timestamp_format(self, value: str):
+        assert isinstance(value, str)
+        self._filename_timestamp_format = value
+
+    @property
+    def output_event_clips_dir(self) -> Optional[str]:
+        """
+        Каталог для отрывков исходных файлов с событиями (см. EventClipExtractor). События собираются
+        из журнала найденных людей, поэтому нужен output_detection_events_filename. None - отрывки не пишутся
+        """
+        return self._output_event_clips_dir
+
+    @output_event_clips_dir.setter
+    def output_event_clips_dir(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._output_event_clips_dir = value
+
+    @property
+    def event_max_gap_seconds(self) -> float:
+        """
+        Наибольший промежуток (в секундах) между найденными людьми, при котором они относятся к одному событию
+        """
+        return self._event_max_gap_seconds
+
+    @event_max_gap_seconds.setter
+    def event_max_gap_seconds(self, value: float):
+        assert isinstance(value, (int, float)) and value >= 0
+        self._event_max_gap_seconds = float(value)
+
+    @property
+    def event_padding_seconds(self) -> float:
+        """
+        Запас (в секундах) до первого и после последнего найденного человека в отрывке события
+        """
+        return self._event_padding_seconds
+
+    @event_padding_seconds.setter
+    def event_padding_seconds(self, value: float):
+        assert isinstance(value, (int, float)) and value >= 0
+        self._event_padding_seconds = float(value)
+
+    @property
+    def adaptive_sampling(self) -> bool:
+        """
+        Адаптивное прореживание кадров (см. AdaptiveFrameSampler): в статичные периоды кадры пропускаются чаще,
+        при активности - реже. Не используется при чтении только ключевых кадров
+        """
+        return self._adaptive_sampling
+
+    @adaptive_sampling.setter
+    def adaptive_sampling(self, value: bool):
+        assert isinstance(value, bool)
+        self._adaptive_sampling = value
+
+    @property
+    def target_output_minutes(self) -> float:
+        """
+        Желаемая длина видео объединения в минутах при адаптивном прореживании (средний шаг вычисляется
+        по количеству кадров входных файлов). 0 - средний шаг задается skipped_frames_count
+        """
+        return self._target_output_minutes
+
+    @target_output_minutes.setter
+    def target_output_minutes(self, value: float):
+        assert isinstance(value, (int, float)) and value >= 0
+        self._target_output_minutes = float(value)
+
+    @property
+    def adaptive_sampling_range(self) -> float:
+        """
+        Во сколько раз шаг между кадрами может отличаться от среднего в каждую сторону
+        """
+        return self._adaptive_sampling_range
+
+    @adaptive_sampling_range.setter
+    def adaptive_sampling_range(self, value: float):
+        assert isinstance(value, (int, float)) and value >= 1
+        self._adaptive_sampling_range = float(value)
+
+    @property
+    def write_output_frame_index(self) -> bool:
+        """
+        Записывать рядом с выходными видеофайлами индекс кадров (см. OutputFrameIndex): из какого исходного файла,
+        кадра и времени получен каждый кадр выходного видео
+        """
+        return self._write_output_frame_index
+
+    @write_output_frame_index.setter
+    def write_output_frame_index(self, value: bool):
+        assert isinstance(value, bool)
+        self._write_output_frame_index = value
+
+    @property
+    def output_metrics_filename(self) -> Optional[str]:
+        """
+        Отчет о времени стадий обработки и счетчиках кадров в JSON (см. StageMetrics), None - не записывается
+        """
+        return self._output_metrics_filename
+
+    @output_metrics_filename.setter
+    def output_metrics_filename(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._output_metrics_filename = value
+
+    @property
+    def output_prometheus_filename(self) -> Optional[str]:
+        """
+        Файл метрик в текстовом формате Prometheus (для textfile collector node_exporter), None - не записывается
+        """
+        return self._output_prometheus_filename
+
+    @output_prometheus_filename.setter
+    def output_prometheus_filename(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._output_prometheus_filename = value
+
+    @property
+    def metrics_flush_interval_seconds(self) -> float:
+        """
+        Как часто (в секундах) записывать отчеты о времени стадий во время обработки, 0 - только в конце задачи
+        """
+        return self._metrics_flush_interval_seconds
+
+    @metrics_flush_interval_seconds.setter
+    def metrics_flush_interval_seconds(self, value: float):
+        assert isinstance(value, (int, float)) and value >= 0
+        self._metrics_flush_interval_seconds = float(value)
+
+    @property
+    def video_writer_backend(self) -> str:
+        """
+        Способ записи выходных видео: opencv (cv2.VideoWriter) или ffmpeg (кодирование в процессе ffmpeg
+        с настройками ffmpeg_encoder_settings, см. FfmpegVideoWriter)
+        """
+        return self._video_writer_backend
+
+    @video_writer_backend.setter
+    def video_writer_backend(self, value: str):
+        assert value in (self.VIDEO_WRITER_BACKEND_OPENCV, self.VIDEO_WRITER_BACKEND_FFMPEG)
+        self._video_writer_backend = value
+
+    @property
+    def ffmpeg_encoder_settings(self) -> FfmpegEncoderSettings:
+        return self._ffmpeg_encoder_settings
+
+    @ffmpeg_encoder_settings.setter
+    def ffmpeg_encoder_settings(self, value: FfmpegEncoderSettings):
+        assert isinstance(value, FfmpegEncoderSettings)
+        self._ffmpeg_encoder_settings = value
+
+    @property
+    def task_type(self) -> str:
+        """
+        Тип задачи: process_video_task (объединение входных файлов одной камеры) или mosaic_video_task
+        (мозаика камер cameras, выровненных по времени, в одном выходном видео)
+        """
+        return self._task_type
+
+    @task_type.setter
+    def task_type(self, value: str):
+        assert value in (self.TASK_TYPE_PROCESS_VIDEO, self.TASK_TYPE_MOSAIC_VIDEO)
+        self._task_type = value
+
+    @property
+    def cameras(self) -> List[CameraSettings]:
+        """
+        Камеры задачи мозаики (входные файлы задачи - файлы всех камер)
+        """
+        return self._cameras
+
+    @cameras.setter
+    def cameras(self, value: List[CameraSettings]):
+        assert isinstance(value, list)
+        assert all([isinstance(camera, CameraSettings) for camera in value])
+        self._cameras = value
+
+    @property
+    def mosaic_step_seconds(self) -> float:
+        """
+        Шаг времени съемки между кадрами мозаики в секундах (на каждом кадре мозаики все камеры показаны
+        в один и тот же момент)
+        """
+        return self._mosaic_step_seconds
+
+    @mosaic_step_seconds.setter
+    def mosaic_step_seconds(self, value: float):
+        assert isinstance(value, (int, float))
+        assert value > 0.0
+        self._mosaic_step_seconds = float(value)
+
+    @property
+    def mosaic_columns(self) -> int:
+        """
+        Количество столбцов мозаики (0 - определяется по количеству камер, сетка близкая к квадратной)
+        """
+        return self._mosaic_columns
+
+    @mosaic_columns.setter
+    def mosaic_columns(self, value: int):
+        assert isinstance(value, int)
+        assert value >= 0
+        self._mosaic_columns = value
+
+    def get_actual_keyframe_index_dir(self) -> str:
+        if self._keyframe_index_dir is not None:
+            return self._keyframe_index_dir
+        return os.path.join(tempfile.gettempdir(), 'fastplay_keyframe_index')
+
     @property
     def output_object_detection_filename(self) -> Optional[str]:
         return self._output_object_detection_filename
@@ -103,6 +623,8 @@ class TaskDescription(Frozen):
     def check(self) -> bool:
         result = self._output_concatenation_filename is not None
         result = result and pathlib.Path(self._output_concatenation_filename).parent.exists()
+        if self._task_type == self.TASK_TYPE_MOSAIC_VIDEO:
+            result = result and len(self._cameras) > 0
         return result
 
     def _get_actual_filename(self, simple_filename: str) -> Path:
@@ -121,6 +643,7 @@ class TaskDescription(Frozen):
     def __str__(self) -> str:
         return \
             f'--- Описание задачи ---\n' \
+            f'    Тип задачи: {self._task_type}\n' \
             f'    Количество входных файлов: {len(self._input_files)}\n' \
             f'    Имя выходного файла с результатами объединения "{self._output_concatenation_filename}"\n' \
             f'    Пример результирующего имени выходного файла "{self.get_actual_output_concatenation_filename()}"\n' \
@@ -133,4 +656,35 @@ class TaskDescription(Frozen):
             f'    Ширина выходного видео: {self._output_video_width}\n' \
             f'    Высота выходного видео: {self._output_video_height}\n' \
             f'    Пропускать каждый {self._skipped_frames_count} кадр\n' \
+            f'    Размер очередей конвейера обработки: {self._pipeline_queue_size}\n' \
+            f'    Читать заранее файлов: {self._prefetch_files} (не больше {self._prefetch_budget_mb} МБ)\n' \
+            f'    Читать только ключевые кадры: {"Да" if self._keyframe_seek else "Нет"}\n' \
+            f'    Восстанавливать чтение после повреждений по индексу потока: ' \
+            f'{"Да" if self._stream_resync else "Нет"}\n' \
+            f'    Каталог индексов ключевых кадров: {self.get_actual_keyframe_index_dir()}\n' \
+            f'    Собирать видео из ключевых кадров без перекодирования: ' \
+            f'{"Да" if self._keyframe_remux else "Нет"}\n' \
+            f'    Путь к ffmpeg: {self._ffmpeg_path}\n' \
+            f'    Искать людей только при движении: {"Да" if self._motion_gate else "Нет"} ' \
+            f'(порог {self._motion_threshold}, минимальная площадь {self._motion_min_area}, ' \
+            f'только в областях движения: {"Да" if self._motion_regions_only else "Нет"})\n' \
+            f'    Каталог базы видеоархива: {self._archive_catalog_dir}\n' \
+            f'    Каталог контрольных точек: {self._checkpoint_dir}\n' \
+            f'    Кэш сегментов: {self._segment_cache_dir} (хранить {self._segment_cache_days} дн.)\n' \
+            f'    Диск входных файлов: {self._storage_device}\n' \
+            f'    Способ поиска людей: {self._detector_backend}' \
+            f'{" (" + str(self._dnn_detector_settings) + ")" if self._detector_backend == "dnn" else ""}\n' \
+            f'    Журнал найденных людей: {self._output_detection_events_filename}\n' \
+            f'    Шаблон времени в имени входного файла: {self._filename_timestamp_format}\n' \
+            f'    Каталог отрывков событий: {self._output_event_clips_dir}\n' \
+            f'    Промежуток и запас событий: {self._event_max_gap_seconds} с, {self._event_padding_seconds} с\n' \
+            f'    Адаптивное прореживание кадров: {self._adaptive_sampling}' \
+            f' (длина {self._target_output_minutes} мин, диапазон шага {self._adaptive_sampling_range})\n' \
+            f'    Индекс кадров выходных видео: {self._write_output_frame_index}\n' \
+            f'    Отчеты о времени стадий: {self._output_metrics_filename}, {self._output_prometheus_filename}' \
+            f' (интервал записи {self._metrics_flush_interval_seconds} с)\n' \
+            f'    Запись выходных видео: {self._video_writer_backend}' \
+            f'{" (" + str(self._ffmpeg_encoder_settings) + ")" if self._video_writer_backend == "ffmpeg" else ""}\n' \
+            f'    Камеры мозаики: {", ".join([str(camera) for camera in self._cameras])}' \
+            f' (шаг {self._mosaic_step_seconds} с, столбцов {self._mosaic_columns})\n' \
             f'--- конец ---'
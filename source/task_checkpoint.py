@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import shutil
+import typing
+
+from source.output_frame_index import OutputFrameIndex
+from source.task.task_description import TaskDescription
+
+
+class TaskCheckpoint:
+    """
+    Контрольные точки задачи: каждый входной файл обрабатывается в свой сегмент (отдельные выходные файлы
+    объединения и распознавания), а после успешной обработки файла сегмент записывается в файл состояния.
+    При повторном запуске той же задачи (после сбоя или остановки) уже обработанные файлы пропускаются,
+    в конце готовые сегменты склеиваются в выходные файлы (см. SegmentStitcher).
+
+    Сегменты задачи хранятся в отдельном подкаталоге, имя которого зависит от выходных файлов и параметров
+    обработки, поэтому другая задача (или та же задача с другими параметрами) не использует чужие сегменты.
+    Сегменты привязаны к входным файлам, а не к их номерам: если при повторном запуске поисковик нашел
+    другой список файлов (сдвинулся интервал поиска), то готовые сегменты общих файлов все равно используются.
+    """
+
+    STATE_VERSION = 1
+
+    _STATE_FILENAME = 'state.json'
+
+    # метка в имени сегмента, который еще записывается (ставится перед расширением,
+    # так как по расширению выбирается формат выходного файла)
+    _PARTIAL_MARK = '.partial'
+
+    def __init__(self, checkpoint_dir: str, task_description: TaskDescription):
+        assert isinstance(checkpoint_dir, str)
+        assert isinstance(task_description, TaskDescription)
+        self._task_dir = os.path.join(checkpoint_dir, self._get_task_key(task_description))
+        self._concatenation_extension = os.path.splitext(task_description.output_concatenation_filename)[1]
+        self._object_detection_extension: typing.Optional[str] = None
+        if task_description.output_object_detection_filename is not None:
+            self._object_detection_extension = os.path.splitext(
+                task_description.output_object_detection_filename)[1]
+        self._files: typing.Dict[str, dict] = self._load_state()
+
+    @property
+    def task_dir(self) -> str:
+        return self._task_dir
+
+    def is_file_done(self, input_file: str) -> bool:
+        """
+        Обработан ли входной файл (сегмент записан, а входной файл не изменялся после обработки)
+        """
+        state = self._files.get(input_file)
+        if state is None:
+            return False
+        try:
+            stat = os.stat(input_file)
+        except OSError:
+            return False
+        if stat.st_size != state['size'] or stat.st_mtime != state['mtime']:
+            return False
+        segments = [state['concatenation_segment'], state['object_detection_segment']]
+        return all([segment is None or os.path.isfile(os.path.join(self._task_dir, segment))
+                    for segment in segments])
+
+    def get_partial_segment_filenames(self, input_file: str) -> typing.Tuple[str, typing.Optional[str]]:
+        """
+        Имена файлов, в которые записывается сегмент входного файла (до вызова mark_file_done)
+        :return: (файл объединения, файл распознавания или None, если распознавание не выполняется)
+        """
+        concatenation_segment, object_detection_segment = self._get_segment_names(input_file)
+        os.makedirs(self._task_dir, exist_ok=True)
+        return (
+            os.path.join(self._task_dir, self._get_partial_name(concatenation_segment)),
+            None if object_detection_segment is None
+            else os.path.join(self._task_dir, self._get_partial_name(object_detection_segment))
+        )
+
+    def mark_file_done(self, input_file: str):
+        """
+        Запомнить, что входной файл обработан (записанный сегмент становится готовым)
+        """
+        stat = os.stat(input_file)
+        segment_names = self._get_segment_names(input_file)
+        for segment in segment_names:
+            if segment is not None:
+                partial_filename = os.path.join(self._task_dir, self._get_partial_name(segment))
+                segment_filename = os.path.join(self._task_dir, segment)
+                if os.path.isfile(partial_filename):
+                    os.replace(partial_filename, segment_filename)
+                # индекс кадров сегмента (если записывается) переименовывается вместе с сегментом
+                partial_index_filename = OutputFrameIndex.get_sidecar_filename(partial_filename)
+                if os.path.isfile(partial_index_filename):
+                    os.replace(partial_index_filename, OutputFrameIndex.get_sidecar_filename(segment_filename))
+        self._files[input_file] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'concatenation_segment': segment_names[0],
+            'object_detection_segment': segment_names[1],
+        }
+        self._save_state()
+
+    def get_segment_filenames(
+            self,
+            input_files: typing.List[str]
+    ) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        """
+        Готовые сегменты входных файлов (в порядке входных файлов)
+        :return: (сегменты объединения, сегменты распознавания)
+        """
+        concatenation_segments = []
+        object_detection_segments = []
+        for input_file in input_files:
+            state = self._files.get(input_file)
+            if state is None:
+                continue
+            for segment, segments in [
+                (state['concatenation_segment'], concatenation_segments),
+                (state['object_detection_segment'], object_detection_segments)
+            ]:
+                if segment is not None and os.path.isfile(os.path.join(self._task_dir, segment)):
+                    segments.append(os.path.join(self._task_dir, segment))
+        return concatenation_segments, object_detection_segments
+
+    def clear(self):
+        """
+        Удалить сегменты и состояние задачи (после успешной склейки)
+        """
+        shutil.rmtree(self._task_dir, ignore_errors=True)
+        self._files = {}
+
+    def _get_segment_names(self, input_file: str) -> typing.Tuple[str, typing.Optional[str]]:
+        name_hash = hashlib.sha1(input_file.encode('utf-8')).hexdigest()[:16]
+        concatenation_segment = 'segment_{0}_concatenation{1}'.format(name_hash, self._concatenation_extension)
+        object_detection_segment = None
+        if self._object_detection_extension is not None:
+            object_detection_segment = 'segment_{0}_detection{1}'.format(name_hash, self._object_detection_extension)
+        return concatenation_segment, object_detection_segment
+
+    def _get_partial_name(self, segment: str) -> str:
+        name, extension = os.path.splitext(segment)
+        return name + self._PARTIAL_MARK + extension
+
+    @staticmethod
+    def get_processing_parameters(task_description: TaskDescription) -> dict:
+        """
+        Параметры задачи, от которых зависит содержимое сегментов (кроме имен выходных файлов)
+        """
+        task_parameters = {
+            'output_video_width': task_description.output_video_width,
+            'output_video_height': task_description.output_video_height,
+            'skipped_frames_count': task_description.skipped_frames_count,
+            'keyframe_seek': task_description.keyframe_seek,
+            'motion_gate': task_description.motion_gate,
+            'motion_threshold': task_description.motion_threshold,
+            'motion_min_area': task_description.motion_min_area,
+            'motion_regions_only': task_description.motion_regions_only,
+            'adaptive_sampling': task_description.adaptive_sampling,
+            'target_output_minutes': task_description.target_output_minutes,
+            'adaptive_sampling_range': task_description.adaptive_sampling_range,
+        }
+        # номера кадров и пропуск поврежденных участков зависят от индекса потока
+        # (параметр добавляется только если задан, чтобы не менять ключи уже сохраненных сегментов)
+        if task_description.stream_resync:
+            task_parameters['stream_resync'] = True
+        # сегменты, записанные разными кодировщиками, нельзя склеить без перекодирования
+        if task_description.video_writer_backend != TaskDescription.VIDEO_WRITER_BACKEND_OPENCV:
+            task_parameters['video_writer'] = '{0}: {1}'.format(
+                task_description.video_writer_backend, task_description.ffmpeg_encoder_settings)
+        if task_description.output_object_detection_filename is not None:
+            task_parameters['detector_backend'] = task_description.detector_backend
+            if task_description.detector_backend == TaskDescription.DETECTOR_BACKEND_DNN:
+                settings = task_description.dnn_detector_settings
+                # количество потоков и размер пакета не влияют на результат распознавания
+                task_parameters['dnn_detector'] = [
+                    settings.model_filename, settings.config_filename, settings.input_width, settings.input_height,
+                    settings.person_class_id, settings.confidence_threshold, settings.scale, settings.mean,
+                    settings.swap_rb
+                ]
+        return task_parameters
+
+    @classmethod
+    def _get_task_key(cls, task_description: TaskDescription) -> str:
+        """
+        Ключ задачи: все, от чего зависит содержимое сегментов
+        """
+        task_parameters = cls.get_processing_parameters(task_description)
+        task_parameters['output_concatenation_filename'] = task_description.output_concatenation_filename
+        task_parameters['output_object_detection_filename'] = task_description.output_object_detection_filename
+        task_json = json.dumps(task_parameters, sort_keys=True)
+        return hashlib.sha1(task_json.encode('utf-8')).hexdigest()[:16]
+
+    def _get_state_filename(self) -> str:
+        return os.path.join(self._task_dir, self._STATE_FILENAME)
+
+    def _load_state(self) -> typing.Dict[str, dict]:
+        state_filename = self._get_state_filename()
+        if not os.path.isfile(state_filename):
+            return {}
+        try:
+            with open(state_filename, 'r') as file:
+                state = json.load(file)
+            if state.get('version') != self.STATE_VERSION:
+                return {}
+            return dict(state['files'])
+        except (ValueError, KeyError, TypeError):
+            print('Поврежден файл состояния задачи: {0}'.format(state_filename))
+            return {}
+
+    def _save_state(self):
+        os.makedirs(self._task_dir, exist_ok=True)
+        state_filename = self._get_state_filename()
+        # пишем во временный файл и переименовываем, чтобы при сбое не остался недописанный файл состояния
+        temp_filename = '{0}.{1}.tmp'.format(state_filename, os.getpid())
+        with open(temp_filename, 'w') as file:
+            json.dump({'version': self.STATE_VERSION, 'files': self._files}, file)
+        os.replace(temp_filename, state_filename)
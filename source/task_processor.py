@@ -1,51 +1,818 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import os
+import tempfile
+import typing
+
 import cv2
 
+from source.adaptive_frame_sampler import AdaptiveFrameSampler
+from source.archive_catalog import ArchiveCatalog
+from source.detection_event_log import DetectionEventLog
+from source.dnn_person_detector_backend import DnnPersonDetectorBackend
+from source.event_clip_extractor import EventClipExtractor
+from source.event_segmenter import EventSegmenter
+from source.ffmpeg_video_writer import FfmpegVideoWriter
+from source.file_prefetcher import FilePrefetcher
+from source.filename_timestamp_parser import FilenameTimestampParser
+from source.frame_info import FrameInfo
+from source.h264_stream_index import H264StreamIndexStore, H264StreamScanner, H264StreamIndex, H264Keyframe
+from source.hog_person_detector_backend import HogPersonDetectorBackend
+from source.i_person_detector_backend import IPersonDetectorBackend
+from source.i_video_writer import IVideoWriter
+from source.keyframe_remuxer import KeyframeRemuxer
+from source.mosaic_composer import MosaicComposer
+from source.motion_detector import MotionDetector
+from source.object_detector import ObjectDetector
+from source.output_frame_index import OutputFrameIndex
 from source.person_detector_frame_postprocessor import PersonDetectorFramePostprocessor
+from source.segment_cache import SegmentCache
+from source.segment_stitcher import SegmentStitcher
+from source.stage_metrics import StageMetrics
 from source.task.task_description import TaskDescription
+from source.task_checkpoint import TaskCheckpoint
 from source.video_concatenator import VideoConcatenator
 
 
 class TaskProcessor:
+    # сколько ключевых кадров помещать в один временный файл при чтении только ключевых кадров
+    _KEYFRAMES_PER_TEMP_FILE = 200
+
+    # кодек и частота кадров видео объединения
+    OUTPUT_FOURCC = 'H264'
+    OUTPUT_FPS = 30.0
+
     def __init__(self):
         self._is_exit_requested: bool = False
 
+        # внешнее событие остановки (объект с методом is_set()), None - не используется
+        self._stop_event: typing.Optional[typing.Any] = None
+
+        # режим без окон (для запуска по расписанию и на серверах без экрана)
+        self._headless: bool = False
+
+        # предпросмотр кадров в отдельном процессе (см. SharedFramePreview)
+        self._preview: typing.Optional[typing.Any] = None
+
+        # способ поиска людей текущей задачи (создается один раз на задачу, так как загрузка модели долгая)
+        self._detector_backend: typing.Optional[IPersonDetectorBackend] = None
+
+        # журнал найденных людей текущей задачи
+        self._detection_event_log: typing.Optional[DetectionEventLog] = None
+
+        # адаптивное прореживание кадров текущей задачи (одно на все входные файлы задачи)
+        self._frame_sampler: typing.Optional[AdaptiveFrameSampler] = None
+
+        # время стадий обработки и счетчики текущей задачи
+        self._metrics: StageMetrics = StageMetrics()
+
+        # упреждающее чтение входных файлов текущей задачи
+        self._prefetcher: typing.Optional[FilePrefetcher] = None
+
+    @property
+    def metrics(self) -> StageMetrics:
+        """
+        Время стадий обработки и счетчики последней задачи
+        """
+        return self._metrics
+
+    @property
+    def stop_event(self) -> typing.Optional[typing.Any]:
+        return self._stop_event
+
+    @stop_event.setter
+    def stop_event(self, value: typing.Optional[typing.Any]):
+        assert value is None or hasattr(value, 'is_set')
+        self._stop_event = value
+
+    @property
+    def headless(self) -> bool:
+        return self._headless
+
+    @headless.setter
+    def headless(self, value: bool):
+        assert isinstance(value, bool)
+        self._headless = value
+
+    @property
+    def preview(self) -> typing.Optional[typing.Any]:
+        return self._preview
+
+    @preview.setter
+    def preview(self, value: typing.Optional[typing.Any]):
+        assert value is None or hasattr(value, 'publish')
+        self._preview = value
+
     def process_task(self, task_description: TaskDescription):
         assert isinstance(task_description, TaskDescription)
-        fourcc = cv2.VideoWriter_fourcc(*'H264')
+        self._begin_task(task_description)
+        try:
+            is_processed = False
+            if task_description.task_type == TaskDescription.TASK_TYPE_MOSAIC_VIDEO:
+                self._process_mosaic(task_description)
+                is_processed = True
+            elif task_description.keyframe_remux:
+                is_processed = self._process_task_remux(task_description)
+                if not is_processed:
+                    print('Видео будет собрано с декодированием')
+            if not is_processed:
+                segment_store = self.create_segment_store(task_description)
+                if segment_store is not None:
+                    self._process_task_segmented(task_description, segment_store)
+                else:
+                    self._prefetch_files(task_description.input_files)
+                    self._process_files(
+                        task_description,
+                        task_description.input_files,
+                        task_description.get_actual_output_concatenation_filename(),
+                        task_description.get_actual_output_object_detection_filename()
+                    )
+            if task_description.output_event_clips_dir is not None and not self._is_exit_requested:
+                self._extract_event_clips(task_description)
+        finally:
+            self._end_task()
+
+    def process_task_segments(self, task_description: TaskDescription, input_files: typing.List[str]):
+        """
+        Обработать входные файлы задачи с контрольными точками или кэшем сегментов в сегменты, без склейки (файлы
+        обрабатываются по мере записи камерой, и обработка задачи целиком сводится к склейке готовых сегментов,
+        см. TaskWatcher). Уже обработанные файлы пропускаются
+        """
+        assert isinstance(task_description, TaskDescription)
+        segment_store = self.create_segment_store(task_description)
+        assert segment_store is not None
+        self._begin_task(task_description)
+        try:
+            self._process_segment_files(task_description, segment_store, input_files)
+        finally:
+            self._end_task()
+
+    @staticmethod
+    def is_segmented_task(task_description: TaskDescription) -> bool:
+        """
+        Можно ли обрабатывать задачу по отдельным входным файлам в сегменты, которые потом склеиваются
+        (process_task_segments). Мозаика записывается целиком, при keyframe_remux выходной файл собирается
+        из ключевых кадров без сегментов, а с адаптивным прореживанием кадров шаг между кадрами зависит
+        от всех входных файлов задачи
+        """
+        return task_description.task_type == TaskDescription.TASK_TYPE_PROCESS_VIDEO \
+            and not task_description.adaptive_sampling and not task_description.keyframe_remux
+
+    @staticmethod
+    def create_segment_store(
+            task_description: TaskDescription
+    ) -> typing.Optional[typing.Union[SegmentCache, TaskCheckpoint]]:
+        """
+        Хранилище сегментов задачи: кэш сегментов (segment_cache_dir), контрольные точки (checkpoint_dir)
+        или None, если входные файлы обрабатываются сразу в выходные файлы.
+        С адаптивным прореживанием кадров кэш не используется, так как шаг между кадрами зависит
+        от всех входных файлов задачи
+        """
+        if task_description.segment_cache_dir is not None and not task_description.adaptive_sampling:
+            return SegmentCache(task_description.segment_cache_dir, task_description)
+        if task_description.checkpoint_dir is not None:
+            return TaskCheckpoint(task_description.checkpoint_dir, task_description)
+        return None
+
+    def _begin_task(self, task_description: TaskDescription):
+        self._metrics = self._create_metrics(task_description)
+        self._detector_backend = None
+        self._detection_event_log = None
+        if task_description.output_object_detection_filename is not None:
+            self._detector_backend = self._create_detector_backend(task_description)
+            if task_description.output_detection_events_filename is not None:
+                self._detection_event_log = DetectionEventLog(task_description.output_detection_events_filename)
+        self._frame_sampler = None
+        if task_description.adaptive_sampling:
+            self._frame_sampler = self._create_frame_sampler(task_description)
+            print('Адаптивное прореживание кадров: шаг от {0} до {1}, средний {2:.1f}'.format(
+                self._frame_sampler.min_step, self._frame_sampler.max_step, self._frame_sampler.base_step))
+            if task_description.segment_cache_dir is not None:
+                print('Кэш сегментов не используется с адаптивным прореживанием кадров')
+        self._prefetcher = None
+        # при чтении только ключевых кадров файлы читаются не целиком, читать их заранее незачем
+        if task_description.prefetch_files > 0 and not task_description.keyframe_seek:
+            self._prefetcher = FilePrefetcher(
+                task_description.prefetch_files, task_description.prefetch_budget_mb * 1024 * 1024)
+
+    def _end_task(self):
+        if self._prefetcher is not None:
+            self._prefetcher.stop()
+            if self._prefetcher.prefetched_bytes > 0:
+                print(self._prefetcher.get_statistics())
+            self._metrics.increment(StageMetrics.COUNTER_PREFETCH_HITS, self._prefetcher.hits_count)
+            self._metrics.increment(StageMetrics.COUNTER_PREFETCH_PARTIAL, self._prefetcher.partial_count)
+            self._metrics.increment(StageMetrics.COUNTER_PREFETCH_MISSES, self._prefetcher.misses_count)
+            self._metrics.increment(StageMetrics.COUNTER_PREFETCHED_BYTES, self._prefetcher.prefetched_bytes)
+            self._prefetcher = None
+        if self._detection_event_log is not None:
+            self._detection_event_log.close()
+            self._detection_event_log = None
+        if self._frame_sampler is not None:
+            print(self._frame_sampler.get_statistics())
+        print(self._metrics.get_summary())
+        self._metrics.flush()
+        self._destroy_windows()
+
+    @staticmethod
+    def _create_metrics(task_description: TaskDescription) -> StageMetrics:
+        task_name = os.path.splitext(os.path.basename(task_description.output_concatenation_filename or ''))[0]
+        metrics = StageMetrics({'task': task_name})
+        metrics.set_export(
+            task_description.output_metrics_filename,
+            task_description.output_prometheus_filename,
+            task_description.metrics_flush_interval_seconds
+        )
+        return metrics
+
+    def _extract_event_clips(self, task_description: TaskDescription):
+        """
+        Записать отрывки входных файлов с событиями (найденными людьми из журнала)
+        """
+        if self._detection_event_log is None:
+            return
+        events = []
+        for file in task_description.input_files:
+            events.extend(self._detection_event_log.find_file_detections(file))
+        segmenter = EventSegmenter(task_description.event_max_gap_seconds, task_description.event_padding_seconds)
+        archive_catalog: typing.Optional[ArchiveCatalog] = None
+        if task_description.archive_catalog_dir is not None:
+            archive_catalog = ArchiveCatalog(task_description.archive_catalog_dir)
+        try:
+            extractor = EventClipExtractor(self._get_index_store(task_description, archive_catalog))
+            clip_filenames = extractor.extract_event_clips(
+                events,
+                segmenter,
+                task_description.output_event_clips_dir,
+                cv2.VideoWriter_fourcc(*self.OUTPUT_FOURCC),
+                os.path.splitext(task_description.output_concatenation_filename)[1] or '.mkv'
+            )
+        finally:
+            if archive_catalog is not None:
+                archive_catalog.close()
+        print('Отрывков событий: {0}, каталог: {1}'.format(
+            len(clip_filenames), task_description.output_event_clips_dir))
+
+    def _process_task_segmented(
+            self,
+            task_description: TaskDescription,
+            segment_store: typing.Union[SegmentCache, TaskCheckpoint]
+    ):
+        """
+        Обработать задачу по сегментам (см. TaskCheckpoint и SegmentCache): каждый входной файл обрабатывается
+        в свой сегмент, уже обработанные файлы пропускаются, в конце сегменты склеиваются
+        """
+        self._process_segment_files(task_description, segment_store, task_description.input_files)
+        if self._is_exit_requested:
+            return
+        concatenation_segments, object_detection_segments = segment_store.get_segment_filenames(
+            task_description.input_files)
+        stitcher = SegmentStitcher(task_description.ffmpeg_path)
+        concatenation_filename = task_description.get_actual_output_concatenation_filename()
+        is_stitched = stitcher.stitch(
+            concatenation_segments,
+            concatenation_filename,
+            cv2.VideoWriter_fourcc(*self.OUTPUT_FOURCC),
+            self.OUTPUT_FPS
+        )
+        if is_stitched and task_description.write_output_frame_index:
+            self._stitch_frame_indexes(concatenation_segments, concatenation_filename, self.OUTPUT_FPS)
+        object_detection_filename = task_description.get_actual_output_object_detection_filename()
+        if object_detection_filename is not None:
+            is_detection_stitched = stitcher.stitch(
+                object_detection_segments,
+                object_detection_filename,
+                cv2.VideoWriter_fourcc(*ObjectDetector.OUTPUT_VIDEO_FOURCC),
+                ObjectDetector.OUTPUT_VIDEO_FPS
+            )
+            if is_detection_stitched and task_description.write_output_frame_index:
+                self._stitch_frame_indexes(
+                    object_detection_segments, object_detection_filename, ObjectDetector.OUTPUT_VIDEO_FPS)
+            is_stitched = is_detection_stitched and is_stitched
+        if isinstance(segment_store, SegmentCache):
+            # сегменты остаются в кэше для следующих запусков, удаляются только давно не используемые
+            if task_description.segment_cache_days > 0:
+                removed_count = segment_store.prune(task_description.segment_cache_days)
+                if removed_count > 0:
+                    print('Удалено старых файлов из кэша сегментов: {0}'.format(removed_count))
+        elif is_stitched:
+            segment_store.clear()
+        else:
+            print('Сегменты не удалены, их можно склеить повторным запуском: {0}'.format(segment_store.task_dir))
+
+    def _process_segment_files(
+            self,
+            task_description: TaskDescription,
+            segment_store: typing.Union[SegmentCache, TaskCheckpoint],
+            input_files: typing.List[str]
+    ):
+        """
+        Обработать каждый еще не обработанный входной файл в свой сегмент
+        """
+        print('Каталог сегментов задачи: {0}'.format(segment_store.task_dir))
+        self._prefetch_files([file for file in input_files if not segment_store.is_file_done(file)])
+        for file in input_files:
+            if self._stop_event is not None and self._stop_event.is_set():
+                self._is_exit_requested = True
+            if self._is_exit_requested:
+                print('Обработка прервана, при повторном запуске будут обработаны только оставшиеся файлы')
+                return
+            if segment_store.is_file_done(file):
+                print('Файл уже обработан: {0}'.format(file))
+                continue
+            concatenation_segment, object_detection_segment = segment_store.get_partial_segment_filenames(file)
+            self._process_files(task_description, [file], concatenation_segment, object_detection_segment)
+            # файл, обработка которого прервана, при повторном запуске обрабатывается заново
+            if not self._is_exit_requested:
+                segment_store.mark_file_done(file)
+
+    def _prefetch_files(self, input_files: typing.List[str]):
+        """
+        Задать порядок, в котором будут открываться входные файлы (чтобы читать следующие файлы заранее)
+        """
+        if self._prefetcher is not None and len(input_files) > 1:
+            self._prefetcher.set_files(input_files)
+
+    @staticmethod
+    def _stitch_frame_indexes(segment_filenames: typing.List[str], output_filename: str, fps: float):
+        """
+        Склеить индексы кадров сегментов в индекс кадров выходного файла (в порядке сегментов)
+        """
+        output_frame_index = OutputFrameIndex(output_filename, fps)
+        for segment_filename in segment_filenames:
+            segment_frame_index = OutputFrameIndex.load(segment_filename)
+            if segment_frame_index is None:
+                print('Нет индекса кадров сегмента, индекс кадров не записан: {0}'.format(segment_filename))
+                return
+            output_frame_index.extend(segment_frame_index)
+        if output_frame_index.get_frames_count() > 0:
+            output_frame_index.save()
+
+    def _process_files(
+            self,
+            task_description: TaskDescription,
+            input_files: typing.List[str],
+            concatenation_filename: str,
+            object_detection_filename: typing.Optional[str]
+    ):
+        """
+        Объединить входные файлы в выходной файл concatenation_filename
+        (и распознать людей с записью в object_detection_filename, если он задан)
+        """
         output_video_resolution = (task_description.output_video_width, task_description.output_video_height)
-        output_video = cv2.VideoWriter(
-            task_description.get_actual_output_concatenation_filename(),
-            fourcc,
-            30.0,
+        output_video = self._create_video_writer(
+            task_description,
+            concatenation_filename,
+            self.OUTPUT_FOURCC,
+            self.OUTPUT_FPS,
             output_video_resolution
         )
+        archive_catalog: typing.Optional[ArchiveCatalog] = None
+        output_frame_index: typing.Optional[OutputFrameIndex] = None
         try:
             concatenator = VideoConcatenator(
                 output_video,
                 task_description.output_video_width,
                 task_description.output_video_height
             )
-            object_detection_filename = task_description.get_actual_output_object_detection_filename()
-            with PersonDetectorFramePostprocessor(object_detection_filename) as person_detector:
+            concatenator.stop_event = self._stop_event
+            concatenator.headless = self._headless
+            concatenator.preview = self._preview
+            concatenator.frame_sampler = self._frame_sampler
+            concatenator.metrics = self._metrics
+            if task_description.write_output_frame_index:
+                output_frame_index = OutputFrameIndex(concatenation_filename, self.OUTPUT_FPS)
+                concatenator.output_frame_index = output_frame_index
+            timestamp_parser = FilenameTimestampParser(task_description.filename_timestamp_format)
+            # при конвейерной обработке люди распознаются в отдельном потоке
+            is_detection_threaded = task_description.pipeline_queue_size > 0
+            with self._create_person_detector(
+                    task_description, object_detection_filename, is_detection_threaded) as person_detector:
                 if person_detector.is_enabled():
                     concatenator.add_post_processor(person_detector)
                 concatenator.skipped_frames_count = task_description.skipped_frames_count
-                for file in task_description.input_files:
+                concatenator.pipeline_queue_size = task_description.pipeline_queue_size
+                if task_description.archive_catalog_dir is not None:
+                    archive_catalog = ArchiveCatalog(task_description.archive_catalog_dir)
+                index_store: typing.Optional[typing.Any] = None
+                if task_description.keyframe_seek or task_description.stream_resync:
+                    index_store = self._get_index_store(task_description, archive_catalog)
+                for file in input_files:
+                    if self._stop_event is not None and self._stop_event.is_set():
+                        self._is_exit_requested = True
+                        break
+                    print('process: {0}'.format(file))
+                    if archive_catalog is not None:
+                        self._print_file_info(archive_catalog, file)
+                    is_annex_b_file = index_store is not None and H264StreamScanner.is_annex_b_file(file)
+                    if is_annex_b_file and task_description.keyframe_seek:
+                        concatenator.set_source(file, timestamp_parser.parse(file), self._get_video_fps(file))
+                        self._append_keyframes(
+                            concatenator, index_store, file, task_description.skipped_frames_count + 1)
+                    else:
+                        if self._prefetcher is not None:
+                            self._prefetcher.open_file(file)
+                        stream_index = self._get_stream_index(index_store, file) if is_annex_b_file else None
+                        input_video = cv2.VideoCapture(file)
+                        try:
+                            concatenator.set_source(
+                                file, timestamp_parser.parse(file), input_video.get(cv2.CAP_PROP_FPS))
+                            concatenator.append_video(input_video, stream_index)
+                        finally:
+                            input_video.release()
+                        self._metrics.increment(StageMetrics.COUNTER_BYTES_READ, self._get_file_size(file))
+                    self._metrics.increment(StageMetrics.COUNTER_INPUT_FILES)
+                    print('avg frame time: ', concatenator.get_avg_frame_time())
+                    concatenator.reset_avg_frame_time()
+                    if concatenator.is_exit_requested():
+                        self._is_exit_requested = True
+                        break
+        finally:
+            if archive_catalog is not None:
+                archive_catalog.close()
+            output_video.release()
+            if output_frame_index is not None:
+                output_frame_index.save()
+
+    def _process_mosaic(self, task_description: TaskDescription):
+        """
+        Записать мозаику камер задачи в одно выходное видео (и распознать людей всех камер с записью в одно
+        видео распознавания, если оно задано)
+        """
+        if task_description.keyframe_remux or task_description.keyframe_seek or task_description.checkpoint_dir \
+                or task_description.segment_cache_dir or task_description.adaptive_sampling:
+            print('Для мозаики не используются keyframe_remux, keyframe_seek, checkpoint_dir, segment_cache_dir '
+                  'и adaptive_sampling')
+        concatenation_filename = task_description.get_actual_output_concatenation_filename()
+        output_video = self._create_video_writer(
+            task_description,
+            concatenation_filename,
+            self.OUTPUT_FOURCC,
+            self.OUTPUT_FPS,
+            (task_description.output_video_width, task_description.output_video_height)
+        )
+        try:
+            composer = MosaicComposer(
+                output_video,
+                task_description.output_video_width,
+                task_description.output_video_height,
+                [camera.name for camera in task_description.cameras],
+                task_description.mosaic_columns
+            )
+            composer.step_seconds = task_description.mosaic_step_seconds
+            composer.stop_event = self._stop_event
+            composer.headless = self._headless
+            composer.preview = self._preview
+            composer.metrics = self._metrics
+            object_detection_filename = task_description.get_actual_output_object_detection_filename()
+            with self._create_person_detector(task_description, object_detection_filename) as person_detector:
+                if person_detector.is_enabled():
+                    composer.add_post_processor(person_detector)
+                composer.compose(
+                    [camera.input_files for camera in task_description.cameras],
+                    FilenameTimestampParser(task_description.filename_timestamp_format)
+                )
+            if composer.is_exit_requested():
+                self._is_exit_requested = True
+            print('Кадров мозаики: {0}, файл: {1}'.format(composer.output_frames_count, concatenation_filename))
+        finally:
+            output_video.release()
+
+    def _append_keyframes(
+            self,
+            concatenator: VideoConcatenator,
+            index_store: typing.Any,
+            filename: str,
+            frames_step: int
+    ):
+        """
+        Добавить в выходное видео ключевые кадры файла, примерно через каждые frames_step кадров.
+        Выбранные ключевые кадры копируются (без декодирования) во временный файл, который затем
+        декодируется целиком - декодируются только те кадры, которые попадут в выходное видео
+        """
+        index = index_store.get_index(filename)
+        keyframes = index.select_keyframes(frames_step)
+        print('keyframes: {0} of {1}, frames: {2}'.format(len(keyframes), len(index.keyframes), index.frames_count))
+        if len(keyframes) == 0:
+            print('Ключевые кадры не найдены, файл будет прочитан полностью')
+            input_video = cv2.VideoCapture(filename)
+            try:
+                concatenator.append_video(input_video)
+            finally:
+                input_video.release()
+            self._metrics.increment(StageMetrics.COUNTER_BYTES_READ, self._get_file_size(filename))
+            return
+
+        for input_video, batch in self._iterate_keyframe_videos(index, keyframes):
+            concatenator.append_keyframes_video(
+                input_video,
+                [keyframe.frame_number for keyframe in batch],
+                [keyframe.offset for keyframe in batch]
+            )
+            if concatenator.is_exit_requested() or concatenator.is_video_skip_requested():
+                break
+
+    @staticmethod
+    def _get_stream_index(index_store: typing.Any, filename: str) -> typing.Optional[H264StreamIndex]:
+        """
+        Индекс потока для чтения файла с восстановлением после повреждений (None - в потоке нет ключевых кадров,
+        и номера кадров декодера нельзя сопоставить с потоком)
+        """
+        index = index_store.get_index(filename)
+        if len(index.keyframes) == 0:
+            print('Ключевые кадры не найдены, файл будет прочитан без индекса потока')
+            return None
+        if len(index.damaged_ranges) > 0:
+            print('Поврежденные участки (кадры): {0}'.format(
+                ', '.join(['{0}-{1}'.format(begin, end - 1) for begin, end in index.damaged_ranges])))
+        return index
+
+    def _process_task_remux(self, task_description: TaskDescription) -> bool:
+        """
+        Собрать видео объединения из ключевых кадров без декодирования (см. KeyframeRemuxer).
+        Для распознавания людей декодируются только выбранные ключевые кадры
+        :return: False, если так собрать видео нельзя (и нужно собирать с декодированием)
+        """
+        remuxer = KeyframeRemuxer(task_description.ffmpeg_path)
+        if not remuxer.is_available():
+            print('Не найден ffmpeg: {0}'.format(task_description.ffmpeg_path))
+            return False
+        for file in task_description.input_files:
+            if not H264StreamScanner.is_annex_b_file(file):
+                print('Файл не является потоком H.264: {0}'.format(file))
+                return False
+
+        archive_catalog: typing.Optional[ArchiveCatalog] = None
+        if task_description.archive_catalog_dir is not None:
+            archive_catalog = ArchiveCatalog(task_description.archive_catalog_dir)
+        try:
+            index_store = self._get_index_store(task_description, archive_catalog)
+            indexes = [index_store.get_index(file) for file in task_description.input_files]
+        finally:
+            if archive_catalog is not None:
+                archive_catalog.close()
+        if not remuxer.is_compatible(indexes):
+            return False
+
+        output_video_resolution = (task_description.output_video_width, task_description.output_video_height)
+        frames_step = task_description.skipped_frames_count + 1
+        object_detection_filename = task_description.get_actual_output_object_detection_filename()
+        timestamp_parser = FilenameTimestampParser(task_description.filename_timestamp_format)
+        concatenation_filename = task_description.get_actual_output_concatenation_filename()
+        output_frame_index: typing.Optional[OutputFrameIndex] = None
+        if task_description.write_output_frame_index:
+            output_frame_index = OutputFrameIndex(concatenation_filename, self.OUTPUT_FPS)
+        remuxer.open(concatenation_filename, self.OUTPUT_FPS)
+        is_remuxed = False
+        try:
+            with self._create_person_detector(task_description, object_detection_filename) as person_detector:
+                for index in indexes:
+                    if self._stop_event is not None and self._stop_event.is_set():
+                        self._is_exit_requested = True
+                        break
+                    keyframes = index.select_keyframes(frames_step)
+                    print('remux: {0}, keyframes: {1} of {2}'.format(
+                        index.filename, len(keyframes), len(index.keyframes)))
+                    remuxer.write_keyframes(index, keyframes)
+                    self._metrics.increment(StageMetrics.COUNTER_INPUT_FILES)
+                    start_time = timestamp_parser.parse(index.filename)
+                    fps = self._get_video_fps(index.filename)
+                    if output_frame_index is not None:
+                        for keyframe in keyframes:
+                            output_frame_index.add_frame(FrameInfo.from_source(
+                                index.filename, keyframe.frame_number, start_time, fps, keyframe.offset))
+                    if person_detector.is_enabled():
+                        for input_video, batch in self._iterate_keyframe_videos(index, keyframes):
+                            for keyframe in batch:
+                                is_ok, frame = input_video.read()
+                                if not is_ok:
+                                    break
+                                frame_info = FrameInfo.from_source(
+                                    index.filename, keyframe.frame_number, start_time, fps, keyframe.offset)
+                                person_detector.process_frame(cv2.resize(frame, output_video_resolution), frame_info)
+        finally:
+            is_remuxed = remuxer.close()
+        if is_remuxed and output_frame_index is not None:
+            output_frame_index.save()
+        return is_remuxed
+
+    def _iterate_keyframe_videos(
+            self,
+            index: H264StreamIndex,
+            keyframes: typing.List[H264Keyframe]
+    ) -> typing.Iterator[typing.Tuple[cv2.VideoCapture, typing.List[H264Keyframe]]]:
+        """
+        Перебрать видео из выбранных ключевых кадров. Ключевые кадры копируются (без декодирования)
+        частями во временные файлы, каждый временный файл открывается как отдельное видео
+        :return: (видео, ключевые кадры этого видео)
+        """
+        for batch_begin in range(0, len(keyframes), self._KEYFRAMES_PER_TEMP_FILE):
+            batch = keyframes[batch_begin:batch_begin + self._KEYFRAMES_PER_TEMP_FILE]
+            temp_file_descriptor, temp_filename = tempfile.mkstemp(suffix='.h264')
+            try:
+                with os.fdopen(temp_file_descriptor, 'wb') as temp_file:
+                    index.write_access_units(batch, temp_file)
+                # из исходного файла прочитаны только скопированные ключевые кадры
+                self._metrics.increment(StageMetrics.COUNTER_BYTES_READ, self._get_file_size(temp_filename))
+                input_video = cv2.VideoCapture(temp_filename)
+                try:
+                    yield input_video, batch
+                finally:
+                    input_video.release()
+            finally:
+                os.remove(temp_filename)
+
+    def print_input_files_info(self, task_description: TaskDescription):
+        """
+        Вывести сведения о входных файлах задачи (количество кадров, длительность, разрешения) из базы
+        видеоархива. Файлы открываются, только если их еще нет в базе или они изменились
+        """
+        assert isinstance(task_description, TaskDescription)
+        if task_description.archive_catalog_dir is None:
+            return
+        frames_count = 0
+        duration_seconds = 0.0
+        resolutions: typing.Dict[typing.Tuple[int, int], int] = {}
+        with ArchiveCatalog(task_description.archive_catalog_dir) as archive_catalog:
+            for file in task_description.input_files:
+                info = archive_catalog.get_file_info(file)
+                if info is None:
+                    print('Файл не найден: {0}'.format(file))
+                    continue
+                frames_count += info.frames_count
+                duration_seconds += info.get_duration_seconds()
+                resolution = (info.width, info.height)
+                resolutions[resolution] = resolutions.get(resolution, 0) + 1
+        print('Входные файлы: {0}, кадров: {1}, длительность: {2:.1f} ч, разрешения: {3}'.format(
+            len(task_description.input_files),
+            frames_count,
+            duration_seconds / 3600.0,
+            ', '.join(['{0}x{1} ({2})'.format(width, height, count)
+                       for (width, height), count in sorted(resolutions.items())])
+        ))
+
+    def _create_frame_sampler(self, task_description: TaskDescription) -> AdaptiveFrameSampler:
+        """
+        Средний шаг между кадрами видео объединения задается желаемой длиной видео и количеством кадров входных
+        файлов (тогда видео объединения не длиннее желаемого), или skipped_frames_count, если длина не задана
+        """
+        base_step = float(task_description.skipped_frames_count + 1)
+        steps_range = task_description.adaptive_sampling_range
+        if task_description.target_output_minutes <= 0.0:
+            return AdaptiveFrameSampler(base_step, steps_range)
+        input_frames_count = self._get_input_frames_count(task_description)
+        if input_frames_count == 0:
+            print('Количество кадров входных файлов неизвестно, средний шаг задается skipped_frames_count')
+            return AdaptiveFrameSampler(base_step, steps_range)
+        target_frames_count = max(1, int(task_description.target_output_minutes * 60.0 * self.OUTPUT_FPS))
+        return AdaptiveFrameSampler(
+            max(1.0, input_frames_count / target_frames_count), steps_range, input_frames_count, target_frames_count)
+
+    def _get_input_frames_count(self, task_description: TaskDescription) -> int:
+        """
+        Количество кадров всех входных файлов (из базы видеоархива, если она задана, у "сырых" файлов H.264 -
+        из индекса ключевых кадров); 0 - неизвестно
+        """
+        input_frames_count = 0
+        archive_catalog: typing.Optional[ArchiveCatalog] = None
+        if task_description.archive_catalog_dir is not None:
+            archive_catalog = ArchiveCatalog(task_description.archive_catalog_dir)
+        try:
+            for file in task_description.input_files:
+                if archive_catalog is not None:
+                    info = archive_catalog.get_file_info(file)
+                    input_frames_count += info.frames_count if info is not None else 0
+                elif H264StreamScanner.is_annex_b_file(file):
+                    input_frames_count += self._get_index_store(task_description, None).get_index(file).frames_count
+                else:
                     input_video = cv2.VideoCapture(file)
                     try:
-                        print('process: {0}'.format(file))
-                        concatenator.append_video(input_video)
-                        print('avg frame time: ', concatenator.get_avg_frame_time())
-                        concatenator.reset_avg_frame_time()
-                        if concatenator.is_exit_requested():
-                            self._is_exit_requested = True
-                            break
+                        input_frames_count += max(0, int(input_video.get(cv2.CAP_PROP_FRAME_COUNT)))
                     finally:
                         input_video.release()
         finally:
-            output_video.release()
+            if archive_catalog is not None:
+                archive_catalog.close()
+        return input_frames_count
+
+    @staticmethod
+    def _get_index_store(
+            task_description: TaskDescription,
+            archive_catalog: typing.Optional[ArchiveCatalog]
+    ) -> typing.Any:
+        """
+        Хранилище индексов ключевых кадров (объект с методом get_index): база видеоархива, если она задана,
+        иначе файлы индексов в каталоге keyframe_index_dir
+        """
+        if archive_catalog is not None:
+            return archive_catalog
+        return H264StreamIndexStore(task_description.get_actual_keyframe_index_dir())
+
+    @staticmethod
+    def _print_file_info(archive_catalog: ArchiveCatalog, filename: str):
+        info = archive_catalog.get_file_info(filename)
+        if info is not None:
+            print('frames: {0}, resolution: {1}x{2}, fps: {3}'.format(
+                info.frames_count, info.width, info.height, info.fps))
+
+    @staticmethod
+    def _create_detector_backend(task_description: TaskDescription) -> IPersonDetectorBackend:
+        if task_description.detector_backend == TaskDescription.DETECTOR_BACKEND_DNN:
+            settings = task_description.dnn_detector_settings
+            return DnnPersonDetectorBackend(
+                settings.model_filename,
+                settings.config_filename,
+                settings.input_width,
+                settings.input_height,
+                settings.threads_count,
+                settings.batch_size,
+                settings.person_class_id,
+                settings.confidence_threshold,
+                settings.scale,
+                settings.mean,
+                settings.swap_rb
+            )
+        return HogPersonDetectorBackend()
+
+    def _create_person_detector(
+            self,
+            task_description: TaskDescription,
+            object_detection_filename: typing.Optional[str],
+            is_detection_threaded: bool = False
+    ) -> PersonDetectorFramePostprocessor:
+        """
+        :param is_detection_threaded: кадры распознаются не в главном потоке. Окна OpenCV можно показывать только
+            из главного потока, поэтому окна распознавания тогда не показываются
+        """
+        person_detector = PersonDetectorFramePostprocessor(
+            object_detection_filename, self._headless or is_detection_threaded, self._detector_backend)
+        self._setup_motion_gate(person_detector, task_description)
+        person_detector.set_detection_event_log(self._detection_event_log)
+        person_detector.set_write_frame_index(task_description.write_output_frame_index)
+        person_detector.set_metrics(self._metrics)
+        person_detector.set_video_writer_factory(
+            lambda filename, fps, frame_size: self._create_video_writer(
+                task_description, filename, ObjectDetector.OUTPUT_VIDEO_FOURCC, fps, frame_size))
+        return person_detector
+
+    @staticmethod
+    def _create_video_writer(
+            task_description: TaskDescription,
+            filename: str,
+            fourcc: str,
+            fps: float,
+            frame_size: typing.Tuple[int, int]
+    ) -> typing.Union[cv2.VideoWriter, IVideoWriter]:
+        """
+        Создать объект записи выходного видео: через ffmpeg, если это задано в задаче и ffmpeg доступен,
+        иначе cv2.VideoWriter с кодеком fourcc
+        """
+        if task_description.video_writer_backend == TaskDescription.VIDEO_WRITER_BACKEND_FFMPEG:
+            if FfmpegVideoWriter.is_available(task_description.ffmpeg_path):
+                settings = task_description.ffmpeg_encoder_settings
+                return FfmpegVideoWriter(
+                    filename,
+                    fps,
+                    frame_size,
+                    task_description.ffmpeg_path,
+                    settings.codec,
+                    settings.preset,
+                    settings.crf,
+                    settings.threads_count,
+                    settings.pix_fmt
+                )
+            print('Не найден ffmpeg: {0}, видео будет записано через OpenCV'.format(task_description.ffmpeg_path))
+        return cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+
+    @staticmethod
+    def _get_file_size(filename: str) -> int:
+        try:
+            return os.path.getsize(filename)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _get_video_fps(filename: str) -> float:
+        """
+        Частота кадров видеофайла (0.0, если не удалось определить)
+        """
+        input_video = cv2.VideoCapture(filename)
+        try:
+            return max(0.0, float(input_video.get(cv2.CAP_PROP_FPS)))
+        finally:
+            input_video.release()
+
+    @staticmethod
+    def _setup_motion_gate(person_detector: PersonDetectorFramePostprocessor, task_description: TaskDescription):
+        if not task_description.motion_gate:
+            return
+        motion_detector = MotionDetector()
+        motion_detector.threshold = task_description.motion_threshold
+        motion_detector.min_area = task_description.motion_min_area
+        person_detector.set_motion_detector(motion_detector, task_description.motion_regions_only)
+
+    def _destroy_windows(self):
+        if not self._headless:
             cv2.destroyAllWindows()
 
     def is_exit_requested(self) -> bool:
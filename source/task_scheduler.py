@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import collections
+import json
+import os
+import typing
+
+from source.task.task_description import TaskDescription
+
+
+class TaskScheduler:
+    """
+    Порядок параллельного выполнения задач (см. ParallelTaskRunner): если задано device_workers, то задачи
+    с одного диска не запускаются больше device_workers одновременно (иначе процессы читают один диск вразнобой,
+    и он работает медленнее, чем при чтении по очереди), а из задач, которые можно запустить, первой запускается
+    самая долгая (так общее время выполнения всех задач меньше).
+
+    Диск задачи - устройство, на котором лежит большинство входных файлов задачи (или storage_device задачи,
+    если на одном физическом диске несколько разделов или папки одного сетевого хранилища). Длительность задачи
+    оценивается по размеру входных файлов и скорости обработки этой задачи при прошлых запусках
+    (история скоростей хранится в history_filename)
+    """
+
+    HISTORY_VERSION = 1
+
+    # скорость обработки задач без истории, если истории нет совсем (секунд на гигабайт входных файлов)
+    _DEFAULT_SECONDS_PER_GB = 60.0
+
+    # вес нового измерения скорости при обновлении истории (сглаживание случайных отклонений)
+    _HISTORY_SMOOTHING = 0.5
+
+    def __init__(self, history_filename: typing.Optional[str] = None, device_workers: int = 0):
+        """
+        :param history_filename: файл истории скоростей обработки задач (None - история не используется)
+        :param device_workers: сколько задач с одного диска выполнять одновременно (0 - без ограничения)
+        """
+        assert isinstance(history_filename, str) or history_filename is None
+        assert isinstance(device_workers, int)
+        assert device_workers >= 0
+        self._history_filename = history_filename
+        self._device_workers = device_workers
+        # задача -> секунд на гигабайт входных файлов
+        self._history: typing.Dict[str, float] = self._load_history()
+        # запущенные задачи по дискам
+        self._running_devices: typing.Counter[str] = collections.Counter()
+        self._pending: typing.List[typing.Tuple[int, TaskDescription, str, float]] = []
+
+    @property
+    def device_workers(self) -> int:
+        return self._device_workers
+
+    def add_tasks(self, tasks: typing.List[TaskDescription]):
+        """
+        Добавить задачи для выполнения (номер задачи - номер в списке)
+        """
+        for task_index, task in enumerate(tasks):
+            self._pending.append((task_index, task, self.get_storage_device(task), self.estimate_seconds(task)))
+        # сначала долгие задачи
+        self._pending.sort(key=lambda item: item[3], reverse=True)
+
+    def get_parallel_tasks_count(self) -> int:
+        """
+        Сколько из добавленных задач может выполняться одновременно с учетом ограничения задач на диск
+        """
+        if self._device_workers == 0:
+            return len(self._pending)
+        devices: typing.Counter[str] = collections.Counter([device for _, _, device, _ in self._pending])
+        return sum([min(tasks_count, self._device_workers) for tasks_count in devices.values()])
+
+    def has_pending_tasks(self) -> bool:
+        return len(self._pending) > 0
+
+    def start_next_task(self) -> typing.Optional[typing.Tuple[int, TaskDescription]]:
+        """
+        Выбрать следующую задачу: самую долгую из задач, диски которых не заняты
+        :return: (номер задачи, задача) или None, если все задачи ждут своих дисков
+        """
+        for pending_index, (task_index, task, device, _) in enumerate(self._pending):
+            if self._device_workers == 0 or self._running_devices[device] < self._device_workers:
+                del self._pending[pending_index]
+                self._running_devices[device] += 1
+                return task_index, task
+        return None
+
+    def finish_task(self, task: TaskDescription, seconds: typing.Optional[float]):
+        """
+        Задача завершена, ее диск освобождается
+        :param seconds: время выполнения задачи (None - задача прервана или завершилась с ошибкой,
+         и в историю не записывается)
+        """
+        self._running_devices[self.get_storage_device(task)] -= 1
+        input_bytes = self._get_input_bytes(task)
+        if seconds is None or input_bytes == 0:
+            return
+        seconds_per_gb = seconds / (input_bytes / 1024.0 ** 3)
+        history_key = self._get_history_key(task)
+        previous = self._history.get(history_key)
+        if previous is not None:
+            seconds_per_gb = previous + (seconds_per_gb - previous) * self._HISTORY_SMOOTHING
+        self._history[history_key] = seconds_per_gb
+
+    def estimate_seconds(self, task: TaskDescription) -> float:
+        """
+        Оценка времени выполнения задачи
+        """
+        seconds_per_gb = self._history.get(self._get_history_key(task))
+        if seconds_per_gb is None:
+            # скорость похожей задачи неизвестна - средняя по всем задачам
+            seconds_per_gb = sum(self._history.values()) / len(self._history) if len(self._history) > 0 \
+                else self._DEFAULT_SECONDS_PER_GB
+        return seconds_per_gb * self._get_input_bytes(task) / 1024.0 ** 3
+
+    def save_history(self):
+        if self._history_filename is None:
+            return
+        dirname = os.path.dirname(self._history_filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        temp_filename = '{0}.{1}.tmp'.format(self._history_filename, os.getpid())
+        with open(temp_filename, 'w', encoding='utf-8') as file:
+            json.dump({'version': self.HISTORY_VERSION, 'seconds_per_gb': self._history}, file,
+                      ensure_ascii=False, indent=2)
+        os.replace(temp_filename, self._history_filename)
+
+    @staticmethod
+    def get_storage_device(task: TaskDescription) -> str:
+        """
+        Диск задачи: storage_device задачи или устройство, на котором лежит большинство входных файлов
+        """
+        if task.storage_device is not None:
+            return task.storage_device
+        devices: typing.Counter[str] = collections.Counter()
+        for file in task.input_files:
+            try:
+                devices[str(os.stat(file).st_dev)] += 1
+            except OSError:
+                continue
+        if len(devices) == 0:
+            return ''
+        return devices.most_common(1)[0][0]
+
+    @staticmethod
+    def _get_input_bytes(task: TaskDescription) -> int:
+        input_bytes = 0
+        for file in task.input_files:
+            try:
+                input_bytes += os.path.getsize(file)
+            except OSError:
+                continue
+        return input_bytes
+
+    @staticmethod
+    def _get_history_key(task: TaskDescription) -> str:
+        # имя выходного файла без префикса-даты одно и то же при всех запусках задачи
+        return '{0}|{1}'.format(task.output_concatenation_filename, task.output_object_detection_filename)
+
+    def _load_history(self) -> typing.Dict[str, float]:
+        if self._history_filename is None or not os.path.isfile(self._history_filename):
+            return {}
+        try:
+            with open(self._history_filename, 'r', encoding='utf-8') as file:
+                history = json.load(file)
+            if history.get('version') != self.HISTORY_VERSION:
+                return {}
+            return {key: float(value) for key, value in history['seconds_per_gb'].items()}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            print('Поврежден файл истории задач: {0}'.format(self._history_filename))
+            return {}
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import tempfile
+import time
+import traceback
+import typing
+
+from source.task.json_task_parser import JsonTaskParser, JsonTaskParserException
+from source.task.task_description import TaskDescription
+from source.task_processor import TaskProcessor
+from source.video_files_index import VideoFilesIndex
+
+
+class TaskWatcher:
+    """
+    Наблюдение за каталогами камер (постоянно работающий процесс вместо запуска по расписанию раз в сутки).
+    Каталоги периодически опрашиваются поисковиками задач, и каждый записанный камерой файл сразу обрабатывается
+    в сегмент задачи (см. TaskCheckpoint). В ежедневное время запуска задачи обрабатываются целиком, но так как
+    почти все файлы уже обработаны, остается только склеить сегменты в выходные файлы.
+
+    Поисковики задач отсчитывают время от ближайшего ежедневного запуска (а не от текущего времени), поэтому
+    в течение дня находят те же файлы, что и при запуске по расписанию. Файл считается записанным, если
+    он не изменялся settle_seconds секунд или у камеры уже есть следующий файл. Файлы с ошибкой обработки
+    повторно обрабатываются только после изменения. Файл настроек перечитывается при каждом опросе
+    """
+
+    # сколько секунд файл не должен изменяться, если у камеры уже есть следующий файл
+    _NEXT_FILE_MIN_AGE_SECONDS = 5.0
+
+    def __init__(
+            self,
+            json_config_filename: str,
+            daily_time: datetime.time,
+            poll_seconds: float = 60.0,
+            settle_seconds: float = 120.0,
+            checkpoint_dir: typing.Optional[str] = None,
+            headless: bool = True,
+            stop_event: typing.Optional[typing.Any] = None
+    ):
+        """
+        :param json_config_filename: файл настроек задач
+        :param daily_time: ежедневное время запуска (склейки выходных файлов)
+        :param poll_seconds: интервал опроса каталогов
+        :param settle_seconds: сколько секунд последний файл камеры не должен изменяться, чтобы считаться записанным
+        :param checkpoint_dir: каталог сегментов для задач, у которых не заданы checkpoint_dir и segment_cache_dir
+         (по умолчанию во временной папке)
+        :param stop_event: внешнее событие остановки (объект с методами is_set() и wait(timeout))
+        """
+        assert isinstance(json_config_filename, str)
+        assert isinstance(daily_time, datetime.time)
+        assert poll_seconds > 0.0
+        assert settle_seconds >= 0.0
+        self._json_config_filename = json_config_filename
+        self._daily_time = daily_time
+        self._poll_seconds = poll_seconds
+        self._settle_seconds = settle_seconds
+        self._checkpoint_dir = checkpoint_dir or os.path.join(tempfile.gettempdir(), 'fastplay_watch_segments')
+        self._headless = headless
+        self._stop_event = stop_event
+        self._is_exit_requested: bool = False
+
+        # файлы, обработка которых завершилась ошибкой: файл -> (размер, время изменения)
+        self._failed_files: typing.Dict[str, typing.Tuple[int, float]] = {}
+
+    def run(self):
+        """
+        Наблюдать за каталогами до остановки (stop_event или ESC в окне обработки)
+        """
+        next_run_time = self.get_next_run_time(datetime.datetime.now())
+        print('Наблюдение за каталогами, ближайшая склейка: {0}, каталог сегментов: {1}'.format(
+            next_run_time, self._checkpoint_dir))
+        while not self._is_stopped():
+            if datetime.datetime.now() >= next_run_time:
+                self._run_tasks(next_run_time)
+                next_run_time = self.get_next_run_time(max(datetime.datetime.now(), next_run_time))
+                print('Ближайшая склейка: {0}'.format(next_run_time))
+                continue
+            self._process_closed_files(next_run_time)
+            if self._stop_event is not None:
+                self._stop_event.wait(self._poll_seconds)
+            else:
+                time.sleep(self._poll_seconds)
+
+    def get_next_run_time(self, after: datetime.datetime) -> datetime.datetime:
+        """
+        Ближайшее ежедневное время запуска позже after
+        """
+        run_time = datetime.datetime.combine(after.date(), self._daily_time)
+        if run_time <= after:
+            run_time += datetime.timedelta(days=1)
+        return run_time
+
+    def is_exit_requested(self) -> bool:
+        return self._is_exit_requested
+
+    def _run_tasks(self, run_time: datetime.datetime):
+        """
+        Обработать задачи целиком (необработанные файлы и склейка сегментов)
+        """
+        print('--- Ежедневная склейка {0} ---'.format(run_time))
+        for task in self._load_tasks(run_time):
+            if self._is_stopped():
+                return
+            print(task)
+            self._run_processor(lambda processor: processor.process_task(task))
+
+    def _process_closed_files(self, run_time: datetime.datetime):
+        """
+        Обработать в сегменты записанные файлы, которые еще не обработаны
+        """
+        for task in self._load_tasks(run_time):
+            if self._is_stopped():
+                return
+            if not TaskProcessor.is_segmented_task(task):
+                # такие задачи не собираются из сегментов, они обрабатываются целиком при ежедневном запуске
+                continue
+            segment_store = TaskProcessor.create_segment_store(task)
+            pending_files = [file for file in self._get_closed_files(task.input_files)
+                             if not segment_store.is_file_done(file) and not self._is_failed_file(file)]
+            if len(pending_files) == 0:
+                continue
+            print('Записанные файлы ({0}) задачи {1}'.format(len(pending_files), task.output_concatenation_filename))
+            for file in pending_files:
+                is_processed = self._run_processor(lambda processor: processor.process_task_segments(task, [file]))
+                if not is_processed:
+                    self._mark_failed_file(file)
+                if self._is_stopped():
+                    return
+
+    def _run_processor(self, process: typing.Callable[[TaskProcessor], None]) -> bool:
+        """
+        Выполнить обработку (ошибки выводятся, но наблюдение продолжается)
+        :return: завершилась ли обработка без ошибок
+        """
+        task_processor = TaskProcessor()
+        task_processor.stop_event = self._stop_event
+        task_processor.headless = self._headless
+        try:
+            process(task_processor)
+        except Exception:
+            traceback.print_exc()
+            return False
+        finally:
+            if task_processor.is_exit_requested():
+                self._is_exit_requested = True
+        return True
+
+    def _load_tasks(self, run_time: datetime.datetime) -> typing.List[TaskDescription]:
+        """
+        Прочитать задачи (входные файлы ищутся с точкой отсчета run_time)
+        """
+        # индексы каталогов single_scan и archive_catalog_dir строятся заново при каждом опросе: за время между
+        # опросами камеры записывают новые файлы (время изменения каталога на сетевой папке может не обновиться)
+        VideoFilesIndex.clear_cache()
+        try:
+            with open(self._json_config_filename, 'r') as file:
+                tasks = JsonTaskParser(False, run_time).tasks_from_json(file.read())
+        except (OSError, ValueError, KeyError, JsonTaskParserException) as error:
+            print('Не удалось прочитать задачи из {0}: {1}'.format(self._json_config_filename, error))
+            return []
+        for task in tasks:
+            if task.checkpoint_dir is None:
+                task.checkpoint_dir = self._checkpoint_dir
+        return [task for task in tasks if task.check()]
+
+    def _get_closed_files(self, input_files: typing.List[str]) -> typing.List[str]:
+        """
+        Входные файлы, запись которых камерой завершена (входные файлы идут по времени начала записи)
+        """
+        now = datetime.datetime.now().timestamp()
+        closed_files = []
+        for file_number, file in enumerate(input_files):
+            try:
+                age_seconds = now - os.path.getmtime(file)
+            except OSError:
+                continue
+            # камера начала писать следующий файл, значит этот файл закрыт
+            has_next_file = file_number + 1 < len(input_files)
+            if age_seconds >= self._settle_seconds or \
+                    (has_next_file and age_seconds >= self._NEXT_FILE_MIN_AGE_SECONDS):
+                closed_files.append(file)
+        return closed_files
+
+    def _is_failed_file(self, file: str) -> bool:
+        state = self._failed_files.get(file)
+        return state is not None and state == self._get_file_state(file)
+
+    def _mark_failed_file(self, file: str):
+        state = self._get_file_state(file)
+        if state is not None:
+            self._failed_files[file] = state
+            print('Ошибка обработки, файл будет обработан повторно после изменения: {0}'.format(file))
+
+    @staticmethod
+    def _get_file_state(file: str) -> typing.Optional[typing.Tuple[int, float]]:
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def _is_stopped(self) -> bool:
+        return self._is_exit_requested or (self._stop_event is not None and self._stop_event.is_set())
@@ -1,24 +1,65 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import datetime
+import queue
+import threading
 import time
 import typing
 from typing import Tuple
 import cv2
+import numpy
 
+from source.adaptive_frame_sampler import AdaptiveFrameSampler
+from source.frame_buffer_pool import FrameBufferPool
+from source.frame_info import FrameInfo
+from source.h264_stream_index import H264StreamIndex
 from source.i_frame_post_processor import IFramePostProcessor
+from source.i_video_writer import IVideoWriter
+from source.output_frame_index import OutputFrameIndex
+from source.stage_metrics import StageMetrics
 from source.utils.frozen import Frozen
 
 
+# признак окончания потока кадров между стадиями конвейера
+_END_OF_STREAM = object()
+
+
+class _PipelineStage(threading.Thread):
+    """
+    Поток стадии конвейера, который запоминает возникшее исключение, чтобы передать его в основной поток
+    """
+
+    def __init__(self, name: str, stage_function: typing.Callable, args: tuple):
+        super().__init__(name=name, daemon=True)
+        self._stage_function = stage_function
+        self._stage_args = args
+        self.error: typing.Optional[BaseException] = None
+
+    def run(self):
+        try:
+            self._stage_function(*self._stage_args)
+        except BaseException as error:
+            self.error = error
+
+
 class VideoConcatenator(Frozen):
     _EOF_FILE_ERROR_FRAMES_COUNT = 150
     _STABILISATION_FRAMES_COUNT = 100
 
+    # как часто стадии конвейера проверяют, не нужно ли завершиться (в секундах)
+    _PIPELINE_POLL_INTERVAL = 0.1
+
     _KEY_ESC = 27
     _KEY_SPACE = 32
 
-    def __init__(self, output_video: cv2.VideoWriter, out_frame_width: int, out_frame_height):
+    def __init__(
+            self,
+            output_video: typing.Union[cv2.VideoWriter, IVideoWriter],
+            out_frame_width: int,
+            out_frame_height
+    ):
         super().__init__()
-        assert isinstance(output_video, cv2.VideoWriter)
+        assert isinstance(output_video, (cv2.VideoWriter, IVideoWriter))
         assert isinstance(out_frame_width, int)
         assert isinstance(out_frame_height, int)
         assert output_video.isOpened()
@@ -33,6 +74,55 @@ class VideoConcatenator(Frozen):
         # флаг активируется, если пользователь запросил выход
         self._exit_requested = False
 
+        # внешнее событие остановки (например, общее для нескольких процессов обработки),
+        # объект должен иметь метод is_set()
+        self._stop_event: typing.Optional[typing.Any] = None
+
+        # размер очередей между стадиями конвейера (0 - обработка без конвейера, в одном потоке)
+        self._pipeline_queue_size: int = 0
+
+        # флаг прекращения чтения текущего входного видео (выход или переход к следующему файлу)
+        self._stop_decoding = threading.Event()
+
+        # флаг активируется, если пользователь запросил переход к следующему входному файлу
+        self._video_skip_requested = False
+
+        # режим без окон (кадры не показываются, клавиши не обрабатываются)
+        self._headless = False
+
+        # предпросмотр кадров в отдельном процессе (объект с методом publish(frame))
+        self._preview: typing.Optional[typing.Any] = None
+
+        # текущий входной файл (для определения происхождения кадров, см. set_source)
+        self._source_filename: typing.Optional[str] = None
+        self._source_start_time: typing.Optional[datetime.datetime] = None
+        self._source_fps: float = 0.0
+
+        # смещения ключевых кадров текущего видео из ключевых кадров (номер кадра -> смещение в исходном файле)
+        self._keyframe_offsets: typing.Dict[int, int] = {}
+
+        # индекс кадров выходного видео (None - не ведется)
+        self._output_frame_index: typing.Optional[OutputFrameIndex] = None
+
+        # адаптивное прореживание кадров (None - пропускается постоянное количество кадров skipped_frames_count)
+        self._frame_sampler: typing.Optional[AdaptiveFrameSampler] = None
+
+        # при конвейерной обработке поток распознавания передает потоку чтения через эту очередь, сколько всего
+        # кадров с найденными людьми (для адаптивного прореживания), и последнее полученное значение
+        self._detection_results: typing.Optional[queue.Queue] = None
+        self._detected_frames_count: int = 0
+
+        # время стадий обработки и счетчики кадров
+        self._metrics: StageMetrics = StageMetrics()
+
+        # повторное использование буферов кадров вместо выделения памяти под каждый кадр.
+        # Декодированные кадры и кадры в разрешении выходного видео берутся из разных пулов: буфер
+        # декодированного кадра освобождается в основном потоке, а повторно выдается только потоку чтения
+        # (после того как адаптивное прореживание закончило работу с этим кадром)
+        self._reuse_frame_buffers: bool = True
+        self._decoded_frame_pool = FrameBufferPool()
+        self._output_frame_pool = FrameBufferPool()
+
         self.freeze()
 
     @property
@@ -44,16 +134,306 @@ class VideoConcatenator(Frozen):
         assert isinstance(value, int)
         self._skipped_frames_count = value
 
+    @property
+    def frame_sampler(self) -> typing.Optional[AdaptiveFrameSampler]:
+        return self._frame_sampler
+
+    @frame_sampler.setter
+    def frame_sampler(self, value: typing.Optional[AdaptiveFrameSampler]):
+        assert isinstance(value, AdaptiveFrameSampler) or value is None
+        self._frame_sampler = value
+
+    @property
+    def metrics(self) -> StageMetrics:
+        """
+        Время стадий обработки и счетчики (передаются и постобработчикам)
+        """
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, value: StageMetrics):
+        assert isinstance(value, StageMetrics)
+        self._metrics = value
+        for post_processor in self._post_processors:
+            post_processor.set_metrics(value)
+
+    @property
+    def reuse_frame_buffers(self) -> bool:
+        """
+        Использовать пулы буферов для декодированных кадров и кадров в разрешении выходного видео
+        (постобработчик может использовать кадр только во время вызова process_frame)
+        """
+        return self._reuse_frame_buffers
+
+    @reuse_frame_buffers.setter
+    def reuse_frame_buffers(self, value: bool):
+        assert isinstance(value, bool)
+        self._reuse_frame_buffers = value
+        if not value:
+            self._decoded_frame_pool.clear()
+            self._output_frame_pool.clear()
+
+    @property
+    def output_frame_index(self) -> typing.Optional[OutputFrameIndex]:
+        return self._output_frame_index
+
+    @output_frame_index.setter
+    def output_frame_index(self, value: typing.Optional[OutputFrameIndex]):
+        assert isinstance(value, OutputFrameIndex) or value is None
+        self._output_frame_index = value
+
+    @property
+    def stop_event(self) -> typing.Optional[typing.Any]:
+        return self._stop_event
+
+    @stop_event.setter
+    def stop_event(self, value: typing.Optional[typing.Any]):
+        assert value is None or hasattr(value, 'is_set')
+        self._stop_event = value
+
+    @property
+    def pipeline_queue_size(self) -> int:
+        return self._pipeline_queue_size
+
+    @pipeline_queue_size.setter
+    def pipeline_queue_size(self, value: int):
+        assert isinstance(value, int)
+        assert value >= 0
+        self._pipeline_queue_size = value
+
+    @property
+    def headless(self) -> bool:
+        return self._headless
+
+    @headless.setter
+    def headless(self, value: bool):
+        assert isinstance(value, bool)
+        self._headless = value
+
+    @property
+    def preview(self) -> typing.Optional[typing.Any]:
+        return self._preview
+
+    @preview.setter
+    def preview(self, value: typing.Optional[typing.Any]):
+        assert value is None or hasattr(value, 'publish')
+        self._preview = value
+
     def add_post_processor(self, processor: IFramePostProcessor):
         assert isinstance(processor, IFramePostProcessor)
+        processor.set_metrics(self._metrics)
         self._post_processors.append(processor)
 
     def clear_all_post_processors(self):
         self._post_processors.clear()
 
-    def append_video(self, input_video: cv2.VideoCapture):
+    def set_source(
+            self,
+            source_filename: typing.Optional[str],
+            start_time: typing.Optional[datetime.datetime] = None,
+            fps: float = 0.0
+    ):
+        """
+        Задать входной файл, кадры которого будут добавляться (постобработчики получают происхождение кадров)
+        :param source_filename: входной файл
+        :param start_time: время начала записи файла (None - неизвестно)
+        :param fps: частота кадров входного файла (для вычисления времени кадра)
+        """
+        assert isinstance(source_filename, str) or source_filename is None
+        assert isinstance(start_time, datetime.datetime) or start_time is None
+        self._source_filename = source_filename
+        self._source_start_time = start_time
+        self._source_fps = float(fps)
+
+    def append_video(self, input_video: cv2.VideoCapture, stream_index: typing.Optional[H264StreamIndex] = None):
+        """
+        Добавить входное видео
+        :param input_video: входное видео
+        :param stream_index: индекс потока H.264 входного файла. Если задан, то кадры нумеруются по потоку,
+         конец файла определяется по количеству кадров потока, а после начала файла и после поврежденных
+         участков кадры пропускаются только до ключевого кадра (а не _STABILISATION_FRAMES_COUNT кадров)
+        """
+        assert isinstance(input_video, cv2.VideoCapture)
+        assert isinstance(stream_index, H264StreamIndex) or stream_index is None
+        if self._frame_sampler is not None:
+            self._frame_sampler.start_video()
+        self._append_frames(self._decode_frames(
+            input_video, self._skipped_frames_count, self._STABILISATION_FRAMES_COUNT, stream_index))
+
+    def append_keyframes_video(
+            self,
+            input_video: cv2.VideoCapture,
+            frame_numbers: typing.Optional[list] = None,
+            byte_offsets: typing.Optional[list] = None
+    ):
+        """
+        Добавить видео, состоящее только из выбранных ключевых кадров
+        (каждый кадр декодируется независимо, поэтому все кадры попадают в выходной файл без пропусков
+        и без ожидания стабилизации изображения)
+        :param input_video: входное видео
+        :param frame_numbers: номера ключевых кадров во входном файле (по порядку)
+        :param byte_offsets: смещения ключевых кадров во входном файле (по порядку)
+        """
         assert isinstance(input_video, cv2.VideoCapture)
-        key = -1
+        frames = self._decode_frames(input_video, 0, 1)
+        if frame_numbers is not None:
+            frames = ((frame_numbers[frame_index], frame) for frame_index, frame in frames
+                      if frame_index < len(frame_numbers))
+            if byte_offsets is not None:
+                self._keyframe_offsets = dict(zip(frame_numbers, byte_offsets))
+        try:
+            self._append_frames(frames)
+        finally:
+            self._keyframe_offsets = {}
+
+    def _get_frame_info(self, frame_index: int) -> FrameInfo:
+        return FrameInfo.from_source(
+            self._source_filename,
+            frame_index,
+            self._source_start_time,
+            self._source_fps,
+            self._keyframe_offsets.get(frame_index)
+        )
+
+    def _append_frames(self, frames: typing.Iterator[typing.Tuple[int, numpy.ndarray]]):
+        self._stop_decoding.clear()
+        self._video_skip_requested = False
+        if self._pipeline_queue_size > 0:
+            self._append_frames_pipelined(frames)
+        else:
+            self._append_frames_serial(frames)
+        if self._is_stop_event_set():
+            self._exit_requested = True
+
+    def _append_frames_serial(self, frames: typing.Iterator[typing.Tuple[int, numpy.ndarray]]):
+        """
+        Последовательная обработка: чтение, изменение размера, запись и постобработка в одном потоке
+        """
+        start_t = time.time()
+        for frame_index, frame in frames:
+            frame_info = self._get_frame_info(frame_index)
+            frame = self._write_frame(frame, frame_info)
+
+            self._post_process_frame(frame, frame_info)
+            self._release_output_frame(frame)
+
+            self._process_key(self._wait_key())
+            start_t = self._register_frame_time(start_t)
+            if self._stop_decoding.is_set():
+                break
+
+    def _append_frames_pipelined(self, frames: typing.Iterator[typing.Tuple[int, numpy.ndarray]]):
+        """
+        Конвейерная обработка. Чтение (декодирование) и постобработка (распознавание) выполняются в отдельных
+        потоках, изменение размера, запись и показ кадра - в текущем потоке. Стадии связаны очередями
+        ограниченного размера: если какая-то стадия не успевает, предыдущая ждет (порядок кадров сохраняется).
+        OpenCV освобождает GIL во время декодирования, кодирования и распознавания, поэтому стадии работают
+        на разных ядрах одновременно.
+        """
+        decoded_frames = queue.Queue(maxsize=self._pipeline_queue_size)
+        detection_frames = queue.Queue(maxsize=self._pipeline_queue_size)
+        if self._frame_sampler is not None and self._post_processors:
+            self._detection_results = queue.Queue()
+        decoder = _PipelineStage('decoder', self._decoder_stage, (frames, decoded_frames))
+        detector = _PipelineStage('detection', self._detection_stage, (detection_frames,))
+        decoder.start()
+        detector.start()
+        try:
+            start_t = time.time()
+            while True:
+                decoded_frame = self._get_from_stage(decoded_frames, decoder)
+                if decoded_frame is _END_OF_STREAM:
+                    break
+                if self._stop_decoding.is_set():
+                    # выход запрошен, оставшиеся в очереди кадры не обрабатываем
+                    continue
+
+                frame_index, frame = decoded_frame
+                frame_info = self._get_frame_info(frame_index)
+                frame = self._write_frame(frame, frame_info)
+                if self._post_processors:
+                    self._put_to_stage(detection_frames, (frame, frame_info), detector)
+                else:
+                    self._release_output_frame(frame)
+
+                self._process_key(self._wait_key())
+                start_t = self._register_frame_time(start_t)
+        finally:
+            self._stop_decoding.set()
+            while decoder.is_alive():
+                try:
+                    decoded_frames.get(timeout=self._PIPELINE_POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+            self._put_to_stage(detection_frames, _END_OF_STREAM, detector, raise_error=False)
+            decoder.join()
+            detector.join()
+            self._detection_results = None
+
+        for stage in [decoder, detector]:
+            if stage.error is not None:
+                raise stage.error
+
+    def _decoder_stage(self, frames: typing.Iterator[typing.Tuple[int, numpy.ndarray]], output_queue: queue.Queue):
+        try:
+            for frame in frames:
+                while not self._stop_decoding.is_set():
+                    try:
+                        output_queue.put(frame, timeout=self._PIPELINE_POLL_INTERVAL)
+                        break
+                    except queue.Full:
+                        pass
+                if self._stop_decoding.is_set():
+                    break
+        finally:
+            output_queue.put(_END_OF_STREAM)
+
+    def _detection_stage(self, input_queue: queue.Queue):
+        while True:
+            item = input_queue.get()
+            if item is _END_OF_STREAM:
+                break
+            frame, frame_info = item
+            self._post_process_frame(frame, frame_info)
+            self._release_output_frame(frame)
+            if self._detection_results is not None:
+                self._detection_results.put(self._count_detected_frames())
+
+    def _get_from_stage(self, stage_queue: queue.Queue, stage: '_PipelineStage'):
+        while True:
+            try:
+                return stage_queue.get(timeout=self._PIPELINE_POLL_INTERVAL)
+            except queue.Empty:
+                if not stage.is_alive() and stage_queue.empty():
+                    return _END_OF_STREAM
+
+    def _put_to_stage(self, stage_queue: queue.Queue, item, stage: '_PipelineStage', raise_error: bool = True):
+        while stage.is_alive():
+            try:
+                stage_queue.put(item, timeout=self._PIPELINE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+        if raise_error and stage.error is not None:
+            raise stage.error
+
+    def _decode_frames(
+            self,
+            input_video: cv2.VideoCapture,
+            skipped_frames_count: int,
+            stabilisation_frames_count: int,
+            stream_index: typing.Optional[H264StreamIndex] = None
+    ) -> typing.Iterator[typing.Tuple[int, numpy.ndarray]]:
+        """
+        Читает входное видео и выдает кадры, которые нужно поместить в выходной файл
+        :param input_video: входное видео
+        :param skipped_frames_count: сколько кадров пропускать после каждого выданного
+         (если задано адаптивное прореживание, то количество определяется им)
+        :param stabilisation_frames_count: сколько кадров подряд нужно получить, чтобы изображение считалось
+         стабильным (после начала файла или после ошибки чтения)
+        :param stream_index: индекс потока H.264 входного файла (см. append_video)
+        :return: итератор по (номер кадра во входном видео, кадр в исходном разрешении)
+        """
         eof = False
 
         # счетчик неудачных попыток подряд получить кадр
@@ -62,57 +442,241 @@ class VideoConcatenator(Frozen):
         # счетчик удачно полученных подряд кадров
         good_frames = 0
 
-        while input_video.isOpened() and key not in [self._KEY_ESC, self._KEY_SPACE] and not eof:
-            start_t = time.time()
+        # номер следующего кадра во входном видео (считаются только успешно полученные кадры)
+        frame_position = 0
 
+        # неудачные попытки получить кадр, которые еще не учтены в счетчике ошибок чтения
+        # (попытки в конце файла ошибками не считаются)
+        failed_grabs_count = 0
+
+        # размер декодированных кадров (известен после первого полученного кадра)
+        decoded_frame_shape: typing.Optional[tuple] = None
+
+        # номер кадра потока, начиная с которого изображение правильное (используется, если задан индекс потока)
+        stable_frame_number = 0
+        if stream_index is not None:
+            # кадры до первого ключевого кадра декодер не выдает
+            frame_position = stream_index.get_first_decoded_frame_number()
+            stable_frame_number = frame_position
+
+        metrics = self._metrics
+        while input_video.isOpened() and not eof and not self._is_decoding_stopped():
+            start_t = time.perf_counter()
             ret = input_video.grab()
+            metrics.add_time(StageMetrics.STAGE_GRAB, time.perf_counter() - start_t)
             if not ret:
+                failed_grabs_count += 1
                 good_frames = 0
                 empty_count += 1
 
                 # больше N подряд кадров не читаются (критерий, что файл завершен)
                 # если только несколько кадров не читается, то это может быть просто битый участок
                 eof = empty_count >= self._EOF_FILE_ERROR_FRAMES_COUNT
+                if stream_index is not None:
+                    eof = eof or self._is_stream_end(stream_index, frame_position)
+                    if not eof:
+                        self._print_stream_position_lost(frame_position)
+                        stream_index = None
             else:
+                metrics.increment(StageMetrics.COUNTER_FRAMES_GRABBED)
+                if failed_grabs_count > 0:
+                    metrics.increment(StageMetrics.COUNTER_GRAB_FAILURES, failed_grabs_count)
+                    failed_grabs_count = 0
                 good_frames += 1
                 empty_count = 0
+                frame_position += 1
+                if stream_index is not None:
+                    stable_frame_number = self._get_stable_frame_number(
+                        stream_index, frame_position - 1, stable_frame_number)
 
-            # чтобы кадр стал "хороший" (картинка стабилизировалась после ключевого кадра),
-            # нужно после начала того, как что-то получено получить еще N кадров подряд
-            if good_frames >= self._STABILISATION_FRAMES_COUNT:
-                ret, frame = input_video.retrieve()
+            if stream_index is None:
+                # чтобы кадр стал "хороший" (картинка стабилизировалась после ключевого кадра),
+                # нужно после начала того, как что-то получено получить еще N кадров подряд
+                is_stable = good_frames >= stabilisation_frames_count
+            else:
+                # по индексу потока известно, с какого ключевого кадра картинка правильная
+                is_stable = ret and frame_position - 1 >= stable_frame_number
+            if is_stable:
+                start_t = time.perf_counter()
+                if self._reuse_frame_buffers and decoded_frame_shape is not None:
+                    # кадр декодируется в буфер из пула (если размер кадра изменится, OpenCV выделит новый)
+                    ret, frame = input_video.retrieve(self._decoded_frame_pool.acquire(decoded_frame_shape))
+                else:
+                    ret, frame = input_video.retrieve()
+                metrics.add_time(StageMetrics.STAGE_RETRIEVE, time.perf_counter() - start_t)
 
                 if ret:
-                    # приводим кадр к размеру, который помещается в выходной файл
-                    frame = cv2.resize(frame, self._out_video_resolution)
-                    cv2.imshow('frame', frame)
-
-                    self._output_video.write(frame)
+                    decoded_frame_shape = frame.shape
+                    metrics.increment(StageMetrics.COUNTER_FRAMES_KEPT)
+                    yield frame_position - 1, frame
 
-                    for post_processor in self._post_processors:
-                        post_processor.process_frame(frame)
+                    if self._frame_sampler is not None:
+                        start_t = time.perf_counter()
+                        skipped_frames_count = self._frame_sampler.get_skipped_frames_count(
+                            frame, self._get_detected_frames_count())
+                        metrics.add_time(StageMetrics.STAGE_SAMPLING, time.perf_counter() - start_t)
 
                     # пропускаем кадры (решение CAP_PROP_POS_FRAMES не срабатывает как надо для данного типа видео)
-                    for i in range(self._skipped_frames_count):
-                        input_video.grab()
-
-                    key = cv2.waitKey(1)
-                    end_t = time.time()
-                    frame_time = end_t - start_t
-                    self._frame_times += frame_time
-                    self._frame_count += 1
+                    start_t = time.perf_counter()
+                    grabbed_frames_count = 0
+                    for i in range(skipped_frames_count):
+                        if input_video.grab():
+                            grabbed_frames_count += 1
+                    frame_position += grabbed_frames_count
+                    metrics.add_time(StageMetrics.STAGE_SKIP, time.perf_counter() - start_t)
+                    metrics.increment(StageMetrics.COUNTER_FRAMES_GRABBED, grabbed_frames_count)
+                    failed_grabs_count += skipped_frames_count - grabbed_frames_count
+                    if stream_index is not None:
+                        if grabbed_frames_count < skipped_frames_count:
+                            eof = self._is_stream_end(stream_index, frame_position)
+                            if not eof:
+                                self._print_stream_position_lost(frame_position)
+                                stream_index = None
+                        else:
+                            stable_frame_number = self._get_stable_frame_number(
+                                stream_index, frame_position - 1, stable_frame_number)
                 else:
+                    metrics.increment(StageMetrics.COUNTER_RETRIEVE_FAILURES)
                     good_frames = 0
                     print('Can not retrieve grabbed frame!')
+
+    @staticmethod
+    def _is_stream_end(stream_index: H264StreamIndex, frame_position: int) -> bool:
+        """
+        Прочитаны ли все кадры потока (последний кадр мог быть записан не полностью и не декодироваться)
+        """
+        return frame_position >= stream_index.frames_count - 1
+
+    @staticmethod
+    def _print_stream_position_lost(frame_position: int):
+        """
+        Кадр не прочитан в середине потока: неизвестно, сколько данных пропустил декодер, поэтому номера кадров
+        больше не соответствуют индексу потока, и дальше файл читается без индекса
+        """
+        print('Ошибка чтения в середине потока (кадр {0}), индекс потока больше не используется'.format(
+            frame_position))
+
+    def _get_stable_frame_number(
+            self,
+            stream_index: H264StreamIndex,
+            frame_number: int,
+            stable_frame_number: int
+    ) -> int:
+        """
+        Номер кадра, начиная с которого изображение правильное: если кадр frame_number в поврежденном участке,
+        то ключевой кадр после этого участка
+        """
+        resync_frame_number = stream_index.get_resync_frame_number(frame_number)
+        if resync_frame_number is None or resync_frame_number <= stable_frame_number:
+            return stable_frame_number
+        self._metrics.increment(StageMetrics.COUNTER_DAMAGED_REGIONS)
+        return resync_frame_number
+
+    def _write_frame(self, frame: numpy.ndarray, frame_info: FrameInfo) -> numpy.ndarray:
+        # приводим кадр к размеру, который помещается в выходной файл
+        start_t = time.perf_counter()
+        if self._reuse_frame_buffers:
+            out_width, out_height = self._out_video_resolution
+            decoded_frame = frame
+            frame = cv2.resize(
+                decoded_frame,
+                self._out_video_resolution,
+                dst=self._output_frame_pool.acquire((out_height, out_width) + decoded_frame.shape[2:])
+            )
+            # декодированный кадр больше не нужен (показывается и записывается кадр выходного разрешения)
+            self._decoded_frame_pool.release(decoded_frame)
+        else:
+            frame = cv2.resize(frame, self._out_video_resolution)
+        self._metrics.add_time(StageMetrics.STAGE_RESIZE, time.perf_counter() - start_t)
+        if not self._headless or self._preview is not None:
+            start_t = time.perf_counter()
+            if not self._headless:
+                cv2.imshow('frame', frame)
+            if self._preview is not None:
+                self._preview.publish(frame)
+            self._metrics.add_time(StageMetrics.STAGE_GUI, time.perf_counter() - start_t)
+
+        start_t = time.perf_counter()
+        self._output_video.write(frame)
+        self._metrics.add_time(StageMetrics.STAGE_ENCODE, time.perf_counter() - start_t)
+        if self._output_frame_index is not None:
+            self._output_frame_index.add_frame(frame_info)
+        return frame
+
+    def _release_output_frame(self, frame: numpy.ndarray):
+        """
+        Вернуть кадр в пул после записи и постобработки
+        """
+        if self._reuse_frame_buffers:
+            self._output_frame_pool.release(frame)
+
+    def _post_process_frame(self, frame: numpy.ndarray, frame_info: FrameInfo):
+        if not self._post_processors:
+            return
+        start_t = time.perf_counter()
+        for post_processor in self._post_processors:
+            post_processor.process_frame(frame, frame_info)
+        self._metrics.add_time(StageMetrics.STAGE_POST_PROCESS, time.perf_counter() - start_t)
+
+    def _wait_key(self) -> int:
+        if self._headless:
+            return -1
+        start_t = time.perf_counter()
+        key = cv2.waitKey(1)
+        self._metrics.add_time(StageMetrics.STAGE_GUI, time.perf_counter() - start_t)
+        return key
+
+    def _process_key(self, key: int):
+        if key in [self._KEY_ESC, self._KEY_SPACE]:
+            self._stop_decoding.set()
         if key == self._KEY_ESC:
             self._exit_requested = True
+        if key == self._KEY_SPACE:
+            self._video_skip_requested = True
+
+    def _register_frame_time(self, start_t: float) -> float:
+        end_t = time.time()
+        self._frame_times += end_t - start_t
+        self._frame_count += 1
+        return end_t
+
+    def _get_detected_frames_count(self) -> int:
+        """
+        Сколько всего кадров с найденными людьми. При конвейерной обработке счетчики постобработчиков меняются
+        в потоке распознавания, поэтому берется последнее значение, переданное им через очередь
+        """
+        if self._detection_results is None:
+            return self._count_detected_frames()
+        try:
+            while True:
+                self._detected_frames_count = self._detection_results.get_nowait()
+        except queue.Empty:
+            pass
+        return self._detected_frames_count
+
+    def _count_detected_frames(self) -> int:
+        return sum([post_processor.get_detected_frames_count() for post_processor in self._post_processors])
+
+    def _is_decoding_stopped(self) -> bool:
+        return self._stop_decoding.is_set() or self._is_stop_event_set()
+
+    def _is_stop_event_set(self) -> bool:
+        return self._stop_event is not None and self._stop_event.is_set()
 
     def get_avg_frame_time(self) -> float:
+        if self._frame_count == 0:
+            return 0.0
         return self._frame_times / self._frame_count
 
     def reset_avg_frame_time(self):
         self._frame_times = 0.0
         self._frame_count = 0
 
+    def is_video_skip_requested(self) -> bool:
+        """
+        Запросил ли пользователь переход к следующему входному файлу во время последнего добавления видео
+        """
+        return self._video_skip_requested
+
     def is_exit_requested(self):
         return self._exit_requested
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import bisect
+import datetime
+import fnmatch
+import glob
+import os
+import typing
+
+
+class VideoFilesIndex:
+    """
+    Индекс файлов каталога по метке даты-времени в имени файла. Каталог читается один раз,
+    из каждого имени файла извлекаются все подстроки, которые могут быть меткой даты-времени
+    (шаблон префикса + метка + шаблон суффикса совпадает с именем файла). Метки хранятся в отсортированном
+    списке, поиск файлов по метке - двоичный поиск.
+
+    Результат поиска совпадает с результатом glob.glob для шаблона префикс + метка + суффикс
+    (учитываются те же правила: скрытые файлы, регистр символов в Windows, разбиение пути на каталог и имя).
+    Индекс строится только для простых случаев (метка даты-времени фиксированной длины, в каталоге нет
+    спецсимволов glob), в остальных случаях нужно искать через glob.
+
+    Построенные индексы запоминаются, чтобы задачи с одним и тем же каталогом не читали каталог повторно.
+    Индекс перестраивается, если время изменения каталога изменилось (в каталоге появились или удалены файлы),
+    поэтому долго работающие процессы (наблюдение за каталогами, очередь работы) видят новые файлы.
+    Если задан каталог архива (ArchiveCatalog), то список файлов берется из него.
+    """
+
+    # даты-время, на которых проверяется, что метка даты-времени имеет фиксированную длину
+    _SAMPLE_DATETIMES = [
+        datetime.datetime(2000, 1, 1, 0, 0, 0),
+        datetime.datetime(2001, 9, 9, 9, 9, 9),
+        datetime.datetime(2022, 12, 31, 23, 59, 59),
+    ]
+
+    _indexes: typing.Dict[tuple, 'VideoFilesIndex'] = {}
+
+    def __init__(
+            self,
+            dirname: str,
+            name_prefix_pattern: str,
+            suffix_pattern: str,
+            key_length: int,
+            digits_only: bool,
+            archive_catalog: typing.Optional[typing.Any] = None
+    ):
+        """
+        :param dirname: каталог (в том виде, в котором его получит glob)
+        :param name_prefix_pattern: шаблон начала имени файла до метки даты-времени
+        :param suffix_pattern: шаблон окончания имени файла после метки даты-времени
+        :param key_length: длина метки даты-времени
+        :param digits_only: метка даты-времени состоит только из цифр
+        :param archive_catalog: каталог архива (ArchiveCatalog), из которого берется список файлов
+        """
+        self._dirname = dirname
+        self._name_prefix_pattern = name_prefix_pattern
+        self._suffix_pattern = suffix_pattern
+        self._key_length = key_length
+        self._digits_only = digits_only
+        self._archive_catalog = archive_catalog
+
+        # время изменения каталога на момент чтения (None - каталог не найден)
+        self._directory_mtime: typing.Optional[float] = self._get_directory_mtime(dirname)
+
+        # отсортированный список (метка даты-времени, имя файла)
+        self._entries: typing.List[typing.Tuple[str, str]] = []
+        self._scan()
+
+    @classmethod
+    def get_index(
+            cls,
+            dir: str,
+            prefix_pattern: str,
+            strftime_pattern: str,
+            suffix_pattern: str,
+            archive_catalog: typing.Optional[typing.Any] = None
+    ) -> typing.Optional['VideoFilesIndex']:
+        """
+        Получить индекс для поиска файлов по шаблону '{dir}\\{prefix}{дата-время}{suffix}'
+        :return: индекс или None, если для этого шаблона индекс построить нельзя
+        """
+        path_prefix = '{dir}\\{prefix}'.format(dir=dir, prefix=prefix_pattern)
+        sample_keys = [sample.strftime(strftime_pattern) for sample in cls._SAMPLE_DATETIMES]
+        key_length = len(sample_keys[0])
+        if key_length == 0 or any([len(key) != key_length for key in sample_keys]):
+            return None
+
+        # метка и суффикс не должны менять каталог, в котором ищутся файлы,
+        # а метка должна совпадать с именем файла буквально
+        separators = [os.sep] + ([os.altsep] if os.altsep else [])
+        for part in sample_keys + [suffix_pattern]:
+            if any([separator in part for separator in separators]):
+                return None
+        if any([glob.has_magic(key) for key in sample_keys]):
+            return None
+
+        sample_path = path_prefix + sample_keys[0] + suffix_pattern
+        dirname, basename = os.path.split(sample_path)
+        # без спецсимволов glob только проверяет существование файла, а спецсимволы в каталоге
+        # означают поиск по нескольким каталогам - такие случаи не индексируем
+        if not glob.has_magic(basename) or glob.has_magic(dirname) or dirname == sample_path:
+            return None
+        # шаблон, начинающийся с точки, находит и скрытые файлы
+        if basename.startswith('.'):
+            return None
+
+        name_prefix_pattern = basename[:len(basename) - len(sample_keys[0]) - len(suffix_pattern)]
+
+        digits_only = all([key.isdigit() for key in sample_keys])
+        cache_key = (dirname, name_prefix_pattern, suffix_pattern, key_length, digits_only)
+        index = cls._indexes.get(cache_key)
+        if index is None or index._directory_mtime != cls._get_directory_mtime(dirname):
+            index = VideoFilesIndex(
+                dirname, name_prefix_pattern, suffix_pattern, key_length, digits_only, archive_catalog)
+            cls._indexes[cache_key] = index
+        return index
+
+    @classmethod
+    def clear_cache(cls):
+        cls._indexes.clear()
+
+    @staticmethod
+    def _get_directory_mtime(dirname: str) -> typing.Optional[float]:
+        try:
+            return os.stat(dirname or os.curdir).st_mtime
+        except OSError:
+            return None
+
+    def find_files(self, keys: typing.Iterable[str]) -> typing.List[str]:
+        """
+        Найти файлы по меткам даты-времени
+        :param keys: метки даты-времени (в порядке, в котором нужны файлы)
+        :return: пути к файлам (для каждой метки отсортированы, без повторов)
+        """
+        video_files: typing.List[str] = []
+        video_files_set: typing.Set[str] = set()
+        checked_keys: typing.Set[str] = set()
+        for key in keys:
+            key = os.path.normcase(key)
+            if key in checked_keys:
+                continue
+            checked_keys.add(key)
+            position = bisect.bisect_left(self._entries, (key, ''))
+            files = []
+            while position < len(self._entries) and self._entries[position][0] == key:
+                files.append(os.path.join(self._dirname, self._entries[position][1]))
+                position += 1
+            files.sort()
+            for file in files:
+                if file not in video_files_set:
+                    video_files.append(file)
+                    video_files_set.add(file)
+        return video_files
+
+    def _scan(self):
+        try:
+            if self._archive_catalog is not None:
+                names = self._archive_catalog.list_directory(self._dirname)
+            else:
+                with os.scandir(self._dirname or os.curdir) as entries:
+                    names = [entry.name for entry in entries]
+        except OSError:
+            names = []
+
+        entries = []
+        for name in names:
+            # glob пропускает скрытые файлы
+            if name.startswith('.'):
+                continue
+            for key in self._extract_keys(name):
+                entries.append((key, name))
+        entries.sort()
+        self._entries = entries
+
+    def _extract_keys(self, name: str) -> typing.Set[str]:
+        """
+        Все подстроки имени файла, которые могут быть меткой даты-времени: до подстроки имя совпадает
+        с шаблоном префикса, после - с шаблоном суффикса
+        """
+        keys = set()
+        for begin in range(len(name) - self._key_length + 1):
+            end = begin + self._key_length
+            key = name[begin:end]
+            if self._digits_only and not key.isdigit():
+                continue
+            if fnmatch.fnmatch(name[:begin], self._name_prefix_pattern) and \
+                    fnmatch.fnmatch(name[end:], self._suffix_pattern):
+                keys.add(os.path.normcase(key))
+        return keys
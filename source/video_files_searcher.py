@@ -5,7 +5,9 @@ import glob
 import os
 from typing import List, Set, Optional
 
+from source.archive_catalog import ArchiveCatalog
 from source.utils.frozen import Frozen
+from source.video_files_index import VideoFilesIndex
 
 
 class VideoFilesSearcher(Frozen):
@@ -83,6 +85,13 @@ class VideoFilesSearcher(Frozen):
         self._video_length_hours: int = 24
         self._video_length_minutes: int = 0
 
+        # читать каталог один раз и искать файлы по индексу меток даты-времени
+        # (вместо вызова glob для каждой минуты интервала поиска)
+        self._single_scan: bool = False
+
+        # каталог кэша с базой видеоархива (см. ArchiveCatalog), None - не используется
+        self._archive_catalog_dir: Optional[str] = None
+
         self.freeze()
 
     @property
@@ -176,6 +185,35 @@ class VideoFilesSearcher(Frozen):
         assert isinstance(value, int)
         self._video_length_minutes = value
 
+    @property
+    def single_scan(self) -> bool:
+        """
+        Режим однократного чтения каталога. Результат поиска тот же, что и при поиске через glob,
+        но каталог читается один раз (а не для каждой минуты интервала поиска), что заметно быстрее
+        для сетевых дисков и больших интервалов. Если для заданных шаблонов индекс построить нельзя,
+        то используется обычный поиск
+        """
+        return self._single_scan
+
+    @single_scan.setter
+    def single_scan(self, value: bool):
+        assert isinstance(value, bool)
+        self._single_scan = value
+
+    @property
+    def archive_catalog_dir(self) -> Optional[str]:
+        """
+        Каталог с базой видеоархива. Если задан, то список файлов каталога с видео берется из базы
+        (каталог с видео читается, только если в нем появились или удалились файлы), поиск выполняется
+        по индексу как в режиме single_scan
+        """
+        return self._archive_catalog_dir
+
+    @archive_catalog_dir.setter
+    def archive_catalog_dir(self, value: Optional[str]):
+        assert isinstance(value, str) or value is None
+        self._archive_catalog_dir = value
+
     def get_actual_reference_date_point(self) -> datetime.datetime:
         """
         Получить точку начала отсчета времени (от которого считаем дельту по времени НАЗАД).
@@ -188,22 +226,44 @@ class VideoFilesSearcher(Frozen):
         assert isinstance(dt, datetime.datetime)
         return self._prefix_pattern + dt.strftime(self._strftime_pattern) + self._suffix_pattern
 
+    def get_search_datetimes(self) -> List[datetime.datetime]:
+        """
+        Даты-время (с шагом в минуту), для которых ищутся видеофайлы
+        """
+        date_reference_point = self.get_actual_reference_date_point()
+        begin_date = date_reference_point - datetime.timedelta(
+            hours=self._reference_date_delta_hours,
+            minutes=self._reference_date_delta_minutes
+        )
+        search_length_minutes = (self._video_length_hours * self._MINUTES_PER_HOUR) + self._video_length_minutes
+        return [begin_date + datetime.timedelta(minutes=current_minute)
+                for current_minute in range(search_length_minutes)]
+
     def search_video_files(self, dir: str) -> List[str]:
         assert os.path.isdir(dir)
+        search_datetimes = self.get_search_datetimes()
+
+        if self._single_scan or self._archive_catalog_dir is not None:
+            archive_catalog = None
+            if self._archive_catalog_dir is not None:
+                archive_catalog = ArchiveCatalog(self._archive_catalog_dir)
+            try:
+                index = VideoFilesIndex.get_index(
+                    dir, self._prefix_pattern, self._strftime_pattern, self._suffix_pattern, archive_catalog)
+                if index is not None:
+                    return index.find_files([dt.strftime(self._strftime_pattern) for dt in search_datetimes])
+            finally:
+                if archive_catalog is not None:
+                    archive_catalog.close()
+            print('Для шаблонов поиска нельзя построить индекс, используется поиск через glob')
+
         video_files: List[str] = []
 
         # будет происходить дублирующее добавление в множество
         # (оптимизация времени выполнения за счет затрат памяти)
         video_files_set: Set[str] = set()
 
-        date_reference_point = self.get_actual_reference_date_point()
-        begin_date = date_reference_point - datetime.timedelta(
-            hours=self._reference_date_delta_hours,
-            minutes=self._reference_date_delta_minutes
-        )
-        search_length_minutes = (self._video_length_hours * self._MINUTES_PER_HOUR) + self._video_length_minutes
-        for current_minute in range(search_length_minutes):
-            selected_time = begin_date + datetime.timedelta(minutes=current_minute)
+        for selected_time in search_datetimes:
             pattern = self.get_pattern_for_datetime(selected_time)
             files = glob.glob('{dir}\\{pattern}'.format(dir=dir, pattern=pattern))
             files.sort()
@@ -223,6 +283,8 @@ class VideoFilesSearcher(Frozen):
             f'    reference_date: "{self._reference_date}" (actual {self.get_actual_reference_date_point()})\n' \
             f'    reference date delta: {self._reference_date_delta_hours} часов ' \
             f'{self._reference_date_delta_minutes} минут\n' \
+            f'    single_scan: {self._single_scan}\n' \
+            f'    archive_catalog_dir: "{self._archive_catalog_dir}"\n' \
             f'--- конец ---\n'
         return res
 
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import time
+import typing
+
+from source.utils.frozen import Frozen
+
+
+class WorkUnit(Frozen):
+    """
+    Единица работы очереди: один входной файл задачи (обрабатывается в сегмент) или задача целиком
+    (если задачу нельзя разделить на сегменты, input_file - None)
+    """
+
+    def __init__(
+            self,
+            unit_id: int,
+            job_id: int,
+            task_index: int,
+            task_json: str,
+            input_file: typing.Optional[str],
+            attempts: int
+    ):
+        super().__init__()
+        assert isinstance(unit_id, int)
+        assert isinstance(job_id, int)
+        assert isinstance(task_index, int)
+        assert isinstance(task_json, str)
+        assert isinstance(input_file, str) or input_file is None
+        assert isinstance(attempts, int)
+        self._unit_id = unit_id
+        self._job_id = job_id
+        self._task_index = task_index
+        self._task_json = task_json
+        self._input_file = input_file
+        self._attempts = attempts
+        self.freeze()
+
+    @property
+    def unit_id(self) -> int:
+        return self._unit_id
+
+    @property
+    def job_id(self) -> int:
+        return self._job_id
+
+    @property
+    def task_index(self) -> int:
+        """
+        Номер задачи в файле настроек
+        """
+        return self._task_index
+
+    @property
+    def task_json(self) -> str:
+        """
+        Настройки задачи (словарь задачи файла настроек с найденными входными файлами)
+        """
+        return self._task_json
+
+    @property
+    def input_file(self) -> typing.Optional[str]:
+        """
+        Входной файл (None - задача целиком)
+        """
+        return self._input_file
+
+    @property
+    def attempts(self) -> int:
+        """
+        Номер попытки обработки (с 1)
+        """
+        return self._attempts
+
+    def __str__(self):
+        target = self._input_file if self._input_file is not None else 'задача целиком'
+        return f'запуск {self._job_id}, задача {self._task_index}: {target} (попытка {self._attempts})'
+
+
+class WorkQueue:
+    """
+    Очередь работы для нескольких машин: база SQLite в общем каталоге (сетевой папке). Координатор добавляет
+    запуск (job) с единицами работы, процессы обработки (на любых машинах) берут единицы работы в аренду (lease).
+    Пока единица работы обрабатывается, аренда продлевается. Если процесс обработки завершился аварийно
+    (или пропала машина), аренда истекает, и единица работы выдается другому процессу. После max_attempts
+    неудачных попыток единица работы считается ошибочной.
+
+    Используется обычный журнал SQLite (не WAL), так как WAL не работает в сетевых папках. Время аренды
+    сравнивается по часам машин, поэтому часы машин должны быть синхронизированы (с точностью много меньше
+    времени аренды)
+    """
+
+    QUEUE_VERSION = 1
+
+    STATE_PENDING = 'pending'
+    STATE_LEASED = 'leased'
+    STATE_DONE = 'done'
+    STATE_FAILED = 'failed'
+
+    _QUEUE_FILENAME = 'work_queue.sqlite'
+
+    # сколько секунд ждать, пока другой процесс закончит запись в базу
+    _LOCK_TIMEOUT = 60.0
+
+    def __init__(self, queue_dir: str, max_attempts: int = 3):
+        assert isinstance(queue_dir, str)
+        assert isinstance(max_attempts, int)
+        assert max_attempts > 0
+        os.makedirs(queue_dir, exist_ok=True)
+        self._queue_dir = queue_dir
+        self._max_attempts = max_attempts
+        # транзакции начинаются явно (BEGIN IMMEDIATE), чтобы выдача работы не пересекалась между процессами
+        self._connection: typing.Optional[sqlite3.Connection] = sqlite3.connect(
+            os.path.join(queue_dir, self._QUEUE_FILENAME), timeout=self._LOCK_TIMEOUT, isolation_level=None)
+        self._create_tables()
+
+    @property
+    def queue_dir(self) -> str:
+        return self._queue_dir
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_job(self, units: typing.List[typing.Tuple[int, str, typing.Optional[str]]]) -> int:
+        """
+        Добавить запуск
+        :param units: единицы работы (номер задачи, настройки задачи, входной файл или None - задача целиком)
+        :return: номер запуска
+        """
+        with self._transaction():
+            cursor = self._connection.execute('INSERT INTO jobs (created) VALUES (?)', (time.time(),))
+            job_id = cursor.lastrowid
+            self._connection.executemany(
+                'INSERT INTO units (job_id, task_index, task_json, input_file, state, attempts) '
+                'VALUES (?, ?, ?, ?, ?, 0)',
+                [(job_id, task_index, task_json, input_file, self.STATE_PENDING)
+                 for task_index, task_json, input_file in units]
+            )
+        return job_id
+
+    def lease(self, worker_id: str, lease_seconds: float) -> typing.Optional[WorkUnit]:
+        """
+        Взять в аренду следующую единицу работы: ожидающую или с истекшей арендой (процесс обработки пропал).
+        Единицы работы с истекшей арендой, у которых закончились попытки, отмечаются ошибочными
+        :return: единица работы или None, если работы нет
+        """
+        assert lease_seconds > 0
+        now = time.time()
+        with self._transaction():
+            self._connection.execute(
+                'UPDATE units SET state = ?, error = ? WHERE state = ? AND lease_expires < ? AND attempts >= ?',
+                (self.STATE_FAILED, 'истекла аренда', self.STATE_LEASED, now, self._max_attempts))
+            row = self._connection.execute(
+                'SELECT id, job_id, task_index, task_json, input_file, attempts FROM units '
+                'WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY job_id, id LIMIT 1',
+                (self.STATE_PENDING, self.STATE_LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            unit_id, job_id, task_index, task_json, input_file, attempts = row
+            self._connection.execute(
+                'UPDATE units SET state = ?, worker_id = ?, lease_expires = ?, attempts = ? WHERE id = ?',
+                (self.STATE_LEASED, worker_id, now + lease_seconds, attempts + 1, unit_id))
+        return WorkUnit(unit_id, job_id, task_index, task_json, input_file, attempts + 1)
+
+    def renew_lease(self, unit: WorkUnit, worker_id: str, lease_seconds: float) -> bool:
+        """
+        Продлить аренду
+        :return: False, если аренда уже потеряна (истекла и единица работы выдана другому процессу)
+        """
+        with self._transaction():
+            cursor = self._connection.execute(
+                'UPDATE units SET lease_expires = ? WHERE id = ? AND state = ? AND worker_id = ?',
+                (time.time() + lease_seconds, unit.unit_id, self.STATE_LEASED, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, unit: WorkUnit, worker_id: str):
+        """
+        Отметить единицу работы выполненной
+        """
+        self._finish(unit, worker_id, self.STATE_DONE, None)
+
+    def fail(self, unit: WorkUnit, worker_id: str, error: str):
+        """
+        Отметить неудачную попытку: единица работы снова ожидает обработки или, если попытки закончились, ошибочна
+        """
+        state = self.STATE_FAILED if unit.attempts >= self._max_attempts else self.STATE_PENDING
+        self._finish(unit, worker_id, state, error)
+
+    def release(self, unit: WorkUnit, worker_id: str):
+        """
+        Вернуть единицу работы в очередь без траты попытки (обработка остановлена)
+        """
+        with self._transaction():
+            self._connection.execute(
+                'UPDATE units SET state = ?, worker_id = NULL, attempts = attempts - 1 '
+                'WHERE id = ? AND state = ? AND worker_id = ?',
+                (self.STATE_PENDING, unit.unit_id, self.STATE_LEASED, worker_id))
+
+    def get_job_states(self, job_id: int) -> typing.Dict[str, int]:
+        """
+        Количество единиц работы запуска по состояниям
+        """
+        rows = self._connection.execute(
+            'SELECT state, COUNT(*) FROM units WHERE job_id = ? GROUP BY state', (job_id,)).fetchall()
+        return {state: count for state, count in rows}
+
+    def is_job_finished(self, job_id: int) -> bool:
+        states = self.get_job_states(job_id)
+        return states.get(self.STATE_PENDING, 0) == 0 and states.get(self.STATE_LEASED, 0) == 0
+
+    def get_job_units(self, job_id: int, state: str) -> typing.List[typing.Tuple[int, typing.Optional[str]]]:
+        """
+        Единицы работы запуска в состоянии state
+        :return: [(номер задачи, входной файл или None)]
+        """
+        return self._connection.execute(
+            'SELECT task_index, input_file FROM units WHERE job_id = ? AND state = ? ORDER BY id',
+            (job_id, state)).fetchall()
+
+    def get_job_errors(self, job_id: int) -> typing.List[typing.Tuple[int, typing.Optional[str], str]]:
+        """
+        Ошибочные единицы работы запуска
+        :return: [(номер задачи, входной файл или None, последняя ошибка)]
+        """
+        return self._connection.execute(
+            'SELECT task_index, input_file, error FROM units WHERE job_id = ? AND state = ? ORDER BY id',
+            (job_id, self.STATE_FAILED)).fetchall()
+
+    def _finish(self, unit: WorkUnit, worker_id: str, state: str, error: typing.Optional[str]):
+        with self._transaction():
+            cursor = self._connection.execute(
+                'UPDATE units SET state = ?, error = ? WHERE id = ? AND state = ? AND worker_id = ?',
+                (state, error, unit.unit_id, self.STATE_LEASED, worker_id))
+        if cursor.rowcount != 1:
+            print('Аренда потеряна, результат не записан в очередь: {0}'.format(unit))
+
+    def _transaction(self) -> '_ImmediateTransaction':
+        return _ImmediateTransaction(self._connection)
+
+    def _create_tables(self):
+        with self._transaction():
+            self._connection.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value INTEGER)')
+            row = self._connection.execute("SELECT value FROM settings WHERE key = 'version'").fetchone()
+            if row is not None and row[0] != self.QUEUE_VERSION:
+                # формат базы изменился - старые запуски не переносятся
+                self._connection.execute('DROP TABLE IF EXISTS jobs')
+                self._connection.execute('DROP TABLE IF EXISTS units')
+            self._connection.execute(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES ('version', ?)", (self.QUEUE_VERSION,))
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'created REAL)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS units ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'job_id INTEGER NOT NULL, '
+                'task_index INTEGER NOT NULL, '
+                'task_json TEXT NOT NULL, '
+                'input_file TEXT, '
+                'state TEXT NOT NULL, '
+                'worker_id TEXT, '
+                'lease_expires REAL, '
+                'attempts INTEGER NOT NULL, '
+                'error TEXT)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS units_state ON units (state, job_id, id)')
+
+
+class _ImmediateTransaction:
+    """
+    Транзакция с блокировкой записи с самого начала (BEGIN IMMEDIATE): два процесса не могут одновременно
+    прочитать одну и ту же ожидающую единицу работы
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def __enter__(self):
+        self._connection.execute('BEGIN IMMEDIATE')
+        return self._connection
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self._connection.execute('COMMIT')
+        else:
+            self._connection.execute('ROLLBACK')
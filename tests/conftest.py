@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import pytest
+
+from source.object_detector import ObjectDetector
+from source.task_processor import TaskProcessor
+
+
+@pytest.fixture
+def mpeg4_output(monkeypatch):
+    """
+    Выходные видео в MPEG-4 Part 2: кодек H.264 есть не в каждой сборке OpenCV
+    """
+    monkeypatch.setattr(TaskProcessor, 'OUTPUT_FOURCC', 'mp4v')
+    monkeypatch.setattr(ObjectDetector, 'OUTPUT_VIDEO_FOURCC', 'mp4v')
+
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import glob
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+import typing
+
+import pytest
+
+from source import queue_coordinator
+from source.queue_coordinator import QueueCoordinator
+from source.queue_worker import QueueWorker
+from source.segment_cache import SegmentCache
+from source.task.json_task_parser import JsonTaskParser
+from source.task_processor import TaskProcessor
+from source.video_concatenator import VideoConcatenator
+from source.work_queue import WorkQueue
+from tests.video_helpers import count_video_frames, write_numbered_video
+
+# процессы обработки запускаются через fork, чтобы наследовать подмены (monkeypatch) тестов
+_HAS_FORK = 'fork' in multiprocessing.get_all_start_methods()
+_CONTEXT = multiprocessing.get_context('fork') if _HAS_FORK else None
+
+pytestmark = pytest.mark.skipif(not _HAS_FORK, reason='нужен запуск процессов через fork')
+
+FRAMES_PER_FILE = 150
+SKIPPED_FRAMES_COUNT = 4
+# в начале файла кадры пропускаются, пока изображение не станет стабильным
+OUTPUT_FRAMES_PER_FILE = len(range(
+    VideoConcatenator._STABILISATION_FRAMES_COUNT - 1, FRAMES_PER_FILE, SKIPPED_FRAMES_COUNT + 1))
+
+LEASE_SECONDS = 1.0
+POLL_SECONDS = 0.1
+
+
+@pytest.fixture(autouse=True)
+def fork_processes(monkeypatch):
+    monkeypatch.setattr(queue_coordinator.multiprocessing, 'Process', _CONTEXT.Process)
+    monkeypatch.setattr(queue_coordinator.multiprocessing, 'Event', _CONTEXT.Event)
+
+
+@pytest.fixture
+def input_files(tmp_path) -> typing.List[str]:
+    input_dir = tmp_path / 'record'
+    input_dir.mkdir()
+    return [
+        write_numbered_video(str(input_dir / 'cam_2022081618{0:02d}00.mkv'.format(minute)), FRAMES_PER_FILE)
+        for minute in range(3)
+    ]
+
+
+def make_tasks_json(input_files: typing.List[str], output_dir: str) -> str:
+    return json.dumps({'tasks': [{
+        'type': 'process_video_task',
+        'input_files': input_files,
+        'output_concatenation_filename': os.path.join(output_dir, 'result.mkv'),
+        'output_video_width': 160,
+        'output_video_height': 120,
+        'skipped_frames_count': SKIPPED_FRAMES_COUNT,
+        'prefetch_files': 0,
+    }]})
+
+
+def get_units(queue_dir: str) -> typing.Dict[str, typing.Tuple[str, int, typing.Optional[str]]]:
+    """
+    :return: входной файл -> (состояние, номер попытки, процесс обработки)
+    """
+    connection = sqlite3.connect(os.path.join(queue_dir, 'work_queue.sqlite'))
+    try:
+        rows = connection.execute('SELECT input_file, state, attempts, worker_id FROM units').fetchall()
+    finally:
+        connection.close()
+    return {input_file: (state, attempts, worker_id) for input_file, state, attempts, worker_id in rows}
+
+
+def get_result_filename(output_dir: str) -> typing.Optional[str]:
+    # к имени выходного файла добавляется дата
+    filenames = glob.glob(os.path.join(output_dir, '*result.mkv'))
+    return filenames[0] if filenames else None
+
+
+def run_coordinator(tmp_path, input_files: typing.List[str], stop_event=None) -> QueueCoordinator:
+    coordinator = QueueCoordinator(
+        str(tmp_path / 'queue'), True, stop_event, lease_seconds=LEASE_SECONDS, poll_seconds=POLL_SECONDS)
+    coordinator.run(make_tasks_json(input_files, str(tmp_path)), local_workers_count=2)
+    return coordinator
+
+
+def test_two_workers_process_segments_and_stitch(tmp_path, mpeg4_output, input_files):
+    coordinator = run_coordinator(tmp_path, input_files)
+
+    assert not coordinator.has_errors()
+    assert not coordinator.is_exit_requested()
+    units = get_units(str(tmp_path / 'queue'))
+    assert sorted(units) == sorted(input_files)
+    assert all([state == WorkQueue.STATE_DONE for state, _, _ in units.values()])
+    assert count_video_frames(get_result_filename(str(tmp_path))) == OUTPUT_FRAMES_PER_FILE * len(input_files)
+    segments_dir = str(tmp_path / 'queue' / 'segments')
+    assert glob.glob(os.path.join(segments_dir, '*', '*_concatenation.mkv'))
+    assert not glob.glob(os.path.join(segments_dir, '*', '*.partial.*'))
+
+
+def test_lease_of_killed_worker_expires(tmp_path, mpeg4_output, input_files, monkeypatch):
+    queue_dir = str(tmp_path / 'queue')
+    workers_started = _CONTEXT.Value('i', 0)
+    lease_taken = _CONTEXT.Event()
+    run_local_worker = queue_coordinator._run_local_worker
+
+    def run_killed_first_worker(*args):
+        with workers_started.get_lock():
+            worker_number = workers_started.value
+            workers_started.value += 1
+        if worker_number == 0:
+            # процесс берет единицу работы в аренду и аварийно завершается
+            with WorkQueue(queue_dir) as queue:
+                assert queue.lease('killed', LEASE_SECONDS) is not None
+            lease_taken.set()
+            os.kill(os.getpid(), signal.SIGKILL)
+        lease_taken.wait(10.0)
+        run_local_worker(*args)
+
+    monkeypatch.setattr(queue_coordinator, '_run_local_worker', run_killed_first_worker)
+    coordinator = run_coordinator(tmp_path, input_files)
+
+    assert not coordinator.has_errors()
+    units = get_units(queue_dir)
+    assert all([state == WorkQueue.STATE_DONE for state, _, _ in units.values()])
+    # первая единица работы обработана вторым процессом со второй попытки
+    assert units[input_files[0]][1] == 2
+    assert units[input_files[0]][2] != 'killed'
+    assert count_video_frames(get_result_filename(str(tmp_path))) == OUTPUT_FRAMES_PER_FILE * len(input_files)
+
+
+def test_failed_unit_is_retried_up_to_max_attempts(tmp_path, mpeg4_output, input_files, monkeypatch):
+    process_task_segments = TaskProcessor.process_task_segments
+
+    def fail_second_file(task_processor, task_description, files):
+        if files == [input_files[1]]:
+            raise RuntimeError('ошибка чтения')
+        process_task_segments(task_processor, task_description, files)
+
+    monkeypatch.setattr(TaskProcessor, 'process_task_segments', fail_second_file)
+    coordinator = run_coordinator(tmp_path, input_files)
+
+    assert coordinator.has_errors()
+    units = get_units(str(tmp_path / 'queue'))
+    assert units[input_files[1]][:2] == (WorkQueue.STATE_FAILED, 3)
+    assert units[input_files[0]][0] == WorkQueue.STATE_DONE
+    assert units[input_files[2]][0] == WorkQueue.STATE_DONE
+    # при склейке ошибочный файл обрабатывается координатором
+    assert count_video_frames(get_result_filename(str(tmp_path))) == OUTPUT_FRAMES_PER_FILE * len(input_files)
+
+
+def test_stop_releases_leased_units(tmp_path, mpeg4_output, input_files, monkeypatch):
+    processing_started = _CONTEXT.Event()
+
+    def wait_for_stop(task_processor, task_description, files):
+        processing_started.set()
+        for _ in range(100):
+            if task_processor.stop_event.is_set():
+                break
+            time.sleep(0.1)
+        task_processor._is_exit_requested = True
+
+    monkeypatch.setattr(TaskProcessor, 'process_task_segments', wait_for_stop)
+    stop_event = threading.Event()
+
+    def stop_after_start():
+        processing_started.wait(10.0)
+        stop_event.set()
+
+    stopper = threading.Thread(target=stop_after_start)
+    stopper.start()
+    coordinator = run_coordinator(tmp_path, input_files, stop_event)
+    stopper.join()
+
+    assert coordinator.is_exit_requested()
+    # прерванная обработка не тратит попытку, единицы работы снова ожидают обработки
+    units = get_units(str(tmp_path / 'queue'))
+    assert all([(state, attempts) == (WorkQueue.STATE_PENDING, 0) for state, attempts, _ in units.values()])
+    assert get_result_filename(str(tmp_path)) is None
+
+
+def test_lost_lease_stops_processing(tmp_path, mpeg4_output, input_files, monkeypatch):
+    queue_dir = str(tmp_path / 'queue')
+    task_dict = json.loads(make_tasks_json(input_files[:1], str(tmp_path)))['tasks'][0]
+    task_dict['segment_cache_dir'] = str(tmp_path / 'segments')
+    with WorkQueue(queue_dir) as queue:
+        queue.add_job([(0, json.dumps(task_dict), input_files[0])])
+    processing_started = threading.Event()
+    processing_stopped = threading.Event()
+
+    def wait_for_stop(task_processor, task_description, files):
+        processing_started.set()
+        for _ in range(100):
+            if task_processor.stop_event.is_set():
+                processing_stopped.set()
+                break
+            time.sleep(0.1)
+        task_processor._is_exit_requested = True
+
+    monkeypatch.setattr(TaskProcessor, 'process_task_segments', wait_for_stop)
+    worker_stop_event = threading.Event()
+
+    def take_over_lease():
+        processing_started.wait(10.0)
+        # аренда истекла, и единицу работы взял другой процесс
+        connection = sqlite3.connect(os.path.join(queue_dir, 'work_queue.sqlite'))
+        with connection:
+            connection.execute("UPDATE units SET worker_id = 'other', lease_expires = lease_expires + 3600")
+        connection.close()
+        processing_stopped.wait(10.0)
+        worker_stop_event.set()
+
+    thief = threading.Thread(target=take_over_lease)
+    thief.start()
+    worker = QueueWorker(queue_dir, 'worker', LEASE_SECONDS, POLL_SECONDS, True, worker_stop_event)
+    worker.run()
+    thief.join()
+
+    assert processing_stopped.is_set()
+    # результат потерявшего аренду процесса не записан, единица работы осталась у другого процесса
+    assert get_units(queue_dir)[input_files[0]] == (WorkQueue.STATE_LEASED, 1, 'other')
+
+
+def test_partial_segments_of_processes_differ(tmp_path, input_files):
+    task = JsonTaskParser(False).task_from_dict(json.loads(make_tasks_json(input_files, str(tmp_path)))['tasks'][0])
+    partial_filenames = _CONTEXT.Queue()
+
+    def get_partial_filename():
+        cache = SegmentCache(str(tmp_path / 'segments'), task)
+        partial_filenames.put(cache.get_partial_segment_filenames(input_files[0])[0])
+
+    processes = [_CONTEXT.Process(target=get_partial_filename) for _ in range(2)]
+    for process in processes:
+        process.start()
+    filenames = [partial_filenames.get(timeout=10.0) for _ in processes]
+    for process in processes:
+        process.join()
+    assert filenames[0] != filenames[1]
+    assert os.path.dirname(filenames[0]) == os.path.dirname(filenames[1])
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import typing
+
+import cv2
+import numpy
+import pytest
+
+from benchmarks.pcm_h264_stream import get_frame_number, write_pcm_stream
+from source.frame_info import FrameInfo
+from source.h264_stream_index import H264StreamScanner, H264StreamIndex
+from source.i_frame_post_processor import IFramePostProcessor
+from source.stage_metrics import StageMetrics
+from source.video_concatenator import VideoConcatenator
+
+FRAMES_COUNT = 200
+GOP_SIZE = 50
+# размер кадра потока (4 x 3 макроблока)
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 48
+
+# кадры 70..76 затерты нулями: в индексе их нет, и ключевой кадр 100 становится кадром 93 потока
+ZEROED_FRAMES = range(70, 77)
+# кадр 133 записан не полностью
+TRUNCATED_FRAME_NUMBER = 133
+
+
+class _FrameNumbersCollector(IFramePostProcessor):
+    """
+    Номера выходных кадров: (номер кадра в индексе потока, номер кадра, записанный в изображении)
+    """
+
+    def __init__(self):
+        self.frame_numbers: typing.List[typing.Tuple[int, int]] = []
+
+    def process_frame(self, frame: numpy.ndarray, frame_info: typing.Optional[FrameInfo] = None):
+        self.frame_numbers.append((frame_info.frame_index, get_frame_number(frame)))
+
+
+@pytest.fixture
+def stream(tmp_path) -> typing.Tuple[bytes, typing.List[int]]:
+    """
+    :return: (данные потока, смещения кадров)
+    """
+    filename = str(tmp_path / 'intact.h264')
+    offsets = write_pcm_stream(filename, FRAMES_COUNT, GOP_SIZE)
+    with open(filename, 'rb') as input_file:
+        return input_file.read(), offsets
+
+
+def write_damaged(tmp_path, name: str, data: typing.Union[bytes, bytearray]) -> str:
+    filename = str(tmp_path / '{0}.h264'.format(name))
+    with open(filename, 'wb') as output_file:
+        output_file.write(data)
+    return filename
+
+
+def get_zeroed_stream(stream) -> bytearray:
+    data, offsets = stream
+    damaged = bytearray(data)
+    start, end = offsets[ZEROED_FRAMES.start], offsets[ZEROED_FRAMES.stop]
+    damaged[start:end] = bytes(end - start)
+    return damaged
+
+
+def concatenate(filename: str, stream_index: typing.Optional[H264StreamIndex], tmp_path) -> \
+        typing.Tuple[typing.List[typing.Tuple[int, int]], StageMetrics]:
+    output_video = cv2.VideoWriter(
+        str(tmp_path / 'output.avi'), cv2.VideoWriter_fourcc(*'MJPG'), 25.0, (FRAME_WIDTH, FRAME_HEIGHT))
+    try:
+        concatenator = VideoConcatenator(output_video, FRAME_WIDTH, FRAME_HEIGHT)
+        concatenator.headless = True
+        concatenator.skipped_frames_count = 0
+        collector = _FrameNumbersCollector()
+        concatenator.add_post_processor(collector)
+        concatenator.set_source(filename)
+        input_video = cv2.VideoCapture(filename)
+        try:
+            concatenator.append_video(input_video, stream_index)
+        finally:
+            input_video.release()
+        return collector.frame_numbers, concatenator.metrics
+    finally:
+        output_video.release()
+
+
+def test_intact_stream(tmp_path, stream):
+    stream_index = H264StreamScanner().scan(write_damaged(tmp_path, 'copy', stream[0]))
+
+    assert stream_index.frames_count == FRAMES_COUNT
+    assert stream_index.damaged_ranges == []
+    assert [keyframe.frame_number for keyframe in stream_index.keyframes] == list(range(0, FRAMES_COUNT, GOP_SIZE))
+
+
+def test_truncated_stream(tmp_path, stream):
+    data, offsets = stream
+    filename = write_damaged(tmp_path, 'truncated', data[:offsets[TRUNCATED_FRAME_NUMBER] + 20])
+    stream_index = H264StreamScanner().scan(filename)
+
+    # оборванный последний кадр считается, поврежденным участком он не является
+    assert stream_index.frames_count == TRUNCATED_FRAME_NUMBER + 1
+    assert stream_index.damaged_ranges == []
+
+
+def test_zeroed_frames(tmp_path, stream):
+    stream_index = H264StreamScanner().scan(write_damaged(tmp_path, 'zeroed', get_zeroed_stream(stream)))
+
+    resync_frame_number = 100 - len(ZEROED_FRAMES)
+    assert stream_index.frames_count == FRAMES_COUNT - len(ZEROED_FRAMES)
+    assert stream_index.damaged_ranges == [(ZEROED_FRAMES.start - 1, resync_frame_number)]
+    assert resync_frame_number in [keyframe.frame_number for keyframe in stream_index.keyframes]
+
+
+def test_flipped_start_code(tmp_path, stream):
+    data, offsets = stream
+    damaged = bytearray(data)
+    # стартовый код кадра 30 испорчен: кадр сливается с предыдущим
+    damaged[offsets[30] + 3] = 0x03
+    stream_index = H264StreamScanner().scan(write_damaged(tmp_path, 'start_code', damaged))
+
+    assert stream_index.frames_count == FRAMES_COUNT - 1
+    assert stream_index.damaged_ranges == [(29, 49)]
+
+
+def test_flipped_forbidden_bit(tmp_path, stream):
+    data, offsets = stream
+    damaged = bytearray(data)
+    damaged[offsets[80] + 4] |= 0x80
+    stream_index = H264StreamScanner().scan(write_damaged(tmp_path, 'forbidden_bit', damaged))
+
+    # испорченный NAL блок не считается кадром, участок до следующего ключевого кадра поврежден
+    assert stream_index.frames_count == FRAMES_COUNT - 1
+    assert stream_index.damaged_ranges == [(79, 99)]
+
+
+def test_flipped_frame_num(tmp_path, stream):
+    data, offsets = stream
+    damaged = bytearray(data)
+    # frame_num в заголовке слайса кадра 80 изменен: пропуск в нумерации кадров
+    damaged[offsets[80] + 6] ^= 0x20
+    stream_index = H264StreamScanner().scan(write_damaged(tmp_path, 'frame_num', damaged))
+
+    assert stream_index.frames_count == FRAMES_COUNT
+    assert stream_index.damaged_ranges == [(79, 100)]
+
+
+def test_concatenator_resumes_at_keyframe_after_damage(tmp_path, stream):
+    filename = write_damaged(tmp_path, 'zeroed', get_zeroed_stream(stream))
+    frame_numbers, metrics = concatenate(filename, H264StreamScanner().scan(filename), tmp_path)
+
+    # кадры до поврежденного участка и с ключевого кадра 100 (кадр 93 потока) до конца файла
+    expected_frame_numbers = list(range(ZEROED_FRAMES.start - 1)) + list(range(100, FRAMES_COUNT))
+    assert [frame_number for _, frame_number in frame_numbers] == expected_frame_numbers
+    assert [frame_index for frame_index, _ in frame_numbers] == \
+        [frame_number if frame_number < 100 else frame_number - len(ZEROED_FRAMES)
+         for frame_number in expected_frame_numbers]
+    assert metrics.get_counter(StageMetrics.COUNTER_DAMAGED_REGIONS) == 1
+
+
+def test_concatenator_stops_at_end_of_truncated_stream(tmp_path, stream):
+    data, offsets = stream
+    filename = write_damaged(tmp_path, 'truncated', data[:offsets[TRUNCATED_FRAME_NUMBER] + 20])
+    frame_numbers, metrics = concatenate(filename, H264StreamScanner().scan(filename), tmp_path)
+
+    # без стабилизации после начала файла и без _EOF_FILE_ERROR_FRAMES_COUNT попыток чтения в конце
+    assert [frame_index for frame_index, _ in frame_numbers] == list(range(TRUNCATED_FRAME_NUMBER + 1))
+    assert [frame_number for _, frame_number in frame_numbers[:-1]] == list(range(TRUNCATED_FRAME_NUMBER))
+    assert metrics.get_counter(StageMetrics.COUNTER_FRAMES_GRABBED) == TRUNCATED_FRAME_NUMBER + 1
+    assert metrics.get_report()['stages'][StageMetrics.STAGE_GRAB]['count'] == TRUNCATED_FRAME_NUMBER + 2
+
+
+def test_concatenator_without_index_waits_for_end_of_file(tmp_path, stream):
+    data, offsets = stream
+    filename = write_damaged(tmp_path, 'truncated', data[:offsets[TRUNCATED_FRAME_NUMBER] + 20])
+    frame_numbers, metrics = concatenate(filename, None, tmp_path)
+
+    stable_frame_number = VideoConcatenator._STABILISATION_FRAMES_COUNT - 1
+    assert frame_numbers[0] == (stable_frame_number, stable_frame_number)
+    assert metrics.get_report()['stages'][StageMetrics.STAGE_GRAB]['count'] == \
+        TRUNCATED_FRAME_NUMBER + 1 + VideoConcatenator._EOF_FILE_ERROR_FRAMES_COUNT
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import typing
+
+import cv2
+import numpy
+
+
+def write_numbered_video(filename: str, frames_count: int, size: typing.Tuple[int, int] = (160, 120)) -> str:
+    """
+    Записать видео (MPEG-4 Part 2), в котором яркость кадра задает номер кадра
+    """
+    output_video = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*'mp4v'), 25.0, size)
+    try:
+        for frame_number in range(frames_count):
+            output_video.write(numpy.full((size[1], size[0], 3), (frame_number * 8) % 256, dtype=numpy.uint8))
+    finally:
+        output_video.release()
+    return filename
+
+
+def count_video_frames(filename: str) -> int:
+    """
+    Количество кадров видео (кадры читаются, количество из контейнера не всегда верное)
+    """
+    if not os.path.isfile(filename):
+        return 0
+    input_video = cv2.VideoCapture(filename)
+    try:
+        frames_count = 0
+        while input_video.grab():
+            frames_count += 1
+        return frames_count
+    finally:
+        input_video.release()